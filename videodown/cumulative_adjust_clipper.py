@@ -5,6 +5,7 @@
 """
 
 import os
+import sys
 import subprocess
 import tempfile
 import shutil
@@ -14,6 +15,10 @@ import pysrt
 import chardet
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videorecomp/src'))
+
+from encoding_profiles import get_profile
+
 
 class CumulativeTimeAdjustClipper:
     """累积时间差值调整剪辑器"""
@@ -25,7 +30,8 @@ class CumulativeTimeAdjustClipper:
         new_srt_path: str,
         output_dir: str = "output",
         threshold: float = 0.5,
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         """
         初始化剪辑器
@@ -37,6 +43,7 @@ class CumulativeTimeAdjustClipper:
             output_dir: 输出目录
             threshold: 时间差阈值（秒，默认0.5）
             use_precise_seek: 是否使用精确seek
+            encoding_profile: 精确模式重新编码使用的编码档位 draft/balanced/archive
         """
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -45,6 +52,7 @@ class CumulativeTimeAdjustClipper:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.threshold = threshold
         self.use_precise_seek = use_precise_seek
+        self.profile = get_profile(encoding_profile)
 
         self.temp_dir = Path(tempfile.mkdtemp(prefix="cumulative_adjust_"))
         self.original_subs = None
@@ -236,10 +244,8 @@ class CumulativeTimeAdjustClipper:
                     '-ss', str(start),
                     '-i', self.video_path,
                     '-t', str(duration),
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
+                    *self.profile.video_args(),
+                    *self.profile.audio_args(),
                     '-loglevel', 'error',
                     str(temp_segment)
                 ]
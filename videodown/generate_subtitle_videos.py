@@ -12,6 +12,10 @@ import shutil
 from pathlib import Path
 from typing import Dict, Optional
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videorecomp/src'))
+
+from encoding_profiles import PROFILES, get_profile
+
 def check_ffmpeg():
     """检查FFmpeg是否安装"""
     try:
@@ -88,7 +92,8 @@ def create_hard_subtitle_video(
     video_path: str,
     srt_path: str,
     output_path: str,
-    subtitle_config: Optional[Dict] = None
+    subtitle_config: Optional[Dict] = None,
+    encoding_profile: Optional[str] = None
 ) -> bool:
     """
     创建硬字幕视频（字幕烧录到画面上）
@@ -98,6 +103,7 @@ def create_hard_subtitle_video(
         srt_path: SRT字幕文件路径
         output_path: 输出视频路径
         subtitle_config: 字幕样式配置
+        encoding_profile: 编码档位 draft/balanced/archive（默认 balanced）
 
     Returns:
         是否成功
@@ -156,21 +162,21 @@ def create_hard_subtitle_video(
 
         subtitle_style = ",".join(style_parts)
 
-        # 使用ffmpeg将字幕烧录到视频上
-        # 注意：使用libx264重新编码会降低质量，增加时间
+        # 使用ffmpeg将字幕烧录到视频上（视频按编码档位重新编码，音频直接复制）
+        profile = get_profile(encoding_profile)
         cmd = [
             'ffmpeg', '-y',
             '-i', video_path,
             '-vf', f"subtitles={temp_srt}:force_style='{subtitle_style}'",
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
+            *profile.video_args(),
             '-c:a', 'copy',
+            *profile.container_args(),
             output_path
         ]
 
         try:
             print(f"   字幕样式: {subtitle_style}")
+            print(f"   编码档位: {profile.name}（preset={profile.preset}, crf={profile.crf}）")
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)  # 硬字幕需要更多时间
 
             # 清理临时文件
@@ -232,19 +238,25 @@ def main():
 
     if len(sys.argv) < 3:
         print("使用方法:")
-        print("  python generate_subtitle_videos.py <视频.mp4> <字幕.srt> [输出目录]")
+        print("  python generate_subtitle_videos.py <视频.mp4> <字幕.srt> [输出目录] [编码档位]")
         print("\n示例:")
         print("  python generate_subtitle_videos.py video.mp4 subtitle.srt")
         print("  python generate_subtitle_videos.py video.mp4 subtitle.srt ./output")
+        print("  python generate_subtitle_videos.py video.mp4 subtitle.srt ./output draft")
         print("\n说明:")
         print("  - 软字幕视频: 字幕嵌入到视频容器中，播放时可开关")
         print("  - 硬字幕视频: 字幕烧录到画面上，无法关闭")
         print("  - 字幕样式: 可在脚本中配置")
+        print(f"  - 编码档位: {' / '.join(PROFILES)}（默认 balanced）")
         sys.exit(1)
 
     video_path = sys.argv[1]
     srt_path = sys.argv[2]
     output_dir = sys.argv[3] if len(sys.argv) > 3 else "output"
+    encoding_profile = sys.argv[4] if len(sys.argv) > 4 else None
+    if encoding_profile and encoding_profile.lower() not in PROFILES:
+        print(f"❌ 未知的编码档位: {encoding_profile}（可选: {', '.join(PROFILES)}）")
+        sys.exit(1)
 
     # 验证文件
     if not os.path.exists(video_path):
@@ -293,7 +305,8 @@ def main():
         video_path,
         srt_path,
         str(hard_output),
-        subtitle_config
+        subtitle_config,
+        encoding_profile
     )
 
     # 总结
@@ -5,6 +5,7 @@
 """
 
 import os
+import sys
 import subprocess
 import tempfile
 import shutil
@@ -14,6 +15,10 @@ import pysrt
 import chardet
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videorecomp/src'))
+
+from encoding_profiles import get_profile
+
 
 class IterativeAdjustClipper:
     """迭代调整剪辑器"""
@@ -24,7 +29,8 @@ class IterativeAdjustClipper:
         original_srt_path: str,
         new_srt_path: str,
         output_dir: str = "output",
-        threshold: float = 0.5
+        threshold: float = 0.5,
+        encoding_profile: Optional[str] = None
     ):
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -32,6 +38,7 @@ class IterativeAdjustClipper:
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.threshold = threshold
+        self.profile = get_profile(encoding_profile)
 
         self.temp_dir = Path(tempfile.mkdtemp(prefix="iterative_clip_"))
         self.original_subs = None
@@ -248,10 +255,10 @@ class IterativeAdjustClipper:
             '-loop', '1',
             '-i', str(temp_frame),
             '-t', str(duration_to_add),
-            '-c:v', 'libx264',
-            '-preset', 'fast',
+            '-c:v', self.profile.video_codec,
+            '-preset', self.profile.preset,
             '-tune', 'stillimage',
-            '-crf', '23',
+            '-crf', str(self.profile.crf),
             '-pix_fmt', 'yuv420p',
             '-an',  # 无音频
             str(freeze_frame)
@@ -18,15 +18,12 @@ from datetime import datetime
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 
-# Pillow and OpenCV for hard subtitle generation
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-
 # 添加src目录到路径
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videorecomp/src'))
+
+from encoding_profiles import FrameWriter, get_profile
 
-from video_processor import create_video_recomposer
+# OpenCV / NumPy / Pillow 只在生成硬字幕时导入，服务启动和健康检查不加载
 
 # 配置日志
 logging.basicConfig(
@@ -110,6 +107,12 @@ def upload_files():
         except:
             subtitle_config = {}
 
+        # 编码档位 draft/balanced/archive（可选）
+        try:
+            encoding_profile = get_profile(request.form.get('encoding_profile') or None).name
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         if video.filename == '' or srt.filename == '':
             return jsonify({'error': '文件名为空'}), 400
 
@@ -152,6 +155,7 @@ def upload_files():
                 'srt_path': srt_path,
                 'audio_path': audio_path,
                 'subtitle_config': subtitle_config,
+                'encoding_profile': encoding_profile,
                 'soft_subtitle_video': None,
                 'hard_subtitle_video': None,
                 'error': None
@@ -160,7 +164,7 @@ def upload_files():
         # 在后台线程中处理
         thread = threading.Thread(
             target=process_local_task,
-            args=(task_id, video_path, srt_path, audio_path, subtitle_config)
+            args=(task_id, video_path, srt_path, audio_path, subtitle_config, encoding_profile)
         )
         thread.daemon = True
         thread.start()
@@ -180,7 +184,7 @@ def upload_files():
         return jsonify({'error': str(e)}), 500
 
 
-def process_local_task(task_id, video_path, srt_path, audio_path, subtitle_config):
+def process_local_task(task_id, video_path, srt_path, audio_path, subtitle_config, encoding_profile=None):
     """处理本地任务（后台线程）"""
     try:
         logger.info(f"🎬 开始处理本地任务 {task_id}")
@@ -214,7 +218,8 @@ def process_local_task(task_id, video_path, srt_path, audio_path, subtitle_confi
             video_path,
             srt_path,
             hard_output,
-            subtitle_config
+            subtitle_config,
+            encoding_profile
         )
 
         if success_hard:
@@ -348,8 +353,13 @@ def wrap_text(text, font, draw, max_width):
     return lines
 
 
-def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str, subtitle_config: dict = None) -> bool:
-    """创建硬字幕视频（使用Pillow/OpenCV将字幕烧录到画面上）"""
+def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str, subtitle_config: dict = None,
+                               encoding_profile: str = None) -> bool:
+    """创建硬字幕视频（使用Pillow/OpenCV将字幕烧录到画面上，按编码档位编码并保留原音轨）"""
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
     try:
         logger.info(f"   正在生成硬字幕视频（使用Pillow）...")
         logger.info(f"   输入: {Path(video_path).name}")
@@ -394,9 +404,9 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
 
         logger.info(f"   视频属性: {width}x{height}, {fps:.2f}fps, {total_frames}帧")
 
-        # 设置输出视频编码器
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        # 帧通过管道交给 ffmpeg 编码，同时复制原视频音轨
+        out = FrameWriter(output_path, fps, (width, height), profile=encoding_profile, audio_source=video_path)
+        logger.info(f"   编码档位: {out.profile.name}")
 
         # 准备字体和颜色
         font_size = config['fontSize']
@@ -513,7 +523,7 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
                 logger.info(f"   处理进度: {progress}% ({frame_count}/{total_frames}帧)")
                 last_progress = progress
 
-        # 释放资源
+        # 释放资源（等待 ffmpeg 编码完成）
         cap.release()
         out.release()
 
@@ -530,6 +540,8 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
 
     except Exception as e:
         import traceback
+        if 'out' in locals():
+            out.abort()
         logger.error(f"   ❌ 出错: {e}")
         logger.error(f"   详细错误:\n{traceback.format_exc()}")
         return False
@@ -5,16 +5,22 @@
 """
 
 import os
+import sys
 import subprocess
 import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import pysrt
-import chardet
 from tqdm import tqdm
 import difflib
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'videorecomp/src'))
+
+from subtitle_alignment import SubtitleAligner
+from subtitle_track import detect_srt_encoding
+from encoding_profiles import get_profile
+
 
 class SmartSegmentClipper:
     """智能片段剪辑器"""
@@ -25,7 +31,8 @@ class SmartSegmentClipper:
         original_srt_path: str,
         new_srt_path: str,
         output_dir: str = "output",
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -33,6 +40,7 @@ class SmartSegmentClipper:
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.use_precise_seek = use_precise_seek
+        self.profile = get_profile(encoding_profile)
 
         self.temp_dir = Path(tempfile.mkdtemp(prefix="smart_clip_"))
         self.original_subs = None
@@ -40,10 +48,7 @@ class SmartSegmentClipper:
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -92,12 +97,22 @@ class SmartSegmentClipper:
         video_duration = self.get_video_duration()
 
         segments = []
-        used_original_indices = set()
-
         processing_log = []
 
         print("\n智能提取片段（保留自然间隙）...")
 
+        # 带状DP全局对齐（按文本相似度，每条字幕最多考虑41条候选）
+        aligner = SubtitleAligner(
+            time_weight=0.0,
+            text_weight=1.0,
+            duration_weight=0.0,
+            time_window=60.0,
+            band=41,
+            min_score=0.3,
+            min_text_similarity=0.3
+        )
+        matches = {j: (idx, score) for j, idx, score in aligner.align_subs(self.original_subs, self.new_subs)}
+
         for i, new_sub in enumerate(tqdm(self.new_subs, desc="匹配字幕")):
             new_start = new_sub.start.ordinal / 1000.0
             new_end = new_sub.end.ordinal / 1000.0
@@ -107,25 +122,9 @@ class SmartSegmentClipper:
             best_score = 0.0
             best_index = -1
 
-            # 在原字幕中找匹配（搜索范围：前后各20条）
-            last_used = max(used_original_indices) if used_original_indices else 0
-            search_start = max(0, last_used - 20)
-            search_end = min(len(self.original_subs), last_used + 21)
-
-            for idx in range(search_start, search_end):
-                if idx in used_original_indices:
-                    continue
-
-                orig_sub = self.original_subs[idx]
-                orig_text = orig_sub.text.lower().strip()
-
-                # 计算文本相似度
-                text_sim = self.text_similarity(new_text, orig_text)
-
-                if text_sim > best_score:
-                    best_score = text_sim
-                    best_match = orig_sub
-                    best_index = idx
+            if i in matches:
+                best_index, best_score = matches[i]
+                best_match = self.original_subs[best_index]
 
             # 如果找到匹配（相似度>0.3）
             if best_match and best_score > 0.3:
@@ -138,7 +137,6 @@ class SmartSegmentClipper:
 
                 if clip_end > clip_start:
                     segments.append((clip_start, clip_end))
-                    used_original_indices.add(best_index)
 
                     processing_log.append({
                         'index': i + 1,
@@ -208,10 +206,8 @@ class SmartSegmentClipper:
                     '-ss', str(start),
                     '-i', self.video_path,
                     '-t', str(duration),
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
+                    *self.profile.video_args(),
+                    *self.profile.audio_args(),
                     '-loglevel', 'error',
                     str(temp_segment)
                 ]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3.12
+"""
+分块上传测试 - 超出声明大小的分块被拒绝后重试，最终哈希与文件内容一致
+"""
+
+import io
+import os
+import sys
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'videorecomp/backend'))
+
+from blob_store import BlobStore, UploadError, COPY_BUFFER_SIZE
+
+
+def upload_with_rejected_chunk(declare_length: bool):
+    """正常分块 -> 超长分块（413）-> 正确分块 -> 完成"""
+    # 超长分块的前两个读块仍在声明大小内，第三块才超出（被拒绝前已有数据进入哈希）
+    data = os.urandom(COPY_BUFFER_SIZE * 3 + COPY_BUFFER_SIZE // 2)
+    first, rest = data[:COPY_BUFFER_SIZE], data[COPY_BUFFER_SIZE:]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = BlobStore(root)
+        session = store.create_upload('data.bin', len(data), kind='other')
+        upload_id = session['upload_id']
+
+        store.append_chunk(upload_id, 0, io.BytesIO(first), len(first))
+
+        # 超出声明大小的分块：带 Content-Length 时提前拒绝，不带时读到超出处拒绝
+        overlong = os.urandom(COPY_BUFFER_SIZE * 3)
+        try:
+            store.append_chunk(upload_id, len(first), io.BytesIO(overlong),
+                               len(overlong) if declare_length else None)
+            raise AssertionError('超长分块没有被拒绝')
+        except UploadError as e:
+            assert e.status == 413
+        assert store.get_upload(upload_id)['offset'] == len(first)
+
+        store.append_chunk(upload_id, len(first), io.BytesIO(rest), len(rest))
+        result = store.complete_upload(upload_id)
+
+        expected = hashlib.sha256(data).hexdigest()
+        assert result['sha256'] == expected, (result['sha256'], expected)
+        with open(store.path(expected), 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == expected
+
+
+def test_rejected_chunk_with_length():
+    upload_with_rejected_chunk(declare_length=True)
+
+
+def test_rejected_chunk_without_length():
+    upload_with_rejected_chunk(declare_length=False)
+
+
+def main():
+    test_rejected_chunk_with_length()
+    test_rejected_chunk_without_length()
+    print("\n✅ 测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3.12
+"""
+剪辑决策列表测试 - 剪切/冻结帧插入（片段边界与片段中间）、渲染计划、JSON 导出与恢复
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'videorecomp/src'))
+
+from edit_decision_list import EditDecisionList
+
+
+def close(a, b):
+    return abs(a - b) < 1e-6
+
+
+def assert_plan(plan, expected):
+    """逐项比较渲染计划（source: (start, end)，freeze: (at, duration)）"""
+    assert len(plan) == len(expected), plan
+    for piece, (kind, x, y) in zip(plan, expected):
+        assert piece['type'] == kind, plan
+        if kind == 'source':
+            assert close(piece['start'], x) and close(piece['end'], y), plan
+        else:
+            assert close(piece['at'], x) and close(piece['duration'], y), plan
+
+
+def assert_offsets(edl):
+    """前缀和与片段时长一致"""
+    assert len(edl.offsets) == len(edl.pieces) + 1
+    total = 0.0
+    for piece, offset in zip(edl.pieces, edl.offsets):
+        assert close(offset, total)
+        total += edl.piece_duration(piece)
+    assert close(edl.duration, total)
+
+
+def build_edl():
+    """100 秒原视频：中间剪切、片段中间插冻结帧、片段边界插冻结帧、跨冻结帧剪切"""
+    edl = EditDecisionList('source.mp4', 100.0)
+
+    # 片段中间剪切：[0,10] + [20,100]
+    assert close(edl.cut(10.0, 20.0), 10.0)
+    assert close(edl.duration, 90.0)
+
+    # 片段中间插入：输出 30 秒对应原视频 40 秒
+    assert close(edl.insert_freeze(30.0, 2.0), 2.0)
+    assert close(edl.source_time_at(31.0), 40.0)
+    assert close(edl.source_time_at(33.0), 41.0)
+
+    # 片段边界插入：输出 10 秒是剪切留下的边界，画面取原视频 20 秒
+    assert close(edl.insert_freeze(10.0, 1.0), 1.0)
+    assert close(edl.duration, 93.0)
+    assert_offsets(edl)
+
+    # 跨冻结帧的剪切：输出 [30, 32] 覆盖原视频 [39, 40] 和前 1 秒冻结帧
+    assert close(edl.cut(30.0, 32.0), 2.0)
+    assert close(edl.duration, 91.0)
+    assert_offsets(edl)
+    return edl
+
+
+def test_cut_and_freeze():
+    edl = build_edl()
+    assert_plan(edl.render_plan(), [
+        ('source', 0.0, 10.0),
+        ('freeze', 20.0, 1.0),
+        ('source', 20.0, 39.0),
+        ('freeze', 40.0, 1.0),
+        ('source', 40.0, 100.0),
+    ])
+    assert [op['action'] for op in edl.operations] == ['cut', 'freeze', 'freeze', 'cut']
+
+
+def test_boundaries():
+    edl = EditDecisionList('source.mp4', 10.0)
+    # 开头和结尾插入冻结帧
+    edl.insert_freeze(0.0, 1.0)
+    edl.insert_freeze(edl.duration, 1.0)
+    assert close(edl.duration, 12.0)
+    assert_plan(edl.render_plan(), [
+        ('freeze', 0.0, 1.0),
+        ('source', 0.0, 10.0),
+        ('freeze', 10.0, 1.0),
+    ])
+    # 超出范围的剪切被截断，空区间不产生操作
+    assert close(edl.cut(11.0, 50.0), 1.0)
+    assert close(edl.cut(5.0, 5.0), 0.0)
+    assert close(edl.insert_freeze(3.0, 0.0), 0.0)
+    assert len(edl.operations) == 3
+    assert_offsets(edl)
+
+
+def test_render_plan_merges_splits():
+    """切分后相邻的原视频片段在渲染计划里合并回一个"""
+    edl = EditDecisionList('source.mp4', 60.0)
+    edl._split_at(15.0)
+    edl._split_at(30.0)
+    assert len(edl.pieces) == 3
+    assert_offsets(edl)
+    assert_plan(edl.render_plan(), [('source', 0.0, 60.0)])
+
+
+def test_json_round_trip():
+    edl = build_edl()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = edl.export_json(os.path.join(tmp, 'edl.json'))
+        loaded = EditDecisionList.load_json(path)
+
+    assert loaded.source_path == edl.source_path
+    assert close(loaded.source_duration, edl.source_duration)
+    assert close(loaded.duration, edl.duration)
+    assert loaded.render_plan() == edl.render_plan()
+    assert loaded.operations == edl.operations
+    assert_offsets(loaded)
+    for out_time in (0.0, 10.5, 25.0, 30.5, 90.0):
+        assert close(loaded.source_time_at(out_time), edl.source_time_at(out_time))
+
+    # 恢复后继续编辑与原对象结果一致
+    assert close(loaded.cut(0.0, 5.0), edl.cut(0.0, 5.0))
+    assert loaded.render_plan() == edl.render_plan()
+
+
+def main():
+    test_cut_and_freeze()
+    test_boundaries()
+    test_render_plan_merges_splits()
+    test_json_round_trip()
+    print("\n✅ 测试完成！")
+
+
+if __name__ == "__main__":
+    main()
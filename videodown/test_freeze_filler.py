@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.12
+"""
+冻结帧填充测试 - 检查 h264 / hevc 视频的静帧编码命令
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'videorecomp/src'))
+
+from freeze_filler import FreezeFrameFiller
+from encoding_profiles import get_profile
+
+
+def build_command(codec_name, codec_profile, encoding_profile='balanced', pix_fmt='yuv420p'):
+    """用预置的流参数构建命令（不调用 ffprobe）"""
+    filler = FreezeFrameFiller()
+    video_path = os.path.abspath(f'fake_{codec_name}.mp4')
+    filler._stream_info[video_path] = {
+        'video': {
+            'codec_name': codec_name, 'profile': codec_profile, 'level': 40,
+            'width': 1920, 'height': 1080, 'r_frame_rate': '30/1',
+            'pix_fmt': pix_fmt, 'time_base': '1/15360'
+        },
+        'audio': {'codec_name': 'aac', 'sample_rate': '48000', 'channels': 2}
+    }
+    return filler._build_command(video_path, 1.0, 0.5, 'out.mp4', get_profile(encoding_profile))
+
+
+def test_h264_command():
+    cmd = build_command('h264', 'High')
+    assert cmd[cmd.index('-c:v') + 1] == 'libx264'
+    assert cmd[cmd.index('-profile:v') + 1] == 'high'
+    assert cmd[cmd.index('-level:v') + 1] == '4.0'
+    assert cmd[cmd.index('-preset') + 1] == get_profile('balanced').preset
+    assert cmd[cmd.index('-tune') + 1] == 'stillimage'
+
+
+def test_hevc_command():
+    cmd = build_command('hevc', 'Main', 'draft')
+    assert cmd[cmd.index('-c:v') + 1] == 'libx265'
+    assert cmd[cmd.index('-profile:v') + 1] == 'main'
+    assert cmd[cmd.index('-preset') + 1] == get_profile('draft').preset
+    assert '-tune' not in cmd
+
+    cmd = build_command('hevc', 'Main 10', pix_fmt='yuv420p10le')
+    assert cmd[cmd.index('-profile:v') + 1] == 'main10'
+
+    cmd = build_command('hevc', 'Rext', pix_fmt='yuv422p10le')
+    assert cmd[cmd.index('-profile:v') + 1] == 'main422-10'
+
+    # 不认识的 profile 不传 -profile:v
+    cmd = build_command('hevc', 'Scalable Main')
+    assert '-profile:v' not in cmd
+
+
+def main():
+    test_h264_command()
+    test_hevc_command()
+    print(' '.join(build_command('h264', 'High')))
+    print("\n✅ 测试完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,35 +4,46 @@
 """
 
 import os
+import re
 import uuid
 import shutil
+import time
 import threading
 import logging
-import tempfile
 import subprocess
 import json
-import re
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import sys
 
-# Pillow and OpenCV for hard subtitle generation
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-
 # 添加src目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
-from video_processor import create_video_recomposer
-from subtitle_analyzer import SubtitleAnalyzer
-from enhanced_video_processor import EnhancedVideoClipper, BatchVideoProcessor
-from compact_video_processor import CompactVideoClipper
-from timeline_aligner import TimelineAligner
-from timeline_remap_clipper import TimelineRemapClipper
+# OpenCV / NumPy / Pillow / MoviePy 和各个处理器模块在用到它们的接口或阶段里才导入，
+# 服务启动和健康检查不加载它们（见 benchmarks/import_time.py）
+from task_store import TaskStore
+from job_scheduler import JobScheduler, QueueFullError, parse_priority
+from task_events import TaskEventBroadcaster, format_event, FINAL_STATUSES
+from blob_store import BlobStore, BlobFile, UploadError
+from file_responses import configure_sendfile, send_media, send_zip
+from storage_manager import StorageManager, ArtifactClass, InsufficientStorageError, parse_ttl_hours, projected_output_bytes
+from result_cache import (ResultCache, RESULT_DIR_FIELDS, normalize_params, file_digest, path_inputs, cache_key,
+                          result_dir, result_fields)
+from ffmpeg_progress import run_ffmpeg, run_probe, ProgressTracker, bind_tracker, progress_stage, report_progress, FrameRate
+from ffmpeg_runner import get_runner
+from zip_stream import write_zip
+from scratch_space import SCRATCH_PREFIXES, FAST_DIR, DISK_DIR, scratch_dir, scratch_space, link_or_copy
+from cancellation import CancelToken, TaskCancelled, bind_token, popen_kwargs, tracked_process
+from metrics import REGISTRY, CACHE_REQUESTS, JOB_SECONDS, record_cache, stage_timer
+from task_trace import TaskTrace, bind_trace, trace_span
+from encoding_profiles import PROFILES, DEFAULT_PROFILE, FrameWriter, bind_profile, get_profile
+from proxy_media import (ProxyCache, PREVIEW_PROFILE, DEFAULT_WINDOW_PADDING, parse_cue_selection, cue_window,
+                         cut_window, shift_subtitles, scale_subtitle_config, video_height)
+from freeze_filler import DEFAULT_CACHE_DIR as FILLER_CACHE_FOLDER
 
 # 配置日志
 logging.basicConfig(
@@ -50,12 +61,14 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 DOWNLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'downloads')
 TASKS_FOLDER = os.path.join(os.path.dirname(__file__), 'tasks')
 OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), '../../output/audio_segments')  # 本地输出目录
+GLOBAL_OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), '../../output')  # 全局输出目录
 
 MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB 最大文件大小
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['DOWNLOAD_FOLDER'] = DOWNLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+configure_sendfile(app)
 
 # 确保目录存在
 for folder in [UPLOAD_FOLDER, DOWNLOAD_FOLDER, TASKS_FOLDER, OUTPUT_FOLDER]:
@@ -67,18 +80,519 @@ logger.info(f"   - 下载目录: {DOWNLOAD_FOLDER}")
 logger.info(f"   - 任务目录: {TASKS_FOLDER}")
 logger.info(f"   - 输出目录: {OUTPUT_FOLDER}")
 
-# 任务存储 (生产环境应使用Redis或数据库)
-tasks = {}
+# 任务存储（SQLite WAL，重启后保留，多个API进程可共享）
+TASKS_DB = os.environ.get('VIDEORECOMP_TASKS_DB', os.path.join(TASKS_FOLDER, 'tasks.db'))
+task_store = TaskStore(TASKS_DB)
+logger.info(f"   - 任务数据库: {TASKS_DB}")
+
+tasks = task_store.table('tasks')
 tasks_lock = threading.Lock()
 
 
+def _mark_worker_crashed(task_id):
+    """任务导致工作进程崩溃（段错误、内存耗尽被杀）时标记为失败"""
+    summary = task_store.summary(task_id)
+    if summary is None:
+        return
+    task_store.update(summary['category'], task_id, {
+        'status': 'failed',
+        'error': '工作进程异常退出',
+        'message': '处理失败: 工作进程异常退出（可能是内存不足或解码器崩溃）',
+    })
+
+
+# 任务调度器（按类别排队并限制并发）
+job_scheduler = JobScheduler(on_crash=_mark_worker_crashed)
+
+# 任务进度推送（所有 SSE 连接共享一个轮询线程）
+task_events = TaskEventBroadcaster(task_store)
+
+# 内容寻址的上传文件存储（同一文件只保存一份，可在多个任务间引用）
+BLOB_FOLDER = os.environ.get('VIDEORECOMP_BLOB_DIR', os.path.join(os.path.dirname(__file__), 'blobs'))
+blob_store = BlobStore(BLOB_FOLDER)
+logger.info(f"   - 文件存储: {BLOB_FOLDER}")
+
+# 结果缓存（相同输入 + 相同参数的任务直接复用之前的产物）
+RESULT_CACHE_ENABLED = os.environ.get('VIDEORECOMP_RESULT_CACHE', '1').lower() not in ('0', 'false', 'no')
+RESULT_CACHE_FOLDER = os.environ.get('VIDEORECOMP_RESULT_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'result_cache'))
+result_cache = ResultCache(
+    RESULT_CACHE_FOLDER,
+    policy=os.environ.get('VIDEORECOMP_RESULT_CACHE_POLICY', 'lru'),
+    max_bytes=int(float(os.environ.get('VIDEORECOMP_RESULT_CACHE_MAX_GB', '50')) * 1024 ** 3),
+    max_entries=int(os.environ.get('VIDEORECOMP_RESULT_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=float(os.environ.get('VIDEORECOMP_RESULT_CACHE_TTL_DAYS', '30')) * 86400,
+)
+logger.info(f"   - 结果缓存: {RESULT_CACHE_FOLDER} ({result_cache.policy}{'' if RESULT_CACHE_ENABLED else '，已关闭'})")
+
+# 磁盘配额与存储清理（各类目录按保留时间过期，超配额时按最近使用时间淘汰）
+STORAGE_TTL_HOURS = parse_ttl_hours(os.environ.get('VIDEORECOMP_STORAGE_TTL_HOURS', ''), {
+    'tasks': 7 * 24,
+    'downloads': 3 * 24,
+    'output': 14 * 24,
+    'global_output': 14 * 24,
+    'temp': 6,
+    'proxies': 3 * 24,
+    'filler_cache': 24,
+    'uploads': 3 * 24,
+    'blobs': 7 * 24,
+    'upload_sessions': 24,
+})
+
+# 预览模式的低分辨率代理（按视频内容缓存，删除后下次预览时重新生成）
+PROXY_FOLDER = os.environ.get('VIDEORECOMP_PROXY_DIR', os.path.join(os.path.dirname(__file__), 'proxy_cache'))
+proxy_cache = ProxyCache(PROXY_FOLDER)
+PREVIEW_OUTPUT_DIR = 'preview'  # 预览产物写在任务输出目录下的这个子目录
+logger.info(f"   - 预览代理: {PROXY_FOLDER}（{proxy_cache.height}p）")
+
+storage_manager = StorageManager(
+    task_store,
+    [
+        ArtifactClass('tasks', TASKS_FOLDER, STORAGE_TTL_HOURS['tasks'], dirs_only=True),
+        ArtifactClass('downloads', DOWNLOAD_FOLDER, STORAGE_TTL_HOURS['downloads']),
+        ArtifactClass('output', OUTPUT_FOLDER, STORAGE_TTL_HOURS['output']),
+        ArtifactClass('global_output', GLOBAL_OUTPUT_FOLDER, STORAGE_TTL_HOURS['global_output'], patterns=('adjusted_*',)),
+        ArtifactClass('proxies', PROXY_FOLDER, STORAGE_TTL_HOURS['proxies'], patterns=('proxy_*',)),
+        # 冻结帧填充片段缓存（在系统临时目录下，删除后下次用到时重新生成）
+        ArtifactClass('filler_cache', str(FILLER_CACHE_FOLDER), STORAGE_TTL_HOURS['filler_cache'],
+                      patterns=('filler_*',)),
+        ArtifactClass('uploads', UPLOAD_FOLDER, STORAGE_TTL_HOURS['uploads']),
+        # 内容寻址存储：objects/<前两位>/<哈希>，元数据 <哈希>.json 随文件一起删除
+        ArtifactClass('blobs', blob_store.objects_dir, STORAGE_TTL_HOURS['blobs'], excludes=('*.json',),
+                      depth=2, sidecars=('.json',)),
+        # 放弃的分块上传会话（<ID>.part + <ID>.json，只按保留时间回收）
+        ArtifactClass('upload_sessions', blob_store.uploads_dir, STORAGE_TTL_HOURS['upload_sessions'],
+                      patterns=('*.part',), sidecars=('.json',), evictable=False),
+        # 处理器崩溃时遗留的临时工作区（只按保留时间回收，不参与配额淘汰；填充缓存目录由 filler_cache 单独管理）
+        *[
+            ArtifactClass(
+                name, root, STORAGE_TTL_HOURS['temp'], patterns=[f'{prefix}*' for prefix in SCRATCH_PREFIXES],
+                excludes=(FILLER_CACHE_FOLDER.name,), dirs_only=True, evictable=False
+            )
+            for name, root in (('temp', DISK_DIR), ('temp_fast', FAST_DIR)) if root and os.path.isdir(root)
+        ],
+    ],
+    quota_bytes=int(float(os.environ.get('VIDEORECOMP_STORAGE_QUOTA_GB', '200')) * 1024 ** 3),
+    min_free_bytes=int(float(os.environ.get('VIDEORECOMP_MIN_FREE_GB', '5')) * 1024 ** 3),
+    interval=float(os.environ.get('VIDEORECOMP_STORAGE_GC_INTERVAL', '600')),
+    lock_path=os.path.join(TASKS_FOLDER, '.storage_gc.lock'),
+    is_active=lambda task_id: job_scheduler.job_status(task_id) is not None,
+)
+
+# 指标（工作进程在任务结束后把快照写到这里，/api/metrics 汇总；以 . 开头，存储清理不会当成任务目录）
+METRICS_FOLDER = os.environ.get('VIDEORECOMP_METRICS_DIR', os.path.join(TASKS_FOLDER, '.metrics'))
+REGISTRY.configure(METRICS_FOLDER)
+
+
+def uploaded_files() -> dict:
+    """
+    当前请求的上传文件：表单文件，以及用 `<字段名>_blob=<sha256>` 引用的已上传文件
+
+    Returns:
+        {字段名: FileStorage 或 BlobFile}，两者都支持 .filename 和 .save(path)
+    """
+    if 'uploaded_files' not in g:
+        files = {}
+        for key, value in request.form.items():
+            if key.endswith('_blob') and value:
+                field = key[:-len('_blob')]
+                try:
+                    files[field] = BlobFile(blob_store, value.strip().lower(), request.form.get(f'{field}_filename'))
+                except UploadError as e:
+                    logger.warning(f"⚠️  引用的文件无效（{field}）: {e}")
+        for key in request.files:
+            if request.files[key].filename or key not in files:
+                files[key] = request.files[key]
+        g.uploaded_files = files
+    return g.uploaded_files
+
+
+def request_fingerprint() -> dict:
+    """
+    当前请求的输入指纹（结果缓存用）
+
+    Returns:
+        {'inputs': {字段名: SHA-256}, 'params': 归一化后的表单/JSON 参数}
+    """
+    if 'request_fingerprint' not in g:
+        inputs = {}
+        for field, file in uploaded_files().items():
+            digest = file_digest(file)
+            if digest:
+                inputs[field] = digest
+        params = request.form.to_dict()
+        params.update(request.get_json(silent=True) or {})
+        params = normalize_params(params)
+        # 服务器端路径参数按文件内容计入输入（路径字符串仍保留在参数中）
+        inputs.update(path_inputs(params))
+        g.request_fingerprint = {'inputs': inputs, 'params': params}
+    return g.request_fingerprint
+
+
+def _use_result_cache() -> bool:
+    """请求可以用 use_cache=false 跳过缓存（结果仍会写入缓存）"""
+    value = request.values.get('use_cache') or (request.get_json(silent=True) or {}).get('use_cache')
+    return str(value).lower() not in ('0', 'false', 'no', 'off')
+
+
+def _restore_cached_result(table, task_id, fn) -> bool:
+    """
+    查找结果缓存，命中则把产物硬链接到新任务并直接完成
+
+    Returns:
+        是否命中
+    """
+    record = table.get(task_id)
+    if record is None or not RESULT_CACHE_ENABLED:
+        return False
+
+    # 先上传、后处理的接口在上传时记录了指纹
+    fingerprint = record.get('fingerprint') or request_fingerprint()
+    # 不同编码档位的产物不能互相复用，预览产物也不能当作正式结果
+    params = {**fingerprint['params'], 'encoding_profile': record.get('encoding_profile', DEFAULT_PROFILE)}
+    if record.get('preview'):
+        params['preview'] = True
+    key = cache_key(f'{table.category}.{fn.__name__}', fingerprint['inputs'], params)
+    record['cache_key'] = key
+    if not _use_result_cache():
+        return False
+
+    dest_dir = _output_dir(record, os.path.join(TASKS_FOLDER, task_id, 'output'))
+    try:
+        fields = result_cache.restore(key, f'{table.category}.{fn.__name__}', dest_dir)
+    except Exception as e:
+        logger.warning(f"⚠️  读取结果缓存失败（任务 {task_id}）: {e}")
+        return False
+    record_cache('result', fields is not None)
+    if fields is None:
+        return False
+
+    record.update({
+        **fields,
+        'status': 'completed',
+        'progress': 100,
+        'message': '处理完成（复用相同输入的已有结果）',
+        'completed_at': datetime.now().isoformat(),
+        'cache_hit': True,
+    })
+    if record.get('preview'):
+        record['preview_fields'] = sorted(fields)
+    logger.info(f"♻️  任务 {task_id} 命中结果缓存 {key[:12]}，已直接完成")
+    return True
+
+
+def _remember_result(category, task_id, fn, before):
+    """任务成功后把结果写入缓存"""
+    after = task_store.get(category, task_id)
+    if not after or after.get('status') != 'completed':
+        return
+    try:
+        if result_cache.store(before['cache_key'], f'{category}.{fn.__name__}',
+                              result_fields(before, after), _output_dir(after)):
+            logger.info(f"♻️  任务 {task_id} 的结果已缓存 {before['cache_key'][:12]}")
+    except Exception as e:
+        logger.warning(f"⚠️  写入结果缓存失败（任务 {task_id}）: {e}")
+
+
+def _remember_preview_fields(category, task_id, before):
+    """记录预览产生的结果字段，去掉 preview 参数正式渲染时清除"""
+    after = task_store.get(category, task_id)
+    if after and after.get('status') == 'completed':
+        task_store.update(category, task_id, {'preview_fields': sorted(result_fields(before, after))})
+
+
+def _discard_cancelled(category, task_id, before):
+    """删除被取消任务的半成品输出，任务记录还在时标记为已取消"""
+    record = task_store.get(category, task_id)
+    roots = [os.path.realpath(p) for p in (OUTPUT_FOLDER, DOWNLOAD_FOLDER, TASKS_FOLDER)]
+    for source in (before, record or {}):
+        for field in RESULT_DIR_FIELDS:
+            path = source.get(field)
+            # 预览任务只删除预览输出，不动之前正式渲染的结果
+            if path and before.get('preview'):
+                path = os.path.join(path, PREVIEW_OUTPUT_DIR)
+            if not path or not os.path.isdir(path):
+                continue
+            real = os.path.realpath(path)
+            # 只删除任务自己的输出目录，不动根目录本身
+            if any(real != root and os.path.commonpath([root, real]) == root for root in roots):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"🧹 已删除被取消任务 {task_id} 的输出: {path}")
+
+    if record is not None:
+        task_store.update(category, task_id, {
+            'status': 'cancelled',
+            'message': '任务已取消',
+            'cancelled_at': datetime.now().isoformat(),
+        })
+
+
+# 所有任务都开启调用栈采样（否则只有提交时带 profile=1 的任务开启）
+TRACE_PROFILE_ALL = os.environ.get('VIDEORECOMP_TRACE_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+
+def _profile_requested() -> bool:
+    """请求可以用 profile=1 开启调用栈采样"""
+    value = request.values.get('profile') or (request.get_json(silent=True) or {}).get('profile')
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _preview_requested() -> bool:
+    """请求可以用 preview=1 在低分辨率代理上快速出预览"""
+    value = request.values.get('preview') or (request.get_json(silent=True) or {}).get('preview')
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _final_render_pending(task: dict) -> bool:
+    """预览完成的任务可以去掉 preview 参数再提交一次，做原视频的正式渲染"""
+    return bool(task.get('preview')) and task.get('type') != 'preview' and not _preview_requested()
+
+
+def _output_dir(record: dict, default: str = None) -> str:
+    """任务产物所在目录（预览任务是输出目录下的 preview/ 子目录）"""
+    path = result_dir(record) or default
+    if path and record.get('preview'):
+        path = os.path.join(path, PREVIEW_OUTPUT_DIR)
+    return path
+
+
+def _requested_encoding_profile(record: dict) -> str:
+    """
+    任务使用的编码档位：本次请求的 encoding_profile，其次是上传时记录的参数，
+    都没有时为默认档位（预览任务为 draft）
+
+    Raises:
+        ValueError: 未知的档位名
+    """
+    value = request.values.get('encoding_profile') or (request.get_json(silent=True) or {}).get('encoding_profile')
+    if not value:
+        value = ((record.get('fingerprint') or {}).get('params') or {}).get('encoding_profile')
+    return get_profile(value or (PREVIEW_PROFILE if record.get('preview') else DEFAULT_PROFILE)).name
+
+
+def trace_paths(task_id):
+    """任务的追踪文件路径 (Chrome trace JSON, folded stacks)"""
+    folder = os.path.join(TASKS_FOLDER, task_id)
+    return os.path.join(folder, 'trace.json'), os.path.join(folder, 'profile.folded')
+
+
+@contextmanager
+def _preview_inputs(category, task_id, record, args):
+    """
+    预览任务读代理、写预览目录，任务结束后还原任务记录
+
+    - 原视频换成代理：代理链接到任务目录下并沿用原视频的文件名（输出文件按视频名命名），
+      原视频路径在执行期间记录在 source_video_path 字段
+    - 输出目录换成其下的 preview/ 子目录，预览产物不覆盖正式渲染的同名文件
+    - 字幕样式（subtitle_config）中的像素值按代理与原视频的高度比例缩放，预览的字幕布局与成片一致
+
+    任务参数中与任务记录相同的路径和字幕样式一并替换。
+    """
+    replaced = {}
+    for field in RESULT_DIR_FIELDS:
+        if record.get(field):
+            replaced[field] = os.path.join(record[field], PREVIEW_OUTPUT_DIR)
+            os.makedirs(replaced[field], exist_ok=True)
+
+    video_path = record.get('video_path')
+    if video_path and os.path.exists(video_path):
+        progress_stage('proxy', 0, 5)
+        try:
+            with trace_span('preview.proxy', 'preview'):
+                proxy_path = proxy_cache.get_proxy(video_path)
+        except Exception as e:
+            # 生成代理失败不影响任务本身，按原视频执行（只是慢一些）
+            logger.warning(f"⚠️  生成代理失败，任务 {task_id} 使用原视频: {e}")
+            proxy_path = None
+        if proxy_path is not None:
+            replaced['video_path'] = link_or_copy(
+                proxy_path, os.path.join(TASKS_FOLDER, task_id, 'preview', f'{Path(video_path).stem}.mp4')
+            )
+            replaced['source_video_path'] = video_path
+            logger.info(f"🎞️  任务 {task_id} 使用 {proxy_cache.height}p 代理预览")
+
+            source_height = video_height(video_path)
+            preview_height = video_height(replaced['video_path'])
+            factor = preview_height / source_height if source_height and preview_height else 1.0
+            if 'subtitle_config' in record and factor != 1.0:
+                # 没填字号、底边距时按硬字幕默认值缩放
+                config = {key: HARD_SUBTITLE_DEFAULTS[key] for key in ('fontSize', 'bottomMargin')}
+                config.update(record.get('subtitle_config') or {})
+                replaced['subtitle_config'] = scale_subtitle_config(config, factor)
+
+    paths = {record[field]: value for field, value in replaced.items()
+             if isinstance(record.get(field), str) and record.get(field)}
+
+    def swap(arg):
+        if isinstance(arg, str):
+            return paths.get(arg, arg)
+        if 'subtitle_config' in replaced and isinstance(arg, dict) and arg == record.get('subtitle_config'):
+            return replaced['subtitle_config']
+        return arg
+
+    task_store.update(category, task_id, replaced)
+    try:
+        yield tuple(swap(arg) for arg in args)
+    finally:
+        if task_store.get(category, task_id) is not None:
+            restored = {field: record[field] for field in replaced if field in record}
+            task_store.update(category, task_id, restored)
+            task_store.remove_fields(category, task_id, [field for field in replaced if field not in record])
+
+
+def _run_tracked(category, task_id, fn, args):
+    """
+    执行任务函数，ffmpeg / 逐帧循环的进度写回任务存储
+
+    任务记录被删除或标记为 cancelled 后，取消令牌结束正在运行的子进程组，
+    处理流程在下一个检查点抛出 TaskCancelled，半成品输出随后被删除。
+    执行过程记录为追踪文件（见 /api/tasks/<task_id>/trace）
+    """
+    if task_store.cancel_requested(category, task_id):
+        logger.info(f"⚠️  任务 {task_id} 在开始前已取消")
+        return
+
+    tracker = ProgressTracker(lambda snapshot: task_store.update_progress(
+        category, task_id, snapshot.get('progress'), snapshot['progress_detail']
+    ))
+    token = CancelToken(task_id)
+    stop_watch = token.watch(lambda: task_store.cancel_requested(category, task_id))
+    before = task_store.get(category, task_id) or {}
+    trace = TaskTrace(task_id, profile=bool(before.get('profile')) or TRACE_PROFILE_ALL).start()
+    root = trace.begin(f'{category}.{fn.__name__}', 'task', task_id=task_id)
+    started = time.perf_counter()
+    try:
+        with bind_tracker(tracker), bind_token(token), bind_trace(trace), \
+                bind_profile(before.get('encoding_profile')):
+            if before.get('preview'):
+                with _preview_inputs(category, task_id, before, args) as preview_args:
+                    fn(*preview_args)
+            else:
+                fn(*args)
+    except TaskCancelled as e:
+        logger.info(f"⚠️  {e}")
+    finally:
+        stop_watch()
+        with bind_trace(trace):
+            tracker.finish()
+        trace.stop()
+
+    if token.cancelled:
+        _discard_cancelled(category, task_id, before)
+    else:
+        if before.get('cache_key'):
+            _remember_result(category, task_id, fn, before)
+        if before.get('preview'):
+            _remember_preview_fields(category, task_id, before)
+
+    record = task_store.get(category, task_id)
+    status = 'cancelled' if token.cancelled else (record or {}).get('status', 'unknown')
+    JOB_SECONDS.observe(time.perf_counter() - started, category=category, status=status)
+    REGISTRY.flush()
+
+    trace.end(root, status=status)
+    if record is not None:
+        try:
+            trace.save(*trace_paths(task_id))
+        except OSError as e:
+            logger.warning(f"⚠️  保存任务追踪失败（任务 {task_id}）: {e}")
+
+
+def submit_job(job_class, table, task_id, fn, args, discard_on_reject=False):
+    """
+    提交任务到调度器
+
+    Args:
+        job_class: 任务类别 (separation / render / light)
+        table: 任务所在的任务表
+        task_id: 任务ID
+        fn: 任务函数
+        args: 任务函数参数
+        discard_on_reject: 被拒绝时是否删除任务记录（上传即开始的接口）
+
+    Returns:
+        需要直接返回的响应（重复提交、编码档位无效、队列已满或磁盘空间不足），成功提交或命中结果缓存返回 None
+
+    请求带 preview=1 时任务在低分辨率代理上执行（见 _preview_inputs），默认使用 draft 编码档位
+    """
+    if job_scheduler.job_status(task_id) is not None:
+        return jsonify({'status': 'queued', 'message': '任务已在队列中', **job_scheduler.job_status(task_id)}), 200
+
+    record = table.get(task_id)
+    if record is not None:
+        # 同一个任务可以先预览、再去掉 preview 参数正式渲染（预览产物的字段随之清除）
+        preview = _preview_requested() or record.get('type') == 'preview'
+        if not preview and record.get('preview_fields'):
+            task_store.remove_fields(table.category, task_id, record.pop('preview_fields'))
+            record = table.get(task_id)
+        record['preview'] = preview
+        try:
+            record['encoding_profile'] = _requested_encoding_profile(record)
+        except ValueError as e:
+            if discard_on_reject:
+                table.pop(task_id, None)
+            return jsonify({'error': str(e)}), 400
+
+    if _restore_cached_result(table, task_id, fn):
+        return None
+
+    try:
+        storage_manager.ensure_capacity(projected_output_bytes(table.get(task_id) or {}, job_class))
+    except InsufficientStorageError as e:
+        logger.warning(f"⚠️  {e}（任务 {task_id}）")
+        if discard_on_reject:
+            table.pop(task_id, None)
+        return jsonify({'error': str(e), 'required_bytes': e.required, 'free_bytes': e.available}), 507
+
+    if _profile_requested():
+        record = table.get(task_id)
+        if record is not None:
+            record['profile'] = True
+
+    try:
+        priority = parse_priority(request.values.get('priority') or (request.get_json(silent=True) or {}).get('priority'))
+        position = job_scheduler.submit(
+            job_class, task_id, _run_tracked, args=(table.category, task_id, fn, args), priority=priority
+        )
+    except QueueFullError as e:
+        logger.warning(f"⚠️  {e}（任务 {task_id}）")
+        if discard_on_reject:
+            table.pop(task_id, None)
+        response = jsonify({'error': str(e), 'job_class': e.job_class, 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response, 429
+
+    if position > 0:
+        record = table.get(task_id)
+        if record is not None:
+            record['message'] = f'排队中，前面还有 {position} 个任务'
+        logger.info(f"⏳ 任务 {task_id} 进入 {job_class} 队列，位置: {position}")
+    return None
+
+
+def with_schedule_info(task_id, payload: dict) -> dict:
+    """在状态响应中附加阶段进度、排队位置和预计剩余时间"""
+    if 'progress_detail' not in payload:
+        summary = task_store.summary(task_id)
+        if summary and summary.get('progress_detail'):
+            payload['progress_detail'] = summary['progress_detail']
+
+    info = job_scheduler.job_status(task_id)
+    if info:
+        detail = payload.get('progress_detail') or {}
+        # 运行中的任务优先用实际进度推算剩余时间
+        if info['state'] == 'running' and detail.get('eta_seconds') is not None:
+            info['eta_seconds'] = detail['eta_seconds']
+        payload.update(info)
+    return payload
+
+
 # ==================== 辅助函数 ====================
 
 def get_video_duration(video_path: str) -> float:
     """获取视频时长"""
     cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', video_path]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = run_probe(cmd)
         info = json.loads(result.stdout)
         return float(info['format']['duration'])
     except:
@@ -105,7 +619,7 @@ def create_soft_subtitle_video(video_path: str, srt_path: str, output_path: str)
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        result = run_ffmpeg(cmd, timeout=600)
 
         if result.returncode == 0 and os.path.exists(output_path):
             duration = get_video_duration(output_path)
@@ -127,38 +641,10 @@ def create_soft_subtitle_video(video_path: str, srt_path: str, output_path: str)
 
 def parse_srt(srt_path: str) -> list:
     """解析SRT字幕文件，返回字幕条目列表"""
-    subtitles = []
-
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # SRT格式：序号 -> 时间轴 -> 文本 -> 空行
-    pattern = r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n(.*?)(?=\n\n|\n*$)'
-    matches = re.findall(pattern, content, re.DOTALL)
-
-    for match in matches:
-        index = int(match[0])
-        start_time = match[1]
-        end_time = match[2]
-        text = match[3].replace('\n', ' ')  # 多行字幕合并为一行
-
-        # 转换时间戳为秒
-        def time_to_seconds(time_str):
-            h, m, s_ms = time_str.split(':')
-            s, ms = s_ms.split(',')
-            return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
-
-        start_seconds = time_to_seconds(start_time)
-        end_seconds = time_to_seconds(end_time)
-
-        subtitles.append({
-            'index': index,
-            'start': start_seconds,
-            'end': end_seconds,
-            'text': text.strip()
-        })
+    from subtitle_track import SubtitleTrack
 
-    return subtitles
+    # 单遍列式解析（编码只按文件开头样本检测）
+    return SubtitleTrack.load(srt_path).to_dicts()
 
 
 def wrap_text(text, font, draw, max_width):
@@ -185,24 +671,37 @@ def wrap_text(text, font, draw, max_width):
     return lines
 
 
+# 硬字幕默认样式（像素值按原视频分辨率，预览时按代理高度缩放）
+HARD_SUBTITLE_DEFAULTS = {
+    'fontSize': 24,
+    'fontColor': '#FFFFFF',
+    'bold': False,
+    'italic': False,
+    'outline': True,
+    'shadow': True,
+    'bottomMargin': 50,  # 距离底部的高度（像素）
+    'maxWidthRatio': 0.9  # 字幕最大宽度占视频宽度的比例
+}
+
+
 def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str, subtitle_config: dict = None) -> bool:
     """创建硬字幕视频（使用Pillow/OpenCV将字幕烧录到画面上）"""
+    with stage_timer('burn', inputs=[video_path], outputs=[output_path]):
+        return _burn_subtitles(video_path, srt_path, output_path, subtitle_config)
+
+
+def _burn_subtitles(video_path: str, srt_path: str, output_path: str, subtitle_config: dict = None) -> bool:
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
     try:
         logger.info(f"   正在生成硬字幕视频（使用Pillow）...")
         logger.info(f"   输入: {Path(video_path).name}")
         logger.info(f"   输出: {Path(output_path).name}")
 
         # 默认配置
-        config = {
-            'fontSize': 24,
-            'fontColor': '#FFFFFF',
-            'bold': False,
-            'italic': False,
-            'outline': True,
-            'shadow': True,
-            'bottomMargin': 50,  # 距离底部的高度（像素）
-            'maxWidthRatio': 0.9  # 字幕最大宽度占视频宽度的比例
-        }
+        config = dict(HARD_SUBTITLE_DEFAULTS)
         if subtitle_config:
             config.update(subtitle_config)
 
@@ -231,9 +730,9 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
 
         logger.info(f"   视频属性: {width}x{height}, {fps:.2f}fps, {total_frames}帧")
 
-        # 设置输出视频编码器
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        # 帧通过管道交给 ffmpeg 按任务的编码档位编码，同时复制原视频音轨
+        out = FrameWriter(output_path, fps, (width, height), audio_source=video_path)
+        logger.info(f"   编码档位: {out.profile.name}")
 
         # 准备字体和颜色
         font_size = config['fontSize']
@@ -270,6 +769,7 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
         # 处理每一帧
         frame_count = 0
         last_progress = 0
+        frame_rate = FrameRate(total_frames)
 
         logger.info(f"   开始处理视频帧...")
 
@@ -343,47 +843,20 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
             out.write(frame)
 
             frame_count += 1
+            frame_rate.tick()
 
             # 显示进度
             progress = int((frame_count / total_frames) * 100)
             if progress - last_progress >= 10:  # 每10%显示一次
-                logger.info(f"   处理进度: {progress}% ({frame_count}/{total_frames}帧)")
+                logger.info(f"   处理进度: {progress}% ({frame_count}/{total_frames}帧, {frame_rate.fps:.1f}fps)")
                 last_progress = progress
 
-        # 释放资源
+        # 释放资源（等待 ffmpeg 编码完成）
         cap.release()
         out.release()
 
         logger.info(f"   ✅ 视频处理完成，共处理 {frame_count} 帧")
 
-        # OpenCV生成的视频没有音频，需要从原视频复制音频
-        logger.info(f"   正在为硬字幕视频添加音轨...")
-
-        temp_output_with_audio = output_path.replace('.mp4', '_temp_with_audio.mp4')
-
-        cmd = [
-            'ffmpeg', '-y',
-            '-i', output_path,     # 硬字幕视频（无音频）
-            '-i', video_path,      # 原视频（有音频）
-            '-map', '0:v:0',       # 使用硬字幕视频的视频流
-            '-map', '1:a:0?',      # 使用原视频的音频流（如果存在）
-            '-c:v', 'copy',        # 视频流直接复制
-            '-c:a', 'aac',         # 音频编码为AAC
-            '-b:a', '192k',        # 音频比特率192kbps
-            '-shortest',           # 以最短的流为准
-            temp_output_with_audio
-        ]
-
-        ffmpeg_result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if ffmpeg_result.returncode != 0:
-            logger.warning(f"   ⚠️  添加音轨失败: {ffmpeg_result.stderr}")
-            logger.warning(f"   ⚠️  将返回不带音频的硬字幕视频")
-        else:
-            logger.info(f"   ✅ 硬字幕视频音轨添加完成")
-            # 用带音频的视频替换原硬字幕视频
-            shutil.move(temp_output_with_audio, output_path)
-
         # 验证输出文件
         if os.path.exists(output_path):
             duration = get_video_duration(output_path)
@@ -395,6 +868,10 @@ def create_hard_subtitle_video(video_path: str, srt_path: str, output_path: str,
 
     except Exception as e:
         import traceback
+        if 'out' in locals():
+            out.abort()
+        if isinstance(e, subprocess.CalledProcessError):
+            logger.error(f"   ❌ 编码失败: {(e.stderr or '').strip()[-500:]}")
         logger.error(f"   ❌ 出错: {e}")
         logger.error(f"   详细错误:\n{traceback.format_exc()}")
         return False
@@ -462,7 +939,7 @@ def _create_subtitle_clips_for_video(video_clip, subtitles_data, subtitle_style)
 
 # ==================== 软硬字幕生成API ====================
 
-subtitle_tasks = {}
+subtitle_tasks = task_store.table('subtitle_tasks')
 subtitle_tasks_lock = threading.Lock()
 
 
@@ -503,25 +980,25 @@ def subtitle_generate_upload():
 
         # 检查必需文件
         if not audio_only and not ai_separation_only and not one_click_workflow:
-            if 'srt' not in request.files:
+            if 'srt' not in uploaded_files():
                 return jsonify({'error': '缺少字幕文件'}), 400
 
         # 一键式工作流需要所有文件
         if one_click_workflow:
-            if 'srt' not in request.files:
+            if 'srt' not in uploaded_files():
                 return jsonify({'error': '缺少字幕文件'}), 400
-            if 'video' not in request.files:
+            if 'video' not in uploaded_files():
                 return jsonify({'error': '缺少视频文件'}), 400
-            if 'audio' not in request.files:
+            if 'audio' not in uploaded_files():
                 return jsonify({'error': '缺少配音音频文件'}), 400
         if not audio_only and not ai_separation_only:
-            if 'srt' not in request.files:
+            if 'srt' not in uploaded_files():
                 return jsonify({'error': '缺少字幕文件'}), 400
 
-        srt = request.files.get('srt')
+        srt = uploaded_files().get('srt')
 
         # 视频文件：在非纯音频合成模式下必需
-        video = request.files.get('video')
+        video = uploaded_files().get('video')
         # audio_only模式不需要视频，只需要字幕和配音
         # ai_separation_only模式需要视频
         # 其他模式也需要视频
@@ -531,8 +1008,8 @@ def subtitle_generate_upload():
             return jsonify({'error': '缺少视频文件'}), 400
 
         # 获取可选文件
-        original_srt = request.files.get('original_srt')
-        audio_zip = request.files.get('audio')
+        original_srt = uploaded_files().get('original_srt')
+        audio_zip = uploaded_files().get('audio')
 
         # 纯音频合成模式下，音频文件是必需的
         if audio_only and not audio_zip:
@@ -691,17 +1168,16 @@ def subtitle_generate_upload():
                 'error': None
             }
 
-        # 在后台线程中处理
-        logger.info(f"   正在创建后台线程...")
-        thread = threading.Thread(
-            target=process_subtitle_generate_task_v2,
-            args=(task_id, video_path, srt_path, output_dir, subtitle_config,
-                  original_srt_path, audio_zip_path, enable_ai_separation, generate_no_subtitle, audio_only, ai_separation_only, one_click_workflow)
+        # 提交到任务调度器（队列已满时返回429）
+        job_class = 'separation' if (enable_ai_separation or ai_separation_only) else 'render'
+        rejected = submit_job(
+            job_class, subtitle_tasks, task_id, process_subtitle_generate_task_v2,
+            (task_id, video_path, srt_path, output_dir, subtitle_config,
+             original_srt_path, audio_zip_path, enable_ai_separation, generate_no_subtitle, audio_only, ai_separation_only, one_click_workflow),
+            discard_on_reject=True
         )
-        thread.daemon = True
-        logger.info(f"   线程对象已创建，准备启动...")
-        thread.start()
-        logger.info(f"   ✅ 后台线程已启动，task_id={task_id}")
+        if rejected:
+            return rejected
 
         logger.info("=" * 60)
 
@@ -728,6 +1204,7 @@ def process_subtitle_generate_task(task_id, video_path, srt_path, output_dir, su
         # 生成软字幕视频
         logger.info(f"📝 步骤1/2: 生成软字幕视频")
         update_subtitle_task_status(task_id, 'processing', 25, '正在生成软字幕视频...')
+        progress_stage('soft_subtitle', 25, 50)
 
         soft_output = os.path.join(output_dir, f"{video_name}_soft.mp4")
         success_soft = create_soft_subtitle_video(video_path, srt_path, soft_output)
@@ -746,6 +1223,7 @@ def process_subtitle_generate_task(task_id, video_path, srt_path, output_dir, su
         # 生成硬字幕视频
         logger.info(f"📝 步骤2/2: 生成硬字幕视频")
         update_subtitle_task_status(task_id, 'burning', 50, '正在生成硬字幕视频...')
+        progress_stage('hard_subtitle', 50, 99)
 
         hard_output = os.path.join(output_dir, f"{video_name}_hard.mp4")
         success_hard = create_hard_subtitle_video(
@@ -859,6 +1337,8 @@ def process_subtitle_generate_task_v2(task_id, video_path, srt_path, output_dir,
             logger.info(f"   有配音文件，使用完整处理流程")
             # 尝试使用 video_processor
             try:
+                from video_processor import create_video_recomposer
+
                 recomposer = create_video_recomposer(
                     original_video=video_path,
                     srt_file=srt_path,
@@ -941,13 +1421,13 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
         update_subtitle_task_status(task_id, 'processing', 20, '正在生成不带字幕视频...')
         no_subtitle_path = os.path.join(output_dir, f"{video_name}_no_subtitle.mp4")
         # 直接复制原视频
-        subprocess.run(['ffmpeg', '-y', '-i', video_path, '-c', 'copy', no_subtitle_path],
-                      capture_output=True, check=True)
+        run_ffmpeg(['ffmpeg', '-y', '-i', video_path, '-c', 'copy', no_subtitle_path], check=True)
         result['no_subtitle'] = no_subtitle_path
         logger.info(f"✅ 不带字幕视频: {no_subtitle_path}")
 
     # 2. 生成新字幕软字幕视频
     update_subtitle_task_status(task_id, 'processing', 40, '正在生成新字幕软字幕视频...')
+    progress_stage('new_soft_subtitle', 40, 60)
     new_soft_path = os.path.join(output_dir, f"{video_name}_new_soft.mp4")
     success = create_soft_subtitle_video(video_path, srt_path, new_soft_path)
     if success:
@@ -956,6 +1436,7 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
 
     # 3. 生成新字幕硬字幕视频
     update_subtitle_task_status(task_id, 'burning', 60, '正在生成新字幕硬字幕视频...')
+    progress_stage('new_hard_subtitle', 60, 80)
     new_hard_path = os.path.join(output_dir, f"{video_name}_new_hard.mp4")
     success = create_hard_subtitle_video(video_path, srt_path, new_hard_path, subtitle_config)
     if success:
@@ -973,6 +1454,7 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
             logger.info(f"✅ 原字幕软字幕视频: {original_soft_path}")
 
         original_hard_path = os.path.join(output_dir, f"{video_name}_original_hard.mp4")
+        progress_stage('original_hard_subtitle', 85, 99)
         success = create_hard_subtitle_video(video_path, original_srt_path, original_hard_path, subtitle_config)
         if success:
             result['original_hard_subtitle'] = original_hard_path
@@ -986,18 +1468,17 @@ def update_subtitle_task_status(task_id, status, progress, message):
     with subtitle_tasks_lock:
         if task_id in subtitle_tasks:
             task = subtitle_tasks[task_id]
-            task['status'] = status
-            task['progress'] = progress
-            task['message'] = message
+            fields = {'status': status, 'progress': progress, 'message': message}
 
             # 更新步骤状态
-            if 'steps' in task and task['steps']:
-                step_count = len(task['steps'])
+            steps = task.get('steps')
+            if steps:
+                step_count = len(steps)
                 current_step_index = int((progress / 100) * step_count)
                 # 确保不超过最大索引
                 current_step_index = min(current_step_index, step_count - 1)
 
-                for i, step in enumerate(task['steps']):
+                for i, step in enumerate(steps):
                     if i < current_step_index:
                         step['status'] = 'completed'
                         step['progress'] = 100
@@ -1010,47 +1491,37 @@ def update_subtitle_task_status(task_id, status, progress, message):
                     else:
                         step['status'] = 'pending'
                         step['progress'] = 0
+                fields['steps'] = steps
+
+            # 一次写入所有字段
+            task.update(fields)
 
 
 @app.route('/api/subtitle-generate/status/<task_id>', methods=['GET'])
 def subtitle_generate_status(task_id):
-    """获取字幕生成任务状态"""
+    """获取字幕生成任务状态（兼容字段只加在响应里，轮询不写任务记录）"""
     with subtitle_tasks_lock:
         task = subtitle_tasks.get(task_id)
         if not task:
             return jsonify({'error': '任务不存在'}), 404
 
-        # 确保files字段存在，如果不存在则初始化
-        if 'files' not in task:
-            task['files'] = {}
-            logger.info(f"   [状态查询] 初始化files字段为空字典")
-
-        # 兼容旧格式：如果使用旧的处理函数，将旧字段映射到新格式
-        if not task['files'] and task.get('soft_subtitle_video'):
-            task['files']['soft'] = task.get('soft_subtitle_video')
-            logger.info(f"   [状态查询] 映射旧字段soft_subtitle_video到files.soft")
-
-        if not task['files'] and task.get('hard_subtitle_video'):
-            task['files']['hard'] = task.get('hard_subtitle_video')
-            logger.info(f"   [状态查询] 映射旧字段hard_subtitle_video到files.hard")
+    view = dict(task)
+    files = dict(view.get('files') or {})
 
-        # 同时也保持新格式的映射（为了前端兼容性）
-        if task.get('files', {}).get('new_soft_subtitle'):
-            task['soft_subtitle_video'] = task['files']['new_soft_subtitle']
+    # 兼容旧格式：如果使用旧的处理函数，将旧字段映射到新格式
+    if not files and view.get('soft_subtitle_video'):
+        files['soft'] = view['soft_subtitle_video']
+    if not files and view.get('hard_subtitle_video'):
+        files['hard'] = view['hard_subtitle_video']
 
-        if task.get('files', {}).get('new_hard_subtitle'):
-            task['hard_subtitle_video'] = task['files']['new_hard_subtitle']
-
-        # 记录状态
-        if task['status'] == 'completed':
-            logger.info(f"   [状态查询] 任务已完成，files字段内容:")
-            for key, value in task['files'].items():
-                if value:
-                    logger.info(f"      {key}: {value}")
-                else:
-                    logger.info(f"      {key}: None")
+    # 同时也保持新格式的映射（为了前端兼容性）
+    if files.get('new_soft_subtitle'):
+        view['soft_subtitle_video'] = files['new_soft_subtitle']
+    if files.get('new_hard_subtitle'):
+        view['hard_subtitle_video'] = files['new_hard_subtitle']
+    view['files'] = files
 
-        return jsonify(task)
+    return jsonify(with_schedule_info(task_id, view))
 
 
 @app.route('/api/subtitle-generate/download/<task_id>/<type>', methods=['GET'])
@@ -1103,7 +1574,7 @@ def subtitle_generate_download(task_id, type):
             return jsonify({'error': f'文件不存在: {type}'}), 404
 
         filename = os.path.basename(file_path)
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        return send_media(file_path, download_name=filename)
 
     except Exception as e:
         logger.error(f"下载失败: {str(e)}")
@@ -1126,6 +1597,7 @@ def subtitle_generate_delete_task(task_id):
 
         # 删除任务记录
         del subtitle_tasks[task_id]
+        job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         return jsonify({'message': '任务已删除'})
 
@@ -1188,11 +1660,12 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
             '-b:a', '192k',
             extracted_audio
         ]
-        subprocess.run(cmd, capture_output=True, check=True)
+        run_ffmpeg(cmd, check=True)
         logger.info(f"   ✅ 原视频音轨提取完成: {extracted_audio}")
 
         # AI分离人声和伴奏
         update_subtitle_task_status(task_id, 'processing', 30, '正在进行AI音频分离...')
+        progress_stage('separation', 30, 50)
         success = separate_vocals_accompaniment(extracted_audio, output_dir)
 
         if not success:
@@ -1230,7 +1703,7 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
         ]
 
         update_subtitle_task_status(task_id, 'processing', 60, '正在混合音轨...')
-        merge_result = subprocess.run(cmd, capture_output=True, text=True)
+        merge_result = run_ffmpeg(cmd)
 
         if merge_result.returncode != 0:
             logger.error(f"   ❌ 音轨合并失败: {merge_result.stderr}")
@@ -1263,11 +1736,12 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
                 '-shortest',        # 以最短的流为准
                 temp_video_with_new_audio
             ]
-            subprocess.run(cmd, capture_output=True, check=True)
+            run_ffmpeg(cmd, check=True)
             logger.info(f"   ✅ 原视频音轨替换完成: {temp_video_with_new_audio}")
 
             # 步骤4.2: 使用新音频视频生成软字幕视频
             update_subtitle_task_status(task_id, 'processing', 82, '正在生成软字幕视频...')
+            progress_stage('soft_subtitle', 82, 90)
 
             final_soft_video = os.path.join(output_dir, f"{video_name}_new_soft.mp4")
             cmd = [
@@ -1280,19 +1754,21 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
                 '-movflags', '+faststart',
                 final_soft_video
             ]
-            subprocess.run(cmd, capture_output=True, check=True)
+            run_ffmpeg(cmd, check=True)
             result['new_soft_subtitle'] = final_soft_video
             logger.info(f"   ✅ 软字幕视频生成完成: {final_soft_video}")
 
             # 步骤4.3: 使用新音频视频生成硬字幕视频
             update_subtitle_task_status(task_id, 'processing', 90, '正在生成硬字幕视频...')
+            progress_stage('hard_subtitle', 90, 99)
 
             final_hard_video = os.path.join(output_dir, f"{video_name}_new_hard.mp4")
 
             # 使用Pillow/OpenCV生成硬字幕视频
             # 导入必要的库
-            from PIL import Image, ImageDraw, ImageFont
+            import cv2
             import numpy as np
+            from PIL import Image, ImageDraw, ImageFont
 
             # 解析SRT字幕
             logger.info(f"   正在解析字幕文件...")
@@ -1314,9 +1790,8 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
 
             logger.info(f"   视频属性: {width}x{height} @ {fps}fps, 共 {total_frames} 帧")
 
-            # 准备写入输出视频
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(final_hard_video, fourcc, fps, (width, height))
+            # 帧通过管道交给 ffmpeg 按任务的编码档位编码，同时复制新音频视频的音轨
+            out = FrameWriter(final_hard_video, fps, (width, height), audio_source=temp_video_with_new_audio)
 
             # 准备字体
             try:
@@ -1353,6 +1828,7 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
 
             frame_count = 0
             last_progress = 0
+            frame_rate = FrameRate(total_frames)
 
             while True:
                 ret, frame = cap.read()
@@ -1421,41 +1897,20 @@ def _process_one_click_workflow(task_id, video_path, srt_path, audio_zip_path, o
                 out.write(frame)
 
                 frame_count += 1
+                frame_rate.tick()
 
                 # 显示进度
                 progress = int((frame_count / total_frames) * 100)
                 if progress - last_progress >= 10:  # 每10%显示一次
-                    logger.info(f"   处理进度: {progress}% ({frame_count}/{total_frames}帧)")
+                    logger.info(f"   处理进度: {progress}% ({frame_count}/{total_frames}帧, {frame_rate.fps:.1f}fps)")
                     last_progress = progress
 
-            # 释放资源
+            # 释放资源（等待 ffmpeg 编码完成）
             cap.release()
             out.release()
 
             logger.info(f"   ✅ 视频处理完成，共处理 {frame_count} 帧")
 
-            # 硬字幕视频现在没有音频，需要从 temp_video_with_new_audio 复制音频
-            logger.info(f"   正在为硬字幕视频添加音轨...")
-            temp_hard_with_audio = final_hard_video.replace('.mp4', '_temp_with_audio.mp4')
-
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', final_hard_video,          # 硬字幕视频（无音频）
-                '-i', temp_video_with_new_audio,  # 原始视频（有新音频）
-                '-map', '0:v:0',                  # 使用硬字幕视频的视频流
-                '-map', '1:a:0?',                 # 使用原始视频的音频流（如果存在）
-                '-c:v', 'copy',                   # 视频流直接复制
-                '-c:a', 'aac',                    # 音频编码为AAC
-                '-b:a', '192k',                   # 音频比特率192kbps
-                '-shortest',                      # 以最短的流为准
-                temp_hard_with_audio
-            ]
-            subprocess.run(cmd, capture_output=True, check=True)
-            logger.info(f"   ✅ 硬字幕视频音轨添加完成")
-
-            # 用带音频的视频替换原硬字幕视频
-            shutil.move(temp_hard_with_audio, final_hard_video)
-
             result['new_hard_subtitle'] = final_hard_video
             logger.info(f"   ✅ 硬字幕视频生成完成: {final_hard_video}")
 
@@ -1515,12 +1970,13 @@ def _process_ai_separation_only(task_id, video_path, output_dir, merge_with_mixe
             '-b:a', '192k',
             extracted_audio
         ]
-        subprocess.run(cmd, capture_output=True, check=True)
+        run_ffmpeg(cmd, check=True)
         logger.info(f"   ✅ 音频提取完成: {extracted_audio}")
 
         update_subtitle_task_status(task_id, 'processing', 30, '正在进行AI音频分离...')
 
         # 2. 使用Demucs进行AI分离
+        progress_stage('separation', 30, 70)
         success = separate_vocals_accompaniment(extracted_audio, output_dir)
 
         if success:
@@ -1571,7 +2027,7 @@ def _process_ai_separation_only(task_id, video_path, output_dir, merge_with_mixe
                             merged_output_path
                         ]
 
-                        merge_result = subprocess.run(cmd, capture_output=True, text=True)
+                        merge_result = run_ffmpeg(cmd)
                         if merge_result.returncode == 0:
                             result['merged_with_vocals'] = merged_output_path
                             logger.info(f"   ✅ 合并完成: {merged_output_path}")
@@ -1688,7 +2144,7 @@ def _process_audio_only_simple(task_id, srt_path, output_dir, audio_zip_path):
                 '-b:a', '192k',
                 output_path
             ]
-            subprocess.run(cmd, capture_output=True, check=True)
+            run_ffmpeg(cmd, check=True)
             result['mixed_audio'] = output_path
         else:
             # 使用多音轨合成函数
@@ -1736,13 +2192,13 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
         update_subtitle_task_status(task_id, 'processing', 20, '正在生成不带字幕视频...')
         no_subtitle_path = os.path.join(output_dir, f"{video_name}_no_subtitle.mp4")
         # 直接复制原视频
-        subprocess.run(['ffmpeg', '-y', '-i', video_path, '-c', 'copy', no_subtitle_path],
-                      capture_output=True, check=True)
+        run_ffmpeg(['ffmpeg', '-y', '-i', video_path, '-c', 'copy', no_subtitle_path], check=True)
         result['no_subtitle'] = no_subtitle_path
         logger.info(f"✅ 不带字幕视频: {no_subtitle_path}")
 
     # 2. 生成新字幕软字幕视频
     update_subtitle_task_status(task_id, 'processing', 40, '正在生成新字幕软字幕视频...')
+    progress_stage('new_soft_subtitle', 40, 60)
     new_soft_path = os.path.join(output_dir, f"{video_name}_new_soft.mp4")
     success = create_soft_subtitle_video(video_path, srt_path, new_soft_path)
     if success:
@@ -1751,6 +2207,7 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
 
     # 3. 生成新字幕硬字幕视频
     update_subtitle_task_status(task_id, 'burning', 60, '正在生成新字幕硬字幕视频...')
+    progress_stage('new_hard_subtitle', 60, 80)
     new_hard_path = os.path.join(output_dir, f"{video_name}_new_hard.mp4")
     success = create_hard_subtitle_video(video_path, srt_path, new_hard_path, subtitle_config)
     if success:
@@ -1768,6 +2225,7 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
             logger.info(f"✅ 原字幕软字幕视频: {original_soft_path}")
 
         original_hard_path = os.path.join(output_dir, f"{video_name}_original_hard.mp4")
+        progress_stage('original_hard_subtitle', 85, 99)
         success = create_hard_subtitle_video(video_path, original_srt_path, original_hard_path, subtitle_config)
         if success:
             result['original_hard_subtitle'] = original_hard_path
@@ -1776,7 +2234,7 @@ def _process_video_only(recomposer, task_id, video_path, srt_path, output_dir,
     return result
 
 
-audio_split_tasks = {}
+audio_split_tasks = task_store.table('audio_split_tasks')
 audio_split_tasks_lock = threading.Lock()
 
 
@@ -1799,12 +2257,12 @@ def subtitle_audio_split_upload():
         logger.info("收到字幕音频分割任务")
 
         # 检查字幕文件
-        if 'srt' not in request.files:
+        if 'srt' not in uploaded_files():
             return jsonify({'error': '缺少字幕文件'}), 400
 
-        srt = request.files['srt']
-        video = request.files.get('video')
-        audio = request.files.get('audio')
+        srt = uploaded_files()['srt']
+        video = uploaded_files().get('video')
+        audio = uploaded_files().get('audio')
 
         # 获取配置
         use_silence = request.form.get('use_silence', 'true').lower() == 'true'
@@ -1867,13 +2325,14 @@ def subtitle_audio_split_upload():
                 'error': None
             }
 
-        # 在后台线程中处理
-        thread = threading.Thread(
-            target=process_audio_split_task,
-            args=(task_id, srt_path, audio_source_path, output_dir, use_silence)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', audio_split_tasks, task_id, process_audio_split_task,
+            (task_id, srt_path, audio_source_path, output_dir, use_silence),
+            discard_on_reject=True
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         logger.info("=" * 60)
 
@@ -2008,7 +2467,7 @@ def extract_audio_from_video(video_path: str, output_path: str) -> bool:
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        result = run_ffmpeg(cmd, timeout=600)
 
         if result.returncode == 0 and os.path.exists(output_path):
             logger.info(f"   ✅ 音频提取成功")
@@ -2039,7 +2498,7 @@ def extract_audio_segment(audio_path: str, start_time: float, duration: float, o
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = run_ffmpeg(cmd, timeout=60)
 
         return result.returncode == 0 and os.path.exists(output_path)
 
@@ -2062,7 +2521,7 @@ def generate_silence(duration: float, output_path: str) -> bool:
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = run_ffmpeg(cmd, timeout=60)
 
         return result.returncode == 0 and os.path.exists(output_path)
 
@@ -2086,7 +2545,7 @@ def audio_split_status(task_id):
         task = audio_split_tasks.get(task_id)
         if not task:
             return jsonify({'error': '任务不存在'}), 404
-        return jsonify(task)
+        return jsonify(with_schedule_info(task_id, dict(task)))
 
 
 @app.route('/api/subtitle-audio-split/download/<task_id>', methods=['GET'])
@@ -2101,26 +2560,12 @@ def audio_split_download(task_id):
             return jsonify({'error': '任务未完成'}), 400
 
     try:
-        import zipfile
-        from io import BytesIO
-
-        # 创建内存中的ZIP文件
-        memory_file = BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for audio_file in task['audio_files']:
-                if os.path.exists(audio_file['path']):
-                    # 添加文件到ZIP，使用相对路径
-                    arcname = audio_file['filename']
-                    zf.write(audio_file['path'], arcname)
-
-        memory_file.seek(0)
-
-        # 发送ZIP文件
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'audio_split_{task_id}.zip'
+        # mp3 已是压缩格式，边打包边发送（STORED），首次完整下载后缓存到任务目录以支持断点续传
+        entries = [(audio_file['path'], audio_file['filename']) for audio_file in task['audio_files']]
+        return send_zip(
+            entries,
+            download_name=f'audio_split_{task_id}.zip',
+            cache_dir=os.path.join(TASKS_FOLDER, f'audio_split_{task_id}')
         )
 
     except Exception as e:
@@ -2150,13 +2595,14 @@ def audio_split_delete_task(task_id):
 
         # 删除任务记录
         del audio_split_tasks[task_id]
+        job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         return jsonify({'message': '任务已删除'})
 
 
 # ==================== 音轨合成API ====================
 
-audio_mix_tasks = {}
+audio_mix_tasks = task_store.table('audio_mix_tasks')
 audio_mix_tasks_lock = threading.Lock()
 
 
@@ -2180,16 +2626,16 @@ def audio_mix_upload():
         logger.info("收到音轨合成任务")
 
         # 检查必需文件
-        if 'video' not in request.files:
+        if 'video' not in uploaded_files():
             return jsonify({'error': '缺少视频文件'}), 400
-        if 'srt' not in request.files:
+        if 'srt' not in uploaded_files():
             return jsonify({'error': '缺少字幕文件'}), 400
 
-        video = request.files['video']
-        srt = request.files['srt']
-        vocals_file = request.files.get('vocals')
-        accompaniment_file = request.files.get('accompaniment')
-        dubbing_zip = request.files.get('dubbing_audio_dir')
+        video = uploaded_files()['video']
+        srt = uploaded_files()['srt']
+        vocals_file = uploaded_files().get('vocals')
+        accompaniment_file = uploaded_files().get('accompaniment')
+        dubbing_zip = uploaded_files().get('dubbing_audio_dir')
 
         if video.filename == '' or srt.filename == '':
             return jsonify({'error': '文件名为空'}), 400
@@ -2292,13 +2738,14 @@ def audio_mix_upload():
                 'current_step': 0
             }
 
-        # 在后台线程中处理
-        thread = threading.Thread(
-            target=process_audio_mix_task,
-            args=(task_id, video_path, srt_path, output_dir, vocals_path, accompaniment_path, skip_separation, dubbing_audio_dir)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light' if skip_separation else 'separation', audio_mix_tasks, task_id, process_audio_mix_task,
+            (task_id, video_path, srt_path, output_dir, vocals_path, accompaniment_path, skip_separation, dubbing_audio_dir),
+            discard_on_reject=True
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         logger.info("=" * 60)
 
@@ -2344,6 +2791,7 @@ def process_audio_mix_task(task_id, video_path, srt_path, output_dir, vocals_pat
             update_audio_mix_task_status(task_id, 10, '正在AI分离人声和伴奏...')
 
             demucs_output = os.path.join(output_dir, 'demucs_output')
+            progress_stage('separation', 10, 35)
             success = separate_vocals_accompaniment(temp_audio, demucs_output)
             if not success:
                 update_audio_mix_step_status(task_id, 2, 'failed', 'AI分离失败')
@@ -2489,7 +2937,7 @@ def extract_audio_for_demucs(video_path: str, output_path: str) -> bool:
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        result = run_ffmpeg(cmd, timeout=600)
 
         if result.returncode == 0 and os.path.exists(output_path):
             logger.info(f"   ✅ 音频提取成功")
@@ -2508,6 +2956,9 @@ def extract_audio_for_demucs(video_path: str, output_path: str) -> bool:
         return False
 
 
+DEMUCS_PROGRESS_RE = re.compile(r'(\d+(?:\.\d+)?)%\|')
+
+
 def separate_vocals_accompaniment(audio_path: str, output_dir: str) -> bool:
     """使用demucs分离人声和伴奏"""
     try:
@@ -2542,28 +2993,37 @@ def separate_vocals_accompaniment(audio_path: str, output_dir: str) -> bool:
             stderr=subprocess.STDOUT,
             text=True,
             bufsize=1,  # 行缓冲
-            env=env  # 传递环境变量
+            env=env,  # 传递环境变量
+            **popen_kwargs()  # 独立进程组，取消任务时连同 Demucs 的子进程一起结束
         )
 
-        # 实时输出demucs的进度
-        last_log_time = start_time
-        for line in iter(process.stdout.readline, ''):
-            if line:
-                current_time = time.time()
-                elapsed = int(current_time - start_time)
-
-                # 记录所有输出（帮助调试）
-                line_stripped = line.strip()
-                if line_stripped:
-                    logger.info(f"   [Demucs] {line_stripped}")
-
-                # 每30秒输出一次进度信息
-                if current_time - last_log_time >= 30:
-                    logger.info(f"   ⏳  Demucs正在处理... 已运行 {elapsed} 秒")
-                    last_log_time = current_time
-
-        # 等待进程完成
-        return_code = process.wait()
+        # 登记到任务的取消令牌：取消时结束 Demucs 进程组，离开 with 时抛出 TaskCancelled
+        with tracked_process(process), stage_timer('separation', inputs=[audio_path], outputs=[output_dir]), \
+                trace_span('demucs', 'separation', child_pid=process.pid, argv=cmd):
+            # 实时输出demucs的进度
+            last_log_time = start_time
+            for line in iter(process.stdout.readline, ''):
+                if line:
+                    current_time = time.time()
+                    elapsed = int(current_time - start_time)
+
+                    # 记录所有输出（帮助调试）
+                    line_stripped = line.strip()
+                    if line_stripped:
+                        logger.info(f"   [Demucs] {line_stripped}")
+
+                    # Demucs 的 tqdm 进度条（如 " 45%|████      | 12.3/27.0"）
+                    match = DEMUCS_PROGRESS_RE.search(line_stripped)
+                    if match:
+                        report_progress(float(match.group(1)) / 100)
+
+                    # 每30秒输出一次进度信息
+                    if current_time - last_log_time >= 30:
+                        logger.info(f"   ⏳  Demucs正在处理... 已运行 {elapsed} 秒")
+                        last_log_time = current_time
+
+            # 等待进程完成
+            return_code = process.wait()
 
         if return_code == 0:
             logger.info(f"   ✅ Demucs处理完成，用时 {int(time.time() - start_time)} 秒")
@@ -2662,7 +3122,7 @@ def separate_vocals_accompaniment(audio_path: str, output_dir: str) -> bool:
                             no_vocals_temp
                         ]
 
-                        result = subprocess.run(cmd, capture_output=True, text=True)
+                        result = run_ffmpeg(cmd)
                         if result.returncode != 0:
                             logger.error(f"   ❌ 伴奏混合失败: {result.stderr}")
                             return False
@@ -2676,7 +3136,7 @@ def separate_vocals_accompaniment(audio_path: str, output_dir: str) -> bool:
                             no_vocals_path
                         ]
 
-                        result2 = subprocess.run(cmd2, capture_output=True, text=True)
+                        result2 = run_ffmpeg(cmd2)
                         if result2.returncode == 0:
                             logger.info(f"   ✅ 伴奏生成成功: no_vocals.wav (音量已提升1.5倍)")
                             # 删除临时文件
@@ -2762,86 +3222,74 @@ def merge_dubbing_audios(srt_path: str, audio_dir: str, output_path: str) -> boo
         total_duration = subtitles[-1]['end']
         logger.info(f"   总时长: {total_duration:.2f} 秒")
 
-        # 创建临时目录
-        temp_dir = os.path.join(os.path.dirname(output_path), 'temp_merge')
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # 创建 concat 文件
-        concat_file = os.path.join(temp_dir, 'concat.txt')
-        segment_files = []
-
-        current_time = 0.0
-
-        for i in range(min(len(audio_files), len(subtitles))):
-            sub = subtitles[i]
-            audio_file = os.path.join(audio_dir, audio_files[i])
-
-            # 在当前时间点和字幕开始时间之间添加静音
-            if current_time < sub['start']:
-                gap = sub['start'] - current_time
-                if gap > 0.05:  # 大于50ms才生成静音
-                    silence_file = os.path.join(temp_dir, f'silence_{i:03d}.mp3')
-                    logger.info(f"   添加静音: {gap:.2f}秒 (从 {current_time:.2f}s 到 {sub['start']:.2f}s)")
+        # 静音片段和拼接列表放在临时工作区（退出时删除，失败也会删除）
+        with scratch_space('audio_merge_') as temp_dir:
+            # 创建 concat 文件
+            concat_file = os.path.join(temp_dir, 'concat.txt')
+            segment_files = []
+
+            current_time = 0.0
+
+            for i in range(min(len(audio_files), len(subtitles))):
+                sub = subtitles[i]
+                audio_file = os.path.join(audio_dir, audio_files[i])
+
+                # 在当前时间点和字幕开始时间之间添加静音
+                if current_time < sub['start']:
+                    gap = sub['start'] - current_time
+                    if gap > 0.05:  # 大于50ms才生成静音
+                        silence_file = os.path.join(temp_dir, f'silence_{i:03d}.mp3')
+                        logger.info(f"   添加静音: {gap:.2f}秒 (从 {current_time:.2f}s 到 {sub['start']:.2f}s)")
+                        if generate_silence(gap, silence_file):
+                            segment_files.append(silence_file)
+                            current_time += gap
+
+                # 添加音频文件（concat 列表直接引用原文件，不复制）
+                logger.info(f"   添加音频 {i+1}: {audio_files[i]} (在 {sub['start']:.2f}s)")
+                if not os.path.isfile(audio_file):
+                    logger.error(f"      ❌ 音频文件不存在: {audio_file}")
+                    return False
+                segment_files.append(os.path.abspath(audio_file))
+
+                # 更新当前时间（需要获取音频时长）
+                # 这里简化处理，假设音频时长不超过字幕时长
+                current_time = sub['end']
+
+            # 在最后添加静音直到总时长
+            if current_time < total_duration:
+                gap = total_duration - current_time
+                if gap > 0.05:
+                    silence_file = os.path.join(temp_dir, f'silence_end.mp3')
+                    logger.info(f"   添加结尾静音: {gap:.2f}秒")
                     if generate_silence(gap, silence_file):
                         segment_files.append(silence_file)
-                        current_time += gap
-
-            # 添加音频文件
-            logger.info(f"   添加音频 {i+1}: {audio_files[i]} (在 {sub['start']:.2f}s)")
-            segment_file = os.path.join(temp_dir, f'audio_{i:03d}.mp3')
-            shutil.copy(audio_file, segment_file)
-
-            # 验证文件复制成功
-            if os.path.exists(segment_file):
-                file_size = os.path.getsize(segment_file)
-                logger.info(f"      ✅ 文件已复制: {segment_file}, 大小: {file_size} 字节")
-                segment_files.append(segment_file)
-            else:
-                logger.error(f"      ❌ 文件复制失败: {segment_file}")
-                return False
 
-            # 更新当前时间（需要获取音频时长）
-            # 这里简化处理，假设音频时长不超过字幕时长
-            current_time = sub['end']
-
-        # 在最后添加静音直到总时长
-        if current_time < total_duration:
-            gap = total_duration - current_time
-            if gap > 0.05:
-                silence_file = os.path.join(temp_dir, f'silence_end.mp3')
-                logger.info(f"   添加结尾静音: {gap:.2f}秒")
-                if generate_silence(gap, silence_file):
-                    segment_files.append(silence_file)
-
-        # 写入 concat 文件
-        with open(concat_file, 'w') as f:
-            for segment in segment_files:
-                # 使用绝对路径，并转义特殊字符
-                f.write(f"file '{segment}'\n")
-
-        logger.info(f"   Concat 文件内容 (前5行):")
-        with open(concat_file, 'r') as f:
-            lines = f.readlines()
-            for line in lines[:5]:
-                logger.info(f"      {line.strip()}")
-
-        # 使用 ffmpeg concat 协议合并
-        cmd = [
-            'ffmpeg', '-y',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', concat_file,
-            '-acodec', 'libmp3lame',
-            '-q:a', '2',
-            '-b:a', '192k',
-            output_path
-        ]
+            # 写入 concat 文件
+            with open(concat_file, 'w') as f:
+                for segment in segment_files:
+                    # 使用绝对路径，并转义特殊字符
+                    f.write("file '" + segment.replace("'", "'\\''") + "'\n")
+
+            logger.info(f"   Concat 文件内容 (前5行):")
+            with open(concat_file, 'r') as f:
+                lines = f.readlines()
+                for line in lines[:5]:
+                    logger.info(f"      {line.strip()}")
 
-        logger.info(f"   执行合并命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            # 使用 ffmpeg concat 协议合并
+            cmd = [
+                'ffmpeg', '-y',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', concat_file,
+                '-acodec', 'libmp3lame',
+                '-q:a', '2',
+                '-b:a', '192k',
+                output_path
+            ]
 
-        # 清理临时文件
-        shutil.rmtree(temp_dir, ignore_errors=True)
+            logger.info(f"   执行合并命令: {' '.join(cmd)}")
+            result = run_ffmpeg(cmd, timeout=600, stage='merge')
 
         if result.returncode == 0 and os.path.exists(output_path):
             logger.info(f"   ✅ 配音音轨合并成功")
@@ -2872,7 +3320,7 @@ def mix_two_audios(audio1_path: str, audio2_path: str, output_path: str, vocals_
             output_path
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        result = run_ffmpeg(cmd, timeout=300)
 
         if result.returncode == 0 and os.path.exists(output_path):
             logger.info(f"   ✅ 音频混合成功")
@@ -2919,9 +3367,11 @@ def update_audio_mix_step_status(task_id, step_id, status, message=None):
                         step['message'] = message
                     break
 
+            fields = {'steps': steps}
             # 更新当前步骤
             if status == 'processing':
-                task['current_step'] = step_id
+                fields['current_step'] = step_id
+            task.update(fields)
 
 
 @app.route('/api/audio-mix/status/<task_id>', methods=['GET'])
@@ -2931,7 +3381,7 @@ def audio_mix_status(task_id):
         task = audio_mix_tasks.get(task_id)
         if not task:
             return jsonify({'error': '任务不存在'}), 404
-        return jsonify(task)
+        return jsonify(with_schedule_info(task_id, dict(task)))
 
 
 @app.route('/api/audio-mix/download/<task_id>', methods=['GET'])
@@ -2951,7 +3401,7 @@ def audio_mix_download(task_id):
             return jsonify({'error': '文件不存在'}), 404
 
         filename = os.path.basename(file_path)
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        return send_media(file_path, download_name=filename)
 
     except Exception as e:
         logger.error(f"下载失败: {str(e)}")
@@ -2980,6 +3430,7 @@ def audio_mix_delete_task(task_id):
 
         # 删除任务记录
         del audio_mix_tasks[task_id]
+        job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         return jsonify({'message': '任务已删除'})
 
@@ -2996,6 +3447,21 @@ def health_check():
     })
 
 
+@app.route('/api/encoding-profiles', methods=['GET'])
+def list_encoding_profiles():
+    """
+    可选的编码档位（提交任务时用 encoding_profile 参数指定）
+
+    Response:
+        - profiles: 档位列表（名称、编码器、preset、CRF、线程数、音频码率等）
+        - default: 默认档位
+    """
+    return jsonify({
+        'profiles': [profile.to_dict() for profile in PROFILES.values()],
+        'default': DEFAULT_PROFILE
+    })
+
+
 @app.before_request
 def log_request():
     """记录请求日志"""
@@ -3023,14 +3489,14 @@ def upload_files():
         logger.info("收到新的视频重新生成任务")
 
         # 检查必需文件
-        if 'video' not in request.files or 'srt' not in request.files or 'audio' not in request.files:
+        if 'video' not in uploaded_files() or 'srt' not in uploaded_files() or 'audio' not in uploaded_files():
             logger.error("❌ 缺少必需文件")
             return jsonify({'error': '缺少必需文件'}), 400
 
-        video = request.files['video']
-        srt = request.files['srt']
-        audio = request.files['audio']
-        original_srt = request.files.get('original_srt')  # 可选
+        video = uploaded_files()['video']
+        srt = uploaded_files()['srt']
+        audio = uploaded_files()['audio']
+        original_srt = uploaded_files().get('original_srt')  # 可选
 
         # 获取自动剪辑选项
         auto_clip = request.form.get('auto_clip', 'false').lower() == 'true'
@@ -3109,6 +3575,7 @@ def upload_files():
                 'output_folder': os.path.join(DOWNLOAD_FOLDER, task_id),
                 'local_output_dir': local_output_dir,  # 本地输出目录
                 'error': None,
+                'fingerprint': request_fingerprint(),  # 结果缓存用的输入指纹
                 'created_at': datetime.now().isoformat()
             }
 
@@ -3146,16 +3613,17 @@ def process_video(task_id):
             if task['status'] == 'processing':
                 return jsonify({'message': '任务正在处理中'}), 200
 
-            if task['status'] == 'completed':
+            if task['status'] == 'completed' and not _final_render_pending(task):
                 return jsonify({'message': '任务已完成'}), 200
 
-        # 在新线程中处理视频
-        thread = threading.Thread(
-            target=process_video_thread,
-            args=(task_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'render', tasks, task_id, process_video_thread,
+            (task_id,),
+            discard_on_reject=False
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         return jsonify({
             'status': 'processing',
@@ -3183,6 +3651,8 @@ def process_video_thread(task_id):
 
         logger.info("🔧 初始化视频处理器")
         # 创建处理器（使用本地输出目录）
+        from video_processor import create_video_recomposer
+
         recomposer = create_video_recomposer(
             original_video=tasks[task_id]['video_path'],
             srt_file=tasks[task_id]['srt_path'],
@@ -3205,7 +3675,8 @@ def process_video_thread(task_id):
             tasks[task_id]['message'] = '正在处理配音文件...'
 
         logger.info("🎵 处理配音文件（合并音频片段）")
-        result = recomposer.process()
+        with progress_stage('recompose', 30, 99):
+            result = recomposer.process()
 
         logger.info(f"✅ 视频处理完成")
         for key, path in result.items():
@@ -3265,12 +3736,15 @@ def get_task_status(task_id):
             'message': task['message'],
             'error': task.get('error')
         }
+        with_schedule_info(task_id, response)
 
         # 如果任务完成，返回本地输出目录和文件路径
         if task['status'] == 'completed':
             response['local_output_dir'] = task.get('local_output_dir', '')
             response['merged_audio_path'] = task.get('_merged_audio', '')
             response['available_versions'] = {}
+            # 预览结果（代理 + draft 档位），去掉 preview 参数重新提交即可正式渲染
+            response['preview'] = bool(task.get('preview'))
 
             # 新字幕版本
             if task.get('_new_soft_subtitle'):
@@ -3288,6 +3762,11 @@ def get_task_status(task_id):
             if task.get('_no_subtitle'):
                 response['available_versions']['no_subtitle'] = task.get('_no_subtitle')
 
+            # 预览（/api/preview）
+            if task.get('_preview'):
+                response['available_versions']['preview'] = task.get('_preview')
+                response['preview_window'] = task.get('preview_window')
+
         return jsonify(response), 200
 
     except Exception as e:
@@ -3301,7 +3780,7 @@ def download_video(task_id, type):
 
     Args:
         task_id: 任务ID
-        type: 类型 (soft, hard, original_soft, original_hard, no_subtitle)
+        type: 类型 (soft, hard, original_soft, original_hard, no_subtitle, preview)
 
     Response:
         - 视频文件
@@ -3323,7 +3802,8 @@ def download_video(task_id, type):
             'original_soft': ('_original_soft_subtitle', 'output_original_soft_subtitle.mp4'),
             'original_hard': ('_original_hard_subtitle', 'output_original_hard_subtitle.mp4'),
             'no_subtitle': ('_no_subtitle', 'output_no_subtitle.mp4'),
-            'clipped_video': ('_clipped_video', 'clipped_video.mp4')
+            'clipped_video': ('_clipped_video', 'clipped_video.mp4'),
+            'preview': ('_preview', 'preview.mp4')
         }
 
         if type not in type_mapping:
@@ -3331,16 +3811,13 @@ def download_video(task_id, type):
 
         key, filename = type_mapping[type]
         file_path = task.get(key)
+        if task.get('preview') and type != 'preview':
+            filename = f'preview_{filename}'
 
         if not file_path or not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 404
 
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='video/mp4'
-        )
+        return send_media(file_path, download_name=filename, mimetype='video/mp4')
 
     except Exception as e:
         return jsonify({'error': f'下载失败: {str(e)}'}), 500
@@ -3364,6 +3841,7 @@ def cancel_task(task_id):
 
             # 删除任务
             del tasks[task_id]
+            job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         # 清理文件
         task_folder = os.path.join(TASKS_FOLDER, task_id)
@@ -3381,27 +3859,315 @@ def cancel_task(task_id):
         return jsonify({'error': f'取消失败: {str(e)}'}), 500
 
 
+@app.route('/api/task/<task_id>/cancel', methods=['POST'])
+def stop_task(task_id):
+    """
+    取消任务但保留任务记录（适用于所有类型的任务）
+
+    运行中的任务在 1 秒内结束其 ffmpeg / Demucs 子进程并删除半成品输出，状态变为 cancelled
+
+    Args:
+        task_id: 任务ID
+
+    Response:
+        - message: 消息
+        - status: 取消后的状态
+    """
+    summary = task_store.summary(task_id)
+    if summary is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if summary['status'] in FINAL_STATUSES:
+        return jsonify({'error': f"任务已结束（{summary['status']}）", 'status': summary['status']}), 409
+
+    job_scheduler.cancel(task_id)  # 排队中的任务直接出队
+    task_store.update(summary['category'], task_id, {
+        'status': 'cancelled',
+        'cancel_requested': True,
+        'message': '任务已取消',
+        'cancelled_at': datetime.now().isoformat(),
+    })
+    logger.info(f"⚠️  已请求取消任务 {task_id}")
+    return jsonify({'message': '任务已取消', 'status': 'cancelled'}), 200
+
+
 @app.route('/api/tasks', methods=['GET'])
 def list_tasks():
-    """列出所有任务（调试用）"""
-    with tasks_lock:
-        task_list = []
-        for task_id, task in tasks.items():
-            task_list.append({
-                'task_id': task_id,
-                'status': task['status'],
-                'progress': task['progress'],
-                'message': task['message'],
-                'created_at': task['created_at']
-            })
+    """
+    列出任务（调试用，按创建时间倒序分页）
+
+    Query:
+        - category: 任务类别（tasks / subtitle_tasks / split_tasks / audio_split_tasks / audio_mix_tasks，可选）
+        - status: 状态过滤（可选）
+        - type: 类型过滤（可选）
+        - limit: 条数（默认100，最大1000）
+        - offset: 起始位置
+    """
+    category = request.args.get('category')
+    status = request.args.get('status')
+    task_type = request.args.get('type')
+    limit = min(max(1, request.args.get('limit', 100, type=int)), 1000)
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    task_list = task_store.list(category, status=status, task_type=task_type, limit=limit, offset=offset)
+    return jsonify({
+        'tasks': task_list,
+        'total': task_store.count(category, status=status, task_type=task_type),
+        'limit': limit,
+        'offset': offset
+    }), 200
+
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    """任务调度器各类别的队列状态"""
+    return jsonify(job_scheduler.stats()), 200
+
+
+@app.route('/api/storage', methods=['GET'])
+def storage_usage():
+    """磁盘使用情况（各类目录、占用最多的任务、最近一次清理）"""
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    return jsonify(storage_manager.usage(refresh=refresh)), 200
+
+
+@app.route('/api/tasks/<task_id>/trace', methods=['GET'])
+def task_trace_download(task_id):
+    """
+    下载任务的执行追踪（任务结束后生成）
+
+    Args:
+        task_id: 任务ID
+
+    Query:
+        - format: chrome（默认，chrome://tracing / Perfetto 打开）或 folded（调用栈采样，flamegraph 格式，
+          仅提交时带 profile=1 或开启 VIDEORECOMP_TRACE_PROFILE 的任务有）
+    """
+    trace_path, profile_path = trace_paths(task_id)
+    if request.args.get('format', 'chrome') == 'folded':
+        if not os.path.exists(profile_path):
+            return jsonify({'error': '没有调用栈采样（提交任务时带 profile=1 开启）'}), 404
+        return send_media(profile_path, f'profile_{task_id}.folded', 'text/plain')
+    if not os.path.exists(trace_path):
+        return jsonify({'error': '追踪文件不存在（任务尚未结束或已被清理）'}), 404
+    return send_media(trace_path, f'trace_{task_id}.json', 'application/json')
+
+
+@app.route('/api/storage/gc', methods=['POST'])
+def storage_gc():
+    """立即执行一次存储清理"""
+    report = storage_manager.collect()
+    return jsonify(report), 200
+
+
+def _scheduler_metrics():
+    """抓取时计算的队列指标"""
+    stats = job_scheduler.stats()
+    for name, field, help_text in (
+        ('videorecomp_queue_depth', 'queued', '排队中的任务数'),
+        ('videorecomp_active_jobs', 'running', '运行中的任务数'),
+        ('videorecomp_workers', 'workers', '工作槽数'),
+    ):
+        yield name, 'gauge', help_text, ('job_class',), [((job_class,), s[field]) for job_class, s in stats.items()]
+
+    # 本进程 ffmpeg 调度器的状态（分离 / 渲染任务在工作进程里各有一个调度器）
+    runner = get_runner().stats()
+    yield 'videorecomp_ffmpeg_running', 'gauge', '运行中的 ffmpeg / ffprobe 进程数', (), [((), runner['running'])]
+    yield 'videorecomp_ffmpeg_waiting', 'gauge', '等待并发名额的 ffmpeg / ffprobe 调用数', (), [((), runner['waiting'])]
+
+
+def _cache_metrics():
+    """缓存命中率（按所有进程的查询次数计算）和结果缓存占用"""
+    lookups = {}
+    for (cache, result), count in REGISTRY.collect()[CACHE_REQUESTS.name]['values']:
+        lookups.setdefault(cache, {'hit': 0, 'miss': 0})[result] += count
+    yield 'videorecomp_cache_hit_ratio', 'gauge', '缓存命中率', ('cache',), [
+        ((cache,), counts['hit'] / (counts['hit'] + counts['miss']))
+        for cache, counts in lookups.items() if counts['hit'] + counts['miss']
+    ]
+
+    stats = result_cache.stats()
+    yield 'videorecomp_result_cache_entries', 'gauge', '结果缓存条目数', (), [((), stats['entries'])]
+    yield 'videorecomp_result_cache_bytes', 'gauge', '结果缓存占用字节数', (), [((), stats['size_bytes'])]
+
+
+REGISTRY.add_collector(_scheduler_metrics)
+REGISTRY.add_collector(_cache_metrics)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus 指标：队列长度、各阶段耗时直方图、ffmpeg 进程数和返回码、各阶段读写字节数、缓存命中率
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/result-cache', methods=['GET'])
+def result_cache_stats():
+    """结果缓存的占用和命中率"""
+    return jsonify({'enabled': RESULT_CACHE_ENABLED, **result_cache.stats()}), 200
+
+
+@app.route('/api/result-cache', methods=['DELETE'])
+def result_cache_clear():
+    """清空结果缓存"""
+    removed = result_cache.clear()
+    logger.info(f"🧹 已清空结果缓存: {removed} 个条目")
+    return jsonify({'message': f'已清空 {removed} 个缓存条目', 'removed': removed}), 200
+
+
+@app.route('/api/events/<task_id>', methods=['GET'])
+def task_event_stream(task_id):
+    """
+    任务进度推送（Server-Sent Events，适用于所有类型的任务）
+
+    Events:
+        - progress: {status, progress, message, error, progress_detail, 排队信息}，有变化时推送
+        - end: 任务结束或被删除后推送，随后关闭连接
+    """
+    if task_store.summary(task_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    def stream():
+        subscription = task_events.subscribe(task_id)
+        if subscription is None:
+            yield format_event({'status': 'deleted'}, event='end')
+            return
+        version, summary = subscription
+        last_sent = None
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if summary is not None:
+                    payload = with_schedule_info(task_id, {
+                        key: summary[key] for key in ('status', 'progress', 'message', 'error', 'progress_detail')
+                    })
+                    if payload != last_sent:
+                        yield format_event(payload, event_id=version)
+                        last_sent = payload
+                    if payload['status'] in FINAL_STATUSES:
+                        yield format_event({'status': payload['status']}, event='end')
+                        return
+
+                # 排队中的任务没有数据库写入，超时后重新计算排队位置
+                entry = task_events.wait(task_id, version, timeout=5.0)
+                if entry is not None:
+                    version, summary = entry
+                elif task_store.summary(task_id) is None:
+                    yield format_event({'status': 'deleted'}, event='end')
+                    return
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            task_events.unsubscribe(task_id)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+# ==================== 分块上传API ====================
 
-        return jsonify({'tasks': task_list}), 200
+@app.errorhandler(UploadError)
+def handle_upload_error(error):
+    """上传错误（偏移量不一致时附带服务器已接收的 offset，便于续传）"""
+    return jsonify({'error': str(error), **error.details}), error.status
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_chunked_upload():
+    """
+    创建分块上传会话
+
+    Request (JSON):
+        - filename: 文件名
+        - size: 文件大小（字节）
+        - kind: video / audio / subtitle / archive / other（用于文件头校验）
+        - sha256: 可选，已知哈希；文件已存在时直接返回，无需上传
+
+    Response:
+        - 201: {upload_id, offset, chunk_size, ...}
+        - 200: {sha256, size, filename, deduplicated: true}（文件已存在）
+    """
+    data = request.get_json(silent=True) or {}
+    result = blob_store.create_upload(
+        filename=data.get('filename', ''),
+        size=data.get('size'),
+        kind=data.get('kind', 'other'),
+        sha256=data.get('sha256')
+    )
+    if result.get('deduplicated'):
+        logger.info(f"♻️  文件已存在，跳过上传: {result['sha256'][:12]} ({result.get('filename')})")
+        return jsonify(result), 200
+    logger.info(f"📤 创建上传会话 {result['upload_id']}: {result['filename']} ({result['size'] / 1024 / 1024:.2f} MB)")
+    return jsonify(result), 201
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """查询上传会话（续传前获取服务器已接收的 offset）"""
+    return jsonify(blob_store.get_upload(upload_id)), 200
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def append_chunked_upload(upload_id):
+    """
+    上传一个分块（请求体为原始字节）
+
+    Query / Header:
+        - offset 或 Upload-Offset: 分块起始位置，必须等于服务器已接收的大小
+
+    Response:
+        - 200: {offset, size, ...}
+        - 409: 偏移量不一致，返回服务器的 offset
+        - 422: 文件头校验失败（会话已删除）
+    """
+    offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+    if offset is None:
+        return jsonify({'error': '缺少 offset'}), 400
+    session = blob_store.append_chunk(upload_id, int(offset), request.stream, request.content_length)
+    return jsonify(session), 200
+
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """
+    完成上传
+
+    Request (JSON):
+        - sha256: 可选，客户端计算的哈希，用于校验
+
+    Response:
+        - {sha256, size, filename, kind, deduplicated}，之后的请求用 `<字段名>_blob=<sha256>` 引用
+    """
+    data = request.get_json(silent=True) or {}
+    result = blob_store.complete_upload(upload_id, sha256=data.get('sha256'))
+    logger.info(f"✅ 上传完成: {result['filename']} -> {result['sha256'][:12]}"
+                f"{'（已存在，去重）' if result['deduplicated'] else ''}")
+    return jsonify(result), 200
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """取消上传"""
+    blob_store.abort_upload(upload_id)
+    return jsonify({'message': '上传已取消'}), 200
+
+
+@app.route('/api/blobs/<digest>', methods=['GET'])
+def get_blob_info(digest):
+    """查询已上传的文件（按 SHA-256）"""
+    info = blob_store.info(digest.lower())
+    if info is None:
+        return jsonify({'error': '文件不存在'}), 404
+    return jsonify(info), 200
 
 
 # ==================== 音频拆分相关API ====================
 
 # 音频拆分任务存储
-split_tasks = {}
+split_tasks = task_store.table('split_tasks')
 split_tasks_lock = threading.Lock()
 
 
@@ -3422,12 +4188,12 @@ def split_upload():
         logger.info("收到新的音频拆分任务")
 
         # 检查必需文件
-        if 'srt' not in request.files or 'audio' not in request.files:
+        if 'srt' not in uploaded_files() or 'audio' not in uploaded_files():
             logger.error("❌ 缺少必需文件")
             return jsonify({'error': '缺少必需文件'}), 400
 
-        srt = request.files['srt']
-        audio = request.files['audio']
+        srt = uploaded_files()['srt']
+        audio = uploaded_files()['audio']
 
         logger.info(f"📝 字幕文件: {srt.filename}")
         logger.info(f"🎤 配音文件: {audio.filename}")
@@ -3471,6 +4237,7 @@ def split_upload():
                 'output_folder': os.path.join(DOWNLOAD_FOLDER, 'split_' + task_id),
                 'segments': [],
                 'error': None,
+                'fingerprint': request_fingerprint(),  # 结果缓存用的输入指纹
                 'created_at': datetime.now().isoformat()
             }
 
@@ -3510,16 +4277,17 @@ def split_process(task_id):
             if task['status'] == 'processing':
                 return jsonify({'message': '任务正在处理中'}), 200
 
-            if task['status'] == 'completed':
+            if task['status'] == 'completed' and not _final_render_pending(task):
                 return jsonify({'message': '任务已完成'}), 200
 
-        # 在新线程中处理拆分
-        thread = threading.Thread(
-            target=process_split_thread,
-            args=(task_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', split_tasks, task_id, process_split_thread,
+            (task_id,),
+            discard_on_reject=False
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         return jsonify({
             'status': 'processing',
@@ -3535,8 +4303,6 @@ def process_split_thread(task_id):
     try:
         from moviepy import AudioFileClip
         import pysrt
-        import chardet
-        import zipfile
 
         logger.info("=" * 60)
         logger.info(f"✂️  开始拆分音频任务: {task_id}")
@@ -3548,11 +4314,10 @@ def process_split_thread(task_id):
 
         # 检测字幕编码
         logger.info("🔍 检测字幕编码")
-        with open(task['srt_path'], 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-            logger.info(f"   编码: {encoding}")
+        from subtitle_track import detect_srt_encoding
+
+        encoding = detect_srt_encoding(task['srt_path'])
+        logger.info(f"   编码: {encoding}")
 
         # 加载字幕
         logger.info("📝 加载字幕文件")
@@ -3613,7 +4378,7 @@ def process_split_thread(task_id):
             ]
 
             # 执行 ffmpeg 命令，隐藏输出
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
 
             if result.returncode != 0:
                 logger.error(f"   [{i+1:03d}] ffmpeg 错误: {result.stderr}")
@@ -3650,10 +4415,10 @@ def process_split_thread(task_id):
 
         logger.info("📦 创建ZIP压缩包")
         zip_path = os.path.join(local_output_dir, 'segments.zip')
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for segment in segments:
-                segment_path = os.path.join(local_output_dir, segment['filename'])
-                zipf.write(segment_path, segment['filename'])
+        write_zip(zip_path, [
+            (os.path.join(local_output_dir, segment['filename']), segment['filename'])
+            for segment in segments
+        ])
 
         logger.info(f"📦 ZIP文件已创建: segments.zip ({len(segments)} 个文件)")
         logger.info(f"💾 文件保存到: {local_output_dir}")
@@ -3714,13 +4479,13 @@ def get_split_status(task_id):
 
             task = split_tasks[task_id]
 
-        return jsonify({
+        return jsonify(with_schedule_info(task_id, {
             'status': task['status'],
             'progress': task['progress'],
             'message': task['message'],
             'segments': task.get('segments', []),
             'error': task.get('error')
-        }), 200
+        })), 200
 
     except Exception as e:
         return jsonify({'error': f'获取状态失败: {str(e)}'}), 500
@@ -3754,12 +4519,7 @@ def download_split_result(task_id, file_type):
             if not os.path.exists(zip_path):
                 return jsonify({'error': '文件不存在'}), 404
 
-            return send_file(
-                zip_path,
-                as_attachment=True,
-                download_name=f'audio_segments_{task_id}.zip',
-                mimetype='application/zip'
-            )
+            return send_media(zip_path, download_name=f'audio_segments_{task_id}.zip', mimetype='application/zip')
 
         elif file_type == 'json':
             # 下载JSON信息
@@ -3798,6 +4558,7 @@ def cancel_split_task(task_id):
 
             # 删除任务
             del split_tasks[task_id]
+            job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         # 清理文件
         task_folder = os.path.join(TASKS_FOLDER, 'split_' + task_id)
@@ -3823,6 +4584,24 @@ def request_entity_too_large(error):
 
 # ==================== 新增：字幕分析和增强剪辑API ====================
 
+# 字幕分析结果缓存（按两个字幕文件的内容哈希，第一次分析时创建）
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """字幕分析结果缓存（subtitle_analyzer 依赖 NumPy，用到时才导入）"""
+    global _analysis_cache
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            from subtitle_analyzer import AnalysisCache
+            _analysis_cache = AnalysisCache(max_entries=32)
+        return _analysis_cache
+
+ANALYSIS_PAGE_SIZE = 100
+ANALYSIS_MAX_PAGE_SIZE = 5000
+
+
 @app.route('/api/analyze-subtitles', methods=['POST'])
 def analyze_subtitles():
     """
@@ -3831,25 +4610,29 @@ def analyze_subtitles():
     Request:
         - original_srt: 原字幕文件
         - new_srt: 新字幕文件
+        - detail_limit: 随摘要一起返回的时间轴条数（可选，默认100）
 
     Response:
-        - analysis: 详细分析结果
-        - visualization: 可视化数据
+        - analysis_id: 分析ID（用于分页获取明细）
+        - analysis: 统计摘要
+        - visualization: 可视化数据（直方图 + 第一页时间轴）
         - recommendations: 剪辑参数推荐
     """
+    temp_dir = None
     try:
         logger.info("=" * 60)
         logger.info("收到字幕分析请求")
 
         # 检查文件
-        if 'original_srt' not in request.files or 'new_srt' not in request.files:
+        if 'original_srt' not in uploaded_files() or 'new_srt' not in uploaded_files():
             return jsonify({'error': '缺少字幕文件'}), 400
 
-        original_srt = request.files['original_srt']
-        new_srt = request.files['new_srt']
+        original_srt = uploaded_files()['original_srt']
+        new_srt = uploaded_files()['new_srt']
+        detail_limit = min(max(0, request.form.get('detail_limit', ANALYSIS_PAGE_SIZE, type=int)), ANALYSIS_MAX_PAGE_SIZE)
 
         # 保存到临时文件
-        temp_dir = tempfile.mkdtemp(prefix="subtitle_analysis_")
+        temp_dir = scratch_dir("subtitle_analysis_")
 
         original_srt_path = os.path.join(temp_dir, 'original.srt')
         new_srt_path = os.path.join(temp_dir, 'new.srt')
@@ -3860,23 +4643,16 @@ def analyze_subtitles():
         logger.info(f"原字幕: {original_srt.filename}")
         logger.info(f"新字幕: {new_srt.filename}")
 
-        # 分析字幕
-        analyzer = SubtitleAnalyzer(original_srt_path, new_srt_path)
-        analyzer.load_subtitles()
-
-        analysis = analyzer.compare_subtitles()
-        visualization = analyzer.generate_visualization_data()
-        recommendations = analyzer.recommend_clip_parameters()
-
-        # 清理临时文件
-        shutil.rmtree(temp_dir)
-
-        logger.info("✅ 字幕分析完成")
+        # 分析字幕（内容相同的字幕对直接复用缓存）
+        analysis_id, analyzer, cached = get_analysis_cache().analyze(original_srt_path, new_srt_path)
+        logger.info(f"{'♻️  命中缓存' if cached else '✅ 字幕分析完成'}: {analysis_id}")
 
         return jsonify({
-            'analysis': analysis,
-            'visualization': visualization,
-            'recommendations': recommendations
+            'analysis_id': analysis_id,
+            'cached': cached,
+            'analysis': analyzer.compare_subtitles(include_details=False),
+            'visualization': analyzer.generate_visualization_data(timeline_limit=detail_limit),
+            'recommendations': analyzer.recommend_clip_parameters()
         }), 200
 
     except Exception as e:
@@ -3884,6 +4660,46 @@ def analyze_subtitles():
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'分析失败: {str(e)}'}), 500
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@app.route('/api/analyze-subtitles/<analysis_id>/details', methods=['GET'])
+def get_subtitle_analysis_details(analysis_id):
+    """
+    分页获取逐条对比明细
+
+    Query:
+        - offset: 起始位置（默认0）
+        - limit: 条数（默认100，最大5000）
+        - format: rows（逐条字典）/ columnar（列式，体积更小）/ timeline（截断文本）
+    """
+    analyzer = get_analysis_cache().get(analysis_id)
+    if analyzer is None:
+        return jsonify({'error': '分析结果不存在或已过期，请重新分析'}), 404
+
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(0, request.args.get('limit', ANALYSIS_PAGE_SIZE, type=int)), ANALYSIS_MAX_PAGE_SIZE)
+    data_format = request.args.get('format', 'rows')
+
+    if data_format == 'columnar':
+        data = analyzer.get_columnar_page(offset, limit)
+    elif data_format == 'timeline':
+        data = analyzer.get_timeline_page(offset, limit)
+    elif data_format == 'rows':
+        data = analyzer.get_details_page(offset, limit)
+    else:
+        return jsonify({'error': f'不支持的格式: {data_format}'}), 400
+
+    return jsonify({
+        'analysis_id': analysis_id,
+        'offset': offset,
+        'limit': limit,
+        'total': analyzer.compared_count,
+        'format': data_format,
+        'data': data
+    }), 200
 
 
 @app.route('/api/enhanced-clip', methods=['POST'])
@@ -3906,12 +4722,12 @@ def enhanced_clip_video():
         logger.info("收到增强视频剪辑请求")
 
         # 检查必需文件
-        if 'video' not in request.files or 'original_srt' not in request.files or 'new_srt' not in request.files:
+        if 'video' not in uploaded_files() or 'original_srt' not in uploaded_files() or 'new_srt' not in uploaded_files():
             return jsonify({'error': '缺少必需文件'}), 400
 
-        video = request.files['video']
-        original_srt = request.files['original_srt']
-        new_srt = request.files['new_srt']
+        video = uploaded_files()['video']
+        original_srt = uploaded_files()['original_srt']
+        new_srt = uploaded_files()['new_srt']
 
         # 获取参数
         merge_gap = float(request.form.get('merge_gap', 2.0))
@@ -3956,6 +4772,7 @@ def enhanced_clip_video():
                 'use_precise': use_precise,
                 'output_folder': output_dir,
                 'error': None,
+                'fingerprint': request_fingerprint(),  # 结果缓存用的输入指纹
                 'created_at': datetime.now().isoformat()
             }
 
@@ -3992,13 +4809,14 @@ def process_enhanced_clip(task_id):
             if task.get('type') != 'enhanced_clip':
                 return jsonify({'error': '任务类型不匹配'}), 400
 
-        # 在新线程中处理
-        thread = threading.Thread(
-            target=process_enhanced_clip_thread,
-            args=(task_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, task_id, process_enhanced_clip_thread,
+            (task_id,),
+            discard_on_reject=False
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         return jsonify({
             'status': 'processing',
@@ -4022,6 +4840,8 @@ def process_enhanced_clip_thread(task_id):
 
         logger.info("创建增强剪辑器...")
 
+        from enhanced_video_processor import EnhancedVideoClipper
+
         clipper = EnhancedVideoClipper(
             video_path=tasks[task_id]['video_path'],
             original_srt_path=tasks[task_id]['original_srt_path'],
@@ -4037,7 +4857,8 @@ def process_enhanced_clip_thread(task_id):
 
         logger.info("处理视频...")
 
-        result = clipper.process()
+        with progress_stage('clip', 20, 99):
+            result = clipper.process()
 
         logger.info(f"✅ 增强剪辑完成")
 
@@ -4078,6 +4899,7 @@ def batch_clip_videos():
         - tasks: 任务列表JSON，每个任务包含 video_path, original_srt_path, new_srt_path
         - merge_gap: 合并间隙阈值（可选）
         - use_precise: 是否精确模式（可选）
+        - max_workers: 最大并发数（可选，默认按 CPU 核数和磁盘带宽计算）
 
     Response:
         - batch_id: 批处理任务ID
@@ -4090,6 +4912,7 @@ def batch_clip_videos():
         tasks_data = request.json.get('tasks', [])
         merge_gap = float(request.json.get('merge_gap', 2.0))
         use_precise = request.json.get('use_precise', False)
+        max_workers = request.json.get('max_workers')
 
         if not tasks_data:
             return jsonify({'error': '任务列表为空'}), 400
@@ -4113,18 +4936,20 @@ def batch_clip_videos():
                 'tasks': tasks_data,
                 'merge_gap': merge_gap,
                 'use_precise': use_precise,
+                'max_workers': int(max_workers) if max_workers else None,
                 'results': [],
                 'error': None,
                 'created_at': datetime.now().isoformat()
             }
 
-        # 在新线程中处理
-        thread = threading.Thread(
-            target=process_batch_clip_thread,
-            args=(batch_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, batch_id, process_batch_clip_thread,
+            (batch_id,),
+            discard_on_reject=True
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         logger.info(f"✅ 批量任务创建成功: {batch_id}")
 
@@ -4149,37 +4974,49 @@ def process_batch_clip_thread(batch_id):
             tasks_data = task['tasks']
             merge_gap = task['merge_gap']
             use_precise = task['use_precise']
+            max_workers = task.get('max_workers')
+
+        # 创建批量处理器（并发数默认按 CPU 核数和磁盘带宽计算）
+        from enhanced_video_processor import BatchVideoProcessor
 
-        # 创建批量处理器
         batch_processor = BatchVideoProcessor(
-            output_dir=os.path.join(OUTPUT_FOLDER, f'batch_{batch_id}')
+            output_dir=os.path.join(OUTPUT_FOLDER, f'batch_{batch_id}'),
+            max_workers=max_workers
         )
 
-        # 处理每个任务
-        for i, task_data in enumerate(tasks_data):
-            with tasks_lock:
-                tasks[batch_id]['message'] = f'处理第 {i+1}/{len(tasks_data)} 个视频'
-                tasks[batch_id]['progress'] = int((i / len(tasks_data)) * 100)
-
-            logger.info(f"[{i+1}/{len(tasks_data)}] 处理: {task_data.get('video_path')}")
-
-            result = batch_processor.process_single(
-                video_path=task_data['video_path'],
-                original_srt_path=task_data['original_srt_path'],
-                new_srt_path=task_data['new_srt_path'],
-                merge_gap=merge_gap,
-                use_precise_seek=use_precise
-            )
+        with tasks_lock:
+            tasks[batch_id]['items'] = [
+                {'index': i, 'video_path': t.get('video_path'), 'status': 'pending'}
+                for i, t in enumerate(tasks_data)
+            ]
 
+        def on_progress(event):
+            """每完成一个视频更新一次任务状态"""
+            result = event['result']
+            logger.info(f"[{event['done']}/{event['total']}] {'✅' if result.get('success') else '❌'} "
+                        f"{result.get('video_path')}")
             with tasks_lock:
-                tasks[batch_id]['results'].append(result)
-                if result.get('success'):
-                    tasks[batch_id]['completed'] += 1
-                else:
-                    tasks[batch_id]['failed'] += 1
+                batch = tasks[batch_id]
+                batch.increment('completed' if result.get('success') else 'failed')
+                batch.update({
+                    'results': batch['results'] + [result],
+                    'items': [dict(item) for item in event['items']],
+                    'progress': int(event['done'] / event['total'] * 100),
+                    'message': f"已完成 {event['done']}/{event['total']} 个视频"
+                })
+
+        # 并发处理（报告随每个视频完成增量写入）
+        report_name = f'batch_{batch_id}_report.json'
+        batch_processor.process_batch(
+            tasks_data,
+            merge_gap=merge_gap,
+            use_precise_seek=use_precise,
+            on_progress=on_progress,
+            report_name=report_name
+        )
 
         # 生成报告
-        report = batch_processor.generate_report(f'batch_{batch_id}_report.json')
+        report = batch_processor.generate_report(report_name)
 
         # 更新状态
         with tasks_lock:
@@ -4233,12 +5070,12 @@ def compact_clip_video():
         logger.info("收到紧凑剪辑请求（累积偏移算法）")
 
         # 检查必需文件
-        if 'video' not in request.files or 'original_srt' not in request.files or 'new_srt' not in request.files:
+        if 'video' not in uploaded_files() or 'original_srt' not in uploaded_files() or 'new_srt' not in uploaded_files():
             return jsonify({'error': '缺少必需文件'}), 400
 
-        video = request.files['video']
-        original_srt = request.files['original_srt']
-        new_srt = request.files['new_srt']
+        video = uploaded_files()['video']
+        original_srt = uploaded_files()['original_srt']
+        new_srt = uploaded_files()['new_srt']
 
         # 获取参数
         use_precise = request.form.get('use_precise', 'false').lower() == 'true'
@@ -4280,6 +5117,7 @@ def compact_clip_video():
                 'use_precise': use_precise,
                 'output_folder': output_dir,
                 'error': None,
+                'fingerprint': request_fingerprint(),  # 结果缓存用的输入指纹
                 'created_at': datetime.now().isoformat()
             }
 
@@ -4316,13 +5154,14 @@ def process_compact_clip(task_id):
             if task.get('type') != 'compact_clip':
                 return jsonify({'error': '任务类型不匹配'}), 400
 
-        # 在新线程中处理
-        thread = threading.Thread(
-            target=process_compact_clip_thread,
-            args=(task_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, task_id, process_compact_clip_thread,
+            (task_id,),
+            discard_on_reject=False
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         return jsonify({
             'status': 'processing',
@@ -4346,6 +5185,8 @@ def process_compact_clip_thread(task_id):
 
         logger.info("创建紧凑剪辑器（累积偏移算法）...")
 
+        from compact_video_processor import CompactVideoClipper
+
         clipper = CompactVideoClipper(
             video_path=tasks[task_id]['video_path'],
             original_srt_path=tasks[task_id]['original_srt_path'],
@@ -4360,7 +5201,8 @@ def process_compact_clip_thread(task_id):
 
         logger.info("处理视频...")
 
-        result = clipper.process()
+        with progress_stage('clip', 20, 99):
+            result = clipper.process()
 
         logger.info(f"✅ 紧凑剪辑完成")
 
@@ -4398,6 +5240,166 @@ def process_compact_clip_thread(task_id):
         logger.error("=" * 60)
 
 
+# ==================== 预览API ====================
+
+@app.route('/api/preview', methods=['POST'])
+def preview_upload():
+    """
+    硬字幕快速预览：在低分辨率代理上烧录字幕，可以只渲染选中字幕附近的时间窗口
+
+    代理与原视频时间轴一致，预览满意后用同样的字幕和样式提交正式任务即可。
+    其他任务（软硬字幕生成、剪辑、混音）提交时带 preview=1 也在代理上执行。
+
+    Request:
+        - video: 原视频文件（可用 video_blob 引用已上传的文件，反复预览不用重传）
+        - srt: 字幕文件
+        - subtitle_config: 字幕样式配置（JSON字符串，可选，像素值按原视频分辨率填写）
+        - cues: 只预览这些字幕（序号从 1 开始，如 "12"、"3,5"、"10-14"，可选）
+        - padding: 选中字幕前后留白秒数（可选，默认2）
+        - start / end: 直接指定时间窗口（秒，可选，与 cues 二选一）
+        - encoding_profile: 编码档位（可选，默认 draft）
+
+    Response:
+        - task_id: 任务ID（状态: /api/status/<task_id>，下载: /api/download/<task_id>/preview）
+        - preview_window: 渲染的时间窗口 [开始秒, 结束秒]，整段预览时为 null
+    """
+    try:
+        if 'video' not in uploaded_files() or 'srt' not in uploaded_files():
+            return jsonify({'error': '缺少视频或字幕文件'}), 400
+
+        video = uploaded_files()['video']
+        srt = uploaded_files()['srt']
+
+        try:
+            subtitle_config = json.loads(request.form.get('subtitle_config') or '{}')
+        except ValueError:
+            return jsonify({'error': 'subtitle_config 不是有效的JSON'}), 400
+
+        try:
+            cues = parse_cue_selection(request.form.get('cues'))
+            padding = float(request.form.get('padding') or DEFAULT_WINDOW_PADDING)
+            start, end = request.form.get('start'), request.form.get('end')
+            if bool(start) != bool(end):
+                raise ValueError('start 和 end 需要同时指定')
+            window = (float(start), float(end)) if start else None
+            if window and not 0 <= window[0] < window[1]:
+                raise ValueError(f'时间窗口无效: {start} - {end}')
+        except ValueError as e:
+            return jsonify({'error': f'预览参数错误: {e}'}), 400
+
+        task_id = str(uuid.uuid4())
+        task_folder = os.path.join(TASKS_FOLDER, task_id)
+        os.makedirs(task_folder, exist_ok=True)
+
+        video_path = os.path.join(task_folder, f"video{Path(video.filename or '').suffix or '.mp4'}")
+        srt_path = os.path.join(task_folder, 'subtitles.srt')
+        video.save(video_path)
+        srt.save(srt_path)
+
+        if cues and not window:
+            try:
+                window = cue_window(srt_path, cues, padding)
+            except ValueError as e:
+                shutil.rmtree(task_folder, ignore_errors=True)
+                return jsonify({'error': str(e)}), 400
+
+        output_dir = os.path.join(OUTPUT_FOLDER, f'preview_{task_id}')
+        os.makedirs(output_dir, exist_ok=True)
+
+        logger.info(f"🎞️  预览任务 {task_id}: {video.filename}，"
+                    f"{'窗口 %.2f-%.2f 秒' % window if window else '整段'}")
+
+        with tasks_lock:
+            tasks[task_id] = {
+                'type': 'preview',
+                'status': 'processing',
+                'progress': 0,
+                'message': '正在生成预览',
+                'video_path': video_path,
+                'srt_path': srt_path,
+                'subtitle_config': subtitle_config,
+                'preview_cues': cues,
+                'preview_window': list(window) if window else None,
+                'output_folder': output_dir,
+                'error': None,
+                'created_at': datetime.now().isoformat()
+            }
+
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, task_id, process_preview_task,
+            (task_id,),
+            discard_on_reject=True
+        )
+        if rejected:
+            return rejected
+
+        return jsonify({
+            'task_id': task_id,
+            'status': 'processing',
+            'preview_window': list(window) if window else None,
+            'message': '预览任务已创建'
+        }), 200
+
+    except Exception as e:
+        logger.error(f"创建预览任务失败: {e}")
+        return jsonify({'error': f'创建预览任务失败: {str(e)}'}), 500
+
+
+def process_preview_task(task_id):
+    """硬字幕预览处理线程（video_path 已由 _preview_inputs 换成代理）"""
+    try:
+        with tasks_lock:
+            task = tasks[task_id]
+            task['status'] = 'processing'
+            task['message'] = '正在生成预览...'
+
+        video_path = task['video_path']
+        srt_path = task['srt_path']
+        preview_dir = os.path.join(TASKS_FOLDER, task_id, 'preview')
+        os.makedirs(preview_dir, exist_ok=True)
+
+        # 只渲染时间窗口：截取窗口，字幕平移到从 0 开始
+        window = task.get('preview_window')
+        if window:
+            start, end = window
+            progress_stage('window', 5, 15)
+            video_path = cut_window(video_path, start, end, os.path.join(preview_dir, 'window.mp4'))
+            window_srt = os.path.join(preview_dir, 'window.srt')
+            count = shift_subtitles(srt_path, start, end, window_srt)
+            srt_path = window_srt
+            logger.info(f"   预览窗口: {start:.2f}-{end:.2f} 秒，{count} 条字幕")
+
+        # 字号和边距已由 _preview_inputs 按代理与原视频的高度比例缩放
+        config = {**HARD_SUBTITLE_DEFAULTS, **(task.get('subtitle_config') or {})}
+
+        output_path = os.path.join(task['output_folder'], 'preview.mp4')
+        with progress_stage('burn', 15, 99):
+            if not create_hard_subtitle_video(video_path, srt_path, output_path, config):
+                raise RuntimeError('预览硬字幕生成失败')
+
+        with tasks_lock:
+            tasks[task_id].update({
+                'status': 'completed',
+                'progress': 100,
+                'message': '预览完成',
+                '_preview': output_path,
+                'completed_at': datetime.now().isoformat()
+            })
+        logger.info(f"✅ 预览任务 {task_id} 完成: {output_path}")
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+
+        logger.error(f"❌ 预览任务 {task_id} 失败: {str(e)}")
+
+        with tasks_lock:
+            tasks[task_id]['status'] = 'failed'
+            tasks[task_id]['error'] = str(e)
+            tasks[task_id]['message'] = f'预览失败: {str(e)}'
+
+
 # ==================== 时间轴对齐API ====================
 
 @app.route('/api/timeline-align', methods=['POST'])
@@ -4422,12 +5424,12 @@ def timeline_align_video():
         logger.info("收到时间轴对齐请求")
 
         # 检查必需文件
-        if 'video' not in request.files or 'original_srt' not in request.files or 'new_srt' not in request.files:
+        if 'video' not in uploaded_files() or 'original_srt' not in uploaded_files() or 'new_srt' not in uploaded_files():
             return jsonify({'error': '缺少必需文件'}), 400
 
-        video = request.files['video']
-        original_srt = request.files['original_srt']
-        new_srt = request.files['new_srt']
+        video = uploaded_files()['video']
+        original_srt = uploaded_files()['original_srt']
+        new_srt = uploaded_files()['new_srt']
 
         # 获取参数
         use_precise = request.form.get('use_precise', 'false').lower() == 'true'
@@ -4469,6 +5471,7 @@ def timeline_align_video():
                 'use_precise': use_precise,
                 'output_folder': output_dir,
                 'error': None,
+                'fingerprint': request_fingerprint(),  # 结果缓存用的输入指纹
                 'created_at': datetime.now().isoformat()
             }
 
@@ -4505,13 +5508,14 @@ def process_timeline_align(task_id):
             if task.get('type') != 'timeline_align':
                 return jsonify({'error': '任务类型不匹配'}), 400
 
-        # 在新线程中处理
-        thread = threading.Thread(
-            target=process_timeline_align_thread,
-            args=(task_id,)
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, task_id, process_timeline_align_thread,
+            (task_id,),
+            discard_on_reject=False
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         return jsonify({
             'status': 'processing',
@@ -4535,6 +5539,8 @@ def process_timeline_align_thread(task_id):
 
         logger.info("创建时间轴对齐器（以新字幕为基准）...")
 
+        from timeline_aligner import TimelineAligner
+
         aligner = TimelineAligner(
             video_path=tasks[task_id]['video_path'],
             original_srt_path=tasks[task_id]['original_srt_path'],
@@ -4549,7 +5555,8 @@ def process_timeline_align_thread(task_id):
 
         logger.info("处理视频...")
 
-        result = aligner.process()
+        with progress_stage('align', 20, 99):
+            result = aligner.process()
 
         logger.info(f"✅ 时间轴对齐完成")
 
@@ -4607,16 +5614,16 @@ def iterative_adjust_upload():
         logger.info("收到迭代调整剪辑任务")
 
         # 检查文件
-        if 'video' not in request.files:
+        if 'video' not in uploaded_files():
             return jsonify({'error': '缺少视频文件'}), 400
-        if 'original_srt' not in request.files:
+        if 'original_srt' not in uploaded_files():
             return jsonify({'error': '缺少原字幕文件'}), 400
-        if 'new_srt' not in request.files:
+        if 'new_srt' not in uploaded_files():
             return jsonify({'error': '缺少新字幕文件'}), 400
 
-        video = request.files['video']
-        original_srt = request.files['original_srt']
-        new_srt = request.files['new_srt']
+        video = uploaded_files()['video']
+        original_srt = uploaded_files()['original_srt']
+        new_srt = uploaded_files()['new_srt']
 
         if video.filename == '' or original_srt.filename == '' or new_srt.filename == '':
             return jsonify({'error': '文件名为空'}), 400
@@ -4658,13 +5665,14 @@ def iterative_adjust_upload():
                 'error': None
             }
 
-        # 在后台线程中处理
-        thread = threading.Thread(
-            target=process_iterative_adjust_task,
-            args=(task_id, video_path, original_srt_path, new_srt_path, 0.5)  # 传递默认阈值
+        # 提交到任务调度器（队列已满时返回429）
+        rejected = submit_job(
+            'light', tasks, task_id, process_iterative_adjust_task,
+            (task_id, video_path, original_srt_path, new_srt_path, 0.5),  # 传递默认阈值
+            discard_on_reject=True
         )
-        thread.daemon = True
-        thread.start()
+        if rejected:
+            return rejected
 
         logger.info("=" * 60)
 
@@ -4691,6 +5699,8 @@ def process_iterative_adjust_task(task_id, video_path, original_srt_path, new_sr
         os.makedirs(output_dir, exist_ok=True)
 
         # 创建剪辑器（使用时间轴重映射算法）
+        from timeline_remap_clipper import TimelineRemapClipper
+
         clipper = TimelineRemapClipper(
             video_path=video_path,
             original_srt_path=original_srt_path,
@@ -4700,7 +5710,8 @@ def process_iterative_adjust_task(task_id, video_path, original_srt_path, new_sr
         )
 
         # 处理
-        result = clipper.process()
+        with progress_stage('adjust', 0, 99):
+            result = clipper.process()
 
         # 更新任务状态
         with tasks_lock:
@@ -4714,10 +5725,10 @@ def process_iterative_adjust_task(task_id, video_path, original_srt_path, new_sr
                 tasks[task_id]['stats'] = result.get('stats')
 
                 # 额外保存到全局output目录
-                global_output_dir = os.path.join(os.path.dirname(__file__), '../../output')
-                os.makedirs(global_output_dir, exist_ok=True)
-                global_video_path = os.path.join(global_output_dir, f'adjusted_{task_id[:8]}_video.mp4')
-                shutil.copy2(video_path, global_video_path)
+                os.makedirs(GLOBAL_OUTPUT_FOLDER, exist_ok=True)
+                global_video_path = os.path.join(GLOBAL_OUTPUT_FOLDER, f'adjusted_{task_id[:8]}_video.mp4')
+                link_or_copy(video_path, global_video_path)
+                tasks[task_id]['global_video'] = global_video_path
                 logger.info(f"   视频已保存到全局目录: {global_video_path}")
 
                 # 统计信息
@@ -4784,7 +5795,7 @@ def iterative_adjust_status(task_id):
         if task['status'] == 'failed':
             response['error'] = task.get('error')
 
-        return jsonify(response)
+        return jsonify(with_schedule_info(task_id, response))
 
 
 @app.route('/api/iterative-adjust/download/<task_id>', methods=['GET'])
@@ -4818,7 +5829,7 @@ def iterative_adjust_download(task_id):
                 return jsonify({'error': '视频文件不存在'}), 404
 
             filename = os.path.basename(file_path)
-            return send_file(file_path, as_attachment=True, download_name=filename)
+            return send_media(file_path, download_name=filename)
 
         elif file_type == 'log':
             log_path = os.path.join(os.path.dirname(task.get('adjusted_video', '')), 'timeline_remap_log.json')
@@ -4826,7 +5837,7 @@ def iterative_adjust_download(task_id):
                 return jsonify({'error': '日志文件不存在'}), 404
 
             filename = os.path.basename(log_path)
-            return send_file(log_path, as_attachment=True, download_name=filename)
+            return send_media(log_path, download_name=filename)
 
         else:
             return jsonify({'error': '无效的文件类型'}), 400
@@ -4861,6 +5872,7 @@ def iterative_adjust_delete_task(task_id):
 
         # 删除任务记录
         del tasks[task_id]
+        job_scheduler.cancel(task_id)  # 排队中的任务直接出队
 
         return jsonify({
             'message': '任务已删除',
@@ -4875,6 +5887,18 @@ if __name__ == '__main__':
     logger.info(f"🌐 API地址: http://localhost:5001")
     logger.info(f"📂 工作目录: {os.path.dirname(__file__)}")
     logger.info("=" * 60)
+    # 服务启动时指标从 0 开始（在 fork 工作进程之前清掉上次运行留下的快照）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        REGISTRY.configure(METRICS_FOLDER, clear=True)
+    # 预先 fork 重任务工作进程（debug 模式下只在实际提供服务的子进程中启动）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and os.environ.get('VIDEORECOMP_WORKER_PROCESSES', '1') != '0':
+        if job_scheduler.start_worker_processes():
+            logger.info(f"⚙️  工作进程已启动: {job_scheduler.stats()}")
+    # 后台存储清理（多个进程时由文件锁保证只有一个在清理）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and os.environ.get('VIDEORECOMP_STORAGE_GC', '1') != '0':
+        storage_manager.start()
+        logger.info(f"🧹 存储清理已启动: 配额 {storage_manager.quota_bytes / 1024 ** 3:.0f} GB")
+
     logger.info("服务已启动，等待请求...")
     logger.info("")
 
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3.12
+"""
+内容寻址的文件存储 - 分块可续传上传、流式 SHA-256 与内容去重
+
+上传的文件按 SHA-256 存放在 objects/<前两位>/<哈希> 下，同一个源视频只保存一份；
+之后的请求用 `<字段名>_blob=<sha256>` 引用已有文件，不必重新上传。
+分块直接从请求流写入临时文件并同时计算哈希，不经过 werkzeug 的表单缓冲；
+前几个分块到达后先检查文件头（ffprobe / 魔数），格式不对立即拒绝。
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import subprocess
+from typing import Dict, Optional, BinaryIO
+
+
+# 读写缓冲大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 收到这么多字节后检查文件头
+HEADER_PROBE_BYTES = 2 * 1024 * 1024
+
+# 单个分块的最大大小
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 文件类型 -> 允许的容器（按文件头魔数识别）
+_MAGIC = (
+    (4, b'ftyp', 'mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'matroska'),
+    (0, b'RIFF', 'riff'),
+    (0, b'FLV', 'flv'),
+    (0, b'\x00\x00\x01\xba', 'mpeg'),
+    (0, b'\x47', 'mpegts'),
+    (0, b'ID3', 'mp3'),
+    (0, b'\xff\xfb', 'mp3'),
+    (0, b'\xff\xf3', 'mp3'),
+    (0, b'\xff\xf2', 'mp3'),
+    (0, b'fLaC', 'flac'),
+    (0, b'OggS', 'ogg'),
+    (0, b'\xff\xf1', 'aac'),
+    (0, b'\xff\xf9', 'aac'),
+    (0, b'PK\x03\x04', 'zip'),
+)
+
+_KIND_FORMATS = {
+    'video': {'mp4', 'matroska', 'riff', 'flv', 'mpeg', 'mpegts'},
+    'audio': {'mp4', 'matroska', 'riff', 'mp3', 'flac', 'ogg', 'aac'},
+    'archive': {'zip'},
+}
+
+
+class UploadError(Exception):
+    """上传请求无效"""
+
+    def __init__(self, message: str, status: int = 400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def link_file(source: str, dest_path: str) -> str:
+    """
+    硬链接文件（跨文件系统时退回复制）
+
+    Returns:
+        dest_path
+    """
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(source, dest_path)
+    except OSError:
+        shutil.copyfile(source, dest_path)
+    return dest_path
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """根据文件头魔数识别容器格式"""
+    for offset, magic, name in _MAGIC:
+        if header[offset:offset + len(magic)] == magic:
+            # MPEG-TS 每 188 字节一个同步字节，只有一个 0x47 不够
+            if name == 'mpegts' and header[188:189] != b'\x47':
+                continue
+            return name
+    return None
+
+
+def probe_header(path: str, kind: str) -> Optional[str]:
+    """
+    检查（可能不完整的）文件头是否符合类型
+
+    Args:
+        path: 文件路径
+        kind: video / audio / subtitle / archive / other
+
+    Returns:
+        None 表示通过，否则为拒绝原因
+    """
+    with open(path, 'rb') as f:
+        header = f.read(64 * 1024)
+
+    if kind == 'subtitle':
+        # SRT 是文本：不能含 NUL，样本里应当有时间轴
+        if b'\x00' in header and not header.startswith((b'\xff\xfe', b'\xfe\xff')):
+            return '字幕文件不是文本文件'
+        if b'-->' not in header and len(header) >= 1024:
+            return '未找到 SRT 时间轴'
+        return None
+
+    allowed = _KIND_FORMATS.get(kind)
+    if not allowed:
+        return None
+
+    magic_format = sniff_format(header)
+    if kind == 'archive':
+        return None if magic_format == 'zip' else '不是 ZIP 文件'
+
+    if shutil.which('ffprobe'):
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=format_name', '-of', 'json', path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
+            if result.returncode == 0:
+                return None
+            # MP4 的 moov 可能在文件末尾，不完整的文件 ffprobe 会失败，此时以魔数为准
+            if magic_format in allowed:
+                return None
+            return f"无法识别的{'视频' if kind == 'video' else '音频'}格式: {result.stderr.strip()[:200]}"
+        except subprocess.TimeoutExpired:
+            pass
+
+    if magic_format in allowed:
+        return None
+    return f"无法识别的{'视频' if kind == 'video' else '音频'}格式"
+
+
+class BlobStore:
+    """内容寻址存储"""
+
+    def __init__(self, root: str):
+        """
+        初始化
+
+        Args:
+            root: 存储根目录
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.uploads_dir = os.path.join(root, 'uploads')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        # 上传中的哈希状态（进程重启后从临时文件重新计算）
+        self._hashers: Dict[str, tuple] = {}
+
+    # ---------- 文件 ----------
+
+    @staticmethod
+    def _valid_digest(digest: str) -> bool:
+        return isinstance(digest, str) and len(digest) == 64 and all(c in '0123456789abcdef' for c in digest)
+
+    def path(self, digest: str) -> str:
+        """文件在存储中的路径"""
+        if not self._valid_digest(digest):
+            raise UploadError('无效的 SHA-256', status=400)
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return self._valid_digest(digest) and os.path.exists(self.path(digest))
+
+    def info(self, digest: str) -> Optional[Dict]:
+        """文件元数据，不存在时返回 None"""
+        if not self.exists(digest):
+            return None
+        try:
+            with open(self.path(digest) + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        meta.update({'sha256': digest, 'size': os.path.getsize(self.path(digest))})
+        return meta
+
+    def link(self, digest: str, dest_path: str) -> str:
+        """
+        把存储中的文件放到任务目录（优先硬链接，不占额外空间）
+
+        Returns:
+            dest_path
+        """
+        source = self.path(digest)
+        if not os.path.exists(source):
+            raise UploadError(f'文件不存在: {digest}', status=404)
+        link_file(source, dest_path)
+        os.utime(source)  # 记录最近使用时间
+        return dest_path
+
+    def _commit(self, temp_path: str, digest: str, meta: Dict) -> bool:
+        """
+        把临时文件移入存储
+
+        Returns:
+            是否是已存在的文件（去重）
+        """
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with self._lock:
+            if os.path.exists(target):
+                os.remove(temp_path)
+                os.utime(target)
+                return True
+            os.replace(temp_path, target)
+            with open(target + '.json', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            return False
+
+    def put_file(self, source: BinaryIO, filename: str = '', kind: str = 'other') -> Dict:
+        """
+        一次性写入（普通表单上传），边写边计算哈希
+
+        Returns:
+            文件元数据（含 'deduplicated'）
+        """
+        temp_path = os.path.join(self.uploads_dir, f"{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        size = 0
+        with open(temp_path, 'wb') as out:
+            while True:
+                block = source.read(COPY_BUFFER_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+                out.write(block)
+                size += len(block)
+        digest = hasher.hexdigest()
+        meta = {'filename': filename, 'kind': kind, 'created_at': time.time()}
+        deduplicated = self._commit(temp_path, digest, meta)
+        return {**(self.info(digest) or {}), 'deduplicated': deduplicated}
+
+    # ---------- 分块上传 ----------
+
+    def _session_path(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise UploadError('无效的上传ID', status=400)
+        return os.path.join(self.uploads_dir, f"{upload_id}.json")
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.uploads_dir, f"{upload_id}.part")
+
+    def _load_session(self, upload_id: str) -> Dict:
+        try:
+            with open(self._session_path(upload_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在或已过期', status=404)
+
+    def _save_session(self, session: Dict):
+        path = self._session_path(session['upload_id'])
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def create_upload(self, filename: str, size: int, kind: str = 'other', sha256: Optional[str] = None) -> Dict:
+        """
+        创建上传会话
+
+        Args:
+            filename: 原始文件名
+            size: 文件总大小（字节）
+            kind: video / audio / subtitle / archive / other
+            sha256: 客户端已知的哈希；已存在时直接返回，不需要上传
+
+        Returns:
+            会话信息；命中已有文件时为文件元数据（'deduplicated': True）
+        """
+        if sha256 and self.exists(sha256.lower()):
+            return {**self.info(sha256.lower()), 'deduplicated': True}
+        if size is None or int(size) < 0:
+            raise UploadError('缺少文件大小', status=400)
+
+        session = {
+            'upload_id': uuid.uuid4().hex,
+            'filename': os.path.basename(filename or ''),
+            'kind': kind,
+            'size': int(size),
+            'offset': 0,
+            'expected_sha256': sha256.lower() if sha256 else None,
+            'header_checked': False,
+            'created_at': time.time(),
+        }
+        open(self._part_path(session['upload_id']), 'wb').close()
+        self._save_session(session)
+        return {**session, 'chunk_size': 8 * 1024 * 1024}
+
+    def get_upload(self, upload_id: str) -> Dict:
+        """查询上传会话（断点续传时获取已接收的偏移量）"""
+        session = self._load_session(upload_id)
+        session['offset'] = os.path.getsize(self._part_path(upload_id))
+        return session
+
+    def _hasher(self, upload_id: str, offset: int):
+        """
+        取得与已接收数据一致的哈希状态（返回副本，分块写入成功后才记回缓存，
+        被拒绝的分块不会混进缓存的哈希）
+        """
+        state = self._hashers.get(upload_id)
+        if state is not None and state[1] == offset:
+            return state[0].copy()
+        hasher = hashlib.sha256()
+        with open(self._part_path(upload_id), 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                block = f.read(min(COPY_BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def append_chunk(self, upload_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> Dict:
+        """
+        追加一个分块（直接从请求流写入）
+
+        Args:
+            upload_id: 上传ID
+            offset: 分块在文件中的起始位置，必须等于已接收的大小
+            stream: 请求体
+            length: 分块大小（Content-Length）
+
+        Returns:
+            会话信息（含新的 offset）
+
+        Raises:
+            UploadError: 偏移量不一致（409）、超出声明大小（413）、文件头校验失败（422）
+        """
+        with self._upload_lock(upload_id):
+            session = self._load_session(upload_id)
+            part_path = self._part_path(upload_id)
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadError('分块偏移量不一致', status=409, offset=current)
+            if length is not None and length > MAX_CHUNK_SIZE:
+                raise UploadError('分块过大', status=413, max_chunk_size=MAX_CHUNK_SIZE)
+            if length is not None and current + length > session['size']:
+                raise UploadError('上传数据超出声明的文件大小', status=413)
+
+            hasher = self._hasher(upload_id, current)
+            written = 0
+            with open(part_path, 'ab') as out:
+                while True:
+                    block = stream.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if current + written > session['size'] or written > MAX_CHUNK_SIZE:
+                        out.truncate(current)
+                        raise UploadError('上传数据超出声明的文件大小', status=413)
+                    hasher.update(block)
+                    out.write(block)
+
+            offset = current + written
+            self._hashers[upload_id] = (hasher, offset)
+            session['offset'] = offset
+
+            if not session['header_checked'] and (offset >= HEADER_PROBE_BYTES or offset >= session['size']):
+                reason = probe_header(part_path, session['kind'])
+                if reason:
+                    self._discard(upload_id)
+                    raise UploadError(reason, status=422)
+                session['header_checked'] = True
+                self._save_session(session)
+            return session
+
+    def complete_upload(self, upload_id: str, sha256: Optional[str] = None) -> Dict:
+        """
+        完成上传：校验大小和哈希后移入存储
+
+        Returns:
+            文件元数据（含 'deduplicated'）
+        """
+        with self._upload_lock(upload_id):
+            session = self.get_upload(upload_id)
+            if session['offset'] != session['size']:
+                raise UploadError('文件尚未上传完整', status=409, offset=session['offset'])
+            if not session['header_checked']:
+                reason = probe_header(self._part_path(upload_id), session['kind'])
+                if reason:
+                    self._discard(upload_id)
+                    raise UploadError(reason, status=422)
+
+            digest = self._hasher(upload_id, session['offset']).hexdigest()
+            expected = (sha256 or session.get('expected_sha256') or '').lower()
+            if expected and expected != digest:
+                self._discard(upload_id)
+                raise UploadError('SHA-256 校验失败', status=422, sha256=digest)
+
+            meta = {'filename': session['filename'], 'kind': session['kind'], 'created_at': time.time()}
+            deduplicated = self._commit(self._part_path(upload_id), digest, meta)
+            self._discard(upload_id)
+            return {**self.info(digest), 'deduplicated': deduplicated}
+
+    def abort_upload(self, upload_id: str):
+        """取消上传"""
+        self._load_session(upload_id)
+        with self._upload_lock(upload_id):
+            self._discard(upload_id)
+
+    def _discard(self, upload_id: str):
+        for path in (self._part_path(upload_id), self._session_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+
+
+class BlobFile:
+    """已上传文件的引用（与 werkzeug FileStorage 的 filename / save 用法一致）"""
+
+    def __init__(self, store: BlobStore, digest: str, filename: Optional[str] = None):
+        info = store.info(digest)
+        if info is None:
+            raise UploadError(f'文件不存在: {digest}', status=404)
+        self.store = store
+        self.digest = digest
+        self.filename = os.path.basename(filename or info.get('filename') or digest)
+
+    def save(self, dest_path: str):
+        self.store.link(self.digest, dest_path)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3.12
+"""
+文件下载响应
+- send_media: 大文件下载，支持 Range（断点续传）、If-None-Match / If-Range；
+  可交给前置的 nginx（X-Accel-Redirect）或 Apache/lighttpd（X-Sendfile）零拷贝发送，
+  否则由 WSGI 服务器的 wsgi.file_wrapper（如 gunicorn 的 sendfile）发送
+- send_zip: 多个文件边打包边下载，内存占用恒定；
+  完整下载一次后留有磁盘缓存，之后的请求和断点续传都直接按文件返回
+
+环境变量：
+    VIDEORECOMP_X_SENDFILE=1          使用 X-Sendfile
+    VIDEORECOMP_X_ACCEL_ROOT=/data    nginx internal location 对应的本地目录
+    VIDEORECOMP_X_ACCEL_PREFIX=/protected/
+"""
+
+import os
+import glob
+from typing import Iterable, Optional
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+
+from storage_manager import touch
+from zip_stream import ZipEntry, existing_entries, tee_zip, write_zip, zip_etag
+
+
+X_ACCEL_ROOT = os.environ.get('VIDEORECOMP_X_ACCEL_ROOT', '')
+X_ACCEL_PREFIX = os.environ.get('VIDEORECOMP_X_ACCEL_PREFIX', '/protected/')
+
+
+def configure_sendfile(app):
+    """根据环境变量开启 X-Sendfile"""
+    if os.environ.get('VIDEORECOMP_X_SENDFILE', '').lower() in ('1', 'true', 'yes'):
+        app.config['USE_X_SENDFILE'] = True
+        print("✅ 文件下载使用 X-Sendfile")
+    elif X_ACCEL_ROOT:
+        print(f"✅ 文件下载使用 X-Accel-Redirect: {X_ACCEL_ROOT} -> {X_ACCEL_PREFIX}")
+
+
+def _x_accel_uri(path: str) -> Optional[str]:
+    """本地路径 -> nginx internal URI，不在映射目录下时返回 None"""
+    if not X_ACCEL_ROOT:
+        return None
+    root = os.path.realpath(X_ACCEL_ROOT)
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root:
+        return None
+    relative = os.path.relpath(real, root).replace(os.sep, '/')
+    return X_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative)
+
+
+def send_media(path: str, download_name: Optional[str] = None, mimetype: Optional[str] = None,
+               as_attachment: bool = True, etag: Optional[str] = None) -> Response:
+    """
+    发送本地文件
+
+    Args:
+        path: 文件路径
+        download_name: 下载文件名（默认取文件名）
+        mimetype: MIME 类型（默认按扩展名推断）
+        as_attachment: 是否作为附件下载
+        etag: 自定义 ETag（默认按文件修改时间和大小生成）
+
+    Returns:
+        Flask 响应
+    """
+    download_name = download_name or os.path.basename(path)
+    accel_uri = _x_accel_uri(path)
+    touch(path)  # 供存储清理按最近使用时间淘汰
+
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=accel_uri is None,
+        etag=etag if etag is not None else True,
+        max_age=0,
+    )
+
+    if accel_uri:
+        # nginx 自己处理 Range / 条件请求，这里只回头部
+        response.close()
+        response.response = []
+        response.headers.pop('Content-Length', None)
+        response.headers['X-Accel-Redirect'] = accel_uri
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _remove_stale(cache_dir: str, stem: str, keep: str):
+    """删除同一下载的旧缓存（源文件变了之后 ETag 不同）"""
+    for old in glob.glob(os.path.join(glob.escape(cache_dir), f'{glob.escape(stem)}.*.zip')):
+        if old != keep:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def send_zip(entries: Iterable[ZipEntry], download_name: str,
+             cache_dir: Optional[str] = None) -> Response:
+    """
+    打包多个文件并下载
+
+    Args:
+        entries: (源文件路径, ZIP 内文件名) 列表，不存在的文件会被跳过
+        download_name: 下载文件名
+        cache_dir: 缓存目录，为 None 时每次都重新打包且不支持断点续传
+
+    Returns:
+        Flask 响应
+    """
+    entries = existing_entries(entries)
+    etag = zip_etag(entries)
+
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        stem = os.path.splitext(download_name)[0]
+        cache_path = os.path.join(cache_dir, f'{stem}.{etag[:16]}.zip')
+        _remove_stale(cache_dir, stem, cache_path)
+
+        if not os.path.exists(cache_path) and request.range is not None:
+            # 断点续传：打包结果是确定的，先落盘再按 Range 返回
+            write_zip(cache_path, entries)
+        if os.path.exists(cache_path):
+            return send_media(cache_path, download_name, 'application/zip', etag=etag)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = Response(tee_zip(entries, cache_path), mimetype='application/zip', direct_passthrough=True)
+    response.set_etag(etag)
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.headers['Accept-Ranges'] = 'bytes' if cache_path else 'none'
+    response.headers['Cache-Control'] = 'no-cache'
+    print(f"📦 流式打包下载: {download_name} ({len(entries)} 个文件)")
+    return response
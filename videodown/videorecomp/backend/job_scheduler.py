@@ -0,0 +1,399 @@
+#!/usr/bin/env python3.12
+"""
+任务调度器 - 按任务类别排队、限制并发、优先级调度和准入控制
+
+任务分为三类，每类有独立的队列和并发上限：
+    - separation: Demucs 人声分离（占满 CPU/GPU 和内存）
+    - render:     重新编码、逐帧烧录字幕、MoviePy 合成
+    - light:      流复制剪辑、拆分、轻量 remux
+队列满时拒绝新任务（API 返回 429）。
+重任务类别可以交给预先 fork 的工作进程执行，
+避免逐帧循环和 API 请求争用同一个 GIL；进度通过共享的任务数据库回传。
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+import importlib
+import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+
+# 优先级：数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+PRIORITY_NAMES = {
+    'high': PRIORITY_HIGH,
+    'normal': PRIORITY_NORMAL,
+    'low': PRIORITY_LOW,
+}
+
+_CPU_COUNT = os.cpu_count() or 1
+
+# 各类别默认配置（可用环境变量 VIDEORECOMP_<CLASS>_WORKERS / _QUEUE 覆盖）
+DEFAULT_JOB_CLASSES = {
+    'separation': {'workers': 1, 'max_queue': 4, 'estimate': 300.0, 'isolate': True},
+    'render': {'workers': max(1, _CPU_COUNT // 4), 'max_queue': 8, 'estimate': 180.0, 'isolate': True},
+    'light': {'workers': max(2, min(8, _CPU_COUNT)), 'max_queue': 32, 'estimate': 30.0, 'isolate': False},
+}
+
+
+class QueueFullError(Exception):
+    """队列已满（准入控制拒绝）"""
+
+    def __init__(self, job_class: str, retry_after: float):
+        super().__init__(f"{job_class} 队列已满，请稍后重试")
+        self.job_class = job_class
+        self.retry_after = retry_after
+
+
+def _run_in_worker(fn: Callable, args: tuple, kwargs: dict):
+    """工作进程中执行任务（异常只记录，任务函数自己负责写失败状态）"""
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        traceback.print_exc()
+
+
+# 工作进程启动时预先导入的重量级模块（API 进程启动时不导入它们，fork 的工作进程不会继承）
+WARM_MODULES = ('numpy', 'cv2', 'moviepy', 'video_processor')
+
+
+def _preload_modules():
+    """工作进程初始化：导入重任务需要的模块，第一个任务不再付导入开销（未安装的模块跳过）"""
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _warm_up():
+    """预热工作进程（模块已由 _preload_modules 导入）"""
+    return os.getpid()
+
+
+class _JobClass:
+    """单个任务类别的队列和运行状态"""
+
+    def __init__(self, name: str, workers: int, max_queue: int, estimate: float, isolate: bool):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.isolate = isolate
+        self.queue = []                        # 堆：(priority, seq, job_id)
+        self.jobs: Dict[str, Dict] = {}        # 排队中的任务
+        self.running: Dict[str, float] = {}    # 运行中的任务 -> 开始时间
+        self.durations = deque([estimate], maxlen=20)
+        self.threads = []
+
+    @property
+    def average_duration(self) -> float:
+        return sum(self.durations) / len(self.durations)
+
+
+class JobScheduler:
+    """有界任务调度器"""
+
+    def __init__(self, job_classes: Optional[Dict[str, Dict]] = None,
+                 on_crash: Optional[Callable[[str], None]] = None):
+        """
+        初始化
+
+        Args:
+            job_classes: {类别: {'workers', 'max_queue', 'estimate', 'isolate'}}，默认 DEFAULT_JOB_CLASSES
+            on_crash: 任务导致工作进程崩溃时调用（参数为任务ID），用于把任务标记为失败
+        """
+        config = job_classes or DEFAULT_JOB_CLASSES
+        self._classes: Dict[str, _JobClass] = {}
+        for name, options in config.items():
+            prefix = f"VIDEORECOMP_{name.upper()}"
+            self._classes[name] = _JobClass(
+                name,
+                workers=int(os.environ.get(f"{prefix}_WORKERS", options.get('workers', 1))),
+                max_queue=int(os.environ.get(f"{prefix}_QUEUE", options.get('max_queue', 8))),
+                estimate=float(options.get('estimate', 60.0)),
+                isolate=bool(options.get('isolate', False))
+            )
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._job_class_of: Dict[str, str] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_count = 0
+        self._pool_lock = threading.Lock()
+        self.on_crash = on_crash
+
+    # ---------- 工作进程 ----------
+
+    def start_worker_processes(self, processes: Optional[int] = None) -> bool:
+        """
+        预先 fork 工作进程（应在启动 HTTP 服务前、主线程中调用）
+
+        Args:
+            processes: 进程数（默认为需要隔离的类别并发数之和）
+
+        Returns:
+            是否启用了工作进程
+        """
+        if self._process_pool is not None:
+            return True
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            return False
+
+        count = processes or sum(c.workers for c in self._classes.values() if c.isolate)
+        if count <= 0:
+            return False
+
+        self._process_count = count
+        self._process_pool = self._create_process_pool()
+        # fork 上下文下第一次提交会一次性创建全部工作进程
+        self._process_pool.submit(_warm_up).result()
+        return True
+
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self._process_count, mp_context=multiprocessing.get_context('fork'),
+            initializer=_preload_modules
+        )
+
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor):
+        """关闭崩溃的工作进程池并重建（多个任务同时发现崩溃时只重建一次）"""
+        with self._pool_lock:
+            if self._process_pool is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            try:
+                self._process_pool = self._create_process_pool()
+            except Exception as e:
+                print(f"⚠️  重建工作进程失败（{e}），隔离类别改为在线程中执行")
+                self._process_pool = None
+
+    def shutdown(self):
+        """关闭工作进程"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    # ---------- 提交 ----------
+
+    def can_accept(self, job_class: str) -> bool:
+        """队列是否还能接收新任务"""
+        cls = self._classes[job_class]
+        with self._cond:
+            return len(cls.jobs) < cls.max_queue or len(cls.running) < cls.workers
+
+    def retry_after(self, job_class: str) -> float:
+        """建议的重试等待时间（秒）"""
+        cls = self._classes[job_class]
+        return round(cls.average_duration / cls.workers, 1)
+
+    def submit(
+        self,
+        job_class: str,
+        job_id: str,
+        fn: Callable,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        priority: int = PRIORITY_NORMAL
+    ) -> int:
+        """
+        提交任务
+
+        Args:
+            job_class: 任务类别
+            job_id: 任务ID（与任务存储中的ID一致）
+            fn: 任务函数
+            args: 位置参数
+            kwargs: 关键字参数
+            priority: 优先级（数值越小越先执行）
+
+        Returns:
+            排队位置（0 表示会立即开始）
+
+        Raises:
+            QueueFullError: 队列已满
+        """
+        cls = self._classes[job_class]
+        with self._cond:
+            idle = len(cls.running) < cls.workers and not cls.jobs
+            if not idle and len(cls.jobs) >= cls.max_queue:
+                raise QueueFullError(job_class, self.retry_after(job_class))
+
+            cls.jobs[job_id] = {
+                'fn': fn, 'args': args, 'kwargs': kwargs or {},
+                'priority': priority, 'submitted_at': time.time()
+            }
+            heapq.heappush(cls.queue, (priority, next(self._seq), job_id))
+            self._job_class_of[job_id] = job_class
+            self._ensure_workers(cls)
+            self._cond.notify_all()
+            return self._queue_position(cls, job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中的任务（运行中的任务由任务自己的取消令牌结束，见 cancellation）"""
+        with self._cond:
+            job_class = self._job_class_of.get(job_id)
+            if not job_class:
+                return False
+            cls = self._classes[job_class]
+            if job_id not in cls.jobs:
+                return False
+            del cls.jobs[job_id]
+            cls.queue = [entry for entry in cls.queue if entry[2] != job_id]
+            heapq.heapify(cls.queue)
+            self._job_class_of.pop(job_id, None)
+            return True
+
+    # ---------- 执行 ----------
+
+    def _ensure_workers(self, cls: _JobClass):
+        """按需启动工作线程（调用方持有锁）"""
+        cls.threads = [t for t in cls.threads if t.is_alive()]
+        while len(cls.threads) < cls.workers:
+            thread = threading.Thread(
+                target=self._worker_loop, args=(cls,),
+                name=f"job_{cls.name}_{len(cls.threads)}", daemon=True
+            )
+            thread.start()
+            cls.threads.append(thread)
+
+    def _worker_loop(self, cls: _JobClass):
+        while True:
+            with self._cond:
+                while not cls.queue:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(cls.queue)
+                job = cls.jobs.pop(job_id, None)
+                if job is None:
+                    continue
+                started = time.time()
+                cls.running[job_id] = started
+
+            try:
+                self._execute(cls, job_id, job)
+            finally:
+                with self._cond:
+                    cls.running.pop(job_id, None)
+                    cls.durations.append(time.time() - started)
+                    self._job_class_of.pop(job_id, None)
+                    self._cond.notify_all()
+
+    def _execute(self, cls: _JobClass, job_id: str, job: Dict):
+        """
+        执行任务：隔离类别交给工作进程，否则在当前线程执行
+
+        工作进程崩溃（段错误、被 OOM 杀死）时重建进程池，任务标记为失败，
+        不在 API 进程里重跑可能再次崩溃的任务。
+        """
+        pool = self._process_pool if cls.isolate else None
+        if pool is not None:
+            try:
+                pool.submit(_run_in_worker, job['fn'], job['args'], job['kwargs']).result()
+                return
+            except BrokenProcessPool:
+                print(f"⚠️  工作进程异常退出，任务 {job_id} 标记为失败，重建工作进程")
+                self._replace_broken_pool(pool)
+                if self.on_crash is not None:
+                    try:
+                        self.on_crash(job_id)
+                    except Exception:
+                        traceback.print_exc()
+                return
+            except Exception as e:
+                print(f"⚠️  提交到工作进程失败（{e}），改为在线程中执行")
+        _run_in_worker(job['fn'], job['args'], job['kwargs'])
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _jobs_ahead(cls: _JobClass, job_id: str) -> int:
+        """排在该任务前面的任务数（调用方持有锁）"""
+        entry = next(e for e in cls.queue if e[2] == job_id)
+        return sum(1 for e in cls.queue if e < entry)
+
+    def _queue_position(self, cls: _JobClass, job_id: str) -> int:
+        """排队位置（0 表示有空闲工作槽，会立即开始）"""
+        free_slots = max(0, cls.workers - len(cls.running))
+        return max(0, self._jobs_ahead(cls, job_id) + 1 - free_slots)
+
+    def _estimate_start(self, cls: _JobClass, ahead: int) -> float:
+        """模拟前面的任务依次占用工作槽，估算开始等待时间"""
+        now = time.time()
+        average = cls.average_duration
+        slots = [max(0.0, average - (now - started)) for started in cls.running.values()]
+        slots += [0.0] * max(0, cls.workers - len(slots))
+        heapq.heapify(slots)
+        for _ in range(ahead):
+            heapq.heappush(slots, heapq.heappop(slots) + average)
+        return slots[0] if slots else 0.0
+
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        """
+        任务的调度状态
+
+        Returns:
+            {'job_class', 'state': queued/running, 'queue_position', 'eta_seconds'}，
+            不在调度器中（已结束或由其它进程调度）时返回 None
+        """
+        with self._cond:
+            job_class = self._job_class_of.get(job_id)
+            if not job_class:
+                return None
+            cls = self._classes[job_class]
+            average = cls.average_duration
+
+            if job_id in cls.running:
+                elapsed = time.time() - cls.running[job_id]
+                return {
+                    'job_class': job_class,
+                    'state': 'running',
+                    'queue_position': 0,
+                    'eta_seconds': round(max(0.0, average - elapsed), 1)
+                }
+
+            if job_id in cls.jobs:
+                ahead = self._jobs_ahead(cls, job_id)
+                wait = self._estimate_start(cls, ahead)
+                return {
+                    'job_class': job_class,
+                    'state': 'queued',
+                    'queue_position': ahead + 1,
+                    'eta_seconds': round(wait + average, 1)
+                }
+            return None
+
+    def stats(self) -> Dict:
+        """各类别的队列统计"""
+        with self._cond:
+            return {
+                name: {
+                    'workers': cls.workers,
+                    'running': len(cls.running),
+                    'queued': len(cls.jobs),
+                    'max_queue': cls.max_queue,
+                    'isolated': cls.isolate and self._process_pool is not None,
+                    'average_duration': round(cls.average_duration, 1)
+                }
+                for name, cls in self._classes.items()
+            }
+
+
+def parse_priority(value) -> int:
+    """解析请求中的优先级（high/normal/low 或数字）"""
+    if value is None or value == '':
+        return PRIORITY_NORMAL
+    if isinstance(value, str) and value.lower() in PRIORITY_NAMES:
+        return PRIORITY_NAMES[value.lower()]
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return PRIORITY_NORMAL
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3.12
+"""
+跨任务的结果缓存 - 按输入内容寻址
+
+缓存键 = 任务函数 + 所有输入文件的 SHA-256 + 归一化后的请求参数。
+批量接口在 JSON 里传服务器端路径（`*_path`），这些文件同样按内容计入输入，
+同一路径上的文件被替换后不会命中旧结果。
+任务完成后，它新产生的字段里引用的文件被硬链接进缓存目录；
+之后相同的请求直接把这些文件硬链接到新任务的输出目录并立即完成。
+
+索引保存在 SQLite 中（多个进程共享），淘汰策略可选 lru / lfu / fifo，
+另有条目数、总大小和过期时间上限；命中率按任务函数统计。
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from blob_store import COPY_BUFFER_SIZE, link_file
+
+
+# 处理逻辑有不兼容的改动时递增，旧缓存自动失效
+CACHE_VERSION = 1
+
+# 淘汰策略
+EVICTION_POLICIES = ('lru', 'lfu', 'fifo')
+
+# 不参与缓存键的请求参数（只影响调度或缓存本身）
+IGNORED_PARAMS = frozenset({'priority', 'use_cache', 'profile'})
+
+# 任务状态字段，不作为结果缓存
+STATUS_FIELDS = frozenset({
+    'status', 'progress', 'message', 'error', 'completed_at', 'progress_detail',
+    'cache_key', 'cache_hit', 'type', 'created_at',
+})
+
+# 任务输出目录字段（按优先级）
+RESULT_DIR_FIELDS = ('local_output_dir', 'output_dir', 'output_folder')
+
+# 缓存清单中的文件引用前缀
+ARTIFACT_PREFIX = 'result-cache://'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    cache_key   TEXT PRIMARY KEY,
+    job         TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    hits        INTEGER DEFAULT 0,
+    created_at  REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    fields      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    job         TEXT PRIMARY KEY,
+    hits        INTEGER DEFAULT 0,
+    misses      INTEGER DEFAULT 0,
+    stores      INTEGER DEFAULT 0,
+    evictions   INTEGER DEFAULT 0
+);
+"""
+
+_EVICTION_ORDER = {
+    'lru': 'last_used ASC',
+    'lfu': 'hits ASC, last_used ASC',
+    'fifo': 'created_at ASC',
+}
+
+
+def _normalize_value(value: Any) -> Any:
+    """表单里的字符串统一成 JSON 值（'true' -> True，'1.50' -> 1.5，JSON 字符串解析后比较）"""
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if not isinstance(value, str):
+        return value
+
+    text = value.strip()
+    lowered = text.lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    if text[:1] in ('{', '['):
+        try:
+            return _normalize_value(json.loads(text))
+        except ValueError:
+            return text
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return int(number) if number.is_integer() else number
+
+
+def normalize_params(params: Dict) -> Dict:
+    """
+    归一化请求参数
+
+    去掉文件引用（`*_blob` / `*_filename`）和只影响调度的参数
+    """
+    return {
+        key: _normalize_value(value)
+        for key, value in sorted(params.items())
+        if key not in IGNORED_PARAMS and not key.endswith(('_blob', '_filename'))
+    }
+
+
+_path_digest_memo: Dict[tuple, str] = {}
+_path_digest_lock = threading.Lock()
+
+
+def path_digest(path: str) -> str:
+    """
+    服务器端文件的 SHA-256（按路径、大小和修改时间记住结果，文件未变时不重复读取）
+
+    Raises:
+        OSError: 文件无法读取
+    """
+    st = os.stat(path)
+    memo_key = (os.path.realpath(path), st.st_size, st.st_mtime_ns, st.st_ino)
+    with _path_digest_lock:
+        if memo_key in _path_digest_memo:
+            return _path_digest_memo[memo_key]
+
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BUFFER_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    with _path_digest_lock:
+        _path_digest_memo[memo_key] = digest
+    return digest
+
+
+def path_inputs(params: Any, prefix: str = '') -> Dict[str, str]:
+    """
+    请求参数中引用的服务器端文件（键以 `_path` 结尾、指向已存在的文件）的内容哈希
+
+    Args:
+        params: 表单/JSON 参数（可嵌套字典和列表）
+        prefix: 字段名前缀（递归用）
+
+    Returns:
+        {字段路径（如 tasks.0.video_path）: SHA-256}
+    """
+    inputs = {}
+    if isinstance(params, dict):
+        items = params.items()
+    elif isinstance(params, (list, tuple)):
+        items = enumerate(params)
+    else:
+        return inputs
+
+    for key, value in items:
+        field = f'{prefix}{key}'
+        if isinstance(value, (dict, list, tuple)):
+            inputs.update(path_inputs(value, f'{field}.'))
+        elif isinstance(value, str) and str(key).endswith('_path') and os.path.isfile(value):
+            inputs[field] = path_digest(value)
+    return inputs
+
+
+def file_digest(file) -> Optional[str]:
+    """
+    上传文件的 SHA-256
+
+    Args:
+        file: werkzeug FileStorage 或 BlobFile
+
+    Returns:
+        十六进制哈希，空文件字段返回 None
+    """
+    digest = getattr(file, 'digest', None)
+    if digest:
+        return digest
+    if not getattr(file, 'filename', None):
+        return None
+
+    stream = file.stream
+    stream.seek(0)
+    hasher = hashlib.sha256()
+    while True:
+        block = stream.read(COPY_BUFFER_SIZE)
+        if not block:
+            break
+        hasher.update(block)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+def cache_key(job: str, inputs: Dict[str, Optional[str]], params: Dict) -> str:
+    """
+    计算缓存键
+
+    Args:
+        job: 任务函数名
+        inputs: {字段名: 文件 SHA-256}
+        params: 归一化后的请求参数
+
+    Returns:
+        十六进制哈希
+    """
+    payload = json.dumps(
+        {'version': CACHE_VERSION, 'job': job, 'inputs': inputs, 'params': params},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def result_dir(record: Dict) -> Optional[str]:
+    """任务的输出目录"""
+    for field in RESULT_DIR_FIELDS:
+        if record.get(field):
+            return record[field]
+    return None
+
+
+def result_fields(before: Dict, after: Dict) -> Dict:
+    """任务执行期间新增或改变的结果字段"""
+    return {
+        key: value for key, value in after.items()
+        if key not in STATUS_FIELDS and before.get(key) != value
+    }
+
+
+def _map_strings(value: Any, fn: Callable[[str], str]) -> Any:
+    if isinstance(value, dict):
+        return {k: _map_strings(v, fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_map_strings(v, fn) for v in value]
+    if isinstance(value, str):
+        return fn(value)
+    return value
+
+
+def _link_tree(source_dir: str, dest_dir: str) -> int:
+    """硬链接整个目录，返回文件总大小"""
+    total = 0
+    for root, _dirs, files in os.walk(source_dir):
+        target_root = os.path.join(dest_dir, os.path.relpath(root, source_dir))
+        for name in files:
+            source = os.path.join(root, name)
+            link_file(source, os.path.join(target_root, name))
+            total += os.path.getsize(source)
+    return total
+
+
+def _inside(path: str, directory: Optional[str]) -> bool:
+    if not directory:
+        return False
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+class ResultCache:
+    """结果缓存"""
+
+    def __init__(self, root: str, policy: str = 'lru', max_bytes: int = 50 * 1024 ** 3,
+                 max_entries: int = 1000, ttl_seconds: Optional[float] = 30 * 86400):
+        """
+        初始化
+
+        Args:
+            root: 缓存目录
+            policy: 淘汰策略 (lru / lfu / fifo)
+            max_bytes: 缓存文件总大小上限
+            max_entries: 条目数上限
+            ttl_seconds: 多久未被使用后过期（None 表示不过期）
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f'未知的淘汰策略: {policy}（可选 {", ".join(EVICTION_POLICIES)}）')
+        self.root = root
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程一个连接（自动提交模式）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.root, 'index.db'), timeout=30.0,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _count(self, job: str, column: str, delta: int = 1):
+        self._conn().execute(
+            f'INSERT INTO stats (job, {column}) VALUES (?, ?) '
+            f'ON CONFLICT(job) DO UPDATE SET {column} = {column} + excluded.{column}',
+            (job, delta)
+        )
+
+    # ---------- 查询 ----------
+
+    def restore(self, key: str, job: str, dest_dir: str) -> Optional[Dict]:
+        """
+        命中时把缓存的文件硬链接到新任务目录
+
+        Args:
+            key: 缓存键
+            job: 任务函数名（用于统计）
+            dest_dir: 新任务的输出目录
+
+        Returns:
+            结果字段（文件路径已指向 dest_dir），未命中返回 None
+        """
+        row = self._conn().execute('SELECT fields FROM entries WHERE cache_key = ?', (key,)).fetchone()
+        entry_dir = self._entry_dir(key)
+        if row is None or not os.path.isdir(entry_dir):
+            self._count(job, 'misses')
+            return None
+
+        def restore_path(value: str) -> str:
+            if not value.startswith(ARTIFACT_PREFIX):
+                return value
+            relative = value[len(ARTIFACT_PREFIX):]
+            source = os.path.join(entry_dir, relative)
+            target = os.path.normpath(os.path.join(dest_dir, relative))
+            if os.path.isdir(source):
+                _link_tree(source, target)
+            else:
+                link_file(source, target)
+            return target
+
+        try:
+            fields = _map_strings(json.loads(row[0]), restore_path)
+        except OSError as e:
+            # 缓存文件被外部删除，作废这个条目
+            print(f"⚠️  结果缓存已损坏，丢弃 {key[:12]}: {e}")
+            self.discard(key)
+            self._count(job, 'misses')
+            return None
+
+        self._conn().execute(
+            'UPDATE entries SET hits = hits + 1, last_used = ? WHERE cache_key = ?', (time.time(), key)
+        )
+        self._count(job, 'hits')
+        return fields
+
+    # ---------- 写入 ----------
+
+    def store(self, key: str, job: str, fields: Dict, source_dir: Optional[str] = None) -> bool:
+        """
+        缓存任务结果
+
+        Args:
+            key: 缓存键
+            job: 任务函数名
+            fields: 结果字段（其中指向已存在文件/目录的字符串会被缓存）
+            source_dir: 任务输出目录，目录内的文件保留相对路径
+
+        Returns:
+            是否缓存（结果不含任何文件时不缓存）
+        """
+        tmp_dir = os.path.join(self.root, 'tmp', f'{key}.{os.getpid()}.{threading.get_ident()}')
+        linked: Dict[str, str] = {}
+
+        def cache_path(value: str) -> str:
+            if os.sep not in value or not os.path.exists(value):
+                return value
+            real = os.path.realpath(value)
+            if real in linked:
+                return ARTIFACT_PREFIX + linked[real]
+            if os.path.isdir(value) and not _inside(value, source_dir):
+                return value
+
+            if _inside(value, source_dir):
+                relative = os.path.relpath(real, os.path.realpath(source_dir))
+            else:
+                relative = os.path.basename(real)
+                while relative in linked.values():
+                    relative = f'{len(linked)}_{relative}'
+            target = os.path.join(tmp_dir, relative)
+            if os.path.isdir(real):
+                _link_tree(real, target)
+            elif not os.path.exists(target):
+                link_file(real, target)
+            linked[real] = relative
+            return ARTIFACT_PREFIX + relative
+
+        try:
+            manifest = _map_strings(fields, cache_path)
+            if not linked:
+                return False
+            size = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _dirs, files in os.walk(tmp_dir) for name in files
+            )
+
+            entry_dir = self._entry_dir(key)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            os.rename(tmp_dir, entry_dir)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        now = time.time()
+        self._conn().execute(
+            'INSERT OR REPLACE INTO entries (cache_key, job, size, hits, created_at, last_used, fields) '
+            'VALUES (?, ?, ?, 0, ?, ?, ?)',
+            (key, job, size, now, now, json.dumps(manifest, ensure_ascii=False, default=str))
+        )
+        self._count(job, 'stores')
+        self.evict()
+        return True
+
+    def discard(self, key: str) -> bool:
+        """删除一个条目"""
+        cursor = self._conn().execute('DELETE FROM entries WHERE cache_key = ?', (key,))
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return cursor.rowcount > 0
+
+    def evict(self) -> int:
+        """
+        按策略淘汰条目，直到满足过期时间、条目数和总大小上限
+
+        Returns:
+            淘汰的条目数
+        """
+        conn = self._conn()
+        victims: List[tuple] = []
+        if self.ttl_seconds is not None:
+            victims += conn.execute(
+                'SELECT cache_key, job, size FROM entries WHERE last_used < ?', (time.time() - self.ttl_seconds,)
+            ).fetchall()
+
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        count -= len(victims)
+        total -= sum(v[2] for v in victims)
+        if count > self.max_entries or total > self.max_bytes:
+            expired = {v[0] for v in victims}
+            for row in conn.execute(f'SELECT cache_key, job, size FROM entries ORDER BY {_EVICTION_ORDER[self.policy]}'):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                if row[0] in expired:
+                    continue
+                victims.append(row)
+                count -= 1
+                total -= row[2]
+
+        for key, job, _size in victims:
+            if self.discard(key):
+                self._count(job, 'evictions')
+        if victims:
+            print(f"🧹 结果缓存淘汰 {len(victims)} 个条目（{self.policy}）")
+        return len(victims)
+
+    def clear(self) -> int:
+        """清空缓存（保留统计）"""
+        keys = [row[0] for row in self._conn().execute('SELECT cache_key FROM entries')]
+        for key in keys:
+            self.discard(key)
+        return len(keys)
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict:
+        """条目数、占用空间和按任务函数统计的命中率"""
+        conn = self._conn()
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+
+        jobs = {}
+        hits_total = misses_total = 0
+        for job, hits, misses, stores, evictions in conn.execute(
+            'SELECT job, hits, misses, stores, evictions FROM stats ORDER BY job'
+        ):
+            lookups = hits + misses
+            jobs[job] = {
+                'hits': hits,
+                'misses': misses,
+                'stores': stores,
+                'evictions': evictions,
+                'hit_rate': round(hits / lookups, 4) if lookups else None,
+            }
+            hits_total += hits
+            misses_total += misses
+
+        lookups = hits_total + misses_total
+        return {
+            'policy': self.policy,
+            'entries': count,
+            'size_bytes': total,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': hits_total,
+            'misses': misses_total,
+            'hit_rate': round(hits_total / lookups, 4) if lookups else None,
+            'jobs': jobs,
+        }
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3.12
+"""
+磁盘配额与存储清理
+
+任务目录、下载目录、输出目录和临时目录按“产物类别”管理：
+    - 每个类别的顶层条目（一个任务目录 / 一个输出文件）是清理的最小单位
+    - 条目按任务数据中引用的路径归属到任务，统计每个任务占用的空间
+    - 超过类别的保留时间（TTL）后删除；总量超过配额或剩余空间不足时，
+      按最近使用时间（LRU）删除已完成任务的产物
+    - 未结束的任务、刚写入的条目不会被删除
+    - 崩溃后遗留的临时目录（videorecomp_* 等）超过保留时间后回收
+    - 内容寻址存储的文件（objects/<前两位>/<哈希>）和放弃的分块上传会话同样按保留时间回收
+任务目录里的文件多是存储文件或结果缓存的硬链接，删除后不一定腾出空间：
+配额按只有一个链接的文件计算可释放的大小，剩余空间在每次删除后重新读取。
+提交新任务前估算输出大小，空间不够时先尝试清理，仍然不够则拒绝（HTTP 507）。
+多个 API 进程共享同一组目录时，用文件锁保证同一时间只有一个进程在清理。
+"""
+
+import os
+import time
+import fnmatch
+import shutil
+import threading
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from task_store import TaskStore
+from task_events import FINAL_STATUSES
+
+
+# 各任务类别的输出大小估算（相对输入文件总大小）
+OUTPUT_FACTORS = {
+    'separation': 3.0,
+    'render': 2.5,
+    'light': 1.5,
+}
+
+# 刚修改过的条目视为正在写入，不清理（秒）
+WRITE_GRACE_SECONDS = 10 * 60
+
+# 未结束的任务超过这么久没有更新，视为进程崩溃遗留，不再保护其文件（秒）
+STALE_TASK_SECONDS = 24 * 3600
+
+
+class InsufficientStorageError(Exception):
+    """磁盘空间不足以接收新任务"""
+
+    def __init__(self, required: int, available: int):
+        super().__init__(
+            f'磁盘空间不足：预计需要 {required / 1024 ** 3:.1f} GB，可用 {available / 1024 ** 3:.1f} GB'
+        )
+        self.required = required
+        self.available = available
+
+
+class ArtifactClass:
+    """一类产物目录"""
+
+    def __init__(self, name: str, root: str, ttl_hours: Optional[float], patterns: Iterable[str] = ('*',),
+                 excludes: Iterable[str] = (), dirs_only: bool = False, evictable: bool = True,
+                 depth: int = 1, sidecars: Iterable[str] = ()):
+        """
+        初始化
+
+        Args:
+            name: 类别名
+            root: 所在目录
+            ttl_hours: 最近一次使用后保留多久（None 表示不过期）
+            patterns: 纳入管理的顶层条目名（glob）
+            excludes: 不管理的顶层条目名（glob）
+            dirs_only: 只管理子目录（目录下的数据库等文件不动）
+            evictable: 超配额时是否可以按 LRU 删除
+            depth: 条目所在的目录层级（1 为 root 下的顶层条目，2 为 root/<子目录>/ 下的条目）
+            sidecars: 随条目一起删除的附属文件扩展名（<条目去掉扩展名><扩展名>，如元数据 .json）
+        """
+        self.name = name
+        self.root = os.path.realpath(root)
+        self.ttl_seconds = ttl_hours * 3600 if ttl_hours is not None else None
+        self.patterns = tuple(patterns)
+        self.excludes = tuple(excludes)
+        self.dirs_only = dirs_only
+        self.evictable = evictable
+        self.depth = max(1, depth)
+        self.sidecar_exts = tuple(sidecars)
+
+    def entries(self) -> List[str]:
+        """列出条目"""
+        parents = [self.root]
+        for _ in range(self.depth - 1):
+            parents = [os.path.join(parent, name) for parent in parents for name in _listdir(parent)
+                       if os.path.isdir(os.path.join(parent, name))]
+        result = []
+        for parent in parents:
+            for name in _listdir(parent):
+                if name.startswith('.') or not any(fnmatch.fnmatch(name, p) for p in self.patterns):
+                    continue
+                if any(fnmatch.fnmatch(name, p) for p in self.excludes):
+                    continue
+                path = os.path.join(parent, name)
+                if self.dirs_only and not os.path.isdir(path):
+                    continue
+                result.append(path)
+        return result
+
+    def sidecars(self, path: str) -> List[str]:
+        """条目的附属文件"""
+        base = os.path.splitext(path)[0]
+        return [base + ext for ext in self.sidecar_exts]
+
+    def entry_of(self, real: str) -> Optional[str]:
+        """文件所属的条目路径（不在本类别目录下时返回 None）"""
+        if real == self.root or not real.startswith(self.root + os.sep):
+            return None
+        parts = os.path.relpath(real, self.root).split(os.sep)
+        if len(parts) < self.depth:
+            return None
+        return os.path.join(self.root, *parts[:self.depth])
+
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def parse_ttl_hours(text: str, defaults: Dict[str, Optional[float]]) -> Dict[str, Optional[float]]:
+    """
+    解析各类别的保留时间，如 "tasks=168,temp=6,output=none"
+
+    Returns:
+        {类别名: 小时数或 None}
+    """
+    result = dict(defaults)
+    for item in (text or '').split(','):
+        if '=' not in item:
+            continue
+        name, value = (part.strip() for part in item.split('=', 1))
+        result[name] = None if value.lower() in ('none', 'off', '') else float(value)
+    return result
+
+
+def touch(path: str):
+    """记录文件被使用（只更新访问时间，不影响基于修改时间的 ETag）"""
+    try:
+        st = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def _measure(path: str, seen: set, extra: Iterable[str] = ()) -> tuple:
+    """
+    统计条目大小和最近使用时间（硬链接只计一次）
+
+    Returns:
+        (字节数, 删除后可释放的字节数（只有一个链接的文件）, 最近的访问/修改时间)
+    """
+    total = 0
+    exclusive = 0
+    latest = 0.0
+    stack = [path, *extra]
+    while stack:
+        current = stack.pop()
+        try:
+            st = os.lstat(current)
+        except OSError:
+            continue
+        if os.path.isdir(current) and not os.path.islink(current):
+            # 目录的访问时间会被扫描本身刷新，只看修改时间
+            latest = max(latest, st.st_mtime)
+            try:
+                stack.extend(os.path.join(current, name) for name in os.listdir(current))
+            except OSError:
+                pass
+            continue
+        latest = max(latest, st.st_mtime, st.st_atime)
+        if st.st_nlink <= 1:
+            exclusive += st.st_size
+        inode = (st.st_dev, st.st_ino)
+        if inode in seen:
+            continue
+        seen.add(inode)
+        total += st.st_size
+    return total, exclusive, latest
+
+
+def _referenced_paths(value) -> Iterable[str]:
+    """任务数据中所有像路径的字符串"""
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _referenced_paths(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _referenced_paths(v)
+    elif isinstance(value, str) and os.sep in value and '\n' not in value:
+        yield value
+
+
+class StorageManager:
+    """存储配额管理"""
+
+    def __init__(self, store: TaskStore, classes: List[ArtifactClass], quota_bytes: int,
+                 min_free_bytes: int = 5 * 1024 ** 3, interval: float = 600.0,
+                 lock_path: Optional[str] = None, is_active=None):
+        """
+        初始化
+
+        Args:
+            store: 任务存储
+            classes: 管理的产物类别
+            quota_bytes: 所有类别合计的配额
+            min_free_bytes: 磁盘至少保留的剩余空间
+            interval: 后台清理间隔（秒）
+            lock_path: 多进程清理锁文件
+            is_active: 判断任务是否仍在调度器中的函数 task_id -> bool
+        """
+        self.store = store
+        self.classes = classes
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.interval = interval
+        self.lock_path = lock_path
+        self.is_active = is_active or (lambda task_id: False)
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_scan: Optional[Dict] = None
+        self._last_gc: Optional[Dict] = None
+
+    # ---------- 扫描 ----------
+
+    def _owners(self) -> tuple:
+        """
+        按任务数据把顶层条目归属到任务
+
+        Returns:
+            ({条目路径: [(category, task_id), ...]}, {task_id: 是否受保护})
+        """
+        owners: Dict[str, List[tuple]] = {}
+        protected: Dict[str, bool] = {}
+        now = time.time()
+
+        for record in self.store.records():
+            task_id = record['task_id']
+            protected[task_id] = self.is_active(task_id) or (
+                record['status'] not in FINAL_STATUSES and now - (record['updated_at'] or 0) < STALE_TASK_SECONDS
+            )
+            for ref in set(_referenced_paths(record['data'])):
+                real = os.path.realpath(ref)
+                for cls in self.classes:
+                    entry = cls.entry_of(real)
+                    if entry is None:
+                        continue
+                    owner = (record['category'], task_id)
+                    if owner not in owners.setdefault(entry, []):
+                        owners[entry].append(owner)
+        return owners, protected
+
+    def scan(self) -> List[Dict]:
+        """
+        扫描所有条目
+
+        Returns:
+            [{'class', 'path', 'bytes', 'exclusive_bytes', 'last_used', 'tasks', 'protected'}, ...]
+        """
+        owners, protected = self._owners()
+        now = time.time()
+        seen: set = set()
+        entries = []
+        for cls in self.classes:
+            for path in cls.entries():
+                size, exclusive, last_used = _measure(path, seen, cls.sidecars(path))
+                tasks = owners.get(path, [])
+                entries.append({
+                    'class': cls.name,
+                    'path': path,
+                    'bytes': size,
+                    'exclusive_bytes': exclusive,
+                    'sidecars': cls.sidecars(path),
+                    'last_used': last_used,
+                    'tasks': tasks,
+                    'protected': (now - last_used < WRITE_GRACE_SECONDS
+                                  or any(protected.get(task_id) for _category, task_id in tasks)),
+                })
+        return entries
+
+    def _free_bytes(self) -> int:
+        """任务产物所在磁盘中最小的剩余空间（临时目录可能在内存盘上，不计入）"""
+        free = []
+        for cls in self.classes:
+            if cls.evictable and os.path.isdir(cls.root):
+                free.append(shutil.disk_usage(cls.root).free)
+        return min(free) if free else 0
+
+    def usage(self, refresh: bool = False, top: int = 20) -> Dict:
+        """
+        存储使用情况
+
+        Args:
+            refresh: 是否重新扫描（否则使用最近一次扫描结果）
+            top: 返回占用最多的任务数
+
+        Returns:
+            {'quota_bytes', 'used_bytes', 'free_bytes', 'classes', 'tasks', 'last_gc', ...}
+        """
+        with self._lock:
+            if refresh or self._last_scan is None:
+                self._last_scan = {'time': time.time(), 'entries': self.scan()}
+            scan = self._last_scan
+
+        classes: Dict[str, Dict] = {cls.name: {'bytes': 0, 'entries': 0} for cls in self.classes}
+        per_task: Dict[str, int] = {}
+        for entry in scan['entries']:
+            classes[entry['class']]['bytes'] += entry['bytes']
+            classes[entry['class']]['entries'] += 1
+            for _category, task_id in entry['tasks']:
+                per_task[task_id] = per_task.get(task_id, 0) + entry['bytes']
+
+        used = sum(c['bytes'] for c in classes.values())
+        largest = sorted(per_task.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            'scanned_at': scan['time'],
+            'quota_bytes': self.quota_bytes,
+            'used_bytes': used,
+            'free_bytes': self._free_bytes(),
+            'min_free_bytes': self.min_free_bytes,
+            'classes': classes,
+            'tasks': [{'task_id': task_id, 'bytes': size} for task_id, size in largest],
+            'last_gc': self._last_gc,
+        }
+
+    # ---------- 清理 ----------
+
+    def _remove(self, entry: Dict) -> bool:
+        path = entry['path']
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️  删除失败 {path}: {e}")
+            return False
+        for sidecar in entry.get('sidecars', ()):
+            try:
+                os.remove(sidecar)
+            except OSError:
+                pass
+        for category, task_id in entry['tasks']:
+            self.store.update(category, task_id, {'artifacts_expired': True})
+        return True
+
+    def collect(self, required_free: int = 0) -> Dict:
+        """
+        执行一次清理：先删过期条目，再按 LRU 删除直到满足配额和剩余空间
+
+        Args:
+            required_free: 额外需要腾出的空间（提交任务前的检查）
+
+        Returns:
+            {'removed', 'freed_bytes', 'duration'}
+        """
+        started = time.time()
+        lock_file = self._acquire_file_lock()
+        if lock_file is False:
+            return {'removed': 0, 'freed_bytes': 0, 'skipped': '其他进程正在清理'}
+
+        try:
+            entries = self.scan()
+            ttl_by_class = {cls.name: cls.ttl_seconds for cls in self.classes}
+            evictable = {cls.name for cls in self.classes if cls.evictable}
+            removed: List[Dict] = []
+
+            # 1. 过期
+            for entry in entries:
+                ttl = ttl_by_class[entry['class']]
+                if ttl is not None and not entry['protected'] and started - entry['last_used'] > ttl:
+                    if self._remove(entry):
+                        removed.append(entry)
+
+            # 2. 配额 / 剩余空间（LRU）
+            # 删除硬链接不释放空间：配额只减去只有一个链接的文件，剩余空间每次删除后重新读取
+            removed_paths = {e['path'] for e in removed}
+            remaining = [e for e in entries if e['path'] not in removed_paths]
+            used = sum(e['bytes'] for e in remaining)
+            free = self._free_bytes()
+            need_free = self.min_free_bytes + required_free
+            candidates = sorted(
+                (e for e in remaining if not e['protected'] and e['class'] in evictable),
+                key=lambda e: e['last_used']
+            )
+            for entry in candidates:
+                if used <= self.quota_bytes and free >= need_free:
+                    break
+                if self._remove(entry):
+                    removed.append(entry)
+                    used -= entry['exclusive_bytes']
+                    free = self._free_bytes()
+
+            freed = sum(e['exclusive_bytes'] for e in removed)
+            report = {
+                'time': started,
+                'removed': len(removed),
+                'freed_bytes': freed,
+                'duration': round(time.time() - started, 3),
+            }
+            if removed:
+                print(f"🧹 存储清理: 删除 {len(removed)} 个条目，释放 {freed / 1024 ** 2:.1f} MB")
+                for entry in removed:
+                    print(f"   - [{entry['class']}] {entry['path']}")
+            with self._lock:
+                self._last_gc = report
+                self._last_scan = None
+            return report
+        finally:
+            if lock_file:
+                lock_file.close()
+
+    def _acquire_file_lock(self):
+        """
+        获取多进程清理锁
+
+        Returns:
+            锁文件对象；不需要加锁时返回 None；已被其他进程持有时返回 False
+        """
+        if not self.lock_path or fcntl is None:
+            return None
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        return lock_file
+
+    def ensure_capacity(self, projected_bytes: int):
+        """
+        检查是否有空间接收新任务，不够时先清理
+
+        Args:
+            projected_bytes: 预计输出大小
+
+        Raises:
+            InsufficientStorageError: 清理后仍然不够
+        """
+        required = projected_bytes + self.min_free_bytes
+        free = self._free_bytes()
+        if free >= required:
+            return
+        self.collect(required_free=projected_bytes)
+        free = self._free_bytes()
+        if free < required:
+            raise InsufficientStorageError(required, free)
+
+    # ---------- 后台线程 ----------
+
+    def start(self):
+        """启动后台清理线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name='storage_gc', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"⚠️  存储清理失败: {e}")
+            time.sleep(self.interval)
+
+
+def projected_output_bytes(record: Dict, job_class: str) -> int:
+    """
+    按任务的输入文件估算输出大小
+
+    Args:
+        record: 任务数据
+        job_class: 任务类别
+
+    Returns:
+        字节数
+    """
+    total = 0
+    seen = set()
+    for ref in _referenced_paths(record):
+        real = os.path.realpath(ref)
+        if real in seen or not os.path.isfile(real):
+            continue
+        seen.add(real)
+        total += os.path.getsize(real)
+    return int(total * OUTPUT_FACTORS.get(job_class, 2.0))
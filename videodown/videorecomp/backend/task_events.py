@@ -0,0 +1,135 @@
+#!/usr/bin/env python3.12
+"""
+任务进度推送 - 服务器推送事件（SSE）的共享轮询器
+
+无论打开多少个浏览器标签页，都只有一个后台线程按 updated_at 索引
+查询有变化的任务，再唤醒订阅了这些任务的连接；
+工作进程写入任务数据库的进度同样会被推送出去。
+"""
+
+import json
+import time
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from task_store import TaskStore
+
+
+# 任务结束状态（推送完最后一次后关闭连接）
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def format_event(data: Dict, event: str = 'progress', event_id: Optional[int] = None) -> str:
+    """格式化一条 SSE 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+class TaskEventBroadcaster:
+    """任务进度广播"""
+
+    def __init__(self, store: TaskStore, interval: float = 0.5):
+        """
+        初始化
+
+        Args:
+            store: 任务存储
+            interval: 轮询间隔（秒）
+        """
+        self.store = store
+        self.interval = interval
+
+        self._cond = threading.Condition()
+        self._subscribers: Counter = Counter()
+        self._snapshots: Dict[str, Tuple[int, Dict]] = {}
+        self._version = 0
+        self._watermark = time.time()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, task_id: str) -> Optional[Tuple[int, Dict]]:
+        """
+        订阅任务
+
+        Returns:
+            (版本号, 当前摘要)，任务不存在时返回 None
+        """
+        summary = self.store.summary(task_id)
+        if summary is None:
+            return None
+        with self._cond:
+            self._subscribers[task_id] += 1
+            if task_id not in self._snapshots:
+                self._version += 1
+                self._snapshots[task_id] = (self._version, summary)
+            self._ensure_thread()
+            self._cond.notify_all()
+            return self._snapshots[task_id]
+
+    def unsubscribe(self, task_id: str):
+        """取消订阅"""
+        with self._cond:
+            self._subscribers[task_id] -= 1
+            if self._subscribers[task_id] <= 0:
+                del self._subscribers[task_id]
+                self._snapshots.pop(task_id, None)
+
+    def wait(self, task_id: str, last_version: int, timeout: float = 15.0) -> Optional[Tuple[int, Dict]]:
+        """
+        等待任务有新的摘要
+
+        Returns:
+            (版本号, 摘要)，超时返回 None
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                entry = self._snapshots.get(task_id)
+                if entry is not None and entry[0] > last_version:
+                    return entry
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _ensure_thread(self):
+        """按需启动轮询线程（调用方持有锁）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._poll_loop, name='task_events', daemon=True)
+            self._thread.start()
+
+    def _poll_loop(self):
+        while True:
+            with self._cond:
+                while not self._subscribers:
+                    self._cond.wait()
+                # 多进程写入时 updated_at 可能略有先后，往回多查一段再去重
+                since = self._watermark - 1.0
+
+            try:
+                rows = self.store.changed_since(since)
+            except Exception as e:
+                print(f"⚠️  查询任务进度失败: {e}")
+                rows = []
+
+            with self._cond:
+                changed = False
+                for row in rows:
+                    self._watermark = max(self._watermark, row['updated_at'])
+                    task_id = row['task_id']
+                    if task_id not in self._subscribers:
+                        continue
+                    current = self._snapshots.get(task_id)
+                    if current is not None and current[1] == row:
+                        continue
+                    self._version += 1
+                    self._snapshots[task_id] = (self._version, row)
+                    changed = True
+                if changed:
+                    self._cond.notify_all()
+
+            time.sleep(self.interval)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3.12
+"""
+持久化任务存储 - 嵌入式 SQLite（WAL 模式）
+
+所有类型的任务存放在同一张表中，按 category 区分；
+状态、类型、创建时间建有索引，任务字段以 JSON 保存。
+字段更新用单条 UPDATE + json_set 完成（行级原子写入），
+WAL 模式下读取不会阻塞写入，多个 API 进程可以共享同一个数据库文件。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, List, Optional, Any, Iterator
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id     TEXT PRIMARY KEY,
+    category    TEXT NOT NULL,
+    type        TEXT,
+    status      TEXT,
+    progress    INTEGER DEFAULT 0,
+    created_at  TEXT,
+    updated_at  REAL,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_type ON tasks(type);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_category_created ON tasks(category, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks(updated_at);
+"""
+
+# 同时写入独立列的字段（用于索引查询）
+_COLUMN_FIELDS = ('type', 'status', 'progress', 'created_at')
+
+# 进度推送用的任务摘要
+_SUMMARY_SQL = (
+    "SELECT task_id, category, status, progress, json_extract(data, '$.message'), "
+    "json_extract(data, '$.error'), json_extract(data, '$.progress_detail'), updated_at FROM tasks"
+)
+_SUMMARY_KEYS = ('task_id', 'category', 'status', 'progress', 'message', 'error', 'progress_detail', 'updated_at')
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _json_path(key: str) -> str:
+    return '$."' + str(key).replace('"', '\\"') + '"'
+
+
+class TaskStore:
+    """SQLite 任务存储"""
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        """
+        初始化
+
+        Args:
+            db_path: 数据库文件路径
+            timeout: 等待写锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程一个连接（自动提交模式）"""
+        conn = getattr(self._local, 'conn', None)
+        # fork 出的子进程不能复用父进程的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---------- 写入 ----------
+
+    def create(self, category: str, task_id: str, data: Dict):
+        """创建（或整体替换）任务"""
+        self._conn().execute(
+            'INSERT OR REPLACE INTO tasks (task_id, category, type, status, progress, created_at, updated_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                task_id, category,
+                data.get('type') or category,
+                data.get('status'),
+                data.get('progress', 0),
+                data.get('created_at'),
+                time.time(),
+                _dumps(data)
+            )
+        )
+
+    def update(self, category: str, task_id: str, fields: Dict) -> bool:
+        """
+        更新任务的若干字段（单条 UPDATE，原子执行）
+
+        Returns:
+            任务是否存在
+        """
+        if not fields:
+            return self.exists(category, task_id)
+
+        json_args, params = [], []
+        for key, value in fields.items():
+            json_args.append('?, json(?)')
+            params += [_json_path(key), _dumps(value)]
+
+        assignments = [f"data = json_set(data, {', '.join(json_args)})", 'updated_at = ?']
+        params.append(time.time())
+        for column in _COLUMN_FIELDS:
+            if column in fields:
+                assignments.append(f'{column} = ?')
+                params.append(fields[column])
+
+        cursor = self._conn().execute(
+            f"UPDATE tasks SET {', '.join(assignments)} WHERE task_id = ? AND category = ?",
+            params + [task_id, category]
+        )
+        return cursor.rowcount > 0
+
+    def increment(self, category: str, task_id: str, key: str, delta: int = 1) -> bool:
+        """数值字段原子自增（多进程安全）"""
+        path = _json_path(key)
+        cursor = self._conn().execute(
+            'UPDATE tasks SET data = json_set(data, ?, COALESCE(json_extract(data, ?), 0) + ?), updated_at = ? '
+            'WHERE task_id = ? AND category = ?',
+            (path, path, delta, time.time(), task_id, category)
+        )
+        return cursor.rowcount > 0
+
+    def update_progress(self, category: str, task_id: str, progress: Optional[int], detail: Dict) -> bool:
+        """
+        写入进度详情，progress 只增不减（不会覆盖任务函数直接写入的更高进度）
+
+        Args:
+            progress: 总进度，None 表示只更新详情
+            detail: 进度详情（progress_detail 字段）
+        """
+        if progress is None:
+            return self.update(category, task_id, {'progress_detail': detail})
+        cursor = self._conn().execute(
+            "UPDATE tasks SET progress = MAX(COALESCE(progress, 0), ?), "
+            "data = json_set(data, '$.progress', MAX(COALESCE(progress, 0), ?), '$.progress_detail', json(?)), "
+            "updated_at = ? WHERE task_id = ? AND category = ?",
+            (progress, progress, _dumps(detail), time.time(), task_id, category)
+        )
+        return cursor.rowcount > 0
+
+    def remove_fields(self, category: str, task_id: str, keys: List[str]) -> bool:
+        """删除任务的若干字段"""
+        if not keys:
+            return False
+        placeholders = ', '.join('?' for _ in keys)
+        cursor = self._conn().execute(
+            f'UPDATE tasks SET data = json_remove(data, {placeholders}), updated_at = ? WHERE task_id = ? AND category = ?',
+            [_json_path(k) for k in keys] + [time.time(), task_id, category]
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, category: str, task_id: str) -> bool:
+        """删除任务"""
+        cursor = self._conn().execute('DELETE FROM tasks WHERE task_id = ? AND category = ?', (task_id, category))
+        return cursor.rowcount > 0
+
+    # ---------- 读取 ----------
+
+    def get(self, category: str, task_id: str) -> Optional[Dict]:
+        """读取任务（返回字段字典的快照）"""
+        row = self._conn().execute(
+            'SELECT data FROM tasks WHERE task_id = ? AND category = ?', (task_id, category)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, category: str, task_id: str) -> bool:
+        row = self._conn().execute(
+            'SELECT 1 FROM tasks WHERE task_id = ? AND category = ?', (task_id, category)
+        ).fetchone()
+        return row is not None
+
+    def cancel_requested(self, category: str, task_id: str) -> bool:
+        """任务是否已被删除或标记为取消（运行中的任务据此结束自己）"""
+        # cancel_requested 单独保存，任务自己随后写入的状态不会把取消请求覆盖掉
+        row = self._conn().execute(
+            "SELECT status, json_extract(data, '$.cancel_requested') FROM tasks WHERE task_id = ? AND category = ?",
+            (task_id, category)
+        ).fetchone()
+        return row is None or row[0] == 'cancelled' or bool(row[1])
+
+    def ids(self, category: str) -> List[str]:
+        rows = self._conn().execute(
+            'SELECT task_id FROM tasks WHERE category = ? ORDER BY created_at', (category,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self, category: Optional[str] = None, status: Optional[str] = None, task_type: Optional[str] = None) -> int:
+        where, params = self._filters(category, status, task_type)
+        return self._conn().execute(f'SELECT COUNT(*) FROM tasks{where}', params).fetchone()[0]
+
+    def list(
+        self,
+        category: Optional[str] = None,
+        status: Optional[str] = None,
+        task_type: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        按创建时间倒序列出任务摘要（走索引，不读取完整任务数据）
+
+        Returns:
+            [{'task_id', 'category', 'type', 'status', 'progress', 'message', 'created_at'}, ...]
+        """
+        where, params = self._filters(category, status, task_type)
+        rows = self._conn().execute(
+            "SELECT task_id, category, type, status, progress, json_extract(data, '$.message'), created_at "
+            f'FROM tasks{where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        ).fetchall()
+        keys = ('task_id', 'category', 'type', 'status', 'progress', 'message', 'created_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def records(self) -> Iterator[Dict]:
+        """
+        遍历所有任务（存储清理用）
+
+        Returns:
+            [{'task_id', 'category', 'status', 'updated_at', 'data'}, ...]
+        """
+        rows = self._conn().execute('SELECT task_id, category, status, updated_at, data FROM tasks').fetchall()
+        for task_id, category, status, updated_at, data in rows:
+            yield {'task_id': task_id, 'category': category, 'status': status,
+                   'updated_at': updated_at, 'data': json.loads(data)}
+
+    def summary(self, task_id: str) -> Optional[Dict]:
+        """读取任务摘要（不区分类别）"""
+        row = self._conn().execute(f'{_SUMMARY_SQL} WHERE task_id = ?', (task_id,)).fetchone()
+        return self._summary_row(row) if row else None
+
+    def changed_since(self, timestamp: float) -> List[Dict]:
+        """
+        列出 timestamp 之后有更新的任务摘要（走 updated_at 索引）
+
+        Returns:
+            [{'task_id', 'category', 'status', 'progress', 'message', 'error', 'progress_detail', 'updated_at'}, ...]
+        """
+        rows = self._conn().execute(
+            f'{_SUMMARY_SQL} WHERE updated_at > ? ORDER BY updated_at', (timestamp,)
+        ).fetchall()
+        return [self._summary_row(row) for row in rows]
+
+    @staticmethod
+    def _summary_row(row) -> Dict:
+        summary = dict(zip(_SUMMARY_KEYS, row))
+        if summary['progress_detail']:
+            summary['progress_detail'] = json.loads(summary['progress_detail'])
+        return summary
+
+    @staticmethod
+    def _filters(category, status, task_type):
+        clauses, params = [], []
+        for column, value in (('category', category), ('status', status), ('type', task_type)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def table(self, category: str) -> 'TaskTable':
+        """获取某一类任务的字典视图"""
+        return TaskTable(self, category)
+
+
+class TaskRecord(dict):
+    """
+    任务快照：读取时从数据库加载，字段赋值立即写回数据库
+
+    注意：对嵌套的列表/字典原地修改不会写回，修改后需重新赋值该字段。
+    """
+
+    def __init__(self, table: 'TaskTable', task_id: str, data: Dict):
+        super().__init__(data)
+        self._table = table
+        self.task_id = task_id
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._table.store.update(self._table.category, self.task_id, {key: value})
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._table.store.remove_fields(self._table.category, self.task_id, [key])
+
+    def update(self, *args, **kwargs):
+        """批量更新字段（一次写入）"""
+        fields = dict(*args, **kwargs)
+        super().update(fields)
+        self._table.store.update(self._table.category, self.task_id, fields)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def pop(self, key, *default):
+        existed = key in self
+        value = super().pop(key, *default)
+        if existed:
+            self._table.store.remove_fields(self._table.category, self.task_id, [key])
+        return value
+
+    def increment(self, key: str, delta: int = 1):
+        """数值字段原子自增"""
+        self._table.store.increment(self._table.category, self.task_id, key, delta)
+        super().__setitem__(key, super().get(key, 0) + delta)
+
+
+class TaskTable(MutableMapping):
+    """某一类任务的字典视图（兼容原来的 dict 用法）"""
+
+    def __init__(self, store: TaskStore, category: str):
+        self.store = store
+        self.category = category
+
+    def __getitem__(self, task_id: str) -> TaskRecord:
+        data = self.store.get(self.category, task_id)
+        if data is None:
+            raise KeyError(task_id)
+        return TaskRecord(self, task_id, data)
+
+    def get(self, task_id: str, default=None):
+        data = self.store.get(self.category, task_id)
+        return TaskRecord(self, task_id, data) if data is not None else default
+
+    def __setitem__(self, task_id: str, data: Dict):
+        self.store.create(self.category, task_id, dict(data))
+
+    def __delitem__(self, task_id: str):
+        if not self.store.delete(self.category, task_id):
+            raise KeyError(task_id)
+
+    def __contains__(self, task_id) -> bool:
+        return self.store.exists(self.category, task_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.ids(self.category))
+
+    def __len__(self) -> int:
+        return self.store.count(self.category)
+
+    def list(self, status: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """按创建时间倒序列出任务摘要"""
+        return self.store.list(self.category, status=status, limit=limit, offset=offset)
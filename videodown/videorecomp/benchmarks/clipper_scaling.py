@@ -0,0 +1,422 @@
+#!/usr/bin/env python3.12
+"""
+剪辑策略的算法基准：只运行规划阶段（匹配字幕、计算片段），不读写视频
+
+生成可控的原字幕 / 新字幕对（插入、删除、改字、时间漂移的比例都可调，固定随机种子），
+同时记录每条新字幕来自哪条原字幕作为标准答案。对每个策略记录：
+- load_seconds / plan_seconds: 解析字幕和规划的耗时
+- plan_peak_mb: 规划期间常驻内存的增长（峰值 - 规划前）
+- cue_recall: 保留下来的原字幕中，内容被规划片段覆盖（≥50%）的比例
+- deleted_leak: 被删除的原字幕中，仍然被规划片段覆盖的比例（越低越好）
+- match_accuracy / false_match_rate: 策略给出逐条对应关系时，对应正确的比例 / 新插入字幕被错配的比例
+
+用法：
+    python benchmarks/clipper_scaling.py                                  # 100 ~ 100k 条，全部策略
+    python benchmarks/clipper_scaling.py -c 1000 -c 10000 -s compact -s smart
+    python benchmarks/clipper_scaling.py --insert 0.05 --delete 0.1 --edit 0.2 --drift 0.3 -o scaling.json
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pipeline_bench import write_srt
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, 'src')
+LEGACY_DIR = os.path.dirname(ROOT)
+
+DEFAULT_COUNTS = (100, 1000, 10000, 100000)
+SEED = 20240601
+
+
+# ---------- 字幕对生成 ----------
+
+def _vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    syllables = ['ka', 'ri', 'mo', 'sen', 'tu', 'la', 'vi', 'do', 'ne', 'shi', 'por', 'an', 'el', 'qu', 'zo', 'fa']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+
+def _sentence(rng: random.Random, words: List[str]) -> str:
+    return ' '.join(rng.choice(words) for _ in range(rng.randint(4, 10)))
+
+
+def _edit_text(rng: random.Random, text: str, words: List[str]) -> str:
+    """替换 / 插入 / 删除 1~2 个词"""
+    tokens = text.split()
+    for _ in range(rng.randint(1, 2)):
+        op = rng.random()
+        pos = rng.randrange(len(tokens))
+        if op < 0.5:
+            tokens[pos] = rng.choice(words)
+        elif op < 0.8 or len(tokens) <= 3:
+            tokens.insert(pos, rng.choice(words))
+        else:
+            del tokens[pos]
+    return ' '.join(tokens)
+
+
+def generate_pair(count: int, insert: float = 0.05, delete: float = 0.05, edit: float = 0.2,
+                  drift: float = 0.2, seed: int = SEED) -> Tuple[List[Dict], List[Dict], Dict]:
+    """
+    生成原字幕和新字幕
+
+    Args:
+        count: 原字幕条数
+        insert: 每条原字幕前插入一条新内容的概率
+        delete: 删除原字幕的概率
+        edit: 改字的概率
+        drift: 每条字幕时间偏移随机游走的标准差（秒）
+        seed: 随机种子
+
+    Returns:
+        (原字幕, 新字幕, 标准答案)；标准答案的 source[j] 是第 j 条新字幕对应的原字幕下标（新插入的为 None），
+        deleted 是被删除的原字幕下标
+    """
+    rng = random.Random(seed)
+    words = _vocabulary(rng)
+
+    original = []
+    t = 0.5
+    for _ in range(count):
+        duration = rng.uniform(1.0, 4.0)
+        original.append({'start': t, 'end': t + duration, 'text': _sentence(rng, words)})
+        t += duration + rng.uniform(0.2, 2.0)
+
+    new, source, deleted = [], [], []
+    offset = 0.0
+    last_end = 0.0
+
+    def place(start: float, duration: float, text: str, origin: Optional[int]):
+        nonlocal last_end
+        start = max(start, last_end + 0.05)
+        new.append({'start': start, 'end': start + duration, 'text': text})
+        source.append(origin)
+        last_end = start + duration
+
+    for k, cue in enumerate(original):
+        if rng.random() < insert:
+            duration = rng.uniform(1.0, 3.0)
+            place(cue['start'] + offset, duration, _sentence(rng, words), None)
+            offset += duration + 0.3
+        if rng.random() < delete:
+            deleted.append(k)
+            offset -= cue['end'] - cue['start']
+            continue
+        offset += rng.gauss(0.0, drift)
+        duration = (cue['end'] - cue['start']) * rng.uniform(0.85, 1.15)
+        text = _edit_text(rng, cue['text'], words) if rng.random() < edit else cue['text']
+        place(cue['start'] + offset, duration, text, k)
+        offset += duration - (cue['end'] - cue['start'])
+
+    truth = {
+        'source': source,
+        'deleted': deleted,
+        'original_spans': [[cue['start'], cue['end']] for cue in original],
+        'duration': original[-1]['end'] + 1.0 if original else 0.0,
+    }
+    return original, new, truth
+
+
+def make_pair(work_dir: str, count: int, params: Dict) -> str:
+    """生成（或复用）字幕对目录"""
+    key = f"{count}_i{params['insert']}_d{params['delete']}_e{params['edit']}_t{params['drift']}_s{params['seed']}"
+    pair_dir = os.path.join(work_dir, 'pairs', key)
+    truth_path = os.path.join(pair_dir, 'truth.json')
+    if not os.path.exists(truth_path):
+        os.makedirs(pair_dir, exist_ok=True)
+        original, new, truth = generate_pair(count, **params)
+        write_srt(os.path.join(pair_dir, 'original.srt'), original)
+        write_srt(os.path.join(pair_dir, 'new.srt'), new)
+        with open(truth_path, 'w', encoding='utf-8') as f:
+            json.dump(truth, f)
+    return pair_dir
+
+
+# ---------- 策略 ----------
+# 每个策略：(模块, 类, 构造参数, 规划函数)；规划函数返回
+# {'segments': [(原视频开始, 原视频结束), ...], 'mapping': {新字幕下标: 原字幕下标} 或 None}
+
+def _log_mapping(stats: Dict, key: str) -> Dict[int, int]:
+    return {entry['index'] - 1: int(entry[key]) - 1 for entry in stats['processing_log'] if key in entry}
+
+
+def _positional(clipper) -> Dict[int, int]:
+    # 按序号一一对应的策略
+    return {i: i for i in range(min(len(clipper.original_subs), len(clipper.new_subs)))}
+
+
+def plan_compact(clipper) -> Dict:
+    segments, _stats = clipper.calculate_compact_segments()
+    return {'segments': segments, 'mapping': None}
+
+
+def plan_timeline_align(clipper) -> Dict:
+    segments, stats = clipper.extract_aligned_segments()
+    return {'segments': segments, 'mapping': _log_mapping(stats, 'original_index')}
+
+
+def plan_smart(clipper) -> Dict:
+    segments, stats = clipper.extract_segments_with_gaps()
+    return {'segments': segments, 'mapping': _log_mapping(stats, 'matched_original')}
+
+
+def plan_timeline_remap(clipper) -> Dict:
+    segments, stats = clipper.extract_segments_by_new_timeline()
+    return {
+        'segments': [(orig_start, orig_start + new_end - new_start) for new_start, new_end, orig_start in segments],
+        'mapping': _log_mapping(stats, 'matched_original'),
+    }
+
+
+def plan_cumulative(clipper) -> Dict:
+    segments, _stats = clipper.calculate_adjusted_segments()
+    return {'segments': segments, 'mapping': _positional(clipper)}
+
+
+def plan_iterative(clipper) -> Dict:
+    # 规划和渲染在同一个 process() 里：渲染换成只保留剪辑决策列表，时长直接给出
+    captured = {}
+
+    def render_edl(edl, output_path):
+        captured['edl'] = edl
+        return True
+
+    clipper.render_edl = render_edl
+    clipper.load_subtitles = lambda: None
+    result = clipper.process()
+    if result.get('error'):
+        raise RuntimeError(result['error'])
+    segments = [(piece['start'], piece['end']) for piece in captured['edl'].render_plan() if piece['type'] == 'source']
+    return {'segments': segments, 'mapping': _positional(clipper)}
+
+
+def plan_enhanced(clipper) -> Dict:
+    return {'segments': clipper.analyze_and_extract_segments(), 'mapping': None}
+
+
+STRATEGIES: Dict[str, Tuple[str, str, Dict, Callable]] = {
+    'compact': ('compact_video_processor', 'CompactVideoClipper', {}, plan_compact),
+    'timeline_align': ('timeline_aligner', 'TimelineAligner', {}, plan_timeline_align),
+    'smart': ('smart_segment_clipper', 'SmartSegmentClipper', {}, plan_smart),
+    'timeline_remap': ('timeline_remap_clipper', 'TimelineRemapClipper', {}, plan_timeline_remap),
+    'cumulative': ('cumulative_adjust_clipper', 'CumulativeTimeAdjustClipper', {}, plan_cumulative),
+    'iterative': ('iterative_adjust_clipper', 'IterativeAdjustClipper', {}, plan_iterative),
+    'enhanced': ('enhanced_video_processor', 'EnhancedVideoClipper', {}, plan_enhanced),
+}
+
+
+# ---------- 评估 ----------
+
+def _union(segments: List[Tuple[float, float]]) -> List[List[float]]:
+    merged = []
+    for start, end in sorted(s for s in segments if s[1] > s[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _covered(union: List[List[float]], starts: List[float], span: List[float], ratio: float = 0.5) -> bool:
+    """原字幕区间被片段覆盖的比例是否达到 ratio"""
+    start, end = span
+    i = max(0, bisect.bisect_right(starts, start) - 1)
+    overlap = 0.0
+    while i < len(union) and union[i][0] < end:
+        overlap += max(0.0, min(end, union[i][1]) - max(start, union[i][0]))
+        i += 1
+    return overlap >= ratio * (end - start)
+
+
+def evaluate(plan: Dict, truth: Dict) -> Dict:
+    """与标准答案对比"""
+    union = _union(plan['segments'])
+    starts = [segment[0] for segment in union]
+    spans = truth['original_spans']
+    kept = [k for k in truth['source'] if k is not None]
+    inserted = [j for j, k in enumerate(truth['source']) if k is None]
+
+    result = {
+        'segments': len(plan['segments']),
+        'planned_seconds': round(sum(end - start for start, end in union), 3),
+        'cue_recall': round(sum(_covered(union, starts, spans[k]) for k in kept) / len(kept), 4) if kept else None,
+        'deleted_leak': round(
+            sum(_covered(union, starts, spans[k]) for k in truth['deleted']) / len(truth['deleted']), 4
+        ) if truth['deleted'] else None,
+    }
+    mapping = plan['mapping']
+    if mapping is not None:
+        correct = sum(1 for j, k in enumerate(truth['source']) if k is not None and mapping.get(j) == k)
+        result['match_accuracy'] = round(correct / len(kept), 4) if kept else None
+        result['false_match_rate'] = round(sum(1 for j in inserted if j in mapping) / len(inserted), 4) if inserted else None
+    return result
+
+
+# ---------- 运行 ----------
+
+def _rss_mb(kilobytes: int) -> float:
+    return kilobytes / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def run_child(strategy: str, pair_dir: str):
+    """子进程入口：运行一个策略的规划阶段，结果以 JSON 打印在最后一行"""
+    sys.path[:0] = [SRC_DIR, LEGACY_DIR]
+    module, cls, kwargs, plan = STRATEGIES[strategy]
+    with open(os.path.join(pair_dir, 'truth.json'), encoding='utf-8') as f:
+        truth = json.load(f)
+
+    out_dir = tempfile.mkdtemp(prefix='clipper_bench_')
+    # 各策略逐条打印匹配过程，输出丢弃（格式化的开销仍计入耗时）
+    sink = open(os.devnull, 'w')
+    error = None
+    try:
+        with redirect_stdout(sink), redirect_stderr(sink):
+            clipper_class = getattr(__import__(module), cls)
+            clipper = clipper_class(
+                video_path=os.path.join(pair_dir, 'video.mp4'),
+                original_srt_path=os.path.join(pair_dir, 'original.srt'),
+                new_srt_path=os.path.join(pair_dir, 'new.srt'),
+                output_dir=out_dir,
+                **kwargs
+            )
+            duration = truth['duration']
+            clipper.get_video_duration = lambda *args: duration
+
+            started = time.perf_counter()
+            clipper.load_subtitles()
+            load_seconds = time.perf_counter() - started
+
+            rss_before = _current_rss_mb()
+            started = time.perf_counter()
+            result = plan(clipper)
+            plan_seconds = time.perf_counter() - started
+            peak = _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        sink.close()
+        temp_dir = getattr(locals().get('clipper'), 'temp_dir', None)
+        for path in (out_dir, temp_dir):
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    if error:
+        print(json.dumps({'ok': False, 'error': error}))
+        return
+    print(json.dumps({
+        'ok': True,
+        'load_seconds': round(load_seconds, 4),
+        'plan_seconds': round(plan_seconds, 4),
+        'plan_peak_mb': round(max(0.0, peak - rss_before), 1),
+        'peak_rss_mb': round(peak, 1),
+        **evaluate(result, truth),
+    }))
+
+
+def run_strategy(strategy: str, pair_dir: str, timeout: Optional[float]) -> Dict:
+    """在新的子进程里运行一次策略（超时记为失败）"""
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', strategy, pair_dir],
+            cwd=ROOT, capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {'ok': False, 'error': f'超时（>{timeout:.0f}s）', 'timed_out': True}
+    try:
+        return json.loads(process.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        tail = process.stderr.strip().splitlines()[-1:]
+        return {'ok': False, 'error': tail[0] if tail else f'exit {process.returncode}'}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剪辑策略的规划阶段基准（不处理视频）')
+    parser.add_argument('-c', '--count', action='append', type=int, help=f'原字幕条数（可重复，默认 {DEFAULT_COUNTS}）')
+    parser.add_argument('-s', '--strategy', action='append', choices=list(STRATEGIES), help='要测的策略（可重复，默认全部）')
+    parser.add_argument('--insert', type=float, default=0.05, help='插入概率（默认 0.05）')
+    parser.add_argument('--delete', type=float, default=0.05, help='删除概率（默认 0.05）')
+    parser.add_argument('--edit', type=float, default=0.2, help='改字概率（默认 0.2）')
+    parser.add_argument('--drift', type=float, default=0.2, help='时间漂移标准差，秒（默认 0.2）')
+    parser.add_argument('--seed', type=int, default=SEED, help='随机种子')
+    parser.add_argument('--timeout', type=float, default=600, help='单次运行超时秒数（默认 600）')
+    parser.add_argument('-w', '--work-dir', default=os.path.join(ROOT, 'benchmarks', '.work'), help='字幕对缓存目录')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件')
+    parser.add_argument('--child', nargs=2, metavar=('STRATEGY', 'PAIR_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    params = {'insert': args.insert, 'delete': args.delete, 'edit': args.edit, 'drift': args.drift, 'seed': args.seed}
+    results = []
+    for count in args.count or DEFAULT_COUNTS:
+        pair_dir = make_pair(os.path.abspath(args.work_dir), count, params)
+        timed_out = set()
+        for strategy in args.strategy or list(STRATEGIES):
+            # 小规模已超时的策略，更大规模不再运行
+            if strategy in timed_out:
+                continue
+            result = {'strategy': strategy, 'count': count, **run_strategy(strategy, pair_dir, args.timeout)}
+            results.append(result)
+            if not result['ok']:
+                print(f"❌ {strategy:15s} {count:7d}  {result['error']}")
+                if result.get('timed_out'):
+                    timed_out.add(strategy)
+                continue
+            accuracy = result.get('match_accuracy')
+            print(f"✅ {strategy:15s} {count:7d}  plan {result['plan_seconds']:9.3f}s  load {result['load_seconds']:7.3f}s  "
+                  f"mem +{result['plan_peak_mb']:7.1f} MB  recall {result['cue_recall']:.3f}  "
+                  f"leak {result['deleted_leak'] if result['deleted_leak'] is not None else '-'}  "
+                  f"match {accuracy if accuracy is not None else '-'}")
+
+    if args.output:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': params,
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3.12
+"""
+冷启动基准：导入耗时和内存
+
+每个目标在全新的解释器里运行若干次，记录：
+- wall_ms: 进程从启动到退出的时间（包括解释器启动）
+- import_ms: 目标代码本身的耗时（导入模块 / 响应第一次健康检查）
+- max_rss_mb: 子进程的峰值内存
+- heavy_modules: 运行结束时已加载的重量级模块（cv2、numpy、moviepy、torch 等）
+
+用法：
+    python benchmarks/import_time.py                   # 所有目标，每个 5 次
+    python benchmarks/import_time.py -t app -t main -n 10
+    python benchmarks/import_time.py -o startup.json  # 结果写成 JSON，便于对比不同提交
+    python benchmarks/import_time.py --importtime app # 打印 -X importtime 里最慢的模块
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+SRC_DIR = os.path.join(ROOT, 'src')
+LOCAL_SERVER = os.path.join(os.path.dirname(ROOT), 'local_server.py')
+
+# 不应该在启动时加载的模块
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL', 'moviepy', 'pysrt', 'chardet', 'tqdm', 'torch', 'torchaudio', 'demucs')
+
+# 子进程里执行的代码：{setup} 之后计时执行 {body}，结果以 JSON 打印在最后一行
+_CHILD = '''
+import sys, time, json
+{setup}
+_started = time.perf_counter()
+try:
+{body}
+    _error = None
+except SystemExit:
+    _error = None
+except BaseException as _e:
+    _error = f"{{type(_e).__name__}}: {{_e}}"
+_elapsed = time.perf_counter() - _started
+print(json.dumps({{
+    'import_ms': _elapsed * 1000,
+    'error': _error,
+    'heavy_modules': [m for m in {heavy!r} if m in sys.modules],
+    'module_count': len(sys.modules),
+}}))
+'''
+
+TARGETS = {
+    # API 服务：导入 app 模块（注册所有路由）
+    'app': (
+        f"sys.path.insert(0, {BACKEND_DIR!r})",
+        "    import app",
+    ),
+    # API 服务：导入后响应第一次健康检查
+    'health': (
+        f"sys.path.insert(0, {BACKEND_DIR!r})",
+        "    import app\n"
+        "    assert app.app.test_client().get('/api/health').status_code == 200",
+    ),
+    # 命令行：解析参数（--help）
+    'main': (
+        f"import runpy; sys.argv = ['main.py', '--help']",
+        f"    runpy.run_path({os.path.join(ROOT, 'main.py')!r}, run_name='__main__')",
+    ),
+    # 本地生成服务
+    'local_server': (
+        f"sys.path.insert(0, {os.path.dirname(LOCAL_SERVER)!r})",
+        "    import local_server",
+    ),
+    # 处理模块本身（用到时才付出的代价，作为对照）
+    'video_processor': (
+        f"sys.path.insert(0, {SRC_DIR!r})",
+        "    import video_processor",
+    ),
+    'clippers': (
+        f"sys.path.insert(0, {SRC_DIR!r})",
+        "    import compact_video_processor, enhanced_video_processor, timeline_aligner, timeline_remap_clipper",
+    ),
+}
+
+
+def run_once(target: str, python: str = sys.executable) -> dict:
+    """
+    在新的解释器里运行一次目标
+
+    Returns:
+        {'wall_ms', 'import_ms', 'max_rss_mb', 'heavy_modules', 'module_count', 'error'}
+    """
+    setup, body = TARGETS[target]
+    code = _CHILD.format(setup=setup, body=body, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [python, '-c', code], cwd=ROOT, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+    )
+    stdout, stderr = process.communicate()
+    wall = time.perf_counter() - started
+
+    result = {'wall_ms': wall * 1000, 'max_rss_mb': None, 'returncode': process.returncode}
+    lines = stdout.decode('utf-8', errors='replace').strip().splitlines()
+    try:
+        result.update(json.loads(lines[-1]))
+    except (IndexError, ValueError):
+        result['error'] = stderr.decode('utf-8', errors='replace').strip().splitlines()[-1:] or ['no output']
+    return result
+
+
+def _max_rss_mb(target: str, python: str = sys.executable) -> float:
+    """单独运行一次，用 wait4 读子进程的峰值内存（Linux 单位 KB，macOS 单位字节）"""
+    setup, body = TARGETS[target]
+    code = _CHILD.format(setup=setup, body=body, heavy=HEAVY_MODULES)
+    process = subprocess.Popen(
+        [python, '-c', code], cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+    )
+    _pid, _status, usage = os.wait4(process.pid, 0)
+    process.returncode = 0
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss / divisor
+
+
+def benchmark(target: str, repeat: int = 5) -> dict:
+    """
+    运行 repeat 次，汇总中位数和最小值
+
+    Returns:
+        每个目标的汇总结果
+    """
+    runs = [run_once(target) for _ in range(repeat)]
+    ok = [run for run in runs if not run.get('error')]
+    summary = {
+        'target': target,
+        'runs': repeat,
+        'errors': sorted({str(run['error']) for run in runs if run.get('error')}),
+    }
+    if ok:
+        summary.update({
+            'wall_ms_median': round(statistics.median(run['wall_ms'] for run in ok), 1),
+            'wall_ms_min': round(min(run['wall_ms'] for run in ok), 1),
+            'import_ms_median': round(statistics.median(run['import_ms'] for run in ok), 1),
+            'import_ms_min': round(min(run['import_ms'] for run in ok), 1),
+            'heavy_modules': ok[-1]['heavy_modules'],
+            'module_count': ok[-1]['module_count'],
+        })
+        if hasattr(os, 'wait4'):
+            summary['max_rss_mb'] = round(_max_rss_mb(target), 1)
+    return summary
+
+
+def importtime_report(target: str, top: int = 20) -> list:
+    """
+    用 -X importtime 找出最慢的模块
+
+    Returns:
+        [(累计微秒, 模块名), ...]，按累计耗时降序
+    """
+    setup, body = TARGETS[target]
+    code = _CHILD.format(setup=setup, body=body, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        try:
+            _self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative_us), name.rstrip()))
+        except ValueError:
+            continue
+    # 只保留顶层模块（缩进最少的那一层），避免父子模块重复计入
+    rows = [(us, name.strip()) for us, name in rows if not name.startswith('   ')]
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动基准：导入耗时和内存')
+    parser.add_argument('-t', '--target', action='append', choices=sorted(TARGETS),
+                        help='要测的目标（可重复，默认全部）')
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='每个目标运行次数（默认 5）')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件')
+    parser.add_argument('--importtime', metavar='TARGET', choices=sorted(TARGETS),
+                        help='打印该目标 -X importtime 中最慢的模块')
+    args = parser.parse_args()
+
+    if args.importtime:
+        for cumulative_us, name in importtime_report(args.importtime):
+            print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+        return
+
+    results = []
+    for target in args.target or list(TARGETS):
+        summary = benchmark(target, args.repeat)
+        results.append(summary)
+        if summary['errors'] and 'wall_ms_median' not in summary:
+            print(f"❌ {target:16s} {summary['errors'][0]}")
+            continue
+        heavy = ','.join(summary['heavy_modules']) or '-'
+        print(f"{'✅' if not summary['errors'] else '⚠️ '} {target:16s} "
+              f"wall {summary['wall_ms_median']:8.1f} ms  import {summary['import_ms_median']:8.1f} ms  "
+              f"rss {summary.get('max_rss_mb', 0):7.1f} MB  modules {summary['module_count']:5d}  heavy: {heavy}")
+
+    if args.output:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': _git_commit(),
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+if __name__ == '__main__':
+    main()
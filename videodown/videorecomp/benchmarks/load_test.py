@@ -0,0 +1,601 @@
+#!/usr/bin/env python3.12
+"""
+API 压测：用假的 ffmpeg / ffprobe / Demucs 启动后端，按并发阶梯驱动上传、处理、状态轮询和下载
+
+处理步骤由 stub_media 里的假工具代替（按媒体时长和设定速度占用时间和 CPU），
+测的是后端本身：请求处理线程、任务调度排队、锁和任务存储在并发下的表现。
+
+每个并发阶段内，每个虚拟用户不停地按权重挑一个场景执行完整流程：
+- compact:          表单上传 -> /api/process-compact -> 轮询 /api/status
+- compact_chunked:  分块上传视频（/api/uploads）-> 用 video_blob 引用创建紧凑剪辑 -> 处理 -> 轮询
+- audio_mix:        /api/audio-mix（提取音轨 + Demucs 分离 + 合并配音 + 混音）-> 轮询 -> 下载
+- iterative:        /api/iterative-adjust -> 轮询 -> 下载
+另外 --watchers 个线程模拟打开的任务面板，反复请求 /api/tasks、/api/scheduler、/api/health。
+
+报告每个阶段：作业完成 / 失败 / 被拒绝（429、507）/ 超时数、端到端耗时分位数和吞吐，
+以及每个端点的请求数、错误率、每秒请求数、延迟分位数。
+
+用法：
+    python benchmarks/load_test.py                                   # 并发 1、4、16，每阶段 60 秒
+    python benchmarks/load_test.py -c 8 -c 32 -c 64 --step-seconds 120 --watchers 4
+    python benchmarks/load_test.py --mix compact=3,audio_mix=1 --stub-speed 10 --stub-cpu 0.9 -o load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5001       # 压已经在运行的服务（需自行配置假工具）
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import socket
+import shutil
+import zipfile
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+from io import BytesIO
+from datetime import datetime
+from urllib.parse import urlparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pipeline_bench import CUE_SECONDS, synthetic_cues, edited_cues, write_srt
+from stub_media import install, media_bytes
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_MIX = 'compact=2,compact_chunked=1,audio_mix=1,iterative=1'
+
+# 服务子进程：任务目录放到工作目录下，预先 fork 工作进程后启动多线程 HTTP 服务
+_SERVER = '''
+import os, sys
+sys.path.insert(0, {backend!r})
+import app
+for name, folder in {folders!r}.items():
+    os.makedirs(folder, exist_ok=True)
+    setattr(app, name, folder)
+app.app.config['UPLOAD_FOLDER'] = app.UPLOAD_FOLDER
+app.app.config['DOWNLOAD_FOLDER'] = app.DOWNLOAD_FOLDER
+app.REGISTRY.configure(app.METRICS_FOLDER, clear=True)
+if os.environ.get('VIDEORECOMP_WORKER_PROCESSES', '1') != '0':
+    app.job_scheduler.start_worker_processes()
+app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)
+'''
+
+_ID_RE = re.compile(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|/[0-9a-f]{32,64}')
+
+
+# ---------- 统计 ----------
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+class Recorder:
+    """按端点记录请求结果（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, List[Tuple[int, float, int]]] = {}
+        self.jobs: List[Dict] = []
+
+    def request(self, endpoint: str, status: int, seconds: float, nbytes: int):
+        with self._lock:
+            self.requests.setdefault(endpoint, []).append((status, seconds, nbytes))
+
+    def job(self, scenario: str, outcome: str, seconds: float, error: Optional[str] = None):
+        with self._lock:
+            self.jobs.append({'scenario': scenario, 'outcome': outcome, 'seconds': seconds, 'error': error})
+
+    def summary(self, elapsed: float) -> Dict:
+        """
+        汇总
+
+        Returns:
+            {'jobs': {...}, 'scenarios': {...}, 'endpoints': {端点: {...}}}
+        """
+        with self._lock:
+            requests = {name: list(rows) for name, rows in self.requests.items()}
+            jobs = list(self.jobs)
+
+        endpoints = {}
+        for name, rows in sorted(requests.items()):
+            latencies = [seconds * 1000 for _status, seconds, _nbytes in rows]
+            errors = sum(1 for status, _s, _n in rows if status == 0 or (status >= 400 and status not in (429, 507)))
+            endpoints[name] = {
+                'requests': len(rows),
+                'errors': errors,
+                'rejected': sum(1 for status, _s, _n in rows if status in (429, 507)),
+                'error_rate': round(errors / len(rows), 4),
+                'rps': round(len(rows) / elapsed, 2) if elapsed else None,
+                'mb_per_s': round(sum(n for _st, _s, n in rows) / 1024 / 1024 / elapsed, 2) if elapsed else None,
+                **{f'p{q}_ms': round(_percentile(latencies, q), 1) for q in (50, 90, 99)},
+                'max_ms': round(max(latencies), 1),
+            }
+
+        def job_stats(rows: List[Dict]) -> Dict:
+            done = [row['seconds'] for row in rows if row['outcome'] == 'completed']
+            stats = {outcome: sum(1 for row in rows if row['outcome'] == outcome)
+                     for outcome in ('completed', 'failed', 'rejected', 'timeout')}
+            stats['jobs_per_min'] = round(len(done) / elapsed * 60, 2) if elapsed else None
+            if done:
+                stats.update({f'p{q}_s': round(_percentile(done, q), 2) for q in (50, 90, 99)})
+            stats['errors'] = sorted({row['error'] for row in rows if row['error']})[:10]
+            return stats
+
+        scenarios = {}
+        for row in jobs:
+            scenarios.setdefault(row['scenario'], []).append(row)
+        return {
+            'jobs': job_stats(jobs),
+            'scenarios': {name: job_stats(rows) for name, rows in sorted(scenarios.items())},
+            'endpoints': endpoints,
+        }
+
+
+# ---------- HTTP ----------
+
+def _multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """一个虚拟用户的 HTTP 连接（keep-alive，出错时重连），每个请求记入 Recorder"""
+
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float = 60):
+        parsed = urlparse(base_url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """
+        发送请求
+
+        Returns:
+            (状态码, 响应体)；连接失败或超时时状态码为 0
+        """
+        endpoint = f"{method} {_ID_RE.sub('/<id>', path.split('?')[0])}"
+        started = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._conn.request(method, path, body=body, headers=headers or {})
+            response = self._conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, data = 0, b''
+        self.recorder.request(endpoint, status, time.perf_counter() - started, len(data) + len(body or b''))
+        return status, data
+
+    def json(self, method: str, path: str, payload: Optional[Dict] = None, **kwargs) -> Tuple[int, Dict]:
+        if payload is not None:
+            kwargs['body'] = json.dumps(payload).encode()
+            kwargs['headers'] = {'Content-Type': 'application/json'}
+        status, data = self.request(method, path, **kwargs)
+        try:
+            return status, json.loads(data) if data else {}
+        except ValueError:
+            return status, {}
+
+    def form(self, path: str, fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[int, Dict]:
+        body, content_type = _multipart(fields, files)
+        return self.json('POST', path, body=body, headers={'Content-Type': content_type})
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------- 场景 ----------
+
+class JobFailed(Exception):
+    """作业没有正常完成（outcome 为 failed / rejected / timeout）"""
+
+    def __init__(self, outcome: str, message: str):
+        super().__init__(message)
+        self.outcome = outcome
+
+
+class Inputs:
+    """所有作业共用的输入（视频每次生成新的，内容带唯一标记，避免上传去重和结果缓存命中）"""
+
+    def __init__(self, work_dir: str, media_seconds: float, video_mb: float):
+        self.media_seconds = media_seconds
+        self.video_size = int(video_mb * 1024 * 1024)
+        input_dir = os.path.join(work_dir, 'inputs')
+        os.makedirs(input_dir, exist_ok=True)
+        original = synthetic_cues(media_seconds)
+        new = edited_cues(original)
+        write_srt(os.path.join(input_dir, 'original.srt'), original)
+        write_srt(os.path.join(input_dir, 'new.srt'), new)
+        with open(os.path.join(input_dir, 'original.srt'), 'rb') as f:
+            self.original_srt = f.read()
+        with open(os.path.join(input_dir, 'new.srt'), 'rb') as f:
+            self.new_srt = f.read()
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+            for i in range(len(new)):
+                zf.writestr(f'{i + 1:03d}.mp3', media_bytes('audio', CUE_SECONDS, 16 * 1024))
+        self.dubbing_zip = archive.getvalue()
+
+    def video(self) -> bytes:
+        return media_bytes('video', self.media_seconds, self.video_size, uuid.uuid4().hex.encode())
+
+
+class Settings:
+    def __init__(self, poll_interval: float, job_timeout: float, chunk_size: Optional[int]):
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.chunk_size = chunk_size
+
+
+def _check(status: int, data: Dict, action: str):
+    if status in (429, 507):
+        raise JobFailed('rejected', f"{action}: {status} {data.get('error', '')}".strip())
+    if status != 200 and status != 201:
+        raise JobFailed('failed', f"{action}: {status or '连接失败'} {data.get('error', '')}".strip())
+
+
+def _poll(client: Client, path: str, settings: Settings, deadline: float) -> Dict:
+    """轮询状态直到完成或失败"""
+    while True:
+        status, data = client.json('GET', path)
+        if status == 200 and data.get('status') == 'completed':
+            if data.get('error'):
+                raise JobFailed('failed', f"completed with error: {data['error']}")
+            return data
+        if status == 200 and data.get('status') in ('failed', 'cancelled'):
+            raise JobFailed('failed', str(data.get('error') or data.get('message') or data['status'])[:200])
+        if status == 404:
+            raise JobFailed('failed', f'{path}: 404')
+        if time.monotonic() >= deadline:
+            raise JobFailed('timeout', f'{path}: {data.get("status")} {data.get("progress")}')
+        time.sleep(settings.poll_interval)
+
+
+def _download(client: Client, path: str):
+    status, data = client.request('GET', path)
+    if status != 200 or not data:
+        raise JobFailed('failed', f'{path}: {status}')
+
+
+def _chunked_upload(client: Client, content: bytes, filename: str, kind: str, settings: Settings) -> str:
+    """分块上传，返回 sha256"""
+    status, session = client.json('POST', '/api/uploads', {'filename': filename, 'size': len(content), 'kind': kind})
+    _check(status, session, 'create upload')
+    if session.get('deduplicated'):
+        return session['sha256']
+    upload_id = session['upload_id']
+    chunk_size = settings.chunk_size or session.get('chunk_size') or 8 * 1024 * 1024
+    offset = session.get('offset', 0)
+    while offset < len(content):
+        chunk = content[offset:offset + chunk_size]
+        status, data = client.json('PUT', f'/api/uploads/{upload_id}?offset={offset}', body=chunk,
+                                   headers={'Content-Type': 'application/octet-stream'})
+        _check(status, data, 'upload chunk')
+        offset = data.get('offset', offset + len(chunk))
+    status, data = client.json('POST', f'/api/uploads/{upload_id}/complete', {})
+    _check(status, data, 'complete upload')
+    return data['sha256']
+
+
+def scenario_compact(client: Client, inputs: Inputs, settings: Settings, deadline: float, chunked: bool = False):
+    files = {'original_srt': ('original.srt', inputs.original_srt), 'new_srt': ('new.srt', inputs.new_srt)}
+    fields = {'use_precise': 'false'}
+    if chunked:
+        fields['video_blob'] = _chunked_upload(client, inputs.video(), 'video.mp4', 'video', settings)
+    else:
+        files['video'] = ('video.mp4', inputs.video())
+    status, data = client.form('/api/compact-clip', fields, files)
+    _check(status, data, 'compact-clip')
+    task_id = data['task_id']
+    status, data = client.json('POST', f'/api/process-compact/{task_id}')
+    _check(status, data, 'process-compact')
+    _poll(client, f'/api/status/{task_id}', settings, deadline)
+
+
+def scenario_compact_chunked(client: Client, inputs: Inputs, settings: Settings, deadline: float):
+    scenario_compact(client, inputs, settings, deadline, chunked=True)
+
+
+def scenario_audio_mix(client: Client, inputs: Inputs, settings: Settings, deadline: float):
+    status, data = client.form('/api/audio-mix', {}, {
+        'video': ('video.mp4', inputs.video()),
+        'srt': ('new.srt', inputs.new_srt),
+        'dubbing_audio_dir': ('dubbing.zip', inputs.dubbing_zip),
+    })
+    _check(status, data, 'audio-mix')
+    task_id = data['task_id']
+    _poll(client, f'/api/audio-mix/status/{task_id}', settings, deadline)
+    _download(client, f'/api/audio-mix/download/{task_id}')
+
+
+def scenario_iterative(client: Client, inputs: Inputs, settings: Settings, deadline: float):
+    status, data = client.form('/api/iterative-adjust', {}, {
+        'video': ('video.mp4', inputs.video()),
+        'original_srt': ('original.srt', inputs.original_srt),
+        'new_srt': ('new.srt', inputs.new_srt),
+    })
+    _check(status, data, 'iterative-adjust')
+    task_id = data['task_id']
+    _poll(client, f'/api/iterative-adjust/status/{task_id}', settings, deadline)
+    _download(client, f'/api/iterative-adjust/download/{task_id}')
+
+
+SCENARIOS: Dict[str, Callable] = {
+    'compact': scenario_compact,
+    'compact_chunked': scenario_compact_chunked,
+    'audio_mix': scenario_audio_mix,
+    'iterative': scenario_iterative,
+}
+
+WATCH_PATHS = ('/api/tasks?limit=50', '/api/scheduler', '/api/health')
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'compact=2,audio_mix=1' -> {'compact': 2.0, 'audio_mix': 1.0}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"未知场景: {name}（可选 {', '.join(SCENARIOS)}）")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ---------- 运行 ----------
+
+def run_step(base_url: str, concurrency: int, seconds: float, mix: Dict[str, float], inputs: Inputs,
+             settings: Settings, watchers: int, watch_interval: float, seed: int) -> Dict:
+    """
+    运行一个并发阶段：concurrency 个虚拟用户在 seconds 秒内连续提交作业，之后等进行中的作业结束
+
+    Returns:
+        Recorder.summary() 加上阶段参数
+    """
+    recorder = Recorder()
+    stop_at = time.monotonic() + seconds
+    stop_watch = threading.Event()
+    names, weights = list(mix), list(mix.values())
+
+    def user(index: int):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url, recorder)
+        try:
+            while time.monotonic() < stop_at:
+                scenario = rng.choices(names, weights)[0]
+                started = time.monotonic()
+                try:
+                    SCENARIOS[scenario](client, inputs, settings, started + settings.job_timeout)
+                    recorder.job(scenario, 'completed', time.monotonic() - started)
+                except JobFailed as e:
+                    recorder.job(scenario, e.outcome, time.monotonic() - started, str(e))
+                    if e.outcome == 'rejected':
+                        time.sleep(settings.poll_interval)
+                except Exception as e:
+                    recorder.job(scenario, 'failed', time.monotonic() - started, f"{type(e).__name__}: {e}")
+        finally:
+            client.close()
+
+    def watcher():
+        client = Client(base_url, recorder)
+        try:
+            while not stop_watch.is_set():
+                for path in WATCH_PATHS:
+                    client.request('GET', path)
+                stop_watch.wait(watch_interval)
+        finally:
+            client.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    watch_threads = [threading.Thread(target=watcher, daemon=True) for _ in range(watchers)]
+    for thread in threads + watch_threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop_watch.set()
+    for thread in watch_threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    _status, scheduler = Client(base_url, Recorder()).json('GET', '/api/scheduler')
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 1),
+        **recorder.summary(elapsed),
+        'scheduler': scheduler,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(work_dir: str, env_overrides: Dict[str, str], startup_timeout: float = 60) -> Tuple[subprocess.Popen, str]:
+    """
+    在独立进程组里启动后端（PATH 上是假工具，任务目录、数据库、文件存储都在 work_dir 下）
+
+    Returns:
+        (服务进程, base_url)
+    """
+    stubs = install(os.path.join(work_dir, 'stubs'))
+    port = _free_port()
+    folders = {name: os.path.join(work_dir, folder) for name, folder in (
+        ('UPLOAD_FOLDER', 'uploads'), ('DOWNLOAD_FOLDER', 'downloads'),
+        ('TASKS_FOLDER', 'tasks'), ('OUTPUT_FOLDER', 'output'),
+    )}
+    env = dict(
+        os.environ,
+        PATH=stubs['bin'] + os.pathsep + os.environ.get('PATH', ''),
+        PYTHONPATH=os.pathsep.join(filter(None, [stubs['python_path'], os.environ.get('PYTHONPATH')])),
+        VIDEORECOMP_TASKS_DB=os.path.join(work_dir, 'tasks.db'),
+        VIDEORECOMP_BLOB_DIR=os.path.join(work_dir, 'blobs'),
+        VIDEORECOMP_RESULT_CACHE_DIR=os.path.join(work_dir, 'result_cache'),
+        VIDEORECOMP_METRICS_DIR=os.path.join(work_dir, 'metrics'),
+        **env_overrides,
+    )
+    log = open(os.path.join(work_dir, 'server.log'), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, '-c', _SERVER.format(backend=BACKEND_DIR, folders=folders, port=port)],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+    log.close()
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败（exit {process.returncode}），日志: {os.path.join(work_dir, 'server.log')}")
+        status, _data = Client(base_url, Recorder(), timeout=2).request('GET', '/api/health')
+        if status == 200:
+            return process, base_url
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'服务 {startup_timeout:.0f} 秒内没有响应健康检查')
+
+
+def stop_server(process: subprocess.Popen):
+    """结束服务进程组（包括工作进程和假工具子进程）"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def print_step(step: Dict):
+    jobs = step['jobs']
+    latency = '  '.join(f"p{q} {jobs[f'p{q}_s']:.1f}s" for q in (50, 90, 99) if f'p{q}_s' in jobs)
+    print(f"\n=== 并发 {step['concurrency']}（{step['seconds']:.0f}s） ===")
+    print(f"作业: 完成 {jobs['completed']}  失败 {jobs['failed']}  拒绝 {jobs['rejected']}  超时 {jobs['timeout']}  "
+          f"吞吐 {jobs['jobs_per_min']}/min  {latency}")
+    for error in jobs['errors'][:3]:
+        print(f"   ⚠️  {error}")
+    print(f"{'端点':44s} {'请求':>6s} {'错误率':>7s} {'拒绝':>5s} {'rps':>7s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>8s}")
+    for name, row in step['endpoints'].items():
+        print(f"{name:46s} {row['requests']:6d} {row['error_rate'] * 100:6.1f}% {row['rejected']:5d} {row['rps']:7.1f} "
+              f"{row['p50_ms']:8.1f} {row['p90_ms']:8.1f} {row['p99_ms']:8.1f} {row['max_ms']:8.1f}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API 压测（假 ffmpeg / ffprobe / Demucs）')
+    parser.add_argument('-c', '--concurrency', action='append', type=int,
+                        help=f'并发用户数（可重复，按阶梯依次运行，默认 {DEFAULT_CONCURRENCY}）')
+    parser.add_argument('--step-seconds', type=float, default=60, help='每个阶段提交作业的时长（默认 60）')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'场景权重（默认 {DEFAULT_MIX}）')
+    parser.add_argument('--watchers', type=int, default=2, help='轮询任务列表的面板数（默认 2）')
+    parser.add_argument('--watch-interval', type=float, default=1.0, help='面板轮询间隔秒数（默认 1）')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='作业状态轮询间隔秒数（默认 0.5）')
+    parser.add_argument('--job-timeout', type=float, default=300, help='单个作业超时秒数（默认 300）')
+    parser.add_argument('--media-seconds', type=float, default=60, help='假视频时长（默认 60）')
+    parser.add_argument('--video-mb', type=float, default=8, help='上传视频大小 MB（默认 8）')
+    parser.add_argument('--chunk-kb', type=int, help='分块上传的块大小（默认由服务端决定）')
+    parser.add_argument('--stub-speed', type=float, default=40, help='假 ffmpeg 每秒处理的媒体秒数（默认 40）')
+    parser.add_argument('--stub-demucs-speed', type=float, default=4, help='假 Demucs 每秒处理的媒体秒数（默认 4）')
+    parser.add_argument('--stub-cpu', type=float, default=0.5, help='假工具处理时间中忙等的比例（默认 0.5）')
+    parser.add_argument('--stub-fail-rate', type=float, default=0.0, help='假工具随机失败的概率（默认 0）')
+    parser.add_argument('--worker-processes', type=int, choices=(0, 1), default=1, help='是否预先 fork 工作进程（默认 1）')
+    parser.add_argument('--result-cache', action='store_true', help='启用结果缓存（默认关闭，每个作业都实际处理）')
+    parser.add_argument('--url', help='压测已经运行的服务（不启动服务，也不安装假工具）')
+    parser.add_argument('--seed', type=int, default=1, help='场景选择的随机种子')
+    parser.add_argument('-w', '--work-dir', default=os.path.join(ROOT, 'benchmarks', '.work', 'load'), help='工作目录')
+    parser.add_argument('--keep', action='store_true', help='保留工作目录（服务日志、任务数据库）')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件')
+    args = parser.parse_args()
+
+    work_dir = os.path.abspath(args.work_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    inputs = Inputs(work_dir, args.media_seconds, args.video_mb)
+    settings = Settings(args.poll_interval, args.job_timeout, args.chunk_kb * 1024 if args.chunk_kb else None)
+    server_env = {
+        'VIDEORECOMP_STUB_SPEED': str(args.stub_speed),
+        'VIDEORECOMP_STUB_DEMUCS_SPEED': str(args.stub_demucs_speed),
+        'VIDEORECOMP_STUB_CPU': str(args.stub_cpu),
+        'VIDEORECOMP_STUB_DURATION': str(args.media_seconds),
+        'VIDEORECOMP_STUB_FAIL_RATE': str(args.stub_fail_rate),
+        'VIDEORECOMP_WORKER_PROCESSES': str(args.worker_processes),
+        'VIDEORECOMP_RESULT_CACHE': '1' if args.result_cache else '0',
+    }
+
+    process = None
+    steps = []
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            process, base_url = start_server(work_dir, server_env)
+            print(f"✅ 服务已启动: {base_url}（日志 {os.path.join(work_dir, 'server.log')}）")
+        for concurrency in args.concurrency or DEFAULT_CONCURRENCY:
+            step = run_step(base_url, concurrency, args.step_seconds, args.mix, inputs, settings,
+                            args.watchers, args.watch_interval, args.seed)
+            steps.append(step)
+            print_step(step)
+    except KeyboardInterrupt:
+        print("\n⚠️  已中断")
+    finally:
+        if process is not None:
+            stop_server(process)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'work_dir')},
+            'server_env': server_env,
+            'steps': steps,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3.12
+"""
+处理流程基准：用 ffmpeg lavfi 生成可复现的合成素材，逐阶段计时
+
+素材（按分辨率和时长生成一次，缓存在工作目录里）：
+- video.mp4       testsrc2 画面 + sine 音轨
+- original.srt    均匀分布的字幕
+- new.srt         在原字幕上做固定种子的删除、改字和时间漂移
+- dubbing.zip     每条新字幕一段 sine 配音
+- vocals.wav / dubbing.mp3 / source.mp3   混音和音频分割用的音轨（sine / anullsrc）
+
+阶段：硬字幕烧录、软字幕封装、配音合并、音轨混合、音频分割，以及每个剪辑器的渲染。
+每个阶段在单独的子进程里运行，记录耗时、吞吐（实时倍数、帧率、输入 MB/s）
+和峰值内存（Python 进程本身 / ffmpeg 等子进程中最大的一个）。
+
+用法：
+    python benchmarks/pipeline_bench.py                              # 默认矩阵，结果打印到终端
+    python benchmarks/pipeline_bench.py -r 640x360 -d 30 -s burn -s soft_mux -n 3
+    python benchmarks/pipeline_bench.py -o bench.json                # 写 JSON，便于在同一台机器上对比不同提交
+    python benchmarks/pipeline_bench.py --compare base.json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Callable, Dict, List
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, 'backend')
+SRC_DIR = os.path.join(ROOT, 'src')
+
+DEFAULT_RESOLUTIONS = ('640x360', '1280x720', '1920x1080')
+DEFAULT_DURATIONS = (30, 120)
+FRAME_RATE = 25
+
+# 合成字幕：每条 CUE_SECONDS 秒，间隔 GAP_SECONDS 秒
+CUE_SECONDS = 2.0
+GAP_SECONDS = 1.0
+SEED = 20240601
+
+
+# ---------- 合成素材 ----------
+
+def _ffmpeg(*args: str):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True, stdin=subprocess.DEVNULL)
+
+
+def synthetic_cues(duration: float) -> List[Dict]:
+    """均匀分布的原字幕 [{'start', 'end', 'text'}]"""
+    cues = []
+    start = 0.5
+    while start + CUE_SECONDS <= duration:
+        index = len(cues) + 1
+        cues.append({'start': start, 'end': start + CUE_SECONDS, 'text': f"第{index}句 原始字幕 line {index}"})
+        start += CUE_SECONDS + GAP_SECONDS
+    return cues
+
+
+def edited_cues(cues: List[Dict], seed: int = SEED) -> List[Dict]:
+    """
+    新字幕：固定种子下约 10% 删除、10% 改字，其余时间轴逐步漂移（最多 ±0.4 秒）
+
+    Returns:
+        新字幕列表（时间轴保持递增、不重叠）
+    """
+    rng = random.Random(seed)
+    edited = []
+    drift = 0.0
+    for cue in cues:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        text = cue['text'] if roll >= 0.2 else cue['text'].replace('原始', '修改后的')
+        drift = max(-0.4, min(0.4, drift + rng.uniform(-0.1, 0.1)))
+        start = max(cue['start'] + drift, edited[-1]['end'] + 0.05 if edited else 0.0)
+        end = start + (cue['end'] - cue['start']) * rng.uniform(0.85, 1.15)
+        edited.append({'start': start, 'end': end, 'text': text})
+    return edited
+
+
+def _srt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def write_srt(path: str, cues: List[Dict]):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, cue in enumerate(cues, 1):
+            f.write(f"{i}\n{_srt_time(cue['start'])} --> {_srt_time(cue['end'])}\n{cue['text']}\n\n")
+
+
+def make_inputs(work_dir: str, resolution: str, duration: int) -> Dict:
+    """
+    生成（或复用已生成的）一组合成素材
+
+    Returns:
+        素材路径和基本信息
+    """
+    input_dir = os.path.join(work_dir, 'inputs', f'{resolution}_{duration}s')
+    manifest_path = os.path.join(input_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    os.makedirs(input_dir, exist_ok=True)
+    print(f"🎬 生成素材 {resolution} {duration}s ...")
+    paths = {name: os.path.join(input_dir, name) for name in (
+        'video.mp4', 'original.srt', 'new.srt', 'dubbing.zip', 'vocals.wav', 'dubbing.mp3', 'source.mp3'
+    )}
+
+    _ffmpeg(
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={FRAME_RATE}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-g', str(FRAME_RATE * 2),
+        '-c:a', 'aac', '-b:a', '128k', '-shortest', paths['video.mp4'],
+    )
+    _ffmpeg('-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=44100:duration={duration}', paths['vocals.wav'])
+    _ffmpeg('-f', 'lavfi', '-i', f'sine=frequency=660:sample_rate=44100:duration={duration}', '-q:a', '4', paths['dubbing.mp3'])
+    _ffmpeg(
+        '-f', 'lavfi', '-i', f'anullsrc=r=44100:cl=stereo:d={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=330:sample_rate=44100:duration={duration}',
+        '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=shortest', '-q:a', '4', paths['source.mp3'],
+    )
+
+    original = synthetic_cues(duration)
+    new = edited_cues(original)
+    write_srt(paths['original.srt'], original)
+    write_srt(paths['new.srt'], new)
+
+    # 每条新字幕一段配音（时长与字幕相同，频率循环变化）
+    clip_dir = os.path.join(input_dir, 'dubbing')
+    os.makedirs(clip_dir, exist_ok=True)
+    with zipfile.ZipFile(paths['dubbing.zip'], 'w', zipfile.ZIP_STORED) as zf:
+        for i, cue in enumerate(new):
+            clip = os.path.join(clip_dir, f'{i + 1:04d}.mp3')
+            _ffmpeg(
+                '-f', 'lavfi', '-i',
+                f"sine=frequency={300 + (i % 8) * 50}:sample_rate=44100:duration={cue['end'] - cue['start']:.3f}",
+                '-q:a', '4', clip,
+            )
+            zf.write(clip, os.path.basename(clip))
+    shutil.rmtree(clip_dir, ignore_errors=True)
+
+    manifest = {
+        'resolution': resolution,
+        'duration': duration,
+        'fps': FRAME_RATE,
+        'original_cues': len(original),
+        'new_cues': len(new),
+        'paths': paths,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+# ---------- 阶段 ----------
+# 每个阶段函数在子进程里调用：做好准备工作，返回要计时的函数（返回 True 表示成功）
+
+def _app():
+    """导入 API 模块（任务数据库等放在基准的工作目录里，不影响正在使用的服务）"""
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    return app
+
+
+def _clipper_stage(module: str, cls: str, **kwargs) -> Callable:
+    def stage(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+        sys.path.insert(0, SRC_DIR)
+        clipper_class = getattr(__import__(module), cls)
+        paths = inputs['paths']
+        clipper = clipper_class(
+            video_path=paths['video.mp4'],
+            original_srt_path=paths['original.srt'],
+            new_srt_path=paths['new.srt'],
+            output_dir=out_dir,
+            **kwargs
+        )
+
+        def run():
+            result = clipper.process() or {}
+            if result.get('error'):
+                raise RuntimeError(result['error'])
+            return result.get('success', True)
+
+        return run
+
+    return stage
+
+
+def stage_burn(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+    app = _app()
+    paths = inputs['paths']
+    return lambda: app.create_hard_subtitle_video(paths['video.mp4'], paths['new.srt'], os.path.join(out_dir, 'burn.mp4'))
+
+
+def stage_soft_mux(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+    app = _app()
+    paths = inputs['paths']
+    return lambda: app.create_soft_subtitle_video(paths['video.mp4'], paths['new.srt'], os.path.join(out_dir, 'soft.mp4'))
+
+
+def stage_dubbing_merge(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+    app = _app()
+    paths = inputs['paths']
+    audio_dir = os.path.join(out_dir, 'dubbing')
+    with zipfile.ZipFile(paths['dubbing.zip']) as zf:
+        zf.extractall(audio_dir)
+    return lambda: app.merge_dubbing_audios(paths['new.srt'], audio_dir, os.path.join(out_dir, 'dubbing_merged.mp3'))
+
+
+def stage_stem_mix(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+    app = _app()
+    paths = inputs['paths']
+    return lambda: app.mix_two_audios(paths['vocals.wav'], paths['dubbing.mp3'], os.path.join(out_dir, 'mixed.mp3'))
+
+
+def stage_audio_split(inputs: Dict, out_dir: str) -> Callable[[], bool]:
+    app = _app()
+    paths = inputs['paths']
+    task_id = str(uuid.uuid4())
+    app.audio_split_tasks[task_id] = {
+        'type': 'audio_split',
+        'status': 'processing',
+        'progress': 0,
+        'message': '基准测试',
+        'created_at': datetime.now().isoformat(),
+        'srt_path': paths['new.srt'],
+        'audio_source_path': paths['source.mp3'],
+        'video_path': None,
+        'output_dir': out_dir,
+        'use_silence': True,
+        'audio_files': [],
+        'error': None,
+    }
+
+    def run():
+        app.process_audio_split_task(task_id, paths['new.srt'], paths['source.mp3'], out_dir, True)
+        return app.audio_split_tasks[task_id]['status'] == 'completed'
+
+    return run
+
+
+STAGES: Dict[str, Callable[[Dict, str], Callable[[], bool]]] = {
+    'burn': stage_burn,
+    'soft_mux': stage_soft_mux,
+    'dubbing_merge': stage_dubbing_merge,
+    'stem_mix': stage_stem_mix,
+    'audio_split': stage_audio_split,
+    'clip_compact': _clipper_stage('compact_video_processor', 'CompactVideoClipper'),
+    'clip_enhanced': _clipper_stage('enhanced_video_processor', 'EnhancedVideoClipper'),
+    'clip_timeline_align': _clipper_stage('timeline_aligner', 'TimelineAligner'),
+    'clip_timeline_remap': _clipper_stage('timeline_remap_clipper', 'TimelineRemapClipper'),
+    'clip_iterative': _clipper_stage('iterative_adjust_clipper', 'IterativeAdjustClipper'),
+}
+
+# 输入是视频的阶段（吞吐按帧率计算）
+VIDEO_STAGES = {'burn', 'soft_mux'} | {name for name in STAGES if name.startswith('clip_')}
+
+
+def _rss_mb(kilobytes: int) -> float:
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    return round(kilobytes / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def run_child(stage: str, manifest_path: str, out_dir: str):
+    """子进程入口：运行一个阶段，结果以 JSON 打印在最后一行"""
+    with open(manifest_path, encoding='utf-8') as f:
+        inputs = json.load(f)
+    run = STAGES[stage](inputs, out_dir)
+
+    started = time.perf_counter()
+    error = None
+    try:
+        ok = bool(run())
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+    if not ok and error is None:
+        error = '阶段返回失败（详见处理日志）'
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'ok': ok,
+        'error': error,
+        'seconds': elapsed,
+        'python_peak_rss_mb': _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+        'child_peak_rss_mb': _rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss),
+        'output_bytes': _dir_bytes(out_dir),
+    }))
+
+
+def run_stage(stage: str, inputs: Dict, work_dir: str) -> Dict:
+    """在新的子进程里运行一次阶段"""
+    out_dir = os.path.join(work_dir, 'runs', f"{stage}_{inputs['resolution']}_{inputs['duration']}s_{uuid.uuid4().hex[:8]}")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(os.path.dirname(inputs['paths']['video.mp4']), 'manifest.json')
+    env = dict(
+        os.environ,
+        VIDEORECOMP_TASKS_DB=os.path.join(work_dir, 'tasks.db'),
+        VIDEORECOMP_BLOB_DIR=os.path.join(work_dir, 'blobs'),
+        VIDEORECOMP_RESULT_CACHE_DIR=os.path.join(work_dir, 'result_cache'),
+        VIDEORECOMP_METRICS_DIR=os.path.join(work_dir, 'metrics'),
+    )
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, manifest_path, out_dir],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    try:
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        tail = (process.stderr or process.stdout).strip().splitlines()[-1:]
+        result = {'ok': False, 'error': tail[0] if tail else f'exit {process.returncode}'}
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return result
+
+
+def summarize(stage: str, inputs: Dict, runs: List[Dict]) -> Dict:
+    """汇总多次运行：中位数耗时、吞吐和最大峰值内存"""
+    ok = [run for run in runs if run.get('ok')]
+    summary = {
+        'stage': stage,
+        'resolution': inputs['resolution'],
+        'duration': inputs['duration'],
+        'runs': len(runs),
+        'failures': len(runs) - len(ok),
+        'errors': sorted({run['error'] for run in runs if run.get('error')}),
+    }
+    if not ok:
+        return summary
+
+    seconds = statistics.median(run['seconds'] for run in ok)
+    input_bytes = os.path.getsize(inputs['paths']['video.mp4'])
+    summary.update({
+        'seconds_median': round(seconds, 3),
+        'seconds_min': round(min(run['seconds'] for run in ok), 3),
+        'realtime_factor': round(inputs['duration'] / seconds, 2) if seconds else None,
+        'python_peak_rss_mb': max(run['python_peak_rss_mb'] for run in ok),
+        'child_peak_rss_mb': max(run['child_peak_rss_mb'] for run in ok),
+        'output_bytes': ok[-1]['output_bytes'],
+    })
+    if stage in VIDEO_STAGES and seconds:
+        summary['fps'] = round(inputs['duration'] * inputs['fps'] / seconds, 1)
+        summary['input_mb_per_s'] = round(input_bytes / 1024 / 1024 / seconds, 2)
+    return summary
+
+
+def compare(base_path: str, head_path: str):
+    """对比两份结果（按阶段 + 分辨率 + 时长），打印耗时变化"""
+    with open(base_path, encoding='utf-8') as f:
+        base = {(r['stage'], r['resolution'], r['duration']): r for r in json.load(f)['results']}
+    with open(head_path, encoding='utf-8') as f:
+        head = json.load(f)['results']
+    for result in head:
+        key = (result['stage'], result['resolution'], result['duration'])
+        before = base.get(key, {}).get('seconds_median')
+        after = result.get('seconds_median')
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{key[0]:20s} {key[1]:>10s} {key[2]:4d}s  {before:8.2f}s -> {after:8.2f}s  ({change:+.1f}%)")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _ffmpeg_version() -> str:
+    try:
+        return subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='处理流程基准（合成素材）')
+    parser.add_argument('-r', '--resolution', action='append', help=f"分辨率（可重复，默认 {' '.join(DEFAULT_RESOLUTIONS)}）")
+    parser.add_argument('-d', '--duration', action='append', type=int, help=f"素材时长秒数（可重复，默认 {DEFAULT_DURATIONS}）")
+    parser.add_argument('-s', '--stage', action='append', choices=list(STAGES), help='要测的阶段（可重复，默认全部）')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='每个阶段运行次数（默认 1）')
+    parser.add_argument('-w', '--work-dir', default=os.path.join(ROOT, 'benchmarks', '.work'),
+                        help='素材和临时输出目录（素材会复用）')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='对比两份结果 JSON')
+    parser.add_argument('--child', nargs=3, metavar=('STAGE', 'MANIFEST', 'OUT_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+    if shutil.which('ffmpeg') is None:
+        print("❌ 找不到 ffmpeg")
+        sys.exit(1)
+
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    for resolution in args.resolution or DEFAULT_RESOLUTIONS:
+        for duration in args.duration or DEFAULT_DURATIONS:
+            inputs = make_inputs(work_dir, resolution, duration)
+            for stage in args.stage or list(STAGES):
+                summary = summarize(stage, inputs, [run_stage(stage, inputs, work_dir) for _ in range(args.repeat)])
+                results.append(summary)
+                if 'seconds_median' not in summary:
+                    print(f"❌ {stage:20s} {resolution:>10s} {duration:4d}s  {summary['errors'][:1]}")
+                    continue
+                print(f"{'✅' if not summary['failures'] else '⚠️ '} {stage:20s} {resolution:>10s} {duration:4d}s  "
+                      f"{summary['seconds_median']:8.2f}s  {summary['realtime_factor']:6.2f}x  "
+                      f"rss {summary['python_peak_rss_mb']:7.1f} MB / ffmpeg {summary['child_peak_rss_mb']:7.1f} MB")
+
+    if args.output:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': _ffmpeg_version(),
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3.12
+"""
+压测用的假 ffmpeg / ffprobe / Demucs
+
+不做任何编解码：按媒体时长和设定的处理速度占用一段时间（其中一部分是忙等，模拟 CPU 占用），
+输出 -progress 进度，写出带时长标记的占位文件，后续步骤的 ffprobe 能读回时长。
+文件头带有真实的魔数（ftyp / ID3 / RIFF），能通过上传时的格式校验。
+
+环境变量：
+    VIDEORECOMP_STUB_SPEED         ffmpeg 每秒处理的媒体秒数（默认 40）
+    VIDEORECOMP_STUB_DEMUCS_SPEED  Demucs 每秒处理的媒体秒数（默认 4）
+    VIDEORECOMP_STUB_CPU           处理时间中忙等的比例 0~1（默认 0.5）
+    VIDEORECOMP_STUB_DURATION      读不到时长标记时的默认媒体时长（默认 60）
+    VIDEORECOMP_STUB_OUTPUT_KB     输出文件大小（默认 512）
+    VIDEORECOMP_STUB_FAIL_RATE     随机失败的概率（默认 0）
+
+用法：
+    python benchmarks/stub_media.py install DIR   # 在 DIR/bin 写入 ffmpeg / ffprobe，DIR/py 写入 demucs 包
+    然后 PATH=DIR/bin:$PATH PYTHONPATH=DIR/py 启动服务
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+from typing import List, Optional
+
+
+MARKER = b'stub-duration='
+
+_HEADERS = {
+    'video': b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2',
+    'audio': b'ID3\x04\x00\x00\x00\x00\x00\x00',
+    'wav': b'RIFF\x00\x00\x00\x00WAVEfmt ',
+    'image': b'\x89PNG\r\n\x1a\n',
+    'other': b'',
+}
+
+_EXTENSIONS = {
+    '.mp4': 'video', '.mkv': 'video', '.mov': 'video', '.ts': 'video', '.avi': 'video', '.flv': 'video',
+    '.mp3': 'audio', '.m4a': 'audio', '.aac': 'audio', '.flac': 'audio',
+    '.wav': 'wav',
+    '.png': 'image', '.jpg': 'image', '.jpeg': 'image',
+}
+
+# 只读一个参数值的 ffmpeg 选项（其余参数按位置处理）
+_VALUE_OPTIONS = {'-t', '-to', '-ss', '-i', '-progress', '-f'}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def media_kind(path: str) -> str:
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'other')
+
+
+def media_bytes(kind: str, duration: float, size: int, token: bytes = b'') -> bytes:
+    """
+    生成占位媒体文件内容
+
+    Args:
+        kind: video / audio / wav / image / other
+        duration: 写入的时长标记（秒）
+        size: 文件大小（字节，不足时补零）
+        token: 附加内容（让每个文件的哈希不同，避免上传去重和结果缓存命中）
+    """
+    body = _HEADERS[kind] + b'\n' + MARKER + f'{duration:.3f}'.encode() + b'\n' + token + b'\n'
+    return body + b'\0' * max(0, size - len(body))
+
+
+def media_duration(path: str) -> Optional[float]:
+    """读取占位文件的时长标记；concat 列表返回各文件时长之和"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+    except OSError:
+        return None
+    if head.startswith(b'file ') or head.startswith(b'ffconcat'):
+        total = 0.0
+        for line in head.decode('utf-8', errors='replace').splitlines():
+            match = re.match(r"file '(.*)'$", line.strip())
+            if match:
+                total += media_duration(match.group(1).replace("'\\''", "'")) or 0.0
+        return total
+    index = head.find(MARKER)
+    if index < 0:
+        return None
+    value = head[index + len(MARKER):].split(b'\n', 1)[0]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def simulate_work(seconds: float, on_tick=None, tick: float = 0.1):
+    """占用 seconds 秒：每个时间片里按 VIDEORECOMP_STUB_CPU 的比例忙等，其余时间休眠"""
+    cpu = min(1.0, max(0.0, _env_float('VIDEORECOMP_STUB_CPU', 0.5)))
+    started = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            break
+        slice_end = min(seconds, elapsed + tick)
+        busy_until = started + elapsed + (slice_end - elapsed) * cpu
+        while time.perf_counter() < busy_until:
+            pass
+        remaining = started + slice_end - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        if on_tick is not None:
+            on_tick(min(1.0, (time.perf_counter() - started) / seconds) if seconds else 1.0)
+
+
+def _maybe_fail(tool: str):
+    if random.random() < _env_float('VIDEORECOMP_STUB_FAIL_RATE', 0.0):
+        sys.stderr.write(f'{tool} (stub): simulated failure\n')
+        sys.exit(1)
+
+
+def _write_output(path: str, duration: float):
+    if '%' in path:
+        try:
+            path = path % 0
+        except (TypeError, ValueError):
+            pass
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    size = int(_env_float('VIDEORECOMP_STUB_OUTPUT_KB', 512) * 1024)
+    with open(path, 'wb') as f:
+        f.write(media_bytes(media_kind(path), duration, size))
+
+
+def _lavfi_duration(spec: str) -> Optional[float]:
+    match = re.search(r'(?:^|[:,])(?:d|duration)=([\d.]+)', spec)
+    return float(match.group(1)) if match else None
+
+
+# ---------- ffmpeg ----------
+
+def ffmpeg_main(argv: List[str]) -> int:
+    if '-version' in argv:
+        print('ffmpeg version stub')
+        return 0
+
+    inputs, durations = [], []
+    values = {}
+    progress = None
+    input_format = None
+    i = 0
+    while i < len(argv) - 1:
+        arg = argv[i]
+        if arg in _VALUE_OPTIONS:
+            value = argv[i + 1]
+            if arg == '-i':
+                inputs.append(value)
+                duration = _lavfi_duration(value) if input_format == 'lavfi' else media_duration(value)
+                if duration is not None:
+                    durations.append(duration)
+                input_format = None
+            elif arg == '-f':
+                input_format = value
+            elif arg == '-progress':
+                progress = value
+            else:
+                values.setdefault(arg, _parse_time(value))
+            i += 2
+        else:
+            i += 1
+
+    output = argv[-1] if argv and (argv[-1] == '-' or not argv[-1].startswith('-')) else None
+    missing = [path for path in inputs if not os.path.exists(path) and '=' not in path and ':' not in path]
+    if missing:
+        sys.stderr.write(f'{missing[0]}: No such file or directory\n')
+        return 1
+
+    source = max(durations) if durations else _env_float('VIDEORECOMP_STUB_DURATION', 60.0)
+    start = values.get('-ss', 0.0)
+    if '-t' in values:
+        duration = values['-t']
+    elif '-to' in values:
+        duration = max(0.0, values['-to'] - start)
+    else:
+        duration = max(0.0, source - start)
+
+    stream = None
+    if progress in ('pipe:1', '-'):
+        stream = sys.stdout
+    elif progress == 'pipe:2':
+        stream = sys.stderr
+
+    def report(fraction: float):
+        if stream is None:
+            return
+        out_us = int(duration * fraction * 1_000_000)
+        stream.write(f'out_time_us={out_us}\nspeed={_env_float("VIDEORECOMP_STUB_SPEED", 40):.1f}x\n'
+                     f'progress={"end" if fraction >= 1.0 else "continue"}\n')
+        stream.flush()
+
+    simulate_work(duration / max(_env_float('VIDEORECOMP_STUB_SPEED', 40.0), 0.001), report)
+    _maybe_fail('ffmpeg')
+    report(1.0)
+    if output and output not in ('-', 'pipe:', 'pipe:1') and output != os.devnull:
+        _write_output(output, duration)
+    return 0
+
+
+def _parse_time(value: str) -> float:
+    parts = value.split(':')
+    try:
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return 0.0
+
+
+# ---------- ffprobe ----------
+
+def ffprobe_main(argv: List[str]) -> int:
+    path = next((arg for arg in reversed(argv) if not arg.startswith('-')), None)
+    if path is None or not os.path.exists(path):
+        sys.stderr.write(f'{path}: No such file or directory\n')
+        return 1
+    _maybe_fail('ffprobe')
+
+    duration = media_duration(path)
+    if duration is None:
+        duration = _env_float('VIDEORECOMP_STUB_DURATION', 60.0)
+    kind = media_kind(path)
+    if kind == 'other':
+        with open(path, 'rb') as f:
+            head = f.read(16)
+        kind = next((name for name, header in _HEADERS.items() if header and head.startswith(header)), 'video')
+
+    streams = []
+    if kind == 'video':
+        streams.append({
+            'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'pix_fmt': 'yuv420p',
+            'width': 1280, 'height': 720, 'r_frame_rate': '25/1', 'avg_frame_rate': '25/1',
+            'time_base': '1/12800', 'duration': f'{duration:.6f}',
+        })
+    if kind in ('video', 'audio', 'wav'):
+        streams.append({
+            'index': len(streams), 'codec_type': 'audio', 'codec_name': 'pcm_s16le' if kind == 'wav' else 'aac',
+            'sample_rate': '48000', 'channels': 2, 'channel_layout': 'stereo', 'duration': f'{duration:.6f}',
+        })
+    select = argv[argv.index('-select_streams') + 1] if '-select_streams' in argv else None
+    if select in ('a', 'v'):
+        streams = [s for s in streams if s['codec_type'].startswith(select)]
+
+    formats = {'video': 'mov,mp4,m4a,3gp,3g2,mj2', 'audio': 'mp3', 'wav': 'wav', 'image': 'png_pipe'}
+    info = {}
+    if '-show_streams' in argv:
+        info['streams'] = streams
+    if '-show_format' in argv or '-show_entries' in argv:
+        info['format'] = {
+            'filename': path, 'format_name': formats.get(kind, 'mov,mp4,m4a,3gp,3g2,mj2'),
+            'duration': f'{duration:.6f}', 'size': str(os.path.getsize(path)),
+        }
+    if 'json' in argv or any(arg.startswith('json') for arg in argv):
+        print(json.dumps(info))
+    else:
+        print(f'{duration:.6f}')
+    return 0
+
+
+# ---------- demucs（python -m demucs） ----------
+
+def demucs_main(argv: List[str]) -> int:
+    model, out_dir, tracks = 'htdemucs', 'separated', []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ('-n', '--name'):
+            model, i = argv[i + 1], i + 2
+        elif arg in ('-o', '--out'):
+            out_dir, i = argv[i + 1], i + 2
+        elif arg.startswith('-'):
+            i += 2 if arg in ('--two-stems', '--device', '-j', '--shifts', '--overlap', '--segment') else 1
+        else:
+            tracks.append(arg)
+            i += 1
+
+    for track in tracks:
+        if not os.path.exists(track):
+            print(f'File {track} does not exist.', flush=True)
+            return 1
+        duration = media_duration(track) or _env_float('VIDEORECOMP_STUB_DURATION', 60.0)
+        print(f'Separated tracks will be stored in {os.path.abspath(os.path.join(out_dir, model))}', flush=True)
+        print(f'Separating track {track}', flush=True)
+
+        def report(fraction: float):
+            done = duration * fraction
+            print(f'{fraction * 100:3.0f}%|{"█" * int(fraction * 20):20s}| {done:.1f}/{duration:.1f}', flush=True)
+
+        simulate_work(duration / max(_env_float('VIDEORECOMP_STUB_DEMUCS_SPEED', 4.0), 0.001), report, tick=0.5)
+        _maybe_fail('demucs')
+        stem_dir = os.path.join(out_dir, model, os.path.splitext(os.path.basename(track))[0])
+        for stem in ('vocals', 'drums', 'bass', 'other'):
+            _write_output(os.path.join(stem_dir, f'{stem}.wav'), duration)
+    return 0
+
+
+# ---------- 安装 ----------
+
+def install(target_dir: str) -> dict:
+    """
+    写入假的可执行文件
+
+    Returns:
+        {'bin': 加到 PATH 前面的目录, 'python_path': 加到 PYTHONPATH 前面的目录}
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    bin_dir = os.path.join(target_dir, 'bin')
+    package_dir = os.path.join(target_dir, 'py', 'demucs')
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(package_dir, exist_ok=True)
+
+    launcher = (
+        f'#!{sys.executable}\n'
+        f'import sys\n'
+        f'sys.path.insert(0, {here!r})\n'
+        f'from stub_media import {{func}}\n'
+        f'sys.exit({{func}}(sys.argv[1:]))\n'
+    )
+    for tool in ('ffmpeg', 'ffprobe'):
+        path = os.path.join(bin_dir, tool)
+        with open(path, 'w') as f:
+            f.write(launcher.format(func=f'{tool}_main'))
+        os.chmod(path, 0o755)
+    with open(os.path.join(package_dir, '__init__.py'), 'w') as f:
+        f.write('')
+    with open(os.path.join(package_dir, '__main__.py'), 'w') as f:
+        f.write(launcher.replace(f'#!{sys.executable}\n', '').format(func='demucs_main'))
+    return {'bin': bin_dir, 'python_path': os.path.dirname(package_dir)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'install':
+        paths = install(os.path.abspath(sys.argv[2]))
+        print(f"export PATH={paths['bin']}:$PATH PYTHONPATH={paths['python_path']}")
+    else:
+        print(__doc__)
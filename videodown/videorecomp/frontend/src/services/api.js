@@ -22,6 +22,61 @@ export function uploadFiles(formData, onProgress) {
   })
 }
 
+// 分块上传单个文件（可续传），返回 {sha256, size, filename, deduplicated}
+// 之后在表单中用 `<字段名>_blob` 传入 sha256 即可引用，无需重复上传
+export async function uploadFileChunked(file, kind = 'other', onProgress) {
+  const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`
+  let session = null
+
+  // 续传：沿用上次未完成的会话
+  const savedId = localStorage.getItem(resumeKey)
+  if (savedId) {
+    try {
+      session = (await api.get(`/uploads/${savedId}`)).data
+    } catch (error) {
+      localStorage.removeItem(resumeKey)
+    }
+  }
+
+  if (!session) {
+    const response = await api.post('/uploads', { filename: file.name, size: file.size, kind })
+    if (response.data.deduplicated) {
+      onProgress && onProgress(100)
+      return response.data
+    }
+    session = response.data
+    localStorage.setItem(resumeKey, session.upload_id)
+  }
+
+  const chunkSize = session.chunk_size || 8 * 1024 * 1024
+  let offset = session.offset || 0
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + chunkSize)
+    try {
+      const response = await api.put(`/uploads/${session.upload_id}`, chunk, {
+        params: { offset },
+        headers: { 'Content-Type': 'application/octet-stream' }
+      })
+      offset = response.data.offset
+    } catch (error) {
+      // 偏移量不一致时按服务器的 offset 继续
+      if (error.response?.status === 409 && error.response.data.offset != null) {
+        offset = error.response.data.offset
+        continue
+      }
+      if (error.response?.status === 422 || error.response?.status === 404) {
+        localStorage.removeItem(resumeKey)
+      }
+      throw error
+    }
+    onProgress && onProgress(Math.round((offset * 100) / file.size))
+  }
+
+  const result = await api.post(`/uploads/${session.upload_id}/complete`)
+  localStorage.removeItem(resumeKey)
+  return result.data
+}
+
 // 处理视频
 export function processVideo(taskId) {
   return api.post(`/process/${taskId}`)
@@ -32,6 +87,26 @@ export function getTaskStatus(taskId) {
   return api.get(`/status/${taskId}`)
 }
 
+// 订阅任务进度推送（SSE），返回取消订阅函数
+// onUpdate 收到 {status, progress, message, error, progress_detail, queue_position, eta_seconds}
+export function subscribeTaskEvents(taskId, onUpdate, onEnd, onError) {
+  const source = new EventSource(`${api.defaults.baseURL}/events/${taskId}`)
+  source.addEventListener('progress', (event) => {
+    onUpdate && onUpdate(JSON.parse(event.data))
+  })
+  source.addEventListener('end', (event) => {
+    source.close()
+    onEnd && onEnd(JSON.parse(event.data))
+  })
+  source.onerror = (error) => {
+    // 连接断开时浏览器会自动重连，任务不存在（404）时直接关闭
+    if (source.readyState === EventSource.CLOSED) {
+      onError && onError(error)
+    }
+  }
+  return () => source.close()
+}
+
 // 下载视频
 export function downloadVideo(taskId, type = 'soft') {
   return api.get(`/download/${taskId}/${type}`, {
@@ -56,6 +131,13 @@ export function analyzeSubtitles(formData) {
   })
 }
 
+// 分页获取字幕分析明细（format: rows / columnar / timeline）
+export function getSubtitleAnalysisDetails(analysisId, offset = 0, limit = 100, format = 'rows') {
+  return api.get(`/analyze-subtitles/${analysisId}/details`, {
+    params: { offset, limit, format }
+  })
+}
+
 // 增强剪辑上传
 export function uploadEnhancedClip(formData, onProgress) {
   return api.post('/enhanced-clip', formData, {
@@ -11,7 +11,9 @@ from pathlib import Path
 # 添加src目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.video_processor import create_video_recomposer
+from encoding_profiles import PROFILES, DEFAULT_PROFILE
+
+# video_processor 会加载 MoviePy / Pillow，参数检查通过后才导入（--help 和参数错误不用等）
 
 
 def main():
@@ -29,6 +31,12 @@ def main():
 
   # 使用相对路径
   python main.py -v input/original.mp4 -s subs/translated.srt -a voiceover.zip
+
+  # 快速出审片版本
+  python main.py -v video.mp4 -s subtitles.srt -a audio.zip --encoding-profile draft
+
+  # 在 360p 代理上预览（代理会缓存，时间轴与原视频一致）
+  python main.py -v video.mp4 -s subtitles.srt -a audio.zip --preview
         """
     )
 
@@ -107,6 +115,19 @@ def main():
         help='（已废弃）AI 音频分离现在默认自动执行'
     )
 
+    parser.add_argument(
+        '--encoding-profile',
+        choices=list(PROFILES),
+        default=None,
+        help=f'编码档位: draft 审片最快 / balanced 默认 / archive 存档高画质（默认: {DEFAULT_PROFILE}，预览时 draft）'
+    )
+
+    parser.add_argument(
+        '--preview',
+        action='store_true',
+        help='在低分辨率代理上快速预览（代理按视频缓存，字幕时间与原视频一致）'
+    )
+
     args = parser.parse_args()
 
     # 转换为绝对路径
@@ -150,15 +171,31 @@ def main():
             'primary_colour': args.text_color,
             'outline_colour': args.outline_color,
         }
+        encoding_profile = args.encoding_profile or DEFAULT_PROFILE
+
+        # 预览：改用低分辨率代理，字号、边距按高度比例缩小
+        if args.preview:
+            from proxy_media import ProxyCache, PREVIEW_PROFILE, scale_subtitle_config, video_height
+
+            proxy_path = ProxyCache().get_proxy(video_path)
+            source_height, proxy_height = video_height(video_path), video_height(proxy_path)
+            if source_height and proxy_height:
+                subtitle_style = scale_subtitle_config(subtitle_style, proxy_height / source_height)
+            video_path = proxy_path
+            encoding_profile = args.encoding_profile or PREVIEW_PROFILE
+            print(f"🎞️  预览模式：使用代理 {proxy_path}")
 
         # 创建处理器
+        from src.video_processor import create_video_recomposer
+
         recomposer = create_video_recomposer(
             original_video=video_path,
             srt_file=srt_path,
             audio_zip=audio_path,
             output_dir=output_dir,
             subtitle_style=subtitle_style,
-            enable_ai_separation=args.separate_audio
+            enable_ai_separation=args.separate_audio,
+            encoding_profile=encoding_profile
         )
 
         # 提取原视频音轨（默认已启用）
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3.12
+"""
+任务协作式取消
+
+每个任务执行时绑定一个 CancelToken：
+- 处理流程在阶段边界、逐帧循环和进度回调里调用 check_cancelled()，取消后抛出 TaskCancelled；
+- 任务启动的 ffmpeg / Demucs 子进程各自在独立的进程组里运行并登记到令牌上，
+  取消时整组发 SIGTERM，宽限期后仍未退出的发 SIGKILL，连同它们派生的子进程一起结束。
+
+TaskCancelled 继承 BaseException，处理函数里通用的 except Exception 不会把取消当成失败吞掉。
+"""
+
+import os
+import signal
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Set
+
+
+# SIGTERM 之后等待进程组退出的时间（秒），超时发 SIGKILL
+KILL_GRACE_SECONDS = 0.5
+
+_local = threading.local()
+
+
+class TaskCancelled(BaseException):
+    """任务已被取消"""
+
+    def __init__(self, task_id: Optional[str] = None, reason: str = ''):
+        super().__init__(f"任务 {task_id} 已取消" + (f"（{reason}）" if reason else ''))
+        self.task_id = task_id
+        self.reason = reason
+
+
+def popen_kwargs() -> Dict:
+    """子进程放进独立的进程组，取消时可以连同它派生的进程一起结束"""
+    return {'start_new_session': True} if os.name == 'posix' else {}
+
+
+def _signal_group(process: subprocess.Popen, sig: int):
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, sig)
+        elif sig == getattr(signal, 'SIGKILL', None):
+            process.kill()
+        else:
+            process.terminate()
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def kill_process_tree(process: subprocess.Popen, grace: float = KILL_GRACE_SECONDS):
+    """
+    结束子进程所在的进程组
+
+    Args:
+        process: 以 popen_kwargs() 启动的子进程
+        grace: SIGTERM 后等待的秒数，之后发 SIGKILL
+    """
+    if process.poll() is not None:
+        return
+    _signal_group(process, signal.SIGTERM)
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    # 主进程退出后组里可能还有残留的子进程，一并 SIGKILL
+    _signal_group(process, getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+
+class CancelToken:
+    """单个任务的取消令牌"""
+
+    def __init__(self, task_id: Optional[str] = None):
+        self.task_id = task_id
+        self.reason = ''
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: Set[subprocess.Popen] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = ''):
+        """取消任务并结束已登记的子进程（可重复调用）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            processes = list(self._processes)
+        for process in processes:
+            kill_process_tree(process)
+
+    def check(self):
+        """已取消时抛出 TaskCancelled"""
+        if self._event.is_set():
+            raise TaskCancelled(self.task_id, self.reason)
+
+    def register(self, process: subprocess.Popen):
+        """登记子进程（已取消时立即结束它）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._processes.add(process)
+                return
+        kill_process_tree(process)
+
+    def unregister(self, process: subprocess.Popen):
+        with self._lock:
+            self._processes.discard(process)
+
+    def watch(self, is_cancelled: Callable[[], bool], interval: float = 0.25) -> Callable[[], None]:
+        """
+        后台轮询取消条件（例如任务记录已被删除），满足时取消任务
+
+        Args:
+            is_cancelled: 返回 True 表示应取消
+            interval: 轮询间隔（秒）
+
+        Returns:
+            停止轮询的函数
+        """
+        stopped = threading.Event()
+
+        def loop():
+            while not stopped.wait(interval) and not self._event.is_set():
+                try:
+                    if is_cancelled():
+                        self.cancel('已请求取消')
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=loop, name=f'cancel-watch-{self.task_id}', daemon=True)
+        thread.start()
+        return stopped.set
+
+
+# ---------- 线程绑定 ----------
+
+def current_token() -> Optional[CancelToken]:
+    """当前线程绑定的取消令牌"""
+    return getattr(_local, 'token', None)
+
+
+@contextmanager
+def bind_token(token: Optional[CancelToken]):
+    """在 with 语句内把取消令牌绑定到当前线程"""
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def check_cancelled():
+    """当前任务已取消时抛出 TaskCancelled（未绑定令牌时什么都不做）"""
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def tracked_process(process: subprocess.Popen):
+    """
+    在 with 语句内把子进程登记到当前令牌；退出时子进程还在运行（出错或取消）就结束它
+
+    取消导致子进程退出时，离开 with 语句会抛出 TaskCancelled
+    """
+    token = current_token()
+    if token is not None:
+        token.register(process)
+    try:
+        yield process
+    finally:
+        if token is not None:
+            token.unregister(process)
+        if process.poll() is None:
+            kill_process_tree(process, grace=0)
+    check_cancelled()
+
@@ -6,14 +6,18 @@
 
 import os
 import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import pysrt
-import chardet
 from tqdm import tqdm
 
+from subtitle_alignment import SubtitleAligner
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe
+from scratch_space import scratch_dir, estimate_bytes
+from encoding_profiles import get_profile
+
 
 class CompactVideoClipper:
     """紧凑视频剪辑器 - 累积偏移算法"""
@@ -24,7 +28,8 @@ class CompactVideoClipper:
         original_srt_path: str,
         new_srt_path: str,
         output_dir: str = "output",
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         """
         初始化紧凑剪辑器
@@ -35,6 +40,7 @@ class CompactVideoClipper:
             new_srt_path: 新字幕路径
             output_dir: 输出目录
             use_precise_seek: 是否使用精确seek
+            encoding_profile: 精确模式重新编码使用的编码档位（默认当前任务绑定的档位）
         """
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -42,18 +48,16 @@ class CompactVideoClipper:
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.use_precise_seek = use_precise_seek
+        self.profile = get_profile(encoding_profile)
 
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="compact_clip_"))
+        # 切出的片段放在临时工作区（大小与原视频相当，放得下时用内存盘）
+        self.temp_dir = Path(scratch_dir("compact_clip_", estimate_bytes(video_path, factor=1.5)))
         self.original_subs = None
         self.new_subs = None
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -75,7 +79,7 @@ class CompactVideoClipper:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             duration = float(info['format']['duration'])
@@ -83,74 +87,6 @@ class CompactVideoClipper:
         except:
             return 0.0
 
-    def find_matching_original_subtitle(
-        self,
-        new_sub: pysrt.SubRipItem,
-        cumulative_offset: float,
-        used_indices: set
-    ) -> Optional[Tuple[int, pysrt.SubRipItem]]:
-        """
-        为新字幕找到最佳匹配的原字幕（考虑累积偏移）
-
-        Args:
-            new_sub: 新字幕
-            cumulative_offset: 累积时间偏移（秒）
-            used_indices: 已使用的原字幕索引
-
-        Returns:
-            (原字幕索引, 原字幕) 或 None
-        """
-        new_start = new_sub.start.ordinal / 1000.0
-        new_end = new_sub.end.ordinal / 1000.0
-        new_text = new_sub.text.lower().strip()
-
-        best_match = None
-        best_score = 0
-        best_index = -1
-
-        # 考虑累积偏移后的目标时间
-        target_start = new_start + cumulative_offset
-        target_end = new_end + cumulative_offset
-
-        for idx, orig_sub in enumerate(self.original_subs):
-            # 跳过已使用的字幕
-            if idx in used_indices:
-                continue
-
-            orig_start = orig_sub.start.ordinal / 1000.0
-            orig_end = orig_sub.end.ordinal / 1000.0
-            orig_text = orig_sub.text.lower().strip()
-
-            # 计算时间接近度得分
-            time_diff = abs(orig_start - target_start)
-            if time_diff > 10:  # 时间差超过10秒，不太可能匹配
-                continue
-
-            # 计算文本相似度（简单版）
-            text_similarity = 0
-            if new_text and orig_text:
-                # 检查是否有相同的词
-                new_words = set(new_text.split())
-                orig_words = set(orig_text.split())
-                if new_words & orig_words:  # 有交集
-                    text_similarity = len(new_words & orig_words) / max(len(new_words), 1)
-
-            # 综合得分（时间接近度 + 文本相似度）
-            # 时间越近得分越高，文本越相似得分越高
-            time_score = max(0, 1 - time_diff / 10)  # 0-1之间
-            total_score = time_score * 0.7 + text_similarity * 0.3
-
-            if total_score > best_score:
-                best_score = total_score
-                best_match = orig_sub
-                best_index = idx
-
-        # 只接受得分足够高的匹配
-        if best_score > 0.3:
-            return best_index, best_match
-
-        return None
-
     def calculate_compact_segments(self) -> Tuple[List[Tuple[float, float]], Dict]:
         """
         计算紧凑的视频片段（累积偏移算法）
@@ -163,11 +99,21 @@ class CompactVideoClipper:
 
         video_duration = self.get_video_duration()
         segments = []
-        used_indices = set()
         cumulative_offset = 0.0  # 累积时间偏移
 
         print("\n使用累积偏移算法分析字幕...")
 
+        # 带状DP全局对齐：时间接近度*0.7 + 文本相似度*0.3，时间窗口10秒（自动跟踪累积偏移）
+        aligner = SubtitleAligner(
+            time_weight=0.7,
+            text_weight=0.3,
+            duration_weight=0.0,
+            time_window=10.0,
+            band=24,
+            min_score=0.3
+        )
+        matches = {j: idx for j, idx, _ in aligner.align_subs(self.original_subs, self.new_subs)}
+
         # 记录每条字幕的处理信息
         processing_log = []
 
@@ -177,14 +123,8 @@ class CompactVideoClipper:
             new_duration = new_end - new_start
 
             # 找到匹配的原字幕
-            match_result = self.find_matching_original_subtitle(
-                new_sub,
-                cumulative_offset,
-                used_indices
-            )
-
-            if match_result:
-                orig_idx, orig_sub = match_result
+            if i in matches:
+                orig_sub = self.original_subs[matches[i]]
 
                 orig_start = orig_sub.start.ordinal / 1000.0
                 orig_end = orig_sub.end.ordinal / 1000.0
@@ -200,7 +140,6 @@ class CompactVideoClipper:
 
                 if clip_end > clip_start:
                     segments.append((clip_start, clip_end))
-                    used_indices.add(orig_idx)
 
                     # 更新累积偏移
                     # 如果新字幕更短，后面的字幕需要向前移
@@ -251,7 +190,8 @@ class CompactVideoClipper:
 
         print(f"\n提取视频片段（使用{'精确' if self.use_precise_seek else '快速'}模式）...")
 
-        for i, (start, end) in enumerate(tqdm(segments, desc="提取片段")):
+        cmds = []
+        for i, (start, end) in enumerate(segments):
             temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
             duration = end - start
 
@@ -261,10 +201,8 @@ class CompactVideoClipper:
                     '-ss', str(start),
                     '-i', self.video_path,
                     '-t', str(duration),
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
+                    *self.profile.video_args(),
+                    *self.profile.audio_args(),
                     '-loglevel', 'error',
                     str(temp_segment)
                 ]
@@ -280,22 +218,20 @@ class CompactVideoClipper:
                     str(temp_segment)
                 ]
 
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-
-                if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
-                    segment_files.append(str(temp_segment))
-                else:
-                    print(f"  ⚠️  片段{i+1}提取失败")
-            except subprocess.TimeoutExpired:
+            cmds.append(cmd)
+
+        # 各片段互不依赖，同时提取
+        results = run_ffmpeg_many(cmds, timeout=300)
+        for i, result in enumerate(results):
+            temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
+            if isinstance(result, subprocess.TimeoutExpired):
                 print(f"  ⚠️  片段{i+1}提取超时")
-            except Exception as e:
-                print(f"  ⚠️  片段{i+1}提取出错: {e}")
+            elif isinstance(result, Exception):
+                print(f"  ⚠️  片段{i+1}提取出错: {result}")
+            elif result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
+                segment_files.append(str(temp_segment))
+            else:
+                print(f"  ⚠️  片段{i+1}提取失败")
 
         return segment_files
 
@@ -323,7 +259,7 @@ class CompactVideoClipper:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = run_ffmpeg(cmd, timeout=600)
 
             if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
                 print(f"✅ 视频拼接成功: {output_path}")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3.12
+"""
+剪辑决策列表（EDL） - 虚拟记录剪切与冻结帧插入，最后一次性渲染
+
+所有调整只修改内存中的片段列表，不产生中间视频；
+片段在输出时间轴上的起点以前缀和保存，定位用 bisect（O(log n)）；
+每次调整要重建该片段之后的前缀和（O(n - i)），按时间顺序调整时后面通常只剩一个原视频片段。
+"""
+
+import json
+import bisect
+from typing import List, Dict
+
+
+class EditDecisionList:
+    """剪辑决策列表"""
+
+    def __init__(self, source_path: str, source_duration: float):
+        self.source_path = source_path
+        self.source_duration = source_duration
+
+        # 片段列表：{'type': 'source', 'start', 'end'} 或 {'type': 'freeze', 'at', 'duration'}
+        self.pieces: List[Dict] = []
+        if source_duration > 0:
+            self.pieces.append({'type': 'source', 'start': 0.0, 'end': source_duration})
+
+        # 前缀和：offsets[i] 为第 i 个片段在输出时间轴上的起点
+        self.offsets: List[float] = [0.0]
+        self._rebuild_offsets(0)
+
+        # 操作记录（用于导出）
+        self.operations: List[Dict] = []
+
+    @staticmethod
+    def piece_duration(piece: Dict) -> float:
+        """片段时长"""
+        if piece['type'] == 'source':
+            return piece['end'] - piece['start']
+        return piece['duration']
+
+    def _rebuild_offsets(self, from_piece: int):
+        """从指定片段开始重建前缀和（O(n - from_piece)，调整发生在末尾时代价很小）"""
+        del self.offsets[from_piece + 1:]
+        for piece in self.pieces[from_piece:]:
+            self.offsets.append(self.offsets[-1] + self.piece_duration(piece))
+
+    @property
+    def duration(self) -> float:
+        """输出总时长"""
+        return self.offsets[-1]
+
+    def _locate(self, out_time: float) -> int:
+        """返回包含输出时间点的片段索引"""
+        index = bisect.bisect_right(self.offsets, out_time) - 1
+        return max(0, min(index, len(self.pieces) - 1))
+
+    def _split_at(self, out_time: float) -> int:
+        """
+        在输出时间点处切分片段
+
+        Returns:
+            切分点之后第一个片段的索引
+        """
+        if out_time <= 0:
+            return 0
+        if out_time >= self.duration:
+            return len(self.pieces)
+
+        index = self._locate(out_time)
+        local = out_time - self.offsets[index]
+        if local <= 1e-6:
+            return index
+
+        piece = self.pieces[index]
+        if local >= self.piece_duration(piece) - 1e-6:
+            return index + 1
+
+        if piece['type'] == 'source':
+            left = {'type': 'source', 'start': piece['start'], 'end': piece['start'] + local}
+            right = {'type': 'source', 'start': piece['start'] + local, 'end': piece['end']}
+        else:
+            left = {'type': 'freeze', 'at': piece['at'], 'duration': local}
+            right = {'type': 'freeze', 'at': piece['at'], 'duration': piece['duration'] - local}
+
+        self.pieces[index:index + 1] = [left, right]
+        self._rebuild_offsets(index)
+        return index + 1
+
+    def source_time_at(self, out_time: float) -> float:
+        """将输出时间映射回原视频时间"""
+        if not self.pieces:
+            return 0.0
+        index = self._locate(out_time)
+        piece = self.pieces[index]
+        if piece['type'] == 'freeze':
+            return piece['at']
+        local = min(max(0.0, out_time - self.offsets[index]), self.piece_duration(piece))
+        return piece['start'] + local
+
+    def cut(self, out_start: float, out_end: float) -> float:
+        """
+        剪掉输出时间轴上的 [out_start, out_end]
+
+        Returns:
+            实际剪掉的时长（秒）
+        """
+        out_start = max(0.0, out_start)
+        out_end = min(self.duration, out_end)
+        if out_end <= out_start:
+            return 0.0
+
+        first = self._split_at(out_start)
+        last = self._split_at(out_end)
+        removed = self.offsets[last] - self.offsets[first]
+
+        del self.pieces[first:last]
+        self._rebuild_offsets(first)
+
+        self.operations.append({
+            'action': 'cut',
+            'out_start': round(out_start, 3),
+            'out_end': round(out_end, 3),
+            'removed': round(removed, 3)
+        })
+        return removed
+
+    def insert_freeze(self, out_point: float, duration: float) -> float:
+        """
+        在输出时间点前插入冻结帧（使用该点的原视频画面）
+
+        Returns:
+            实际插入的时长（秒）
+        """
+        if duration <= 0:
+            return 0.0
+
+        out_point = min(max(0.0, out_point), self.duration)
+        source_time = self.source_time_at(out_point)
+        index = self._split_at(out_point)
+
+        self.pieces.insert(index, {'type': 'freeze', 'at': source_time, 'duration': duration})
+        self._rebuild_offsets(index)
+
+        self.operations.append({
+            'action': 'freeze',
+            'out_point': round(out_point, 3),
+            'source_time': round(source_time, 3),
+            'duration': round(duration, 3)
+        })
+        return duration
+
+    def render_plan(self) -> List[Dict]:
+        """
+        生成渲染计划：合并相邻的连续原视频片段，去掉零长度片段
+        """
+        plan = []
+        for piece in self.pieces:
+            if self.piece_duration(piece) <= 1e-3:
+                continue
+            if plan and piece['type'] == 'source' and plan[-1]['type'] == 'source' \
+                    and abs(plan[-1]['end'] - piece['start']) < 1e-6:
+                plan[-1] = dict(plan[-1], end=piece['end'])
+            else:
+                plan.append(dict(piece))
+        return plan
+
+    def to_dict(self) -> Dict:
+        """导出为字典"""
+        return {
+            'source': self.source_path,
+            'source_duration': self.source_duration,
+            'output_duration': self.duration,
+            'operations': self.operations,
+            'pieces': self.render_plan()
+        }
+
+    def export_json(self, output_path: str) -> str:
+        """导出为JSON文件"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return str(output_path)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EditDecisionList':
+        """从导出的字典恢复"""
+        edl = cls(data['source'], data['source_duration'])
+        edl.pieces = [dict(p) for p in data.get('pieces', [])]
+        edl.operations = list(data.get('operations', []))
+        edl._rebuild_offsets(0)
+        return edl
+
+    @classmethod
+    def load_json(cls, json_path: str) -> 'EditDecisionList':
+        """从JSON文件加载"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3.12
+"""
+编码档位（速度 / 质量预设）
+
+所有重新编码的输出（VideoRecomposer 的 write_videofile、硬字幕烧录、剪辑器精确模式、静帧填充）
+都从这里取视频编码器、preset、CRF、线程数、音频编码和码率、faststart：
+- draft:    审片用，ultrafast + CRF 28，编码速度约为 balanced 的 5~10 倍
+- balanced: 默认，fast + CRF 23（与原来剪辑器精确模式的参数一致）
+- archive:  成片存档，slow + CRF 18，音频码率更高，线程数减半（长时间批量任务不挤占其他任务）
+
+处理模块在构造时接受档位名；没有指定时使用当前线程绑定的档位（任务执行时由 bind_profile 绑定），
+都没有时使用默认档位。
+
+环境变量：
+    VIDEORECOMP_ENCODING_PROFILE   默认档位（默认 balanced）
+    VIDEORECOMP_ENCODE_THREADS     覆盖所有档位的编码线程数（0 = 由编码器决定）
+"""
+
+import os
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+from cancellation import popen_kwargs, current_token, check_cancelled
+from task_trace import begin_span, end_span
+
+
+_local = threading.local()
+
+
+def _threads(default: int) -> int:
+    override = os.environ.get('VIDEORECOMP_ENCODE_THREADS', '')
+    return int(override) if override.strip().isdigit() else default
+
+
+class EncodingProfile:
+    """一组编码参数"""
+
+    def __init__(self, name: str, description: str, video_codec: str, preset: str, crf: int, threads: int,
+                 audio_codec: str, audio_bitrate: str, faststart: bool):
+        self.name = name
+        self.description = description
+        self.video_codec = video_codec
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+        self.faststart = faststart
+
+    def video_args(self) -> List[str]:
+        """ffmpeg 视频编码参数"""
+        args = ['-c:v', self.video_codec, '-preset', self.preset, '-crf', str(self.crf), '-pix_fmt', 'yuv420p']
+        if self.threads:
+            args += ['-threads', str(self.threads)]
+        return args
+
+    def audio_args(self) -> List[str]:
+        """ffmpeg 音频编码参数"""
+        return ['-c:a', self.audio_codec, '-b:a', self.audio_bitrate]
+
+    def container_args(self) -> List[str]:
+        """ffmpeg 容器参数（faststart：moov 放到文件头，浏览器可以边下边播）"""
+        return ['-movflags', '+faststart'] if self.faststart else []
+
+    def output_args(self) -> List[str]:
+        """视频 + 音频 + 容器参数"""
+        return self.video_args() + self.audio_args() + self.container_args()
+
+    def moviepy_kwargs(self) -> Dict:
+        """MoviePy write_videofile 的编码参数"""
+        return {
+            'codec': self.video_codec,
+            'preset': self.preset,
+            'threads': self.threads or None,
+            'audio_codec': self.audio_codec,
+            'audio_bitrate': self.audio_bitrate,
+            'ffmpeg_params': ['-crf', str(self.crf), '-pix_fmt', 'yuv420p'] + self.container_args(),
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'video_codec': self.video_codec,
+            'preset': self.preset,
+            'crf': self.crf,
+            'threads': self.threads,
+            'audio_codec': self.audio_codec,
+            'audio_bitrate': self.audio_bitrate,
+            'faststart': self.faststart,
+        }
+
+
+PROFILES: Dict[str, EncodingProfile] = {
+    'draft': EncodingProfile(
+        'draft', '审片：最快编码，画质较低', 'libx264', 'ultrafast', 28, _threads(0), 'aac', '96k', True),
+    'balanced': EncodingProfile(
+        'balanced', '默认：速度和画质平衡', 'libx264', 'fast', 23, _threads(0), 'aac', '192k', True),
+    'archive': EncodingProfile(
+        'archive', '存档：高画质，编码最慢', 'libx264', 'slow', 18, _threads(max(1, (os.cpu_count() or 2) // 2)),
+        'aac', '256k', False),
+}
+
+DEFAULT_PROFILE = os.environ.get('VIDEORECOMP_ENCODING_PROFILE', 'balanced').lower()
+if DEFAULT_PROFILE not in PROFILES:
+    DEFAULT_PROFILE = 'balanced'
+
+
+def get_profile(name: Union[str, EncodingProfile, None] = None) -> EncodingProfile:
+    """
+    按名称取编码档位
+
+    Args:
+        name: 档位名（不区分大小写）、EncodingProfile 或 None（使用当前线程绑定的档位或默认档位）
+
+    Returns:
+        EncodingProfile
+
+    Raises:
+        ValueError: 未知的档位名
+    """
+    if isinstance(name, EncodingProfile):
+        return name
+    if not name:
+        return current_profile()
+    try:
+        return PROFILES[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"未知的编码档位: {name}（可选: {', '.join(PROFILES)}）")
+
+
+# ---------- 线程绑定 ----------
+
+def current_profile() -> EncodingProfile:
+    """当前线程绑定的编码档位（未绑定时为默认档位）"""
+    return getattr(_local, 'profile', None) or PROFILES[DEFAULT_PROFILE]
+
+
+@contextmanager
+def bind_profile(profile: Union[str, EncodingProfile, None]):
+    """在 with 语句内把编码档位绑定到当前线程"""
+    previous = getattr(_local, 'profile', None)
+    _local.profile = get_profile(profile) if profile else previous
+    try:
+        yield current_profile()
+    finally:
+        _local.profile = previous
+
+
+# ---------- 逐帧编码 ----------
+
+class FrameWriter:
+    """
+    逐帧写入视频（替代 cv2.VideoWriter 的 mp4v 输出）
+
+    BGR 帧通过管道交给 ffmpeg，按编码档位编码；指定 audio_source 时同时复制它的音轨，
+    省去先写无声视频、再合并音轨的第二遍。ffmpeg 进程登记到当前任务的取消令牌上。
+    """
+
+    def __init__(self, output_path: str, fps: float, size: Tuple[int, int],
+                 profile: Union[str, EncodingProfile, None] = None, audio_source: Optional[str] = None):
+        """
+        Args:
+            output_path: 输出视频路径
+            fps: 帧率
+            size: (宽, 高)
+            profile: 编码档位（默认当前线程绑定的档位）
+            audio_source: 音轨来源文件（可选，没有音轨时忽略）
+        """
+        width, height = size
+        self.profile = get_profile(profile)
+        self.output_path = output_path
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:.6f}',
+            '-i', 'pipe:0'
+        ]
+        if audio_source:
+            cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0?']
+        cmd += self.profile.video_args()
+        if audio_source:
+            cmd += self.profile.audio_args() + ['-shortest']
+        else:
+            cmd += ['-an']
+        cmd += self.profile.container_args() + [output_path]
+        self.cmd = cmd
+
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr, **popen_kwargs()
+        )
+        self._token = current_token()
+        if self._token is not None:
+            self._token.register(self.process)
+        self._span = begin_span(f'ffmpeg encode ({self.profile.name})', 'ffmpeg', child_pid=self.process.pid, argv=cmd)
+        self._broken = False
+
+    def isOpened(self) -> bool:
+        return self.process.poll() is None and not self._broken
+
+    def write(self, frame):
+        """写入一帧（numpy uint8 数组，BGR，尺寸与构造时一致）"""
+        if self._broken:
+            return
+        try:
+            self.process.stdin.write(frame.data if frame.flags['C_CONTIGUOUS'] else frame.tobytes())
+        except (BrokenPipeError, ValueError):
+            # ffmpeg 已退出（出错或被取消），错误在 release() 时报告
+            self._broken = True
+
+    def release(self):
+        """
+        写完所有帧后调用：等待 ffmpeg 完成编码
+
+        Raises:
+            subprocess.CalledProcessError: ffmpeg 失败
+            TaskCancelled: 任务已取消
+        """
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self.process.wait()
+        self._finish(returncode)
+        check_cancelled()
+        if returncode != 0:
+            self._stderr.seek(0)
+            stderr = self._stderr.read().decode('utf-8', errors='replace')
+            self._stderr.close()
+            raise subprocess.CalledProcessError(returncode, self.cmd, stderr=stderr)
+        self._stderr.close()
+
+    def abort(self):
+        """放弃编码（出错时）：结束 ffmpeg"""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self._finish(self.process.returncode)
+        if not self._stderr.closed:
+            self._stderr.close()
+
+    def _finish(self, returncode: Optional[int]):
+        if self._token is not None:
+            self._token.unregister(self.process)
+            self._token = None
+        if self._span is not None:
+            end_span(self._span, returncode=returncode)
+            self._span = None
+
+    def __del__(self):
+        # 调用方出错没有 release() 时，不留下等待输入的 ffmpeg
+        process = getattr(self, 'process', None)
+        if process is not None and process.poll() is None:
+            self.abort()
@@ -4,15 +4,24 @@
 """
 
 import os
+import time
 import subprocess
-import tempfile
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Callable
 import pysrt
-import chardet
 from tqdm import tqdm
 
+from subtitle_alignment import CueTimeIndex, cues_from_subs
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe
+from scratch_space import scratch_dir, estimate_bytes
+from cancellation import CancelToken, TaskCancelled, bind_token, current_token
+from task_trace import TaskTrace, bind_trace, current_trace
+from encoding_profiles import EncodingProfile, bind_profile, current_profile, get_profile
+
 
 class EnhancedVideoClipper:
     """增强的视频剪辑器"""
@@ -24,7 +33,8 @@ class EnhancedVideoClipper:
         new_srt_path: str,
         output_dir: str = "output",
         merge_gap: float = 2.0,
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         """
         初始化剪辑器
@@ -36,6 +46,7 @@ class EnhancedVideoClipper:
             output_dir: 输出目录
             merge_gap: 合并间隙阈值（秒）
             use_precise_seek: 是否使用精确seek
+            encoding_profile: 精确模式重新编码使用的编码档位（默认当前任务绑定的档位）
         """
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -44,18 +55,16 @@ class EnhancedVideoClipper:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.merge_gap = merge_gap
         self.use_precise_seek = use_precise_seek
+        self.profile = get_profile(encoding_profile)
 
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="enhanced_clip_"))
+        # 切出的片段放在临时工作区（大小与原视频相当，放得下时用内存盘）
+        self.temp_dir = Path(scratch_dir("enhanced_clip_", estimate_bytes(video_path, factor=1.5)))
         self.original_subs = None
         self.new_subs = None
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -77,7 +86,7 @@ class EnhancedVideoClipper:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             duration = float(info['format']['duration'])
@@ -101,6 +110,9 @@ class EnhancedVideoClipper:
 
         print("\n分析字幕时间匹配...")
 
+        # 按开始时间建立索引，只检查时间上可能重叠的原字幕
+        orig_index = CueTimeIndex(cues_from_subs(self.original_subs))
+
         # 对每个新字幕，找到最佳匹配的原字幕片段
         for idx, new_sub in enumerate(tqdm(self.new_subs, desc="匹配字幕")):
             new_start = new_sub.start.ordinal / 1000.0
@@ -111,10 +123,11 @@ class EnhancedVideoClipper:
             best_overlap_duration = 0
             best_orig_idx = -1
 
-            for orig_idx, orig_sub in enumerate(self.original_subs):
+            for orig_idx in orig_index.overlapping(new_start, new_end):
                 if orig_idx in used_original_indices:
                     continue
 
+                orig_sub = self.original_subs[orig_idx]
                 orig_start = orig_sub.start.ordinal / 1000.0
                 orig_end = orig_sub.end.ordinal / 1000.0
 
@@ -178,7 +191,8 @@ class EnhancedVideoClipper:
 
         print(f"\n提取视频片段（使用{'精确' if self.use_precise_seek else '快速'}模式）...")
 
-        for i, (start, end) in enumerate(tqdm(segments, desc="提取片段")):
+        cmds = []
+        for i, (start, end) in enumerate(segments):
             temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
             duration = end - start
 
@@ -189,10 +203,8 @@ class EnhancedVideoClipper:
                     '-ss', str(start),
                     '-i', self.video_path,
                     '-t', str(duration),
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
+                    *self.profile.video_args(),
+                    *self.profile.audio_args(),
                     '-loglevel', 'error',
                     str(temp_segment)
                 ]
@@ -209,22 +221,20 @@ class EnhancedVideoClipper:
                     str(temp_segment)
                 ]
 
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
+            cmds.append(cmd)
 
-                if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
-                    segment_files.append(str(temp_segment))
-                else:
-                    print(f"  ⚠️  片段{i+1}提取失败")
-            except subprocess.TimeoutExpired:
+        # 各片段互不依赖，同时提取
+        results = run_ffmpeg_many(cmds, timeout=300)
+        for i, result in enumerate(results):
+            temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
+            if isinstance(result, subprocess.TimeoutExpired):
                 print(f"  ⚠️  片段{i+1}提取超时")
-            except Exception as e:
-                print(f"  ⚠️  片段{i+1}提取出错: {e}")
+            elif isinstance(result, Exception):
+                print(f"  ⚠️  片段{i+1}提取出错: {result}")
+            elif result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
+                segment_files.append(str(temp_segment))
+            else:
+                print(f"  ⚠️  片段{i+1}提取失败")
 
         return segment_files
 
@@ -262,7 +272,7 @@ class EnhancedVideoClipper:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = run_ffmpeg(cmd, timeout=600)
 
             if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
                 print(f"✅ 视频拼接成功: {output_path}")
@@ -329,19 +339,64 @@ class EnhancedVideoClipper:
             shutil.rmtree(self.temp_dir)
 
 
+# 批量处理资源预算
+DEFAULT_DISK_BANDWIDTH_MBPS = 400   # 磁盘可用带宽预算（MB/s）
+COPY_JOB_MBPS = 100                 # 单个流复制任务的大致读写速率（MB/s）
+
+
+def default_batch_workers(
+    task_count: int,
+    use_precise_seek: bool = False,
+    disk_bandwidth_mbps: Optional[float] = None
+) -> int:
+    """
+    根据 CPU 核数和磁盘带宽预算计算批量处理并发数
+
+    流复制（-c copy）以磁盘 I/O 为主，并发数受磁盘带宽限制；
+    精确模式需要重新编码，每个 ffmpeg 会占用多个核，按核数减半。
+
+    Args:
+        task_count: 任务数量
+        use_precise_seek: 是否精确模式
+        disk_bandwidth_mbps: 磁盘带宽预算（MB/s）
+
+    Returns:
+        并发数
+    """
+    cpu_count = os.cpu_count() or 1
+    if use_precise_seek:
+        workers = max(1, cpu_count // 2)
+    else:
+        bandwidth = disk_bandwidth_mbps or DEFAULT_DISK_BANDWIDTH_MBPS
+        workers = min(cpu_count * 2, max(1, int(bandwidth // COPY_JOB_MBPS)))
+    return max(1, min(workers, task_count))
+
+
 class BatchVideoProcessor:
-    """批量视频处理器"""
+    """批量视频处理器（线程池并发处理，单个失败不影响其它任务）"""
 
-    def __init__(self, output_dir: str = "output"):
+    def __init__(
+        self,
+        output_dir: str = "output",
+        max_workers: Optional[int] = None,
+        disk_bandwidth_mbps: Optional[float] = None
+    ):
         """
         初始化批量处理器
 
         Args:
             output_dir: 输出目录
+            max_workers: 最大并发数（默认按 CPU 核数和磁盘带宽计算）
+            disk_bandwidth_mbps: 磁盘带宽预算（MB/s）
         """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.disk_bandwidth_mbps = disk_bandwidth_mbps
         self.results = []
+        self.items: List[Dict] = []
+        self._lock = threading.Lock()
+        self._report_path: Optional[Path] = None
 
     def process_single(
         self,
@@ -349,7 +404,8 @@ class BatchVideoProcessor:
         original_srt_path: str,
         new_srt_path: str,
         merge_gap: float = 2.0,
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        output_name: Optional[str] = None
     ) -> Dict:
         """
         处理单个视频
@@ -360,12 +416,13 @@ class BatchVideoProcessor:
             new_srt_path: 新字幕路径
             merge_gap: 合并间隙阈值
             use_precise_seek: 是否精确模式
+            output_name: 输出子目录名（默认为视频文件名）
 
         Returns:
             处理结果
         """
         video_name = Path(video_path).stem
-        task_output_dir = self.output_dir / video_name
+        task_output_dir = self.output_dir / (output_name or video_name)
 
         clipper = EnhancedVideoClipper(
             video_path=video_path,
@@ -382,64 +439,147 @@ class BatchVideoProcessor:
 
         return result
 
+    def _run_item(self, index: int, task: Dict, merge_gap: float, use_precise_seek: bool, output_name: str,
+                  token: Optional[CancelToken] = None, trace: Optional[TaskTrace] = None,
+                  profile: Optional[EncodingProfile] = None) -> Dict:
+        """执行单个任务，异常转换为失败结果（取消除外）"""
+        with bind_token(token), bind_trace(trace), bind_profile(profile):
+            if token is not None:
+                token.check()
+            return self._run_item_bound(index, task, merge_gap, use_precise_seek, output_name)
+
+    def _run_item_bound(self, index: int, task: Dict, merge_gap: float, use_precise_seek: bool, output_name: str) -> Dict:
+        with self._lock:
+            self.items[index].update(status='processing', started_at=time.time())
+        try:
+            return self.process_single(
+                video_path=task['video_path'],
+                original_srt_path=task['original_srt_path'],
+                new_srt_path=task['new_srt_path'],
+                merge_gap=merge_gap,
+                use_precise_seek=use_precise_seek,
+                output_name=output_name
+            )
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'video_name': Path(task.get('video_path', '')).stem,
+                'video_path': task.get('video_path')
+            }
+
     def process_batch(
         self,
         tasks: List[Dict],
         merge_gap: float = 2.0,
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        report_name: Optional[str] = "batch_report.json"
     ) -> List[Dict]:
         """
-        批量处理多个视频
+        批量处理多个视频（并发执行，每完成一个就更新进度和报告）
 
         Args:
             tasks: 任务列表，每个任务包含 video_path, original_srt_path, new_srt_path
             merge_gap: 合并间隙阈值
             use_precise_seek: 是否精确模式
+            on_progress: 进度回调，参数为 {'index', 'result', 'done', 'total', 'items'}
+            report_name: 增量写入的报告文件名（None 表示不写）
 
         Returns:
-            处理结果列表
+            处理结果列表（与任务顺序一致）
         """
-        print(f"\n开始批量处理 {len(tasks)} 个视频...")
+        total = len(tasks)
+        workers = self.max_workers or default_batch_workers(total, use_precise_seek, self.disk_bandwidth_mbps)
+        print(f"\n开始批量处理 {total} 个视频（并发数: {workers}）...")
+
+        # 同名视频分配不同的输出目录，避免并发写入冲突
+        output_names, used = [], set()
+        for i, task in enumerate(tasks):
+            name = Path(task['video_path']).stem
+            if name in used:
+                name = f"{name}_{i + 1}"
+            used.add(name)
+            output_names.append(name)
+
+        self.items = [
+            {'index': i, 'video_path': task['video_path'], 'status': 'pending'}
+            for i, task in enumerate(tasks)
+        ]
+        self.results = [None] * total
+        self._report_path = self.output_dir / report_name if report_name else None
+        done = 0
+        # 工作线程沿用调用线程的取消令牌、执行追踪和编码档位，任务取消时尚未开始的视频直接跳过
+        token = current_token()
+        trace = current_trace()
+        profile = current_profile()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch_clip") as executor, \
+                tqdm(total=total, desc="批量处理") as progress_bar:
+            futures = {
+                executor.submit(self._run_item, i, task, merge_gap, use_precise_seek, output_names[i], token, trace, profile): i
+                for i, task in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except TaskCancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                done += 1
+
+                with self._lock:
+                    self.results[i] = result
+                    item = self.items[i]
+                    item['status'] = 'completed' if result.get('success') else 'failed'
+                    item['elapsed'] = round(time.time() - item.get('started_at', time.time()), 2)
+                    item.pop('started_at', None)
+                    self._write_report()
+
+                progress_bar.update(1)
+                if result.get('success'):
+                    print(f"  ✅ [{done}/{total}] 成功: {result.get('clipped_video')}")
+                else:
+                    print(f"  ❌ [{done}/{total}] 失败: {Path(tasks[i]['video_path']).name} - {result.get('error')}")
 
-        results = []
+                if on_progress:
+                    on_progress({'index': i, 'result': result, 'done': done, 'total': total, 'items': self.items})
 
-        for i, task in enumerate(tqdm(tasks, desc="批量处理")):
-            print(f"\n[{i+1}/{len(tasks)}] 处理: {Path(task['video_path']).name}")
+        return self.results
 
-            result = self.process_single(
-                video_path=task['video_path'],
-                original_srt_path=task['original_srt_path'],
-                new_srt_path=task['new_srt_path'],
-                merge_gap=merge_gap,
-                use_precise_seek=use_precise_seek
-            )
-
-            results.append(result)
+    def _build_report(self) -> Dict:
+        """根据当前结果生成报告（未完成的任务记为 pending/processing）"""
+        finished = [r for r in self.results if r is not None]
+        return {
+            'total': len(self.results),
+            'finished': len(finished),
+            'successful': sum(1 for r in finished if r.get('success')),
+            'failed': sum(1 for r in finished if not r.get('success')),
+            'items': self.items,
+            'results': finished
+        }
 
-            if result.get('success'):
-                print(f"  ✅ 成功: {result.get('clipped_video')}")
-            else:
-                print(f"  ❌ 失败: {result.get('error')}")
+    def _write_report(self):
+        """增量写入报告（先写临时文件再替换，读取方不会看到半成品）"""
+        if not self._report_path:
+            return
+        import json
 
-        self.results = results
-        return results
+        partial_path = self._report_path.with_suffix('.partial')
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(self._build_report(), f, ensure_ascii=False, indent=2)
+        os.replace(partial_path, self._report_path)
 
     def generate_report(self, output_path: str = "batch_report.json"):
         """生成批量处理报告"""
-        import json
-
-        report = {
-            'total': len(self.results),
-            'successful': sum(1 for r in self.results if r.get('success')),
-            'failed': sum(1 for r in self.results if not r.get('success')),
-            'results': self.results
-        }
-
-        report_path = self.output_dir / output_path
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        self._report_path = self.output_dir / output_path
+        with self._lock:
+            self._write_report()
+            report = self._build_report()
 
-        print(f"\n✅ 批量处理报告已保存: {report_path}")
+        print(f"\n✅ 批量处理报告已保存: {self._report_path}")
         print(f"   总计: {report['total']}")
         print(f"   成功: {report['successful']}")
         print(f"   失败: {report['failed']}")
@@ -0,0 +1,648 @@
+#!/usr/bin/env python3.12
+"""
+ffmpeg 进度解析与分阶段进度汇总
+
+run_ffmpeg 以 `-progress` 方式运行 ffmpeg，解析 out_time / speed / fps，
+按输出时长换算完成比例；逐帧循环和 MoviePy 写文件也上报同样的进度。
+子进程都交给 ffmpeg_runner 的事件循环运行，run_ffmpeg_many / run_probe_many 可以同时运行多个命令。
+所有进度都汇总到当前线程绑定的 ProgressTracker：每个阶段占总进度的一段区间，
+阶段可以嵌套，得到阶段进度、总进度和预计剩余时间。
+进度上报的同时检查当前任务是否已取消（见 cancellation），ffmpeg 进程登记到取消令牌上。
+每次 ffmpeg / ffprobe 调用和每个进度阶段的耗时、读写字节数记入 metrics，
+并作为 span 记入当前线程绑定的任务追踪（task_trace）。
+"""
+
+import re
+import time
+import threading
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, wait as futures_wait
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+from cancellation import check_cancelled, current_token
+from ffmpeg_runner import FFmpegResult, ProcessHandle, get_runner
+from metrics import FFMPEG_EXITS, FFMPEG_STARTED, TASK_STAGE_SECONDS, observe_stage, path_bytes
+from task_trace import begin_span, end_span, trace_complete
+
+
+_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+_PROGRESS_KEYS = ('out_time_us', 'out_time_ms', 'out_time', 'speed', 'fps', 'frame', 'progress')
+
+_local = threading.local()
+
+
+def parse_time(value: str) -> Optional[float]:
+    """解析 ffmpeg 时间参数（秒数或 HH:MM:SS.xx）"""
+    try:
+        parts = [float(p) for p in str(value).split(':')]
+    except ValueError:
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
+def _output_duration(cmd: List[str]) -> Optional[float]:
+    """从命令行的 -t / -to 参数推断输出时长"""
+    for flag in ('-t', '-to'):
+        if flag in cmd[:-1]:
+            value = parse_time(cmd[cmd.index(flag) + 1])
+            if value is not None and flag == '-to' and '-ss' in cmd[:-1]:
+                start = parse_time(cmd[cmd.index('-ss') + 1]) or 0.0
+                # -ss 在 -i 之前时 -to 以输入时间计，需要减去起点
+                if cmd.index('-ss') < cmd.index('-i'):
+                    value -= start
+            return value
+    return None
+
+
+def _progress_target(cmd: List[str]) -> str:
+    """输出写到 stdout 时进度改走 stderr"""
+    writes_stdout = any(arg in ('-', 'pipe:', 'pipe:1') for arg in cmd[1:])
+    return 'pipe:2' if writes_stdout else 'pipe:1'
+
+
+def _filter_args(cmd: List[str]) -> str:
+    return ' '.join(
+        cmd[i + 1] for i, arg in enumerate(cmd[:-1])
+        if arg in ('-vf', '-af', '-filter_complex', '-filter:v', '-filter:a')
+    )
+
+
+def _input_paths(cmd: List[str]) -> List[str]:
+    return [cmd[i + 1] for i, arg in enumerate(cmd[:-1]) if arg == '-i']
+
+
+def ffmpeg_stage(cmd: List[str]) -> str:
+    """按命令行判断 ffmpeg 调用属于哪个处理阶段（指标标签）"""
+    filters = _filter_args(cmd)
+    if 'subtitles=' in filters or 'ass=' in filters:
+        return 'burn'
+    if 'amix' in filters or 'amerge' in filters:
+        return 'mix'
+    if '-f' in cmd[:-1] and cmd[cmd.index('-f') + 1] == 'concat':
+        return 'concat'
+    if '-vn' in cmd:
+        return 'extract'
+    if '-c:s' in cmd or len(_input_paths(cmd)) > 1:
+        return 'remux'
+    if '-ss' in cmd or '-t' in cmd or '-to' in cmd:
+        return 'clip'
+    return 'encode'
+
+
+class _FFmpegCall:
+    """一次 ffmpeg / ffprobe 调用：提交给 ffmpeg_runner，解析进度，结束后记录指标和追踪"""
+
+    def __init__(
+        self,
+        cmd: List[str],
+        duration: Optional[float] = None,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        stage: Optional[str] = None,
+        parse_progress: bool = True,
+    ):
+        cmd = [str(arg) for arg in cmd]
+        self.target = None
+        if parse_progress:
+            if '-progress' not in cmd:
+                self.target = _progress_target(cmd)
+                cmd = [cmd[0], '-progress', self.target, '-nostats'] + cmd[1:]
+            else:
+                self.target = cmd[cmd.index('-progress') + 1]
+            if on_progress is None:
+                tracker = current_tracker()
+                if tracker is not None:
+                    def on_progress(info):
+                        tracker.update(info['fraction'], speed=info['speed'], fps=info['fps'], out_time=info['out_time'])
+
+        self.cmd = cmd
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.stage = stage or (ffmpeg_stage(cmd) if parse_progress else 'probe')
+        self.state = {'duration': duration or _output_duration(cmd), 'values': {}}
+        self.token = current_token()
+        self.handle = None
+        self.span = None
+        self.future = None
+
+    def _handle_progress(self, line: str) -> bool:
+        """处理一行输出，是进度行时返回 True"""
+        key, sep, value = line.strip().partition('=')
+        if not sep or key not in _PROGRESS_KEYS:
+            return False
+        self.state['values'][key] = value.strip()
+        if key == 'progress':
+            _emit(self.state, self.on_progress)
+        return True
+
+    def _on_stderr(self, line: str) -> bool:
+        if self.target == 'pipe:2' and self._handle_progress(line):
+            return True
+        if self.state['duration'] is None:
+            match = _DURATION_RE.search(line)
+            if match:
+                h, m, s = match.groups()
+                self.state['duration'] = int(h) * 3600 + int(m) * 60 + float(s)
+        return False
+
+    def _on_start(self, handle: ProcessHandle):
+        # 在调度器线程里调用：登记到取消令牌，追踪改为采样子进程的内存
+        self.handle = handle
+        self.span.child_pid = handle.pid
+        self.span.peak_rss = 0
+        if self.token is not None:
+            self.token.register(handle)
+
+    def start(self) -> '_FFmpegCall':
+        """提交给调度器（不等待）"""
+        check_cancelled()
+        self.read_bytes = path_bytes(_input_paths(self.cmd)) if self.target else 0
+        FFMPEG_STARTED.inc(stage=self.stage)
+        self.span = begin_span('ffprobe' if self.stage == 'probe' else f'ffmpeg {self.stage}', 'ffmpeg', argv=self.cmd)
+        on_stdout = self._handle_progress if self.target == 'pipe:1' else None
+        self.future = get_runner().submit(
+            self.cmd, timeout=self.timeout, on_stdout=on_stdout, on_stderr=self._on_stderr, on_start=self._on_start
+        )
+        return self
+
+    def result(self, check: bool = False) -> FFmpegResult:
+        """
+        等待结束
+
+        Raises:
+            subprocess.TimeoutExpired: 超时
+            subprocess.CalledProcessError: check=True 且返回码非 0
+            TaskCancelled: 运行期间任务被取消
+        """
+        try:
+            result = self.future.result()
+        except BaseException as e:
+            # 进程没能启动（如找不到 ffmpeg），或等待时被打断（子进程随 Future 一起结束）
+            self.future.cancel()
+            FFMPEG_EXITS.inc(stage=self.stage, exit_code='error')
+            end_span(self.span, error=type(e).__name__)
+            raise
+        finally:
+            if self.token is not None and self.handle is not None:
+                self.token.unregister(self.handle)
+
+        written_bytes = path_bytes([self.cmd[-1]]) if self.target and result.returncode == 0 else 0
+        FFMPEG_EXITS.inc(stage=self.stage, exit_code='timeout' if result.timed_out else result.returncode)
+        observe_stage(self.stage, result.elapsed, self.read_bytes, written_bytes)
+        end_span(self.span, exit_code=result.returncode, timed_out=result.timed_out,
+                 read_bytes=self.read_bytes, written_bytes=written_bytes)
+
+        check_cancelled()
+        if result.timed_out:
+            raise subprocess.TimeoutExpired(self.cmd, self.timeout, output=result.stdout, stderr=result.stderr)
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, self.cmd, output=result.stdout, stderr=result.stderr)
+        return result
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    duration: Optional[float] = None,
+    timeout: Optional[float] = None,
+    check: bool = False,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    stage: Optional[str] = None,
+    **_ignored
+) -> FFmpegResult:
+    """
+    运行 ffmpeg 并解析进度（用法与 subprocess.run(cmd, capture_output=True, text=True) 相同）
+
+    Args:
+        cmd: ffmpeg 命令
+        duration: 输出时长（秒），默认从 -t 参数或输入的 Duration 推断
+        timeout: 超时时间（秒）
+        check: 返回码非 0 时是否抛出 CalledProcessError
+        on_progress: 进度回调，参数为 {'fraction', 'out_time', 'speed', 'fps'}；
+            默认上报给当前线程绑定的 ProgressTracker
+        stage: 指标中的阶段名，默认按命令行判断（见 ffmpeg_stage）
+
+    Returns:
+        FFmpegResult（兼容 CompletedProcess，stdout 为空，stderr 为 ffmpeg 日志）
+
+    Raises:
+        subprocess.TimeoutExpired: 超时
+        subprocess.CalledProcessError: check=True 且返回码非 0
+        TaskCancelled: 运行期间任务被取消（ffmpeg 进程组已结束）
+    """
+    return _FFmpegCall(cmd, duration, timeout, on_progress, stage).start().result(check)
+
+
+def run_ffmpeg_many(
+    cmds: List[List[str]],
+    timeout: Optional[float] = None,
+    stage: Optional[str] = None,
+    max_parallel: Optional[int] = None,
+) -> List:
+    """
+    同时运行多个相互独立的 ffmpeg 命令（如切出多个片段），进度按完成比例的平均值上报
+
+    Args:
+        cmds: ffmpeg 命令列表
+        timeout: 每个命令的超时时间（秒）
+        stage: 指标中的阶段名
+        max_parallel: 本次最多同时运行的命令数（默认只受调度器的全局上限约束）
+
+    Returns:
+        与 cmds 顺序一致的结果列表，每项是 FFmpegResult，或该命令抛出的异常
+        （subprocess.TimeoutExpired 等，与逐个调用 run_ffmpeg 时一样由调用方处理）
+
+    Raises:
+        TaskCancelled: 运行期间任务被取消（所有进程组已结束）
+    """
+    check_cancelled()
+    count = len(cmds)
+    tracker = current_tracker()
+    fractions = [0.0] * count
+
+    def part(index):
+        if tracker is None:
+            return None
+
+        def on_progress(info):
+            if info['fraction'] is not None:
+                fractions[index] = info['fraction']
+            tracker.update(sum(fractions) / count, speed=info['speed'], fps=info['fps'])
+
+        return on_progress
+
+    window = max_parallel or count
+    pending = list(enumerate(cmds))
+    running: Dict = {}
+    results: List = [None] * count
+    try:
+        while pending or running:
+            while pending and len(running) < window:
+                index, cmd = pending.pop(0)
+                call = _FFmpegCall(cmd, timeout=timeout, on_progress=part(index), stage=stage).start()
+                running[call.future] = (index, call)
+            done, _ = futures_wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, call = running.pop(future)
+                try:
+                    results[index] = call.result()
+                except (subprocess.SubprocessError, OSError) as e:
+                    results[index] = e
+    except BaseException:
+        for _index, call in running.values():
+            call.future.cancel()
+        raise
+    return results
+
+
+def run_probe(cmd: List[str], timeout: Optional[float] = None, check: bool = True) -> FFmpegResult:
+    """
+    运行 ffprobe（用法同 subprocess.run(cmd, capture_output=True, text=True, check=True)），耗时计入 probe 阶段
+
+    Raises:
+        subprocess.TimeoutExpired: 超时
+        subprocess.CalledProcessError: check=True 且返回码非 0
+    """
+    return _FFmpegCall(cmd, timeout=timeout, stage='probe', parse_progress=False).start().result(check)
+
+
+def run_probe_many(cmds: List[List[str]], timeout: Optional[float] = None) -> List:
+    """
+    同时运行多个 ffprobe
+
+    Returns:
+        与 cmds 顺序一致的结果列表，每项是 FFmpegResult 或该命令抛出的异常
+    """
+    check_cancelled()
+    calls = [_FFmpegCall(cmd, timeout=timeout, stage='probe', parse_progress=False).start() for cmd in cmds]
+    results = []
+    for call in calls:
+        try:
+            results.append(call.result(check=True))
+        except (subprocess.SubprocessError, OSError) as e:
+            results.append(e)
+    return results
+
+
+def _emit(state: Dict, on_progress: Optional[Callable[[Dict], None]]):
+    """把一组 key=value 进度换算成完成比例并回调"""
+    if on_progress is None:
+        return
+    values = state['values']
+
+    out_time = None
+    # out_time_ms 实际单位也是微秒（ffmpeg 的历史遗留）
+    for key in ('out_time_us', 'out_time_ms'):
+        if values.get(key, 'N/A') not in ('N/A', ''):
+            try:
+                out_time = int(values[key]) / 1_000_000
+                break
+            except ValueError:
+                pass
+    if out_time is None and 'out_time' in values:
+        out_time = parse_time(values['out_time'])
+
+    def number(key):
+        try:
+            return float(values.get(key, '').rstrip('x'))
+        except ValueError:
+            return None
+
+    fraction = None
+    if values.get('progress') == 'end':
+        fraction = 1.0
+    elif out_time is not None and state['duration']:
+        fraction = min(1.0, max(0.0, out_time / state['duration']))
+
+    on_progress({'fraction': fraction, 'out_time': out_time, 'speed': number('speed'), 'fps': number('fps')})
+
+
+class _StageScope:
+    """阶段作用域：with 语句内声明的阶段是它的子阶段"""
+
+    def __init__(self, tracker: 'ProgressTracker', name: str, band: tuple):
+        self.tracker = tracker
+        self.name = name
+        self.band = band
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.path = self.tracker._stage_name
+        # 作用域整体在退出时计时，它的子阶段各自计时
+        self.tracker._timing = None
+        self.tracker._parents.append((self.name, self.band))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracker._close_timing()
+        now = time.perf_counter()
+        TASK_STAGE_SECONDS.observe(now - self.started, stage=self.path)
+        trace_complete(self.path, 'stage', self.started, now)
+        self.tracker._parents.pop()
+        self.tracker._set_stage(self.name, self.band)
+        if exc_type is None:
+            self.tracker.update(1.0, force=True)
+            check_cancelled()
+        return False
+
+
+class ProgressTracker:
+    """分阶段进度汇总"""
+
+    def __init__(self, on_update: Callable[[Dict], None], min_interval: float = 0.5):
+        """
+        初始化
+
+        Args:
+            on_update: 进度快照回调
+            min_interval: 两次回调的最小间隔（秒）
+        """
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.started_at = time.time()
+
+        self._parents = [(None, (0.0, 100.0))]
+        self._stage_name: Optional[str] = None
+        self._band: Optional[tuple] = None
+        self._stage_started = self.started_at
+        self._stage_fraction = 0.0
+        self._overall = 0.0
+        self._last_emit = 0.0
+        self._timing: Optional[tuple] = None
+
+    def stage(self, name: str, start: float, end: float) -> _StageScope:
+        """
+        进入新阶段
+
+        Args:
+            name: 阶段名
+            start: 阶段起点（占上级阶段的百分比）
+            end: 阶段终点（占上级阶段的百分比）
+
+        Returns:
+            可用于 with 语句的阶段作用域（其中声明的阶段按本阶段区间换算）
+        """
+        self._close_timing()
+        lo, hi = self._parents[-1][1]
+        band = (lo + (hi - lo) * start / 100.0, lo + (hi - lo) * end / 100.0)
+        self._set_stage(name, band)
+        self._timing = (self._stage_name, time.perf_counter())
+        self.update(0.0, force=True)
+        return _StageScope(self, name, band)
+
+    def _close_timing(self):
+        """记录上一个阶段的耗时"""
+        if self._timing is not None:
+            name, started = self._timing
+            self._timing = None
+            now = time.perf_counter()
+            TASK_STAGE_SECONDS.observe(now - started, stage=name)
+            trace_complete(name, 'stage', started, now)
+
+    def finish(self):
+        """任务结束，记录最后一个阶段的耗时"""
+        self._close_timing()
+
+    def _set_stage(self, name: str, band: tuple):
+        path = [p[0] for p in self._parents[1:]] + [name]
+        self._stage_name = '/'.join(path)
+        self._band = band
+        self._stage_started = time.time()
+        self._stage_fraction = 0.0
+
+    def update(
+        self,
+        fraction: Optional[float],
+        speed: Optional[float] = None,
+        fps: Optional[float] = None,
+        out_time: Optional[float] = None,
+        force: bool = False
+    ):
+        """
+        上报当前阶段的进度
+
+        Args:
+            fraction: 阶段完成比例 0-1（未知时为 None）
+            speed: ffmpeg 处理速度（倍速）
+            fps: 每秒处理帧数
+            out_time: 已输出的媒体时长（秒）
+            force: 忽略节流立即回调
+        """
+        now = time.time()
+        if fraction is not None:
+            self._stage_fraction = min(1.0, max(0.0, fraction))
+            if self._band is not None:
+                lo, hi = self._band
+                # 总进度只增不减（同一阶段内多次调用 ffmpeg 时阶段进度会回到 0）
+                self._overall = max(self._overall, lo + (hi - lo) * self._stage_fraction)
+
+        if not force and now - self._last_emit < self.min_interval and fraction != 1.0:
+            return
+        self._last_emit = now
+        self.on_update(self.snapshot(speed=speed, fps=fps, out_time=out_time, now=now))
+
+    def snapshot(self, speed=None, fps=None, out_time=None, now: Optional[float] = None) -> Dict:
+        """当前进度快照"""
+        now = now or time.time()
+        stage_elapsed = now - self._stage_started
+        elapsed = now - self.started_at
+
+        f = self._stage_fraction
+        stage_eta = None
+        if 0 < f < 1 and stage_elapsed > 0:
+            stage_eta = round(stage_elapsed * (1 - f) / f, 1)
+        elif f >= 1:
+            stage_eta = 0.0
+
+        detail = {
+            'stage': self._stage_name,
+            'stage_progress': round(f * 100, 1),
+            'stage_eta_seconds': stage_eta,
+            'elapsed_seconds': round(elapsed, 1),
+            'speed': speed,
+            'fps': round(fps, 1) if fps is not None else None,
+            'out_time': round(out_time, 2) if out_time is not None else None,
+        }
+
+        snapshot = {'progress_detail': detail}
+        if self._band is not None:
+            overall = self._overall
+            eta = None
+            if 0 < overall < 100:
+                eta = round(elapsed * (100 - overall) / overall, 1)
+            detail['overall_progress'] = round(overall, 1)
+            detail['eta_seconds'] = eta
+            snapshot['progress'] = int(overall)
+        return snapshot
+
+
+# ---------- 线程绑定 ----------
+
+def current_tracker() -> Optional[ProgressTracker]:
+    """当前线程绑定的进度汇总器"""
+    return getattr(_local, 'tracker', None)
+
+
+@contextmanager
+def bind_tracker(tracker: Optional[ProgressTracker]):
+    """在 with 语句内把进度汇总器绑定到当前线程"""
+    previous = current_tracker()
+    _local.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _local.tracker = previous
+
+
+def progress_stage(name: str, start: float, end: float):
+    """在当前线程的进度汇总器上进入新阶段（未绑定时只检查是否已取消）"""
+    check_cancelled()
+    tracker = current_tracker()
+    if tracker is None:
+        return nullcontext()
+    return tracker.stage(name, start, end)
+
+
+def report_progress(fraction: Optional[float], fps: Optional[float] = None, speed: Optional[float] = None):
+    """向当前线程的进度汇总器上报阶段进度（未绑定时只检查是否已取消）"""
+    check_cancelled()
+    tracker = current_tracker()
+    if tracker is not None:
+        tracker.update(fraction, speed=speed, fps=fps)
+
+
+def part_progress(index: int, count: int) -> Optional[Callable[[Dict], None]]:
+    """
+    循环中第 index 个（共 count 个）ffmpeg 调用的进度回调，换算成整个阶段的进度
+
+    Returns:
+        run_ffmpeg 的 on_progress 回调，未绑定进度汇总器时返回 None
+    """
+    tracker = current_tracker()
+    if tracker is None or count <= 0:
+        return None
+
+    def on_progress(info):
+        fraction = (index + (info['fraction'] or 0.0)) / count
+        tracker.update(fraction, speed=info['speed'], fps=info['fps'], out_time=info['out_time'])
+
+    return on_progress
+
+
+class FrameRate:
+    """逐帧循环的帧率统计（约每秒一个帧窗口记入任务追踪）"""
+
+    # 帧窗口的最短时长（秒）
+    WINDOW_SECONDS = 1.0
+
+    def __init__(self, total_frames: int, report_every: int = 25):
+        self.total_frames = max(0, int(total_frames))
+        self.report_every = report_every
+        self.started_at = time.time()
+        self.frames = 0
+        self._window = (time.perf_counter(), 0)
+
+    def tick(self, frames: int = 1):
+        """处理完若干帧"""
+        self.frames += frames
+        check_cancelled()
+        if self.frames % self.report_every == 0 or self.frames == self.total_frames:
+            report_progress(self.fraction, fps=self.fps)
+            self._close_window()
+
+    def _close_window(self):
+        started, first = self._window
+        now = time.perf_counter()
+        if now - started < self.WINDOW_SECONDS and self.frames != self.total_frames:
+            return
+        count = self.frames - first
+        trace_complete(f'frames {first}-{self.frames}', 'frames', started, now,
+                       frames=count, fps=round(count / (now - started), 1) if now > started else None)
+        self._window = (now, self.frames)
+
+    @property
+    def fps(self) -> float:
+        elapsed = time.time() - self.started_at
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> Optional[float]:
+        return min(1.0, self.frames / self.total_frames) if self.total_frames else None
+
+
+def moviepy_logger():
+    """
+    MoviePy write_videofile 的 logger 参数：绑定了进度汇总器时上报逐帧进度，否则使用默认进度条
+
+    Returns:
+        proglog 日志对象或 'bar'
+    """
+    if current_tracker() is None:
+        return 'bar'
+    try:
+        from proglog import ProgressBarLogger
+    except ImportError:
+        return 'bar'
+
+    tracker = current_tracker()
+
+    class _TrackerLogger(ProgressBarLogger):
+        def __init__(self):
+            super().__init__()
+            self._rates = {}
+
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if attr != 'index':
+                return
+            check_cancelled()
+            # 音频块和视频帧各有一个进度条，只按视频帧计算进度和 fps
+            if bar not in ('frame_index', 't'):
+                return
+            total = self.bars[bar].get('total')
+            elapsed = time.time() - self._rates.setdefault(bar, time.time())
+            tracker.update(value / total if total else None, fps=value / elapsed if elapsed > 0 else None)
+
+    return _TrackerLogger()
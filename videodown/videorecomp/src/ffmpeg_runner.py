@@ -0,0 +1,262 @@
+#!/usr/bin/env python3.12
+"""
+ffmpeg / ffprobe 子进程调度
+
+所有子进程由一个后台线程里的 asyncio 事件循环统一管理：
+等待子进程、读取 stdout/stderr 都不占用工作线程，多个子进程可以同时运行（受并发上限约束）；
+调用方通过同步接口提交命令，拿到 concurrent.futures.Future 或直接等待结果；
+ffmpeg_progress 的 run_ffmpeg / run_probe 等都经由这里运行。
+
+环境变量：
+    VIDEORECOMP_FFMPEG_CONCURRENCY   同时运行的 ffmpeg / ffprobe 进程数上限（默认 CPU 核数，至少 2）
+"""
+
+import os
+import time
+import signal
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence
+
+from cancellation import popen_kwargs
+
+
+DEFAULT_CONCURRENCY = int(os.environ.get('VIDEORECOMP_FFMPEG_CONCURRENCY', '0')) or max(2, os.cpu_count() or 2)
+
+# 单行输出的最大长度（ffmpeg 日志里偶尔有很长的元数据行）
+LINE_LIMIT = 1024 * 1024
+
+# 行回调：stderr 回调返回 True 表示该行已处理（不计入 stderr）
+LineCallback = Callable[[str], Optional[bool]]
+
+
+class FFmpegResult(subprocess.CompletedProcess):
+    """子进程结果（兼容 subprocess.CompletedProcess），附带耗时、超时标记和进程号"""
+
+    def __init__(self, args, returncode: int, stdout: str, stderr: str,
+                 elapsed: float, timed_out: bool = False, pid: Optional[int] = None):
+        super().__init__(args, returncode, stdout, stderr)
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.pid = pid
+
+    def to_dict(self) -> dict:
+        return {
+            'args': list(self.args),
+            'returncode': self.returncode,
+            'elapsed': round(self.elapsed, 3),
+            'timed_out': self.timed_out,
+            'pid': self.pid,
+        }
+
+
+class ProcessHandle:
+    """
+    运行中子进程的句柄（提供 pid / poll() / wait()，可以登记到取消令牌上）
+
+    进程由事件循环回收，这里只反映它的状态
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+        self._exited = threading.Event()
+        # 句柄在事件循环线程里创建；在该线程里等待会卡住循环，只能立即返回
+        self._loop_thread = threading.get_ident()
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if threading.get_ident() == self._loop_thread:
+            timeout = 0
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+    def _set_exited(self, returncode: int):
+        self.returncode = returncode
+        self._exited.set()
+
+
+def _kill_group(pid: int):
+    try:
+        if os.name == 'posix':
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+class FFmpegRunner:
+    """asyncio 子进程调度器（每个进程一个，fork 后在子进程里重新创建事件循环）"""
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pid: Optional[int] = None
+        self._running = 0
+        self._waiting = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def serve():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=serve, name='ffmpeg-runner', daemon=True).start()
+            ready.wait()
+            self._loop, self._pid = loop, os.getpid()
+            self._running = self._waiting = 0
+            return loop
+
+    def stats(self) -> dict:
+        """运行中和排队等待的子进程数"""
+        return {'max_concurrency': self.max_concurrency, 'running': self._running, 'waiting': self._waiting}
+
+    async def run(
+        self,
+        cmd: Sequence[str],
+        timeout: Optional[float] = None,
+        on_stdout: Optional[LineCallback] = None,
+        on_stderr: Optional[LineCallback] = None,
+        on_start: Optional[Callable[[ProcessHandle], None]] = None,
+    ) -> FFmpegResult:
+        """
+        运行子进程（协程，在调度器的事件循环里执行）
+
+        Args:
+            cmd: 命令
+            timeout: 超时时间（秒，从进程启动开始计），超时后结束整个进程组
+            on_stdout: stdout 行回调（设置后 stdout 不再保存到结果里）
+            on_stderr: stderr 行回调（返回 True 的行不保存到结果里）
+            on_start: 进程启动后的回调，参数为进程句柄
+
+        Returns:
+            FFmpegResult
+        """
+        cmd = [str(arg) for arg in cmd]
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        process = None
+        handle = None
+        try:
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                limit=LINE_LIMIT, **popen_kwargs()
+            )
+            handle = ProcessHandle(process.pid)
+            if on_start is not None:
+                on_start(handle)
+
+            stdout_lines: List[str] = []
+            stderr_lines: List[str] = []
+
+            async def pump(stream, callback, sink, is_stderr):
+                async for raw in stream:
+                    line = raw.decode('utf-8', errors='replace')
+                    if callback is None:
+                        sink.append(line)
+                    elif callback(line) is not True and is_stderr:
+                        sink.append(line)
+
+            timed_out = False
+            try:
+                await asyncio.wait_for(asyncio.gather(
+                    pump(process.stdout, on_stdout, stdout_lines, False),
+                    pump(process.stderr, on_stderr, stderr_lines, True),
+                    process.wait(),
+                ), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                _kill_group(process.pid)
+                await process.wait()
+
+            return FFmpegResult(
+                cmd, process.returncode, ''.join(stdout_lines), ''.join(stderr_lines),
+                time.perf_counter() - started, timed_out, process.pid,
+            )
+        finally:
+            # 出错或被取消（Future.cancel()）时不留下子进程
+            if process is not None and process.returncode is None:
+                _kill_group(process.pid)
+                try:
+                    await process.wait()
+                except BaseException:
+                    pass
+            if handle is not None:
+                handle._set_exited(process.returncode)
+            self._running -= 1
+            self._semaphore.release()
+
+    # ---------- 同步接口 ----------
+
+    def submit(self, cmd: Sequence[str], **kwargs) -> Future:
+        """
+        提交命令，立即返回（参数同 run）
+
+        Returns:
+            concurrent.futures.Future，结果为 FFmpegResult；cancel() 会结束子进程
+        """
+        return asyncio.run_coroutine_threadsafe(self.run(cmd, **kwargs), self._ensure_loop())
+
+    def run_sync(self, cmd: Sequence[str], **kwargs) -> FFmpegResult:
+        """运行命令并等待结果（参数同 run）"""
+        future = self.submit(cmd, **kwargs)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def run_many(self, cmds: Sequence[Sequence[str]], **kwargs) -> List[FFmpegResult]:
+        """同时运行多个命令（受并发上限约束），按提交顺序返回结果"""
+        futures = [self.submit(cmd, **kwargs) for cmd in cmds]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+_runner: Optional[FFmpegRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> FFmpegRunner:
+    """进程共享的调度器"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = FFmpegRunner()
+        return _runner
+
+
+def _reset_after_fork():
+    # 事件循环线程不会被 fork 到子进程里，子进程用新的调度器
+    global _runner, _runner_lock
+    _runner = None
+    _runner_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
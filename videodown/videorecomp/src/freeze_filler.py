@@ -0,0 +1,281 @@
+#!/usr/bin/env python3.12
+"""
+冻结帧填充片段生成器 - 生成与原视频编码参数一致的静帧片段
+
+生成的片段与原视频的编码器、profile、分辨率、帧率、时间基和音频布局一致，
+并带静音音轨，可以直接与 -c copy 提取的片段一起 concat 拼接。
+片段按 (视频, 时间点, 时长) 缓存，重复请求几乎零成本。
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, Optional
+
+from ffmpeg_progress import run_ffmpeg, run_probe
+from encoding_profiles import EncodingProfile, get_profile
+
+
+# ffprobe 编码名称 -> ffmpeg 编码器
+VIDEO_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'mpeg4': 'mpeg4',
+    'vp9': 'libvpx-vp9',
+    'vp8': 'libvpx',
+    'av1': 'libaom-av1',
+}
+
+AUDIO_ENCODERS = {
+    'aac': 'aac',
+    'mp3': 'libmp3lame',
+    'opus': 'libopus',
+    'vorbis': 'libvorbis',
+    'ac3': 'ac3',
+}
+
+# ffprobe profile 名称 -> libx264/libx265 -profile:v 参数
+H264_PROFILES = {
+    'baseline': 'baseline',
+    'constrained baseline': 'baseline',
+    'main': 'main',
+    'high': 'high',
+    'high 10': 'high10',
+    'high 4:2:2': 'high422',
+    'high 4:4:4 predictive': 'high444',
+}
+
+HEVC_PROFILES = {
+    'main': 'main',
+    'main 10': 'main10',
+    'main 12': 'main12',
+    'main still picture': 'mainstillpicture',
+    'main 4:2:2 10': 'main422-10',
+    'main 4:2:2 12': 'main422-12',
+    'main 4:4:4': 'main444-8',
+    'main 4:4:4 10': 'main444-10',
+    'main 4:4:4 12': 'main444-12',
+}
+
+# HEVC 格式范围扩展（ffprobe 只报 "Rext"）按像素格式确定 libx265 profile
+HEVC_REXT_PROFILES = {
+    'yuv420p12le': 'main12',
+    'yuv422p10le': 'main422-10',
+    'yuv422p12le': 'main422-12',
+    'yuv444p': 'main444-8',
+    'yuv444p10le': 'main444-10',
+    'yuv444p12le': 'main444-12',
+}
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "videorecomp_filler_cache"
+
+
+class FreezeFrameFiller:
+    """冻结帧填充片段生成器（带缓存）"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._stream_info: Dict[str, Dict] = {}
+        self._cache: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def probe_streams(self, video_path: str) -> Dict:
+        """
+        获取视频/音频流参数（按文件缓存）
+
+        Returns:
+            {'video': {...}, 'audio': {...} 或 None}
+        """
+        video_path = os.path.abspath(video_path)
+        if video_path in self._stream_info:
+            return self._stream_info[video_path]
+
+        cmd = [
+            'ffprobe', '-v', 'quiet', '-print_format', 'json',
+            '-show_streams', video_path
+        ]
+        result = run_probe(cmd)
+        streams = json.loads(result.stdout).get('streams', [])
+
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        if video is None:
+            raise ValueError(f"视频中没有视频流: {video_path}")
+
+        info = {'video': video, 'audio': audio}
+        self._stream_info[video_path] = info
+        return info
+
+    def _cache_key(self, video_path: str, at: float, duration: float, profile: EncodingProfile) -> tuple:
+        """缓存键：文件路径 + 修改时间 + 时间点 + 时长（毫秒精度）+ 编码档位"""
+        video_path = os.path.abspath(video_path)
+        mtime = os.path.getmtime(video_path) if os.path.exists(video_path) else 0
+        return (video_path, int(mtime), int(round(at * 1000)), int(round(duration * 1000)), profile.name)
+
+    def _build_command(self, video_path: str, at: float, duration: float, output_path: str,
+                       profile: EncodingProfile) -> list:
+        """构建与原视频参数一致的静帧编码命令（编码速度取编码档位的 preset/线程数）"""
+        info = self.probe_streams(video_path)
+        video = info['video']
+        audio = info['audio']
+
+        width = video.get('width')
+        height = video.get('height')
+        frame_rate = video.get('r_frame_rate') or video.get('avg_frame_rate') or '25/1'
+        if frame_rate in ('0/0', '0/1'):
+            frame_rate = '25/1'
+        pix_fmt = video.get('pix_fmt') or 'yuv420p'
+        time_base = Fraction(video.get('time_base') or '1/12800')
+
+        # 只取一帧，循环到目标时长
+        video_filter = (
+            f"[0:v]trim=end_frame=1,loop=loop=-1:size=1:start=0,"
+            f"scale={width}:{height},setsar=1,fps={frame_rate},format={pix_fmt}[v]"
+        )
+
+        cmd = [
+            'ffmpeg', '-y',
+            '-ss', str(max(0.0, at)),
+            '-i', video_path
+        ]
+
+        if audio:
+            sample_rate = audio.get('sample_rate') or '48000'
+            channel_layout = audio.get('channel_layout') or ('stereo' if audio.get('channels', 2) >= 2 else 'mono')
+            cmd += ['-f', 'lavfi', '-i', f"anullsrc=channel_layout={channel_layout}:sample_rate={sample_rate}"]
+
+        cmd += ['-filter_complex', video_filter, '-map', '[v]']
+
+        codec_name = video.get('codec_name', 'h264')
+        encoder = VIDEO_ENCODERS.get(codec_name, 'libx264')
+        cmd += ['-c:v', encoder]
+        if codec_name in ('h264', 'hevc'):
+            # 不认识的 profile 名称不传 -profile:v，由编码器按像素格式选择
+            profile_name = (video.get('profile') or '').lower()
+            if codec_name == 'h264':
+                codec_profile = H264_PROFILES.get(profile_name)
+            elif profile_name == 'rext':
+                codec_profile = HEVC_REXT_PROFILES.get(pix_fmt)
+            else:
+                codec_profile = HEVC_PROFILES.get(profile_name)
+            if codec_profile:
+                cmd += ['-profile:v', codec_profile]
+            level = video.get('level')
+            if codec_name == 'h264' and level and int(level) > 0:
+                cmd += ['-level:v', f"{int(level) / 10:.1f}"]
+            cmd += ['-preset', profile.preset]
+            if codec_name == 'h264':
+                cmd += ['-tune', 'stillimage']
+        if profile.threads:
+            cmd += ['-threads', str(profile.threads)]
+        if video.get('codec_tag_string') == 'hvc1':
+            cmd += ['-tag:v', 'hvc1']
+        cmd += ['-video_track_timescale', str(time_base.denominator)]
+
+        if audio:
+            audio_encoder = AUDIO_ENCODERS.get(audio.get('codec_name', 'aac'), 'aac')
+            cmd += ['-map', '1:a', '-c:a', audio_encoder, '-ar', str(audio.get('sample_rate') or '48000'),
+                    '-ac', str(audio.get('channels') or 2)]
+            if audio.get('bit_rate'):
+                cmd += ['-b:a', str(audio['bit_rate'])]
+        else:
+            cmd += ['-an']
+
+        cmd += ['-t', f"{duration:.3f}", '-loglevel', 'error', output_path]
+        return cmd
+
+    def get_filler(self, video_path: str, at: float, duration: float,
+                   profile: Optional[EncodingProfile] = None) -> Optional[str]:
+        """
+        获取冻结帧填充片段（命中缓存时直接返回）
+
+        Args:
+            video_path: 原视频路径
+            at: 取帧时间点（秒）
+            duration: 片段时长（秒）
+            profile: 编码档位（默认当前任务绑定的档位）
+
+        Returns:
+            片段路径，失败返回 None
+        """
+        if duration <= 0:
+            return None
+
+        profile = get_profile(profile)
+        key = self._cache_key(video_path, at, duration, profile)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and os.path.exists(cached):
+            self.hits += 1
+            self._touch(Path(cached))
+            return cached
+
+        # 磁盘缓存（跨进程/跨任务复用）
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+        output_path = self.cache_dir / f"filler_{digest}.mp4"
+        if output_path.exists() and output_path.stat().st_size > 1000:
+            self.hits += 1
+            self._touch(output_path)
+            with self._lock:
+                self._cache[key] = str(output_path)
+            return str(output_path)
+
+        self.misses += 1
+        # 先写临时文件再改名，避免并发读取到半成品
+        partial_path = self.cache_dir / f"filler_{digest}.{os.getpid()}.partial.mp4"
+        try:
+            cmd = self._build_command(video_path, at, duration, str(partial_path), profile)
+            # 填充片段很短，不计入所在阶段的进度
+            result = run_ffmpeg(cmd, timeout=120, on_progress=lambda info: None)
+            if result.returncode != 0 or not partial_path.exists() or partial_path.stat().st_size <= 1000:
+                print(f"  ⚠️  生成冻结帧片段失败: {result.stderr.strip()[:200]}")
+                return None
+            os.replace(partial_path, output_path)
+        except Exception as e:
+            print(f"  ⚠️  生成冻结帧片段出错: {e}")
+            return None
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+
+        with self._lock:
+            self._cache[key] = str(output_path)
+        return str(output_path)
+
+    @staticmethod
+    def _touch(path: Path):
+        """记录片段被使用（更新访问时间，存储清理按它淘汰）"""
+        try:
+            st = path.stat()
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0
+        }
+
+
+_default_filler: Optional[FreezeFrameFiller] = None
+
+
+def get_default_filler() -> FreezeFrameFiller:
+    """获取进程内共享的填充片段生成器"""
+    global _default_filler
+    if _default_filler is None:
+        _default_filler = FreezeFrameFiller()
+    return _default_filler
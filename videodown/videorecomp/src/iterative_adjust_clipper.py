@@ -4,16 +4,19 @@
 按照用户的规则：每次对比后生成新视频，下次对比使用新视频
 """
 
-import os
-import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import pysrt
-import chardet
 from tqdm import tqdm
 
+from edit_decision_list import EditDecisionList
+from freeze_filler import get_default_filler
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe
+from scratch_space import scratch_dir, estimate_bytes, link_or_copy
+from encoding_profiles import get_profile
+
 
 class IterativeAdjustClipper:
     """迭代调整剪辑器"""
@@ -24,7 +27,8 @@ class IterativeAdjustClipper:
         original_srt_path: str,
         new_srt_path: str,
         output_dir: str = "output",
-        threshold: float = 0.5
+        threshold: float = 0.5,
+        encoding_profile: Optional[str] = None
     ):
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -33,19 +37,19 @@ class IterativeAdjustClipper:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.threshold = threshold
 
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="iterative_clip_"))
+        # 切出的片段放在临时工作区（大小与原视频相当，放得下时用内存盘）
+        self.temp_dir = Path(scratch_dir("iterative_clip_", estimate_bytes(video_path, factor=1.5)))
         self.original_subs = None
         self.new_subs = None
         self.current_video = video_path  # 当前使用的视频
-        self.current_subs = None  # 当前字幕（会随着调整而更新）
         self.video_offset = 0.0  # 视频累积偏移量（正数表示视频比原视频长，负数表示短）
+        self.edl: Optional[EditDecisionList] = None  # 剪辑决策列表（虚拟调整，最后一次性渲染）
+        self.filler = get_default_filler()  # 与原视频编码一致的冻结帧片段（带缓存）
+        self.profile = get_profile(encoding_profile)  # 冻结帧片段的编码速度
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -53,7 +57,6 @@ class IterativeAdjustClipper:
         print("加载字幕文件...")
         self.original_subs = self.load_subtitle(self.original_srt_path)
         self.new_subs = self.load_subtitle(self.new_srt_path)
-        self.current_subs = list(self.original_subs)  # 复制一份，用于更新
 
         print(f"原字幕: {len(self.original_subs)} 条")
         print(f"新字幕: {len(self.new_subs)} 条")
@@ -62,260 +65,74 @@ class IterativeAdjustClipper:
         """获取视频时长"""
         cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', video_path]
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             return float(info['format']['duration'])
         except:
             return 0.0
 
-    def update_subtitle_times(self, from_index: int, time_offset: float):
-        """
-        更新从from_index开始的所有字幕的时间戳
-
-        Args:
-            from_index: 从哪个索引开始更新
-            time_offset: 时间偏移量（秒），正数表示时间前移，负数表示后移
-        """
-        print(f"  更新字幕{from_index+1}及之后的时间戳，偏移量: {time_offset:+.3f}秒")
-
-        for i in range(from_index, len(self.current_subs)):
-            sub = self.current_subs[i]
-
-            # 转换为秒
-            start_seconds = sub.start.ordinal / 1000.0
-            end_seconds = sub.end.ordinal / 1000.0
-
-            # 应用偏移
-            new_start = max(0, start_seconds - time_offset)
-            new_end = max(0, end_seconds - time_offset)
-
-            # 转换回pysrt时间格式
-            sub.start = pysrt.SubRipTime.from_ordinal(int(new_start * 1000))
-            sub.end = pysrt.SubRipTime.from_ordinal(int(new_end * 1000))
-
-    def clip_segment_at_point(
-        self,
-        video_path: str,
-        clip_point: float,
-        duration_to_remove: float
-    ) -> Optional[str]:
+    def render_edl(self, edl: EditDecisionList, output_path: Path) -> bool:
         """
-        在指定时间点前剪掉指定时长的视频
+        按剪辑决策列表一次性渲染视频：逐段提取（copy）+ 冻结帧，最后只拼接一次
 
         Args:
-            video_path: 输入视频路径
-            clip_point: 剪切点（秒）
-            duration_to_remove: 要剪掉的时长（秒）
+            edl: 剪辑决策列表
+            output_path: 输出视频路径
 
         Returns:
-            输出视频路径
+            是否成功
         """
-        # 计算实际要剪掉的片段
-        remove_start = clip_point - duration_to_remove
-        remove_end = clip_point
-
-        if remove_start < 0:
-            print(f"  ⚠️  剪掉起点{remove_start:.3f}秒 < 0，调整为从0开始")
-            remove_start = 0
-            duration_to_remove = remove_end - remove_start
-
-        print(f"  剪掉 [{remove_start:.3f} - {remove_end:.3f}] 秒，时长: {duration_to_remove:.3f}秒")
-
-        # 使用concat方式：保留 [0 - remove_start] 和 [remove_end - 结束]
-        output_path = self.temp_dir / f'clip_{len(os.listdir(self.temp_dir))}.mp4'
-
-        # 获取视频时长
-        video_duration = self.get_video_duration(video_path)
-
-        segments_to_extract = []
-        segment_1_start = 0
-        segment_1_end = remove_start
-        segment_2_start = remove_end
-        segment_2_end = video_duration
-
-        # 提取第一段
-        if segment_1_end > segment_1_start:
-            segments_to_extract.append((segment_1_start, segment_1_end))
-
-        # 提取第二段
-        if segment_2_end > segment_2_start:
-            segments_to_extract.append((segment_2_start, segment_2_end))
-
-        if not segments_to_extract:
-            print("  ⚠️  没有可提取的片段")
-            return None
-
-        # 提取所有片段
-        segment_files = []
-        for i, (start, end) in enumerate(segments_to_extract):
-            temp_segment = self.temp_dir / f'temp_seg_{i}.mp4'
-            duration = end - start
-
-            cmd = [
+        plan = edl.render_plan()
+        if not plan:
+            print("  ⚠️  没有可渲染的片段")
+            return False
+
+        # 没有任何调整时直接链接原视频（不复制字节）
+        if len(plan) == 1 and plan[0]['type'] == 'source' \
+                and plan[0]['start'] <= 1e-3 and plan[0]['end'] >= edl.source_duration - 1e-3:
+            link_or_copy(edl.source_path, output_path)
+            return True
+
+        print(f"\n渲染剪辑决策列表: {len(plan)} 个片段")
+        # 原视频片段互不依赖，同时提取；冻结帧片段按顺序生成（有缓存）
+        sources = [i for i, piece in enumerate(plan) if piece['type'] != 'freeze']
+        cmds = [
+            [
                 'ffmpeg', '-y',
-                '-ss', str(start),
-                '-i', video_path,
-                '-t', str(duration),
+                '-ss', str(plan[i]['start']),
+                '-i', edl.source_path,
+                '-t', str(plan[i]['end'] - plan[i]['start']),
                 '-c', 'copy',
                 '-avoid_negative_ts', '1',
                 '-loglevel', 'error',
-                str(temp_segment)
+                str(self.temp_dir / f'edl_seg_{i:04d}.mp4')
             ]
-
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
-                    segment_files.append(str(temp_segment))
-                else:
-                    print(f"  ⚠️  片段{i+1}提取失败")
-                    return None
-            except Exception as e:
-                print(f"  ⚠️  片段{i+1}提取出错: {e}")
-                return None
-
-        # 拼接片段
-        concat_list = self.temp_dir / 'concat_list.txt'
-        with open(concat_list, 'w') as f:
-            for seg_file in segment_files:
-                f.write(f"file '{seg_file}'\n")
-
-        cmd = [
-            'ffmpeg', '-y',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', str(concat_list),
-            '-c', 'copy',
-            str(output_path)
-        ]
-
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
-                print(f"  ✅ 视频剪辑成功")
-                return str(output_path)
-            else:
-                print(f"  ⚠️  视频剪辑失败")
-                return None
-        except Exception as e:
-            print(f"  ⚠️  视频剪辑出错: {e}")
-            return None
-
-    def extend_segment_at_point(
-        self,
-        video_path: str,
-        extend_point: float,
-        duration_to_add: float
-    ) -> Optional[str]:
-        """
-        在指定时间点前增加指定时长的视频（使用该节点的画面）
-
-        Args:
-            video_path: 输入视频路径
-            extend_point: 延长点（秒）
-            duration_to_add: 要增加的时长（秒）
-
-        Returns:
-            输出视频路径
-        """
-        print(f"  在{extend_point:.3f}秒前增加 {duration_to_add:.3f}秒（使用该节点画面）")
-
-        # 提取 extend_point 位置的一帧，并延长 duration_to_add 秒
-        freeze_frame = self.temp_dir / f'freeze_{len(os.listdir(self.temp_dir))}.mp4'
-
-        # 先提取一帧图片
-        temp_frame = self.temp_dir / 'frame.png'
-        cmd = [
-            'ffmpeg', '-y',
-            '-ss', str(extend_point),
-            '-i', video_path,
-            '-vframes', '1',
-            '-q:v', '2',
-            str(temp_frame)
+            for i in sources
         ]
+        results = dict(zip(sources, run_ffmpeg_many(cmds, timeout=300)))
 
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            if result.returncode != 0 or not temp_frame.exists():
-                print(f"  ⚠️  提取帧失败")
-                return None
-        except Exception as e:
-            print(f"  ⚠️  提取帧出错: {e}")
-            return None
-
-        # 使用该帧创建视频（从原视频获取音频参数）
-        cmd = [
-            'ffmpeg', '-y',
-            '-loop', '1',
-            '-i', str(temp_frame),
-            '-t', str(duration_to_add),
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            '-tune', 'stillimage',
-            '-crf', '23',
-            '-pix_fmt', 'yuv420p',
-            '-an',  # 无音频
-            str(freeze_frame)
-        ]
-
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-            if result.returncode != 0 or not freeze_frame.exists():
-                print(f"  ⚠️  创建冻结帧视频失败")
-                return None
-        except Exception as e:
-            print(f"  ⚠️  创建冻结帧视频出错: {e}")
-            return None
-
-        # 获取视频时长
-        video_duration = self.get_video_duration(video_path)
-
-        # 分割视频：[0 - extend_point] + [freeze_frame] + [extend_point - 结束]
-        segment_1_start = 0
-        segment_1_end = extend_point
-        segment_2_start = extend_point
-        segment_2_end = video_duration
-
-        segments_to_extract = []
-        if segment_1_end > segment_1_start:
-            segments_to_extract.append((segment_1_start, segment_1_end))
-        if segment_2_end > segment_2_start:
-            segments_to_extract.append((segment_2_start, segment_2_end))
-
-        # 提取片段
         segment_files = []
-        for i, (start, end) in enumerate(segments_to_extract):
-            temp_segment = self.temp_dir / f'temp_seg_{i}.mp4'
-            duration = end - start
-
-            cmd = [
-                'ffmpeg', '-y',
-                '-ss', str(start),
-                '-i', video_path,
-                '-t', str(duration),
-                '-c', 'copy',
-                '-avoid_negative_ts', '1',
-                '-loglevel', 'error',
-                str(temp_segment)
-            ]
+        for i, piece in enumerate(plan):
+            if piece['type'] == 'freeze':
+                clip = self.filler.get_filler(edl.source_path, piece['at'], piece['duration'], self.profile)
+                if not clip:
+                    return False
+                segment_files.append(clip)
+                continue
+
+            temp_segment = self.temp_dir / f'edl_seg_{i:04d}.mp4'
+            result = results[i]
+            if isinstance(result, Exception):
+                print(f"  ⚠️  片段{i+1}提取出错: {result}")
+                return False
+            if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
+                segment_files.append(str(temp_segment))
+            else:
+                print(f"  ⚠️  片段{i+1}提取失败")
+                return False
 
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
-                    segment_files.append(str(temp_segment))
-                else:
-                    print(f"  ⚠️  片段{i+1}提取失败")
-                    return None
-            except Exception as e:
-                print(f"  ⚠️  片段{i+1}提取出错: {e}")
-                return None
-
-        # 插入冻结帧
-        segment_files.insert(1, str(freeze_frame))
-
-        # 拼接所有片段
-        output_path = self.temp_dir / f'extend_{len(os.listdir(self.temp_dir))}.mp4'
-        concat_list = self.temp_dir / 'concat_list.txt'
+        concat_list = self.temp_dir / 'edl_concat_list.txt'
         with open(concat_list, 'w') as f:
             for seg_file in segment_files:
                 f.write(f"file '{seg_file}'\n")
@@ -326,20 +143,19 @@ class IterativeAdjustClipper:
             '-safe', '0',
             '-i', str(concat_list),
             '-c', 'copy',
+            '-loglevel', 'error',
             str(output_path)
         ]
-
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = run_ffmpeg(cmd, timeout=1800)
             if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
-                print(f"  ✅ 视频延长成功")
-                return str(output_path)
-            else:
-                print(f"  ⚠️  视频延长失败")
-                return None
+                print(f"  ✅ 渲染完成")
+                return True
+            print(f"  ⚠️  拼接失败: {result.stderr}")
+            return False
         except Exception as e:
-            print(f"  ⚠️  视频延长出错: {e}")
-            return None
+            print(f"  ⚠️  拼接出错: {e}")
+            return False
 
     def process(self) -> Dict:
         """执行迭代调整剪辑流程"""
@@ -357,6 +173,9 @@ class IterativeAdjustClipper:
             original_video_duration = self.get_video_duration(self.video_path)
             print(f"原视频时长: {original_video_duration:.2f}秒")
 
+            # 所有调整只记录到剪辑决策列表，不生成中间视频
+            self.edl = EditDecisionList(self.video_path, original_video_duration)
+
             # 2. 逐个对比调整
             total_adjustments = 0
             total_adjustment_time = 0.0
@@ -407,23 +226,17 @@ class IterativeAdjustClipper:
 
                     # 在 curr_video_start 节点前剪掉 time_diff 秒
                     # 即剪掉 [curr_video_start - time_diff, curr_video_start]
-                    new_video = self.clip_segment_at_point(
-                        self.current_video,
-                        curr_video_start,
-                        time_diff
-                    )
+                    removed = self.edl.cut(curr_video_start - time_diff, curr_video_start)
 
-                    if new_video:
-                        self.current_video = new_video
-                        total_adjustment_time += time_diff
-                        cumulative_offset -= time_diff  # 视频变短了，偏移量减少
+                    if removed > 0:
+                        total_adjustment_time += removed
+                        cumulative_offset -= removed  # 视频变短了，偏移量减少
 
                         adjustment_log.append({
                             'index': i + 1,
                             'time_diff': f"{time_diff:+.3f}",
                             'action': '剪掉',
-                            'adjustment': f"剪掉{time_diff:.3f}秒",
-                            'new_video': new_video,
+                            'adjustment': f"剪掉{removed:.3f}秒",
                             'clip_point': f"{curr_video_start:.3f}s",
                             'cumulative_offset': f"{cumulative_offset:+.3f}s"
                         })
@@ -433,7 +246,7 @@ class IterativeAdjustClipper:
                             'index': i + 1,
                             'time_diff': f"{time_diff:+.3f}",
                             'action': '剪掉失败',
-                            'error': '视频剪辑失败'
+                            'error': '剪切区间超出视频范围'
                         })
 
                 else:  # time_diff < 0
@@ -442,23 +255,17 @@ class IterativeAdjustClipper:
                     print(f"  差值 < 0，需要增加 {duration_to_add:.3f}秒")
 
                     # 在 curr_video_start 节点前增加 duration_to_add 秒
-                    new_video = self.extend_segment_at_point(
-                        self.current_video,
-                        curr_video_start,
-                        duration_to_add
-                    )
+                    added = self.edl.insert_freeze(curr_video_start, duration_to_add)
 
-                    if new_video:
-                        self.current_video = new_video
-                        total_adjustment_time -= duration_to_add  # 负数，表示增加了时长
-                        cumulative_offset += duration_to_add  # 视频变长了，偏移量增加
+                    if added > 0:
+                        total_adjustment_time -= added  # 负数，表示增加了时长
+                        cumulative_offset += added  # 视频变长了，偏移量增加
 
                         adjustment_log.append({
                             'index': i + 1,
                             'time_diff': f"{time_diff:+.3f}",
                             'action': '增加',
-                            'adjustment': f"增加{duration_to_add:.3f}秒",
-                            'new_video': new_video,
+                            'adjustment': f"增加{added:.3f}秒",
                             'extend_point': f"{curr_video_start:.3f}s",
                             'cumulative_offset': f"{cumulative_offset:+.3f}s"
                         })
@@ -471,9 +278,14 @@ class IterativeAdjustClipper:
                             'error': '视频延长失败'
                         })
 
-            # 3. 复制最终视频到输出目录
+            # 3. 按剪辑决策列表一次性渲染最终视频
+            edl_path = self.edl.export_json(self.output_dir / "iterative_edl.json")
+            print(f"✅ 剪辑决策列表已导出: {edl_path}")
+
             final_video = self.output_dir / "iterative_adjusted_video.mp4"
-            shutil.copy2(self.current_video, final_video)
+            if not self.render_edl(self.edl, final_video):
+                raise RuntimeError("按剪辑决策列表渲染视频失败")
+            self.current_video = str(final_video)
 
             final_duration = self.get_video_duration(str(final_video))
 
@@ -498,6 +310,7 @@ class IterativeAdjustClipper:
 
             results['success'] = True
             results['adjusted_video'] = str(final_video)
+            results['edl'] = edl_path
             results['stats'] = {
                 'original_duration': original_video_duration,
                 'final_duration': final_duration,
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3.12
+"""
+进程内指标注册表（Prometheus 文本格式）
+
+计数器和直方图只在内存里做加法（每次记录一次加锁），热路径上没有 I/O；
+调度器的工作进程在每个任务结束后把本进程的快照写到快照目录（<pid>.json），
+/api/metrics 合并本进程和其他进程的快照后输出。
+
+阶段（stage）：probe / extract / separation / merge / mix / burn / remux / clip / concat / encode
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from task_trace import trace_span
+
+
+# 耗时直方图的桶（秒），覆盖从 ffprobe 到整段 Demucs 分离
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, object] = {}
+
+    def _key(self, labels: Dict) -> Labels:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def dump(self) -> Dict:
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {'kind': self.kind, 'help': self.help, 'labelnames': list(self.labelnames), 'values': values}
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """当前值（只反映本进程，不与其他进程的快照合并）"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [各桶计数（最后一个是 +Inf）, 总和, 次数]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def dump(self) -> Dict:
+        with self._lock:
+            values = [[list(key), [list(entry[0]), entry[1], entry[2]]] for key, entry in self._values.items()]
+        return {'kind': self.kind, 'help': self.help, 'labelnames': list(self.labelnames),
+                'buckets': list(self.buckets), 'values': values}
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Sequence[str], List]]]] = []
+        self._lock = threading.Lock()
+        self.snapshot_dir: Optional[str] = None
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Sequence[str], List]]]):
+        """
+        注册抓取时才计算的指标（如队列长度）
+
+        Args:
+            collector: 返回 (名称, 类型, 说明, 标签名, [(标签值, 数值), ...]) 序列的函数
+        """
+        self._collectors.append(collector)
+
+    def reset(self):
+        """清空本进程的指标（fork 出的子进程不继承父进程已记录的数值）"""
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._reset()
+
+    # ---------- 多进程汇总 ----------
+
+    def configure(self, snapshot_dir: str, clear: bool = False):
+        """
+        设置快照目录
+
+        Args:
+            snapshot_dir: 各进程快照所在目录
+            clear: 是否删除旧快照（服务启动时计数从 0 开始）
+        """
+        os.makedirs(snapshot_dir, exist_ok=True)
+        if clear:
+            for name in os.listdir(snapshot_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(snapshot_dir, name))
+                    except OSError:
+                        pass
+        self.snapshot_dir = snapshot_dir
+
+    def dump(self) -> Dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+    def flush(self):
+        """把本进程的计数器和直方图写到快照目录（先写临时文件再改名）"""
+        if not self.snapshot_dir:
+            return
+        data = {name: dump for name, dump in self.dump().items() if dump['kind'] != 'gauge'}
+        path = os.path.join(self.snapshot_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _snapshots(self) -> Iterator[Dict]:
+        """其他进程写下的快照"""
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return
+        own = f'{os.getpid()}.json'
+        for name in os.listdir(self.snapshot_dir):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, name)) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def collect(self) -> Dict:
+        """本进程的指标合并其他进程的快照"""
+        merged = self.dump()
+        for snapshot in self._snapshots():
+            for name, dump in snapshot.items():
+                target = merged.get(name)
+                if target is None:
+                    merged[name] = dump
+                    continue
+                if target['kind'] != dump['kind'] or target.get('buckets') != dump.get('buckets'):
+                    continue
+                values = {tuple(key): value for key, value in target['values']}
+                for key, value in dump['values']:
+                    key = tuple(key)
+                    current = values.get(key)
+                    if current is None:
+                        values[key] = value
+                    elif dump['kind'] == 'histogram':
+                        values[key] = [[a + b for a, b in zip(current[0], value[0])],
+                                       current[1] + value[1], current[2] + value[2]]
+                    else:
+                        values[key] = current + value
+                target['values'] = [[list(key), value] for key, value in values.items()]
+        return merged
+
+    # ---------- 输出 ----------
+
+    def render(self) -> str:
+        """Prometheus 文本格式（version 0.0.4）"""
+        lines = []
+        for name, dump in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {dump["help"]}')
+            lines.append(f'# TYPE {name} {dump["kind"]}')
+            labelnames = dump['labelnames']
+            for key, value in sorted(dump['values'], key=lambda kv: kv[0]):
+                if dump['kind'] != 'histogram':
+                    lines.append(f'{name}{_format_labels(labelnames, key)} {_format_number(value)}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(dump['buckets']) + [float('inf')], counts):
+                    cumulative += bucket_count
+                    le = 'le="' + _format_number(bound) + '"'
+                    lines.append(f'{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labelnames, key)} {_format_number(total)}')
+                lines.append(f'{name}_count{_format_labels(labelnames, key)} {count}')
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                continue
+            for name, kind, help_text, labelnames, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for label_values, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(labelnames, label_values)} {_format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=REGISTRY.reset)
+
+
+# ---------- 公共指标 ----------
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'videorecomp_stage_duration_seconds', '各处理阶段（ffmpeg / ffprobe / Demucs 调用）耗时', ('stage',))
+STAGE_READ_BYTES = REGISTRY.counter(
+    'videorecomp_stage_read_bytes_total', '各处理阶段读取的输入文件字节数', ('stage',))
+STAGE_WRITTEN_BYTES = REGISTRY.counter(
+    'videorecomp_stage_written_bytes_total', '各处理阶段写出的文件字节数', ('stage',))
+FFMPEG_STARTED = REGISTRY.counter(
+    'videorecomp_ffmpeg_started_total', '启动的 ffmpeg / ffprobe 进程数', ('stage',))
+FFMPEG_EXITS = REGISTRY.counter(
+    'videorecomp_ffmpeg_exits_total', '结束的 ffmpeg / ffprobe 进程数（按返回码）', ('stage', 'exit_code'))
+TASK_STAGE_SECONDS = REGISTRY.histogram(
+    'videorecomp_task_stage_duration_seconds', '任务流程各阶段（进度阶段）耗时', ('stage',))
+JOB_SECONDS = REGISTRY.histogram(
+    'videorecomp_job_duration_seconds', '任务总耗时', ('category', 'status'))
+CACHE_REQUESTS = REGISTRY.counter(
+    'videorecomp_cache_requests_total', '缓存查询次数', ('cache', 'result'))
+
+
+def path_bytes(paths: Iterable[Optional[str]]) -> int:
+    """文件大小之和（目录按其中所有文件计算，不存在的路径计 0）"""
+    total = 0
+    for path in paths:
+        if not path:
+            continue
+        path = str(path)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+    return total
+
+
+def observe_stage(stage: str, seconds: float, read_bytes: int = 0, written_bytes: int = 0):
+    """记录一次阶段耗时和读写字节数"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if read_bytes:
+        STAGE_READ_BYTES.inc(read_bytes, stage=stage)
+    if written_bytes:
+        STAGE_WRITTEN_BYTES.inc(written_bytes, stage=stage)
+
+
+@contextmanager
+def stage_timer(stage: str, inputs: Iterable[Optional[str]] = (), outputs: Iterable[Optional[str]] = ()):
+    """
+    记录 with 语句内的阶段耗时（出错也记录），输入/输出按文件大小计入读写字节数；
+    同时作为 span 记入当前任务的执行追踪
+
+    Args:
+        stage: 阶段名
+        inputs: 输入文件
+        outputs: 输出文件或目录（退出时统计）
+    """
+    read_bytes = path_bytes(inputs)
+    started = time.perf_counter()
+    with trace_span(stage, 'stage') as span:
+        try:
+            yield
+        finally:
+            written_bytes = path_bytes(outputs)
+            observe_stage(stage, time.perf_counter() - started, read_bytes, written_bytes)
+            span.args.update(read_bytes=read_bytes, written_bytes=written_bytes)
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存查询"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
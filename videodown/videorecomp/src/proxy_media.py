@@ -0,0 +1,268 @@
+#!/usr/bin/env python3.12
+"""
+低分辨率代理（预览模式）
+
+调字幕时间和样式时要反复出片，每次都完整解码、编码原分辨率视频太慢。
+预览模式第一次用到某个视频时生成一份低分辨率代理（默认 360p、0.5 秒一个关键帧、ultrafast），
+之后烧录、剪辑、混音都读代理；还可以只渲染选中字幕附近的一段时间窗口。
+
+代理保留原视频的帧率、时长和全部音轨，时间轴与原视频完全一致，
+预览时确定的字幕时间可以直接用于原视频的最终渲染。
+代理按视频内容抽样指纹缓存，同一视频在不同任务目录下的副本共用一份。
+pysrt / subtitle_track（numpy）只在处理字幕窗口时导入，导入本模块不拖慢服务启动。
+
+环境变量：
+    VIDEORECOMP_PROXY_HEIGHT   代理高度（默认 360，不会放大比它小的视频）
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ffmpeg_progress import run_ffmpeg, run_probe
+from encoding_profiles import EncodingProfile, get_profile
+
+
+PROXY_HEIGHT = int(os.environ.get('VIDEORECOMP_PROXY_HEIGHT', '360'))
+PROXY_GOP_SECONDS = 0.5          # 关键帧间隔：流复制切片和窗口裁剪的 seek 误差不超过半秒
+PREVIEW_PROFILE = 'draft'        # 预览任务默认使用的编码档位
+DEFAULT_WINDOW_PADDING = 2.0     # 时间窗口在选中字幕前后各留的秒数
+FINGERPRINT_SAMPLE_BYTES = 4 * 1024 * 1024
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "videorecomp_proxy_cache"
+
+
+def source_fingerprint(video_path: str) -> str:
+    """
+    视频内容的抽样指纹：文件大小 + 开头和结尾各 4MB（mp4 的 moov 在文件头或文件尾）
+
+    不读完整文件，GB 级视频也只需要几毫秒。
+    """
+    size = os.path.getsize(video_path)
+    hasher = hashlib.sha1(str(size).encode('ascii'))
+    with open(video_path, 'rb') as f:
+        hasher.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+        if size > FINGERPRINT_SAMPLE_BYTES:
+            f.seek(max(FINGERPRINT_SAMPLE_BYTES, size - FINGERPRINT_SAMPLE_BYTES))
+            hasher.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    return hasher.hexdigest()[:24]
+
+
+class ProxyCache:
+    """低分辨率代理生成器（带缓存）"""
+
+    def __init__(self, cache_dir: Optional[str] = None, height: int = PROXY_HEIGHT):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.height = height
+
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def proxy_path(self, video_path: str) -> Path:
+        """代理文件路径（不检查是否已生成）"""
+        return self.cache_dir / f"proxy_{source_fingerprint(video_path)}_{self.height}p.mp4"
+
+    def _build_command(self, video_path: str, output_path: str) -> list:
+        """构建代理编码命令：缩小画面、固定短关键帧间隔，帧率和音轨保持不变"""
+        profile = get_profile(PREVIEW_PROFILE)
+        return [
+            'ffmpeg', '-y',
+            '-i', video_path,
+            '-map', '0:v:0', '-map', '0:a?',
+            '-vf', f"scale=-2:'trunc(min({self.height},ih)/2)*2'",
+            *profile.video_args(),
+            '-force_key_frames', f'expr:gte(t,n_forced*{PROXY_GOP_SECONDS})',
+            '-sc_threshold', '0',
+            *profile.audio_args(),
+            *profile.container_args(),
+            '-sn', '-dn',
+            '-loglevel', 'error',
+            output_path
+        ]
+
+    def get_proxy(self, video_path: str) -> str:
+        """
+        获取视频的代理（没有时生成）
+
+        Args:
+            video_path: 原视频路径
+
+        Returns:
+            代理文件路径
+
+        Raises:
+            subprocess.CalledProcessError: 生成代理失败
+        """
+        output_path = self.proxy_path(video_path)
+        with self._lock:
+            key_lock = self._locks.setdefault(output_path.name, threading.Lock())
+
+        # 同一视频的并发请求只生成一次
+        with key_lock:
+            if output_path.exists() and output_path.stat().st_size > 0:
+                self.hits += 1
+                self._touch(output_path)
+                return str(output_path)
+
+            self.misses += 1
+            print(f"🎞️  生成 {self.height}p 代理: {Path(video_path).name}")
+            # 先写临时文件再改名，其他进程不会读到半成品
+            partial_path = output_path.with_name(f"{output_path.stem}.{os.getpid()}.partial.mp4")
+            try:
+                run_ffmpeg(self._build_command(video_path, str(partial_path)), check=True, stage='proxy')
+                os.replace(partial_path, output_path)
+            finally:
+                if partial_path.exists():
+                    partial_path.unlink()
+            return str(output_path)
+
+    @staticmethod
+    def _touch(path: Path):
+        """记录代理被使用（更新访问时间，存储清理按它淘汰）"""
+        try:
+            st = path.stat()
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0
+        }
+
+
+def video_height(video_path: str) -> Optional[int]:
+    """视频画面高度（获取失败返回 None）"""
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-select_streams', 'v:0', '-show_entries', 'stream=height', video_path
+    ]
+    try:
+        streams = json.loads(run_probe(cmd).stdout).get('streams', [])
+        return int(streams[0]['height']) if streams else None
+    except Exception:
+        return None
+
+
+# ---------- 时间窗口 ----------
+
+def parse_cue_selection(value: Optional[str]) -> List[int]:
+    """
+    解析字幕序号选择（从 1 开始），如 "12"、"3,5"、"10-14"
+
+    Raises:
+        ValueError: 格式错误
+    """
+    cues = set()
+    for part in (value or '').replace('，', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (int(x) for x in part.split('-', 1))
+            if first > last:
+                first, last = last, first
+            cues.update(range(first, last + 1))
+        else:
+            cues.add(int(part))
+    if any(cue < 1 for cue in cues):
+        raise ValueError(f"字幕序号从 1 开始: {value}")
+    return sorted(cues)
+
+
+def cue_window(srt_path: str, cues: List[int], padding: float = DEFAULT_WINDOW_PADDING) -> Tuple[float, float]:
+    """
+    选中字幕覆盖的时间窗口（前后各留 padding 秒）
+
+    Args:
+        srt_path: 字幕文件
+        cues: 字幕序号（从 1 开始，按文件中的顺序）
+        padding: 前后留白（秒）
+
+    Returns:
+        (开始秒, 结束秒)
+
+    Raises:
+        ValueError: 序号超出字幕条数
+    """
+    import pysrt
+    from subtitle_track import detect_srt_encoding
+
+    subs = pysrt.open(srt_path, encoding=detect_srt_encoding(srt_path))
+    if not cues or max(cues) > len(subs):
+        raise ValueError(f"字幕序号超出范围（共 {len(subs)} 条）: {cues}")
+    start = min(subs[cue - 1].start.ordinal for cue in cues) / 1000.0
+    end = max(subs[cue - 1].end.ordinal for cue in cues) / 1000.0
+    return max(0.0, start - padding), end + padding
+
+
+def cut_window(video_path: str, start: float, end: float, output_path: str,
+               profile: Optional[EncodingProfile] = None) -> str:
+    """
+    截取时间窗口（重新编码，起点精确到帧；代理是短 GOP 低分辨率，只需要很短时间）
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg 失败
+    """
+    profile = get_profile(profile or PREVIEW_PROFILE)
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{start:.3f}',
+        '-i', video_path,
+        '-t', f'{end - start:.3f}',
+        '-map', '0:v:0', '-map', '0:a?',
+        *profile.output_args(),
+        '-loglevel', 'error',
+        output_path
+    ]
+    run_ffmpeg(cmd, check=True)
+    return output_path
+
+
+def shift_subtitles(srt_path: str, start: float, end: float, output_path: str) -> int:
+    """
+    把字幕裁到时间窗口内并平移到从 0 开始（与 cut_window 的输出对齐）
+
+    Returns:
+        窗口内的字幕条数
+    """
+    import pysrt
+    from subtitle_track import detect_srt_encoding
+
+    subs = pysrt.open(srt_path, encoding=detect_srt_encoding(srt_path))
+    start_ms, end_ms = int(round(start * 1000)), int(round(end * 1000))
+    kept = pysrt.SubRipFile()
+    for sub in subs:
+        if sub.end.ordinal <= start_ms or sub.start.ordinal >= end_ms:
+            continue
+        item = pysrt.SubRipItem(
+            index=len(kept) + 1,
+            start=pysrt.SubRipTime.from_ordinal(max(sub.start.ordinal, start_ms) - start_ms),
+            end=pysrt.SubRipTime.from_ordinal(min(sub.end.ordinal, end_ms) - start_ms),
+            text=sub.text
+        )
+        kept.append(item)
+    kept.save(output_path, encoding='utf-8')
+    return len(kept)
+
+
+def scale_subtitle_config(config: Optional[Dict], factor: float) -> Dict:
+    """按代理与原视频的高度比例缩放字幕样式中的像素值（字号、边距、描边）"""
+    scaled = dict(config or {})
+    for key in ('fontSize', 'bottomMargin', 'font_size', 'margin_v', 'outline'):
+        value = scaled.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            scaled[key] = max(1, int(round(value * factor)))
+    return scaled
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3.12
+"""
+临时工作区管理
+短期中间文件（切出的片段、拼接列表、提取的音轨）优先放在快速存储（tmpfs，如 /dev/shm），
+快速存储的预算不够时放到磁盘临时目录；产物转正用 rename / 硬链接，不复制字节。
+
+环境变量：
+    VIDEORECOMP_SCRATCH_FAST_DIR   快速存储目录（默认 /dev/shm，不存在时不用；设为空关闭）
+    VIDEORECOMP_SCRATCH_FAST_MB    快速存储预算（默认 1024 MB，所有进程合计）
+    VIDEORECOMP_SCRATCH_DIR        磁盘临时目录（默认系统临时目录）
+"""
+
+import os
+import errno
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+# 各处理器的临时目录前缀（存储清理按这些前缀回收崩溃遗留的目录）
+SCRATCH_PREFIXES = (
+    'videorecomp_', 'compact_clip_', 'enhanced_clip_', 'iterative_clip_',
+    'timeline_align_', 'timeline_remap_', 'subtitle_analysis_', 'audio_merge_',
+)
+
+FAST_DIR = os.environ.get('VIDEORECOMP_SCRATCH_FAST_DIR', '/dev/shm')
+FAST_BUDGET = int(float(os.environ.get('VIDEORECOMP_SCRATCH_FAST_MB', '1024')) * 1024 * 1024)
+DISK_DIR = os.environ.get('VIDEORECOMP_SCRATCH_DIR') or tempfile.gettempdir()
+
+# 快速存储至少保留的剩余空间（tmpfs 占用的是内存）
+FAST_RESERVE = 256 * 1024 * 1024
+
+_lock = threading.Lock()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def fast_usage() -> int:
+    """快速存储上所有工作区的占用（包括其他进程的）"""
+    if not FAST_DIR or not os.path.isdir(FAST_DIR):
+        return 0
+    total = 0
+    for name in os.listdir(FAST_DIR):
+        if name.startswith(SCRATCH_PREFIXES):
+            total += _dir_size(os.path.join(FAST_DIR, name))
+    return total
+
+
+def _fits_fast(expected_bytes: int) -> bool:
+    if not FAST_DIR or FAST_BUDGET <= 0 or not os.path.isdir(FAST_DIR) or not os.access(FAST_DIR, os.W_OK):
+        return False
+    if fast_usage() + expected_bytes > FAST_BUDGET:
+        return False
+    return shutil.disk_usage(FAST_DIR).free - expected_bytes > FAST_RESERVE
+
+
+def scratch_dir(prefix: str = 'videorecomp_', expected_bytes: int = 0) -> str:
+    """
+    创建临时工作目录
+
+    Args:
+        prefix: 目录名前缀（应为 SCRATCH_PREFIXES 之一）
+        expected_bytes: 预计写入的字节数，放得进快速存储预算时放在快速存储上
+
+    Returns:
+        目录路径（由调用方删除）
+    """
+    with _lock:
+        if _fits_fast(expected_bytes):
+            return tempfile.mkdtemp(prefix=prefix, dir=FAST_DIR)
+    os.makedirs(DISK_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=DISK_DIR)
+
+
+@contextmanager
+def scratch_space(prefix: str = 'videorecomp_', expected_bytes: int = 0) -> Iterator[str]:
+    """临时工作目录（退出时删除，出错也会删除）"""
+    path = scratch_dir(prefix, expected_bytes)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def estimate_bytes(*paths: Optional[str], factor: float = 1.0) -> int:
+    """按输入文件大小估算中间文件大小"""
+    total = 0
+    for path in paths:
+        if path and os.path.isfile(path):
+            total += os.path.getsize(path)
+    return int(total * factor)
+
+
+def promote(source: str, dest: str) -> str:
+    """
+    把临时文件转正为产物（同一文件系统上 rename，跨文件系统时才复制）
+
+    Returns:
+        dest
+    """
+    dest = str(dest)
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    try:
+        os.replace(source, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(source, dest)
+        os.remove(source)
+    return dest
+
+
+def link_or_copy(source: str, dest: str) -> str:
+    """
+    让产物在另一个位置也可见（硬链接，跨文件系统时才复制）
+
+    产物生成后不再修改，共用同一个 inode 是安全的
+
+    Returns:
+        dest
+    """
+    source, dest = str(source), str(dest)
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+    return dest
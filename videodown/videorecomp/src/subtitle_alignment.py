@@ -0,0 +1,253 @@
+#!/usr/bin/env python3.12
+"""
+字幕对齐引擎 - 带状动态规划（DP/DTW）求全局最优的单调匹配
+
+综合时间接近度、文本相似度、时长相似度打分；
+每条新字幕的候选原字幕窗口通过对排序后的开始时间做 bisect 得到，
+复杂度 O(N·band)，所有剪辑策略共用。
+DP 只用 MinHash 估计的文本相似度打分；需要精确值时，
+只对回溯得到的 N 个匹配用 SequenceMatcher 复核。
+"""
+
+import bisect
+from itertools import accumulate
+from typing import List, Tuple, Optional, Callable, Sequence
+
+from text_similarity import CueTextKernel
+
+
+# 字幕条目: (开始秒, 结束秒, 文本)
+Cue = Tuple[float, float, str]
+
+# MinHash 估计值对不相关文本偏高（约 0.1~0.2），用估计值选锚点时提高门槛，避免时间偏移被错误锚点带偏
+_ESTIMATE_ANCHOR_MARGIN = 0.2
+
+
+def cues_from_subs(subs) -> List[Cue]:
+    """将 pysrt 字幕列表（或 SubtitleTrack）转换为 (开始, 结束, 文本) 列表"""
+    if hasattr(subs, 'cues'):
+        return subs.cues()
+    return [(sub.start.ordinal / 1000.0, sub.end.ordinal / 1000.0, sub.text) for sub in subs]
+
+
+class CueTimeIndex:
+    """按开始时间排序的字幕索引，用 bisect 查找时间窗口内的候选"""
+
+    def __init__(self, cues: Sequence[Cue]):
+        self.order = sorted(range(len(cues)), key=lambda k: cues[k][0])
+        self.starts = [cues[k][0] for k in self.order]
+        self.ends = [cues[k][1] for k in self.order]
+        self.max_duration = max((e - s for s, e in zip(self.starts, self.ends)), default=0.0)
+
+    def window(self, start: float, end: float) -> Tuple[int, int]:
+        """开始时间落在 [start, end] 内的排序位置区间 [lo, hi)"""
+        return bisect.bisect_left(self.starts, start), bisect.bisect_right(self.starts, end)
+
+    def overlapping(self, start: float, end: float) -> List[int]:
+        """与 [start, end] 有重叠的字幕（原始索引）"""
+        lo = bisect.bisect_left(self.starts, start - self.max_duration)
+        hi = bisect.bisect_left(self.starts, end)
+        return [self.order[k] for k in range(lo, hi) if self.ends[k] > start]
+
+
+class SubtitleAligner:
+    """带状DP字幕对齐器"""
+
+    def __init__(
+        self,
+        time_weight: float = 0.4,
+        text_weight: float = 0.4,
+        duration_weight: float = 0.2,
+        time_window: float = 10.0,
+        band: int = 24,
+        min_score: float = 0.3,
+        min_text_similarity: float = 0.0,
+        text_similarity: Optional[Callable[[str, str], float]] = None,
+        track_drift: bool = True,
+        anchor_similarity: float = 0.6,
+        top_k: int = 3,
+        rerank: bool = False
+    ):
+        """
+        初始化对齐器
+
+        Args:
+            time_weight: 时间接近度权重
+            text_weight: 文本相似度权重
+            duration_weight: 时长相似度权重
+            time_window: 候选时间窗口（秒），开始时间差超过该值不参与匹配
+            band: 每条新字幕最多考虑的候选原字幕数
+            min_score: 接受匹配的最低综合得分
+            min_text_similarity: 接受匹配的最低文本相似度
+            text_similarity: 自定义文本相似度函数（默认使用预计算签名的批量相似度核）
+            track_drift: 是否跟踪累积时间偏移（插入/删除导致的整体漂移）
+            anchor_similarity: 用于更新时间偏移的锚点文本相似度
+            top_k: 每条新字幕保留的文本候选数（其余候选文本相似度按0计）
+            rerank: 是否用 SequenceMatcher 复核回溯得到的匹配（文本部分换成精确值后重新检查
+                min_score / min_text_similarity；关闭时只用 MinHash 估计值）
+        """
+        self.time_weight = time_weight
+        self.text_weight = text_weight
+        self.duration_weight = duration_weight
+        self.time_window = time_window
+        self.band = max(1, band)
+        self.min_score = min_score
+        self.min_text_similarity = min_text_similarity
+        self.text_similarity = text_similarity
+        self.track_drift = track_drift
+        self.anchor_similarity = anchor_similarity
+        self.top_k = top_k
+        self.rerank = rerank
+
+    def _window(self, target: float, orig_starts: List[float], prev_lo: int, prev_hi: int) -> Tuple[int, int]:
+        """计算候选窗口 [lo, hi)，保证 lo/hi 单调不减且宽度不超过 band"""
+        lo = bisect.bisect_left(orig_starts, target - self.time_window)
+        hi = bisect.bisect_right(orig_starts, target + self.time_window)
+        if hi - lo > self.band:
+            center = bisect.bisect_left(orig_starts, target)
+            lo = max(lo, min(center - self.band // 2, hi - self.band))
+            hi = lo + self.band
+        hi = max(hi, prev_hi)
+        lo = max(lo, prev_lo, hi - self.band)
+        return lo, hi
+
+    def align(self, original_cues: Sequence[Cue], new_cues: Sequence[Cue]) -> List[Tuple[int, int, float]]:
+        """
+        求全局最优单调匹配
+
+        Args:
+            original_cues: 原字幕 [(开始, 结束, 文本), ...]
+            new_cues: 新字幕 [(开始, 结束, 文本), ...]
+
+        Returns:
+            [(新字幕索引, 原字幕索引, 得分), ...]，按新字幕顺序
+        """
+        if not original_cues or not new_cues:
+            return []
+
+        orig_index = CueTimeIndex(original_cues)
+        new_index = CueTimeIndex(new_cues)
+        orig_order, new_order = orig_index.order, new_index.order
+
+        o_starts = orig_index.starts
+        o_durs = [e - s for s, e in zip(orig_index.starts, orig_index.ends)]
+        n_starts = new_index.starts
+        n_durs = [e - s for s, e in zip(new_index.starts, new_index.ends)]
+
+        custom_sim = self.text_similarity
+        if custom_sim is None:
+            kernel = CueTextKernel(
+                [original_cues[k][2] for k in orig_order],
+                [new_cues[k][2] for k in new_order],
+                top_k=self.top_k
+            )
+        else:
+            o_texts = [original_cues[k][2] for k in orig_order]
+            n_texts = [new_cues[k][2] for k in new_order]
+
+        w_time, w_text, w_dur = self.time_weight, self.text_weight, self.duration_weight
+        window_sec = self.time_window
+        min_score, min_text = self.min_score, self.min_text_similarity
+        anchor_floor = self.anchor_similarity
+        if custom_sim is None:
+            anchor_floor = min(1.0, anchor_floor + _ESTIMATE_ANCHOR_MARGIN)
+
+        windows = []
+        rows = []  # 每行 (左侧取值, 行取值, 候选取值, {列: (得分, 文本相似度)})
+        drift = 0.0  # 原字幕时间 - 新字幕时间 的当前估计
+
+        prev_lo, prev_hi, prev_vals, prev_left = 0, 0, [], 0.0
+        for j in range(len(n_starts)):
+            ns, nd = n_starts[j] + drift, n_durs[j]
+            lo, hi = self._window(ns, o_starts, prev_lo, prev_hi)
+            windows.append((lo, hi))
+            prev_best = prev_vals[-1] if prev_vals else prev_left
+
+            # 上一行在 [lo-1, hi) 上的取值（lo >= prev_lo，只有 lo-1 可能落在上一窗口左侧）
+            if lo - 1 < prev_lo:
+                prev_ext = [prev_left] + prev_vals[:hi - prev_lo]
+            else:
+                prev_ext = prev_vals[lo - 1 - prev_lo:hi - prev_lo]
+            if hi > prev_hi:
+                prev_ext.extend([prev_best] * (hi - max(prev_hi, lo - 1)))
+
+            # 整块计算文本相似度（一次矩阵运算）
+            if hi == lo:
+                row_text = []
+            elif custom_sim is None:
+                row_text = kernel.block_similarity(j, lo, hi).tolist()
+            else:
+                row_text = [custom_sim(n_texts[j], o_texts[i]) for i in range(lo, hi)]
+
+            left_val = prev_ext[0]
+            cands = prev_ext[1:]  # 每列 max(上方, 对角)
+            diags = {}
+            anchor_sim, anchor_i = anchor_floor, -1
+            # top-k 之外的候选文本相似度为0，只对达到 min_text 的候选打分
+            for k, text_sim in enumerate(row_text):
+                if text_sim < min_text:
+                    continue
+                i = lo + k
+                time_diff = abs(o_starts[i] - ns)
+                if time_diff > window_sec:
+                    continue
+                time_sim = 1.0 - time_diff / window_sec if window_sec > 0 else 1.0
+                od = o_durs[i]
+                longest = od if od > nd else nd
+                dur_sim = (od if od < nd else nd) / longest if longest > 0 else 1.0
+                score = w_time * time_sim + w_dur * dur_sim + w_text * text_sim
+                if score >= min_score:
+                    if text_sim >= anchor_sim:
+                        anchor_sim, anchor_i = text_sim, i
+                    diag = prev_ext[k] + score
+                    if diag > cands[k]:
+                        cands[k] = diag
+                        diags[k] = (score, text_sim)
+
+            # 行取值 = 左侧与候选取值的前缀最大值
+            vals = list(accumulate(cands, max, initial=left_val))
+            del vals[0]
+
+            rows.append((left_val, vals, cands, diags))
+            if self.track_drift and anchor_i >= 0:
+                drift = o_starts[anchor_i] - n_starts[j]
+            prev_lo, prev_hi, prev_vals, prev_left = lo, hi, vals, left_val
+
+        # 回溯：对角取值严格大于左侧和上方时匹配，否则左侧严格大于上方时跳过原字幕，再否则跳过新字幕
+        matches = []
+        j, i = len(windows) - 1, len(o_starts) - 1
+        while j >= 0 and i >= 0:
+            lo, hi = windows[j]
+            if i >= hi:
+                i = hi - 1
+                continue
+            if i < lo:
+                j -= 1
+                continue
+            left_val, vals, cands, diags = rows[j]
+            k = i - lo
+            current = vals[k - 1] if k else left_val
+            cell = diags.get(k)
+            if cell is not None and cands[k] > current:
+                score, text_sim = cell
+                if self.rerank and custom_sim is None:
+                    # 文本部分换成精确值，不再满足阈值的匹配丢弃
+                    exact = kernel.similarity(j, i)
+                    score += w_text * (exact - text_sim)
+                    if score < min_score or exact < min_text:
+                        score = None
+                if score is not None:
+                    matches.append((new_order[j], orig_order[i], score))
+                i -= 1
+                j -= 1
+            elif cell is not None or current > cands[k]:
+                i -= 1
+            else:
+                j -= 1
+
+        matches.reverse()
+        return matches
+
+    def align_subs(self, original_subs, new_subs) -> List[Tuple[int, int, float]]:
+        """对齐 pysrt 字幕列表"""
+        return self.align(cues_from_subs(original_subs), cues_from_subs(new_subs))
@@ -1,12 +1,54 @@
 #!/usr/bin/env python3.12
 """
 增强的字幕分析器 - 提供详细的时间分析和可视化数据
+
+差值、统计和直方图都在 NumPy 列上计算；逐条明细按需分页生成，
+分析结果按两个字幕文件的内容哈希缓存。
 """
 
-import pysrt
-import chardet
-from typing import List, Dict, Tuple
 import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from subtitle_track import SubtitleTrack
+from metrics import record_cache
+
+
+# 明细中截断显示的文本长度
+TIMELINE_TEXT_LIMIT = 50
+
+
+def _offset_stats(values: np.ndarray) -> Dict:
+    """最小/最大/平均值统计"""
+    if not len(values):
+        return {'min': 0, 'max': 0, 'avg': 0}
+    return {
+        'min': round(float(values.min()), 3),
+        'max': round(float(values.max()), 3),
+        'avg': round(float(values.mean()), 3),
+    }
+
+
+def _histogram(values: np.ndarray, bin_count: int = 20) -> Dict:
+    """等宽直方图"""
+    if not len(values):
+        return {'bins': [], 'counts': []}
+    counts, edges = np.histogram(values, bins=bin_count)
+    return {
+        'bins': np.round(edges, 3).tolist(),
+        'counts': counts.tolist(),
+        'min': round(float(values.min()), 3),
+        'max': round(float(values.max()), 3),
+        'avg': round(float(values.mean()), 3)
+    }
+
+
+def _truncate(text: str, limit: int = TIMELINE_TEXT_LIMIT) -> str:
+    return text[:limit] + '...' if len(text) > limit else text
 
 
 class SubtitleAnalyzer:
@@ -22,21 +64,14 @@ class SubtitleAnalyzer:
         """
         self.original_srt_path = original_srt_path
         self.new_srt_path = new_srt_path
-        self.original_subs = None
-        self.new_subs = None
+        self.original_subs: Optional[SubtitleTrack] = None
+        self.new_subs: Optional[SubtitleTrack] = None
+        self.columns: Dict[str, np.ndarray] = {}
         self.analysis_result = {}
 
-    def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
+    def load_subtitle(self, srt_path: str) -> SubtitleTrack:
         """加载单个字幕文件"""
-        # 检测编码
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-
-        # 加载字幕
-        subs = pysrt.open(srt_path, encoding=encoding)
-        return subs
+        return SubtitleTrack.load(srt_path)
 
     def load_subtitles(self):
         """加载字幕文件"""
@@ -48,183 +83,206 @@ class SubtitleAnalyzer:
             print(f"加载新字幕: {self.new_srt_path}")
             self.new_subs = self.load_subtitle(self.new_srt_path)
 
-    def analyze_single_subtitle(self, subs: pysrt.SubRipFile) -> Dict:
+    def analyze_single_subtitle(self, subs) -> Dict:
         """分析单个字幕文件的时间特征"""
-        if not subs or len(subs) == 0:
+        if subs is None or len(subs) == 0:
             return {}
+        if not isinstance(subs, SubtitleTrack):
+            subs = SubtitleTrack.from_subs(subs)
 
-        # 计算时间间隔
-        gaps = []
-        durations = []
-        for i in range(len(subs)):
-            sub = subs[i]
-            start = sub.start.ordinal / 1000.0
-            end = sub.end.ordinal / 1000.0
-            duration = end - start
-            durations.append(duration)
-
-            if i > 0:
-                prev_end = subs[i-1].end.ordinal / 1000.0
-                gap = start - prev_end
-                gaps.append(gap)
+        starts, ends = subs.start_seconds, subs.end_seconds
+        durations = ends - starts
+        gaps = starts[1:] - ends[:-1]
+        duration_stats = _offset_stats(durations)
+        gap_stats = _offset_stats(gaps)
 
         return {
             'count': len(subs),
-            'total_duration': subs[-1].end.ordinal / 1000.0,
-            'avg_duration': sum(durations) / len(durations) if durations else 0,
-            'min_duration': min(durations) if durations else 0,
-            'max_duration': max(durations) if durations else 0,
-            'avg_gap': sum(gaps) / len(gaps) if gaps else 0,
-            'min_gap': min(gaps) if gaps else 0,
-            'max_gap': max(gaps) if gaps else 0,
+            'total_duration': float(ends[-1]),
+            'avg_duration': duration_stats['avg'],
+            'min_duration': duration_stats['min'],
+            'max_duration': duration_stats['max'],
+            'avg_gap': gap_stats['avg'],
+            'min_gap': gap_stats['min'],
+            'max_gap': gap_stats['max'],
         }
 
-    def compare_subtitles(self) -> Dict:
+    def _build_columns(self):
+        """按序号对齐两份字幕，计算时间差列（毫秒整数运算，避免浮点累积误差）"""
+        count = min(len(self.original_subs), len(self.new_subs))
+        orig_start = self.original_subs.starts_ms[:count]
+        orig_end = self.original_subs.ends_ms[:count]
+        new_start = self.new_subs.starts_ms[:count]
+        new_end = self.new_subs.ends_ms[:count]
+
+        self.columns = {
+            'original_start': orig_start / 1000.0,
+            'original_end': orig_end / 1000.0,
+            'original_duration': (orig_end - orig_start) / 1000.0,
+            'new_start': new_start / 1000.0,
+            'new_end': new_end / 1000.0,
+            'new_duration': (new_end - new_start) / 1000.0,
+            'start_diff': (new_start - orig_start) / 1000.0,
+            'end_diff': (new_end - orig_end) / 1000.0,
+            'duration_diff': ((new_end - new_start) - (orig_end - orig_start)) / 1000.0,
+        }
+
+    @property
+    def compared_count(self) -> int:
+        return len(self.columns.get('start_diff', ()))
+
+    def compare_subtitles(self, include_details: bool = True) -> Dict:
         """
         对比原字幕和新字幕的时间差异
 
+        Args:
+            include_details: 是否生成全部逐条明细（大文件建议用 get_details_page 分页获取）
+
         Returns:
             详细的分析结果字典
         """
         if not self.original_subs or not self.new_subs:
             return {'error': '需要加载两个字幕文件才能对比'}
 
-        # 获取最小数量
-        min_count = min(len(self.original_subs), len(self.new_subs))
+        if not self.columns:
+            self._build_columns()
+        columns = self.columns
 
-        details = []
-        start_diffs = []
-        duration_diffs = []
-        end_diffs = []
+        analysis = {
+            'summary': {
+                'original_count': len(self.original_subs),
+                'new_count': len(self.new_subs),
+                'compared_count': self.compared_count,
+                'start_offset': _offset_stats(columns['start_diff']),
+                'duration_offset': _offset_stats(columns['duration_diff']),
+                'end_offset': _offset_stats(columns['end_diff']),
+            }
+        }
 
-        for i in range(min_count):
-            orig_sub = self.original_subs[i]
-            new_sub = self.new_subs[i]
+        self.analysis_result = analysis
+        if include_details:
+            return dict(analysis, details=self.get_details_page(0, self.compared_count))
+        return analysis
+
+    def _ensure_analysis(self):
+        if not self.analysis_result:
+            self.compare_subtitles(include_details=False)
 
-            orig_start = orig_sub.start.ordinal / 1000.0
-            orig_end = orig_sub.end.ordinal / 1000.0
-            orig_duration = orig_end - orig_start
-            orig_text = orig_sub.text
+    def _rounded_slice(self, name: str, offset: int, end: int) -> List[float]:
+        return np.round(self.columns[name][offset:end], 3).tolist()
 
-            new_start = new_sub.start.ordinal / 1000.0
-            new_end = new_sub.end.ordinal / 1000.0
-            new_duration = new_end - new_start
-            new_text = new_sub.text
+    def get_details_page(self, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """
+        逐条对比明细（分页）
 
-            start_diff = new_start - orig_start
-            end_diff = new_end - orig_end
-            duration_diff = new_duration - orig_duration
+        Args:
+            offset: 起始位置
+            limit: 条数
 
-            start_diffs.append(start_diff)
-            end_diffs.append(end_diff)
-            duration_diffs.append(duration_diff)
+        Returns:
+            明细列表，格式与 compare_subtitles 的 details 一致
+        """
+        self._ensure_analysis()
+        offset = max(0, offset)
+        end = min(self.compared_count, offset + max(0, limit))
+        if end <= offset:
+            return []
+
+        names = ('original_start', 'original_end', 'original_duration',
+                 'new_start', 'new_end', 'new_duration',
+                 'start_diff', 'end_diff', 'duration_diff')
+        (o_start, o_end, o_dur, n_start, n_end, n_dur,
+         start_diff, end_diff, dur_diff) = (self._rounded_slice(name, offset, end) for name in names)
+        orig_texts, new_texts = self.original_subs.texts, self.new_subs.texts
 
+        details = []
+        for k in range(end - offset):
+            i = offset + k
             details.append({
                 'index': i + 1,
                 'original': {
-                    'text': orig_text,
-                    'start': round(orig_start, 3),
-                    'end': round(orig_end, 3),
-                    'duration': round(orig_duration, 3)
+                    'text': orig_texts[i],
+                    'start': o_start[k],
+                    'end': o_end[k],
+                    'duration': o_dur[k]
                 },
                 'new': {
-                    'text': new_text,
-                    'start': round(new_start, 3),
-                    'end': round(new_end, 3),
-                    'duration': round(new_duration, 3)
+                    'text': new_texts[i],
+                    'start': n_start[k],
+                    'end': n_end[k],
+                    'duration': n_dur[k]
                 },
                 'differences': {
-                    'start_diff': round(start_diff, 3),
-                    'end_diff': round(end_diff, 3),
-                    'duration_diff': round(duration_diff, 3)
+                    'start_diff': start_diff[k],
+                    'end_diff': end_diff[k],
+                    'duration_diff': dur_diff[k]
                 }
             })
+        return details
 
-        # 统计信息
-        analysis = {
-            'summary': {
-                'original_count': len(self.original_subs),
-                'new_count': len(self.new_subs),
-                'compared_count': min_count,
-                'start_offset': {
-                    'min': round(min(start_diffs), 3) if start_diffs else 0,
-                    'max': round(max(start_diffs), 3) if start_diffs else 0,
-                    'avg': round(sum(start_diffs) / len(start_diffs), 3) if start_diffs else 0,
-                },
-                'duration_offset': {
-                    'min': round(min(duration_diffs), 3) if duration_diffs else 0,
-                    'max': round(max(duration_diffs), 3) if duration_diffs else 0,
-                    'avg': round(sum(duration_diffs) / len(duration_diffs), 3) if duration_diffs else 0,
-                },
-                'end_offset': {
-                    'min': round(min(end_diffs), 3) if end_diffs else 0,
-                    'max': round(max(end_diffs), 3) if end_diffs else 0,
-                    'avg': round(sum(end_diffs) / len(end_diffs), 3) if end_diffs else 0,
-                }
-            },
-            'details': details
-        }
+    def get_columnar_page(self, offset: int = 0, limit: int = 1000) -> Dict:
+        """
+        逐条对比明细（列式，体积比逐条字典小得多）
 
-        self.analysis_result = analysis
-        return analysis
+        Returns:
+            {'offset', 'count', 'index': [...], 'original_start': [...], ...}
+        """
+        self._ensure_analysis()
+        offset = max(0, offset)
+        end = max(offset, min(self.compared_count, offset + max(0, limit)))
+
+        page = {'offset': offset, 'count': end - offset, 'index': list(range(offset + 1, end + 1))}
+        for name in self.columns:
+            page[name] = self._rounded_slice(name, offset, end)
+        page['original_text'] = self.original_subs.texts[offset:end]
+        page['new_text'] = self.new_subs.texts[offset:end]
+        return page
+
+    def get_timeline_page(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """时间轴对比数据（文本截断显示）"""
+        self._ensure_analysis()
+        offset = max(0, offset)
+        end = self.compared_count if limit is None else min(self.compared_count, offset + max(0, limit))
+        if end <= offset:
+            return []
+
+        o_start, o_end, n_start, n_end = (
+            self._rounded_slice(name, offset, end)
+            for name in ('original_start', 'original_end', 'new_start', 'new_end')
+        )
+        orig_texts, new_texts = self.original_subs.texts, self.new_subs.texts
+        return [
+            {
+                'index': offset + k + 1,
+                'original_start': o_start[k],
+                'original_end': o_end[k],
+                'new_start': n_start[k],
+                'new_end': n_end[k],
+                'original_text': _truncate(orig_texts[offset + k]),
+                'new_text': _truncate(new_texts[offset + k]),
+            }
+            for k in range(end - offset)
+        ]
 
-    def generate_visualization_data(self) -> Dict:
+    def generate_visualization_data(self, timeline_limit: Optional[int] = None) -> Dict:
         """
         生成前端可视化所需的数据
 
+        Args:
+            timeline_limit: 时间轴数据最多返回的条数（None 为全部）
+
         Returns:
             可视化数据字典
         """
-        if not self.analysis_result:
-            self.compare_subtitles()
-
-        details = self.analysis_result.get('details', [])
-
-        # 时间轴数据
-        timeline_data = []
-        for detail in details:
-            timeline_data.append({
-                'index': detail['index'],
-                'original_start': detail['original']['start'],
-                'original_end': detail['original']['end'],
-                'new_start': detail['new']['start'],
-                'new_end': detail['new']['end'],
-                'original_text': detail['original']['text'][:50] + '...' if len(detail['original']['text']) > 50 else detail['original']['text'],
-                'new_text': detail['new']['text'][:50] + '...' if len(detail['new']['text']) > 50 else detail['new']['text'],
-            })
-
-        # 偏移分布数据
-        start_diffs = [d['differences']['start_diff'] for d in details]
-        duration_diffs = [d['differences']['duration_diff'] for d in details]
-
-        # 创建直方图数据
-        def create_histogram(data, bin_count=20):
-            if not data:
-                return {'bins': [], 'counts': []}
-
-            min_val = min(data)
-            max_val = max(data)
-            bin_size = (max_val - min_val) / bin_count
-
-            bins = [round(min_val + i * bin_size, 3) for i in range(bin_count + 1)]
-            counts = [0] * bin_count
-
-            for val in data:
-                bin_idx = min(int((val - min_val) / bin_size), bin_count - 1)
-                counts[bin_idx] += 1
-
-            return {
-                'bins': bins,
-                'counts': counts,
-                'min': round(min_val, 3),
-                'max': round(max_val, 3),
-                'avg': round(sum(data) / len(data), 3)
-            }
+        self._ensure_analysis()
+        if not self.columns:
+            return {'timeline': [], 'summary': self.analysis_result.get('summary', {})}
 
         return {
-            'timeline': timeline_data,
-            'start_diff_histogram': create_histogram(start_diffs),
-            'duration_diff_histogram': create_histogram(duration_diffs),
+            'timeline': self.get_timeline_page(0, timeline_limit),
+            'timeline_total': self.compared_count,
+            'start_diff_histogram': _histogram(self.columns['start_diff']),
+            'duration_diff_histogram': _histogram(self.columns['duration_diff']),
             'summary': self.analysis_result.get('summary', {})
         }
 
@@ -235,8 +293,7 @@ class SubtitleAnalyzer:
         Returns:
             推荐参数字典
         """
-        if not self.analysis_result:
-            self.compare_subtitles()
+        self._ensure_analysis()
 
         summary = self.analysis_result.get('summary', {})
         start_offset = summary.get('start_offset', {})
@@ -279,11 +336,8 @@ class SubtitleAnalyzer:
 
     def export_report(self, output_path: str = None):
         """导出分析报告为JSON"""
-        if not self.analysis_result:
-            self.compare_subtitles()
-
         report = {
-            'analysis': self.analysis_result,
+            'analysis': self.compare_subtitles(),
             'visualization': self.generate_visualization_data(),
             'recommendations': self.recommend_clip_parameters()
         }
@@ -295,6 +349,62 @@ class SubtitleAnalyzer:
         return report
 
 
+def file_content_hash(path: str) -> str:
+    """文件内容的 SHA1（分块读取）"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """按 (原字幕哈希, 新字幕哈希) 缓存分析器（LRU）"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, SubtitleAnalyzer]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(original_srt: str, new_srt: str) -> str:
+        """分析ID：两个文件内容哈希的组合"""
+        return hashlib.sha1(
+            f"{file_content_hash(original_srt)}:{file_content_hash(new_srt)}".encode('ascii')
+        ).hexdigest()[:24]
+
+    def get(self, analysis_id: str) -> Optional[SubtitleAnalyzer]:
+        with self._lock:
+            analyzer = self._entries.get(analysis_id)
+            if analyzer is not None:
+                self._entries.move_to_end(analysis_id)
+            return analyzer
+
+    def analyze(self, original_srt: str, new_srt: str) -> Tuple[str, SubtitleAnalyzer, bool]:
+        """
+        分析字幕（内容相同则直接复用缓存）
+
+        Returns:
+            (分析ID, 分析器, 是否命中缓存)
+        """
+        analysis_id = self.make_key(original_srt, new_srt)
+        analyzer = self.get(analysis_id)
+        record_cache('analysis', analyzer is not None)
+        if analyzer is not None:
+            return analysis_id, analyzer, True
+
+        analyzer = SubtitleAnalyzer(original_srt, new_srt)
+        analyzer.load_subtitles()
+        analyzer.compare_subtitles(include_details=False)
+
+        with self._lock:
+            self._entries[analysis_id] = analyzer
+            self._entries.move_to_end(analysis_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analysis_id, analyzer, False
+
+
 def analyze_subtitles_for_api(original_srt: str, new_srt: str) -> Dict:
     """
     API专用：分析字幕并返回完整报告
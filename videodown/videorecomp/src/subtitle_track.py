@@ -0,0 +1,266 @@
+#!/usr/bin/env python3.12
+"""
+列式字幕轨道 - 快速SRT加载与向量化时间运算
+
+开始/结束时间以毫秒 int64 NumPy 数组保存，文本做字符串驻留，
+归一化文本按需缓存；编码只根据 BOM 或文件开头的小段样本检测。
+"""
+
+import re
+import sys
+import codecs
+from typing import List, Dict, Tuple, Optional, Union
+
+import numpy as np
+
+
+# 编码检测只读取的样本大小
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_TIMING_RE = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    根据 BOM 或样本检测编码
+
+    Args:
+        sample: 文件开头的字节样本
+
+    Returns:
+        编码名称
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # 样本末尾截断了多字节字符也算 UTF-8
+        if e.start >= len(sample) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+
+    try:
+        import chardet
+        encoding = chardet.detect(sample)['encoding']
+        if encoding:
+            # GB2312 是 GB18030 的子集，统一用更大的字符集避免生僻字解码失败
+            return 'gb18030' if encoding.lower() in ('gb2312', 'gbk') else encoding
+    except ImportError:
+        pass
+    return 'gb18030'
+
+
+def detect_srt_encoding(srt_path: str) -> str:
+    """只读取文件开头样本检测字幕编码"""
+    with open(srt_path, 'rb') as f:
+        return detect_encoding(f.read(ENCODING_SAMPLE_SIZE))
+
+
+def read_srt_text(srt_path: str) -> str:
+    """读取字幕文件为文本（自动检测编码）"""
+    with open(srt_path, 'rb') as f:
+        raw = f.read()
+    encoding = detect_encoding(raw[:ENCODING_SAMPLE_SIZE])
+    return raw.decode(encoding, errors='replace')
+
+
+def format_srt_time(ms: int) -> str:
+    """毫秒转换为 SRT 时间格式"""
+    ms = max(0, int(ms))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+class SubtitleTrack:
+    """列式字幕轨道"""
+
+    def __init__(
+        self,
+        starts_ms: Union[np.ndarray, List[int]],
+        ends_ms: Union[np.ndarray, List[int]],
+        texts: List[str],
+        indexes: Optional[List[int]] = None
+    ):
+        self._starts = np.asarray(starts_ms, dtype=np.int64)
+        self._ends = np.asarray(ends_ms, dtype=np.int64)
+        self.texts: List[str] = [sys.intern(t) for t in texts]
+        self.indexes: List[int] = list(indexes) if indexes is not None else list(range(1, len(texts) + 1))
+
+        # 延迟偏移：差分数组，shift_from 只改一个元素，读取时再做一次前缀和
+        self._pending: Optional[np.ndarray] = None
+        self._normalized: Optional[List[str]] = None
+
+    # ---------- 加载 / 导出 ----------
+
+    @classmethod
+    def parse(cls, content: str) -> 'SubtitleTrack':
+        """单遍解析SRT文本"""
+        starts, ends, texts, indexes = [], [], [], []
+        timing_match = _TIMING_RE.match
+
+        lines = content.lstrip('\ufeff').splitlines()
+        count = len(lines)
+        pos = 0
+        while pos < count:
+            line = lines[pos].strip()
+            pos += 1
+            if not line:
+                continue
+
+            # 时间轴行可能紧跟序号，也可能没有序号
+            index = None
+            match = timing_match(line)
+            if match is None:
+                if not line.isdigit() or pos >= count:
+                    continue
+                index = int(line)
+                match = timing_match(lines[pos].strip())
+                if match is None:
+                    continue
+                pos += 1
+
+            g = match.groups()
+            starts.append(((int(g[0]) * 60 + int(g[1])) * 60 + int(g[2])) * 1000 + int(g[3].ljust(3, '0')))
+            ends.append(((int(g[4]) * 60 + int(g[5])) * 60 + int(g[6])) * 1000 + int(g[7].ljust(3, '0')))
+
+            text_lines = []
+            while pos < count and lines[pos].strip():
+                text_lines.append(lines[pos].rstrip())
+                pos += 1
+            texts.append('\n'.join(text_lines))
+            indexes.append(index if index is not None else len(indexes) + 1)
+
+        return cls(starts, ends, texts, indexes)
+
+    @classmethod
+    def load(cls, srt_path: str) -> 'SubtitleTrack':
+        """加载SRT文件"""
+        return cls.parse(read_srt_text(srt_path))
+
+    @classmethod
+    def from_subs(cls, subs) -> 'SubtitleTrack':
+        """从 pysrt 字幕列表创建"""
+        return cls(
+            [sub.start.ordinal for sub in subs],
+            [sub.end.ordinal for sub in subs],
+            [sub.text for sub in subs],
+            [sub.index for sub in subs]
+        )
+
+    def to_srt(self) -> str:
+        """导出为SRT文本"""
+        starts, ends = self.starts_ms, self.ends_ms
+        blocks = []
+        for k, text in enumerate(self.texts):
+            blocks.append(f"{k + 1}\n{format_srt_time(starts[k])} --> {format_srt_time(ends[k])}\n{text}\n")
+        return '\n'.join(blocks)
+
+    def save(self, srt_path: str, encoding: str = 'utf-8'):
+        """保存为SRT文件"""
+        with open(srt_path, 'w', encoding=encoding) as f:
+            f.write(self.to_srt())
+
+    def to_dicts(self) -> List[Dict]:
+        """转换为字典列表（多行文本合并为一行）"""
+        starts, ends = self.start_seconds.tolist(), self.end_seconds.tolist()
+        return [
+            {
+                'index': self.indexes[k],
+                'start': starts[k],
+                'end': ends[k],
+                'text': self.texts[k].replace('\n', ' ').strip()
+            }
+            for k in range(len(self.texts))
+        ]
+
+    def cues(self) -> List[Tuple[float, float, str]]:
+        """转换为 (开始秒, 结束秒, 文本) 列表"""
+        return list(zip(self.start_seconds.tolist(), self.end_seconds.tolist(), self.texts))
+
+    # ---------- 时间数据 ----------
+
+    def _materialize(self):
+        """应用延迟偏移"""
+        if self._pending is not None:
+            offsets = np.cumsum(self._pending[:-1])
+            self._starts = np.maximum(self._starts + offsets, 0)
+            self._ends = np.maximum(self._ends + offsets, 0)
+            self._pending = None
+
+    @property
+    def starts_ms(self) -> np.ndarray:
+        self._materialize()
+        return self._starts
+
+    @property
+    def ends_ms(self) -> np.ndarray:
+        self._materialize()
+        return self._ends
+
+    @property
+    def start_seconds(self) -> np.ndarray:
+        return self.starts_ms / 1000.0
+
+    @property
+    def end_seconds(self) -> np.ndarray:
+        return self.ends_ms / 1000.0
+
+    @property
+    def durations_ms(self) -> np.ndarray:
+        return self.ends_ms - self.starts_ms
+
+    @property
+    def normalized_texts(self) -> List[str]:
+        """归一化文本（只计算一次）"""
+        if self._normalized is None:
+            self._normalized = [' '.join(t.lower().split()) for t in self.texts]
+        return self._normalized
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, k: int) -> Tuple[float, float, str]:
+        return int(self.starts_ms[k]) / 1000.0, int(self.ends_ms[k]) / 1000.0, self.texts[k]
+
+    # ---------- 向量化时间运算 ----------
+
+    def shift(self, delta_ms: int):
+        """整体平移"""
+        self._materialize()
+        self._starts = np.maximum(self._starts + int(delta_ms), 0)
+        self._ends = np.maximum(self._ends + int(delta_ms), 0)
+
+    def shift_from(self, from_index: int, delta_ms: int):
+        """从 from_index 开始的所有字幕平移（O(1)，读取时才统一应用）"""
+        if from_index >= len(self.texts) or not delta_ms:
+            return
+        if self._pending is None:
+            self._pending = np.zeros(len(self.texts) + 1, dtype=np.int64)
+        self._pending[max(0, from_index)] += int(delta_ms)
+
+    def scale(self, factor: float, origin_ms: int = 0):
+        """以 origin_ms 为原点整体缩放时间轴"""
+        self._materialize()
+        self._starts = np.rint((self._starts - origin_ms) * factor + origin_ms).astype(np.int64)
+        self._ends = np.rint((self._ends - origin_ms) * factor + origin_ms).astype(np.int64)
+
+    def copy(self) -> 'SubtitleTrack':
+        """复制"""
+        track = SubtitleTrack(self.starts_ms.copy(), self.ends_ms.copy(), [], list(self.indexes))
+        track.texts = list(self.texts)
+        return track
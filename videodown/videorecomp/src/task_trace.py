@@ -0,0 +1,343 @@
+#!/usr/bin/env python3.12
+"""
+任务执行追踪（Chrome trace 格式）
+
+每个任务绑定一个 TaskTrace：ffmpeg / ffprobe 调用（命令行、耗时、返回码）、处理阶段、逐帧循环的帧窗口
+都记录为 span，保存为 Chrome trace event JSON（chrome://tracing 或 https://ui.perfetto.dev 打开）。
+后台线程定时采样本进程和正在运行的子进程的内存，span 记录其间的峰值 RSS，
+并输出内存 / CPU 曲线（counter 事件）；开启 tracemalloc 时额外记录 Python 堆内存。
+
+可选的采样分析器定时抓取任务线程的调用栈，输出 folded stacks
+（flamegraph.pl、speedscope、inferno 可直接打开）。
+
+环境变量：
+    VIDEORECOMP_TRACE_SAMPLE_MS       内存采样间隔（默认 200 ms）
+    VIDEORECOMP_PROFILE_INTERVAL_MS   调用栈采样间隔（默认 10 ms）
+    VIDEORECOMP_TRACE_TRACEMALLOC=1   任务执行期间开启 tracemalloc
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+SAMPLE_INTERVAL = float(os.environ.get('VIDEORECOMP_TRACE_SAMPLE_MS', '200')) / 1000
+PROFILE_INTERVAL = float(os.environ.get('VIDEORECOMP_PROFILE_INTERVAL_MS', '10')) / 1000
+USE_TRACEMALLOC = os.environ.get('VIDEORECOMP_TRACE_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+
+# 单个任务最多记录的事件数（超出后丢弃并计数）
+MAX_EVENTS = 200_000
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_MB = 1024 * 1024
+
+_local = threading.local()
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """进程当前的常驻内存（默认本进程；读不到时返回 None）"""
+    try:
+        with open(f'/proc/{pid or "self"}/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes(pid: int) -> Optional[int]:
+    """子进程到目前为止的峰值常驻内存（VmHWM）"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class Span:
+    """进行中的 span"""
+
+    __slots__ = ('name', 'cat', 'args', 'start', 'tid', 'child_pid', 'peak_rss', 'recorded')
+
+    def __init__(self, name: str, cat: str, args: Dict, child_pid: Optional[int] = None, recorded: bool = True):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = time.perf_counter()
+        self.tid = threading.get_ident()
+        self.child_pid = child_pid
+        self.peak_rss = 0
+        self.recorded = recorded
+
+    def observe_rss(self, value: Optional[int]):
+        if value and value > self.peak_rss:
+            self.peak_rss = value
+
+
+class TaskTrace:
+    """单个任务的执行追踪"""
+
+    def __init__(self, task_id: str, profile: bool = False,
+                 sample_interval: float = SAMPLE_INTERVAL, profile_interval: float = PROFILE_INTERVAL):
+        """
+        初始化
+
+        Args:
+            task_id: 任务ID
+            profile: 是否开启调用栈采样
+            sample_interval: 内存采样间隔（秒）
+            profile_interval: 调用栈采样间隔（秒）
+        """
+        self.task_id = task_id
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.profile_interval = profile_interval
+        self.pid = os.getpid()
+
+        self._origin = time.perf_counter()
+        self._wall_origin = time.time()
+        self._lock = threading.Lock()
+        self._events: List[Dict] = []
+        self._dropped = 0
+        self._open: set = set()
+        self._threads: Dict[int, str] = {}
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._started_tracemalloc = False
+
+    # ---------- 生命周期 ----------
+
+    def start(self) -> 'TaskTrace':
+        """启动内存采样（和调用栈采样）线程"""
+        if USE_TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._spawn(self._sample_loop, 'trace-sampler')
+        if self.profile:
+            self._spawn(self._profile_loop, 'trace-profiler')
+        return self
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=f'{name}-{self.task_id}', daemon=True)
+        thread.start()
+        self._workers.append(thread)
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop.set()
+        for thread in self._workers:
+            thread.join(timeout=1)
+        self._workers.clear()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def bind_thread(self):
+        """登记当前线程（调用栈采样只采集登记过的线程）"""
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+
+    # ---------- 记录 ----------
+
+    def _ts(self, perf: float) -> float:
+        return round((perf - self._origin) * 1_000_000, 1)
+
+    def _append(self, event: Dict):
+        with self._lock:
+            if len(self._events) >= MAX_EVENTS:
+                self._dropped += 1
+                return
+            self._events.append(event)
+
+    def begin(self, name: str, cat: str = 'python', child_pid: Optional[int] = None, **args) -> Span:
+        """开始一个 span（用 end() 结束）"""
+        span = Span(name, cat, args, child_pid)
+        span.observe_rss(rss_bytes() if child_pid is None else None)
+        with self._lock:
+            self._open.add(span)
+        return span
+
+    def end(self, span: Span, **args):
+        """结束 span 并记录"""
+        end = time.perf_counter()
+        with self._lock:
+            self._open.discard(span)
+        if span.child_pid is None:
+            span.observe_rss(rss_bytes())
+        span.args.update(args)
+        if span.peak_rss:
+            span.args['peak_rss_mb'] = round(span.peak_rss / _MB, 1)
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            span.args['py_heap_mb'] = round(current / _MB, 1)
+            span.args['py_heap_peak_mb'] = round(peak / _MB, 1)
+        self._append({
+            'name': span.name, 'cat': span.cat, 'ph': 'X', 'pid': self.pid, 'tid': span.tid,
+            'ts': self._ts(span.start), 'dur': self._ts(end) - self._ts(span.start), 'args': span.args,
+        })
+
+    def complete(self, name: str, cat: str, start: float, end: float, **args):
+        """记录一个已经结束的区间（start / end 为 time.perf_counter() 读数）"""
+        self._append({
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid, 'tid': threading.get_ident(),
+            'ts': self._ts(start), 'dur': self._ts(end) - self._ts(start), 'args': args,
+        })
+
+    def counter(self, name: str, values: Dict):
+        self._append({'name': name, 'ph': 'C', 'pid': self.pid, 'ts': self._ts(time.perf_counter()), 'args': values})
+
+    # ---------- 采样 ----------
+
+    def _sample_loop(self):
+        last_wall, last_cpu = time.perf_counter(), time.process_time()
+        while not self._stop.wait(self.sample_interval):
+            own = rss_bytes()
+            with self._lock:
+                spans = list(self._open)
+            children = 0
+            child_pids = set()
+            for span in spans:
+                if span.child_pid is None:
+                    span.observe_rss(own)
+                    continue
+                current = rss_bytes(span.child_pid)
+                span.observe_rss(peak_rss_bytes(span.child_pid) or current)
+                if current and span.child_pid not in child_pids:
+                    child_pids.add(span.child_pid)
+                    children += current
+
+            now_wall, now_cpu = time.perf_counter(), time.process_time()
+            cpu_percent = (now_cpu - last_cpu) / (now_wall - last_wall) * 100 if now_wall > last_wall else 0.0
+            last_wall, last_cpu = now_wall, now_cpu
+
+            values = {'rss_mb': round((own or 0) / _MB, 1), 'children_rss_mb': round(children / _MB, 1)}
+            if tracemalloc.is_tracing():
+                values['py_heap_mb'] = round(tracemalloc.get_traced_memory()[0] / _MB, 1)
+            self.counter('memory', values)
+            self.counter('cpu', {'process_percent': round(cpu_percent, 1)})
+
+    def _profile_loop(self):
+        while not self._stop.wait(self.profile_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = dict(self._threads)
+            for ident, thread_name in threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(thread_name)
+                self._stacks[';'.join(reversed(stack))] += 1
+
+    # ---------- 输出 ----------
+
+    def to_chrome(self) -> Dict:
+        """Chrome trace event 格式"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': f'task {self.task_id}'}}]
+        metadata += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': ident, 'args': {'name': name}}
+            for ident, name in threads.items()
+        ]
+        return {
+            'traceEvents': metadata + events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'task_id': self.task_id,
+                'started_at': self._wall_origin,
+                'dropped_events': self._dropped,
+                'profile_samples': sum(self._stacks.values()),
+            },
+        }
+
+    def folded_stacks(self) -> str:
+        """flamegraph 使用的 folded stacks 文本（每行：调用栈 采样次数）"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
+
+    def save(self, trace_path: str, profile_path: Optional[str] = None):
+        """
+        保存追踪文件（先写临时文件再改名）
+
+        Args:
+            trace_path: Chrome trace JSON 路径
+            profile_path: folded stacks 路径（开启调用栈采样时写入）
+        """
+        os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+        outputs = [(trace_path, json.dumps(self.to_chrome(), ensure_ascii=False))]
+        if profile_path and self.profile:
+            outputs.append((profile_path, self.folded_stacks()))
+        for path, content in outputs:
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+
+# ---------- 线程绑定 ----------
+
+def current_trace() -> Optional[TaskTrace]:
+    """当前线程绑定的执行追踪"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def bind_trace(trace: Optional[TaskTrace]):
+    """在 with 语句内把执行追踪绑定到当前线程"""
+    previous = current_trace()
+    _local.trace = trace
+    if trace is not None:
+        trace.bind_thread()
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def begin_span(name: str, cat: str = 'python', child_pid: Optional[int] = None, **args) -> Span:
+    """在当前线程的追踪上开始 span（未绑定时返回不记录的 span）"""
+    trace = current_trace()
+    if trace is None:
+        return Span(name, cat, args, child_pid, recorded=False)
+    return trace.begin(name, cat, child_pid, **args)
+
+
+def end_span(span: Span, **args):
+    """结束 begin_span() 开始的 span"""
+    trace = current_trace()
+    if trace is not None and span.recorded:
+        trace.end(span, **args)
+
+
+@contextmanager
+def trace_span(name: str, cat: str = 'python', child_pid: Optional[int] = None, **args) -> Iterator[Span]:
+    """with 语句内的代码记录为一个 span（出错时记录异常类型）"""
+    span = begin_span(name, cat, child_pid, **args)
+    try:
+        yield span
+    except BaseException as e:
+        span.args['error'] = type(e).__name__
+        raise
+    finally:
+        end_span(span)
+
+
+def trace_complete(name: str, cat: str, start: float, end: float, **args):
+    """记录已经结束的区间（未绑定追踪时什么都不做）"""
+    trace = current_trace()
+    if trace is not None:
+        trace.complete(name, cat, start, end, **args)
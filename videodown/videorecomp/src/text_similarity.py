@@ -0,0 +1,171 @@
+#!/usr/bin/env python3.12
+"""
+字幕文本相似度计算 - 预计算签名 + 批量矩阵打分
+
+每条字幕只归一化一次，预先计算字符 n-gram 的 MinHash 签名；
+候选块的相似度用 NumPy 矩阵运算一次算出，
+每个块只保留估计值最高的 top-k 个候选（其余置0）；
+精确值（SequenceMatcher）只按单对计算，由调用方决定用在哪些匹配上。
+"""
+
+import difflib
+from typing import List, Sequence, Optional
+
+import numpy as np
+
+
+# MinHash 参数
+DEFAULT_NUM_PERM = 32
+_NGRAM_MULTIPLIER = np.uint64(1000003)
+_EMPTY = np.uint32(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+_CHUNK_NGRAMS = 20000  # 每批处理的 n-gram 数量（中间矩阵约 5MB，留在缓存里）
+
+
+def normalize_text(text: str) -> str:
+    """文本归一化（小写、去首尾空白、合并空白）"""
+    return ' '.join((text or '').lower().split())
+
+
+def _permutations(num_perm: int, seed: int):
+    """生成 multiply-shift 哈希参数（a 为奇数）"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = DEFAULT_NUM_PERM, seed: int = 1) -> np.ndarray:
+    """
+    计算字符二元组的 MinHash 签名（整体向量化）
+
+    Args:
+        texts: 已归一化的文本列表
+        num_perm: 哈希函数个数
+        seed: 随机种子
+
+    Returns:
+        (len(texts), num_perm) 的 uint32 矩阵，空文本整行为 0xFFFFFFFF
+    """
+    count = len(texts)
+    signatures = np.full((count, num_perm), _EMPTY, dtype=np.uint32)
+    if count == 0:
+        return signatures
+
+    # 所有文本拼接为一个码点数组，标记每个字符所属文本
+    compact = [t.replace(' ', '') for t in texts]
+    lengths = np.fromiter((len(t) for t in compact), dtype=np.int64, count=count)
+    codepoints = np.frombuffer(''.join(compact).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if not len(codepoints):
+        return signatures
+    owner = np.repeat(np.arange(count), lengths)
+
+    # n-gram：同一文本内相邻字符组成二元组；只有一个字符的文本取单字
+    same_text = owner[:-1] == owner[1:]
+    bigram_pos = np.flatnonzero(same_text)
+    single_rows = np.flatnonzero(lengths == 1)
+    single_pos = np.cumsum(lengths)[single_rows] - 1
+
+    hashes = np.concatenate((
+        codepoints[bigram_pos] * _NGRAM_MULTIPLIER + codepoints[bigram_pos + 1],
+        codepoints[single_pos] * _NGRAM_MULTIPLIER
+    ))
+    hash_owner = np.concatenate((owner[bigram_pos], single_rows))
+    order = np.argsort(hash_owner, kind='stable')
+    hashes, hash_owner = hashes[order], hash_owner[order]
+
+    rows, offsets = np.unique(hash_owner, return_index=True)
+    a, b = _permutations(num_perm, seed)
+
+    # 分批计算 (num_perm, n) 的哈希值，按文本区间取最小值（控制内存）
+    batch_start = 0
+    while batch_start < len(rows):
+        lo = offsets[batch_start]
+        if lo + _CHUNK_NGRAMS >= len(hashes):
+            batch_end = len(rows)
+        else:
+            batch_end = int(np.searchsorted(offsets, lo + _CHUNK_NGRAMS, side='right')) - 1
+            batch_end = max(batch_end, batch_start + 1)
+        hi = offsets[batch_end] if batch_end < len(rows) else len(hashes)
+
+        permuted = a * hashes[None, lo:hi]
+        permuted += b
+        permuted >>= _SHIFT
+        signatures[rows[batch_start:batch_end]] = np.minimum.reduceat(
+            permuted, offsets[batch_start:batch_end] - lo, axis=1
+        ).T
+        batch_start = batch_end
+
+    return signatures
+
+
+def exact_similarity(text1: str, text2: str) -> float:
+    """精确相似度（SequenceMatcher，输入应为已归一化文本）"""
+    if not text1 or not text2:
+        return 0.0
+    if text1 == text2:
+        return 1.0
+    return difflib.SequenceMatcher(None, text1, text2).ratio()
+
+
+class CueTextKernel:
+    """字幕文本相似度核：预计算两组字幕的签名，按块打分"""
+
+    def __init__(
+        self,
+        original_texts: Sequence[str],
+        new_texts: Sequence[str],
+        num_perm: int = DEFAULT_NUM_PERM,
+        top_k: int = 3
+    ):
+        """
+        初始化
+
+        Args:
+            original_texts: 原字幕文本
+            new_texts: 新字幕文本
+            num_perm: MinHash 哈希函数个数
+            top_k: 每个块保留的候选数（不相关文本的估计值偏高，置0后 DP 不会串联弱匹配）
+        """
+        self.original_norm: List[str] = [normalize_text(t) for t in original_texts]
+        self.new_norm: List[str] = [normalize_text(t) for t in new_texts]
+        self.original_sigs = minhash_signatures(self.original_norm, num_perm)
+        self.new_sigs = minhash_signatures(self.new_norm, num_perm)
+        self.original_empty = np.array([not t for t in self.original_norm], dtype=bool)
+        self.new_empty = np.array([not t for t in self.new_norm], dtype=bool)
+        self.any_original_empty = bool(self.original_empty.any())
+        self.top_k = top_k
+        self._perm_ones = np.ones(num_perm)  # 与相等矩阵点积得到每行相等的签名位数（比 count_nonzero 快）
+
+    def estimate_block(self, new_index: int, lo: int, hi: int) -> np.ndarray:
+        """MinHash 估计的相似度（Dice 形式，与 SequenceMatcher.ratio 量级接近）"""
+        if hi <= lo or self.new_empty[new_index]:
+            return np.zeros(max(0, hi - lo))
+        equal = (self.original_sigs[lo:hi] == self.new_sigs[new_index]).dot(self._perm_ones)
+        dice = 2.0 * equal / (len(self._perm_ones) + equal)
+        if self.any_original_empty:
+            dice[self.original_empty[lo:hi]] = 0.0
+        return dice
+
+    def block_similarity(self, new_index: int, lo: int, hi: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        新字幕 new_index 与原字幕 [lo, hi) 的估计相似度
+
+        Args:
+            new_index: 新字幕位置
+            lo, hi: 原字幕区间
+            mask: 只需要计算的候选（布尔数组），其余置0
+
+        Returns:
+            相似度数组（MinHash 估计值，只有前 top_k 个候选非0）
+        """
+        scores = self.estimate_block(new_index, lo, hi)
+        if mask is not None:
+            scores[~mask] = 0.0
+        if self.top_k < len(scores):
+            scores[np.argpartition(scores, -self.top_k)[:-self.top_k]] = 0.0
+        return scores
+
+    def similarity(self, new_index: int, orig_index: int) -> float:
+        """单对精确相似度"""
+        return exact_similarity(self.new_norm[new_index], self.original_norm[orig_index])
@@ -6,15 +6,19 @@
 
 import os
 import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import pysrt
-import chardet
 from tqdm import tqdm
 import difflib
 
+from subtitle_alignment import SubtitleAligner
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe
+from scratch_space import scratch_dir, estimate_bytes
+from encoding_profiles import get_profile
+
 
 class TimelineAligner:
     """时间轴对齐剪辑器"""
@@ -25,7 +29,8 @@ class TimelineAligner:
         original_srt_path: str,
         new_srt_path: str,
         output_dir: str = "output",
-        use_precise_seek: bool = False
+        use_precise_seek: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         """
         初始化时间轴对齐器
@@ -36,6 +41,7 @@ class TimelineAligner:
             new_srt_path: 新字幕路径
             output_dir: 输出目录
             use_precise_seek: 是否使用精确seek
+            encoding_profile: 精确模式重新编码使用的编码档位（默认当前任务绑定的档位）
         """
         self.video_path = video_path
         self.original_srt_path = original_srt_path
@@ -43,18 +49,16 @@ class TimelineAligner:
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.use_precise_seek = use_precise_seek
+        self.profile = get_profile(encoding_profile)
 
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="timeline_align_"))
+        # 切出的片段放在临时工作区（大小与原视频相当，放得下时用内存盘）
+        self.temp_dir = Path(scratch_dir("timeline_align_", estimate_bytes(video_path, factor=1.5)))
         self.original_subs = None
         self.new_subs = None
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -76,7 +80,7 @@ class TimelineAligner:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             duration = float(info['format']['duration'])
@@ -97,80 +101,13 @@ class TimelineAligner:
 
         if not text1 or not text2:
             return 0.0
+        if text1 == text2:
+            return 1.0
 
         # 使用SequenceMatcher计算相似度
         sequence = difflib.SequenceMatcher(None, text1, text2)
         return sequence.ratio()
 
-    def find_matching_segment(
-        self,
-        new_sub: pysrt.SubRipItem,
-        used_original_indices: set,
-        last_original_index: int
-    ) -> Optional[Tuple[int, float, float]]:
-        """
-        为新字幕找到原视频中的匹配片段
-
-        Args:
-            new_sub: 新字幕
-            used_original_indices: 已使用的原字幕索引
-            last_original_index: 上一个匹配的原字幕索引
-
-        Returns:
-            (原字幕索引, 开始时间, 结束时间) 或 None
-        """
-        new_text = new_sub.text.lower().strip()
-        new_start = new_sub.start.ordinal / 1000.0
-        new_end = new_sub.end.ordinal / 1000.0
-        new_duration = new_end - new_start
-
-        best_match = None
-        best_score = 0.0
-        best_index = -1
-        best_start = 0.0
-        best_end = 0.0
-
-        # 搜索范围：从上一个匹配位置开始，前后各搜索10条字幕
-        search_start = max(0, last_original_index - 10)
-        search_end = min(len(self.original_subs), last_original_index + 11)
-
-        for idx in range(search_start, search_end):
-            if idx in used_original_indices:
-                continue
-
-            orig_sub = self.original_subs[idx]
-            orig_text = orig_sub.text.lower().strip()
-            orig_start = orig_sub.start.ordinal / 1000.0
-            orig_end = orig_sub.end.ordinal / 1000.0
-            orig_duration = orig_end - orig_start
-
-            # 计算文本相似度
-            text_sim = self.text_similarity(new_text, orig_text)
-
-            # 如果文本相似度太低，跳过
-            if text_sim < 0.3:
-                continue
-
-            # 计算时长相似度（时长差异越小越好）
-            duration_diff = abs(new_duration - orig_duration)
-            duration_sim = max(0, 1 - duration_diff / max(new_duration, orig_duration))
-
-            # 综合得分（文本相似度更重要）
-            total_score = text_sim * 0.7 + duration_sim * 0.3
-
-            if total_score > best_score:
-                best_score = total_score
-                best_match = orig_sub
-                best_index = idx
-                best_start = orig_start
-                best_end = orig_end
-
-        # 只接受得分足够高的匹配
-        if best_score > 0.4:
-            return best_index, best_start, best_end
-
-        return None
-
     def extract_aligned_segments(self) -> Tuple[List[Tuple[float, float]], Dict]:
         """
         提取与新字幕时间轴对齐的视频片段
@@ -190,28 +127,38 @@ class TimelineAligner:
         video_duration = self.get_video_duration()
 
         segments = []
-        used_original_indices = set()
-        last_original_index = 0
-
         processing_log = []
 
         print("\n以新字幕时间轴为基准，提取匹配的视频片段...")
 
+        # 带状DP全局对齐：文本相似度*0.7 + 时长相似度*0.3，每条字幕最多考虑21条候选
+        aligner = SubtitleAligner(
+            time_weight=0.0,
+            text_weight=0.7,
+            duration_weight=0.3,
+            time_window=60.0,
+            band=21,
+            min_score=0.4,
+            min_text_similarity=0.3
+        )
+        matches = {j: idx for j, idx, _ in aligner.align_subs(self.original_subs, self.new_subs)}
+
         for i, new_sub in enumerate(tqdm(self.new_subs, desc="对齐字幕")):
             new_start = new_sub.start.ordinal / 1000.0
             new_end = new_sub.end.ordinal / 1000.0
             new_duration = new_end - new_start
             new_text = new_sub.text
 
-            # 找到匹配的原字幕片段
-            match_result = self.find_matching_segment(
-                new_sub,
-                used_original_indices,
-                last_original_index
-            )
+            # 找到匹配的原字幕片段（DP 按 MinHash 估计值打分，这里用精确相似度复核文本阈值）
+            orig_idx = matches.get(i)
+            if orig_idx is not None:
+                text_sim = self.text_similarity(new_text, self.original_subs[orig_idx].text)
+                if text_sim < 0.3:
+                    orig_idx = None
 
-            if match_result:
-                orig_idx, orig_start, orig_end = match_result
+            if orig_idx is not None:
+                orig_start = self.original_subs[orig_idx].start.ordinal / 1000.0
+                orig_end = self.original_subs[orig_idx].end.ordinal / 1000.0
 
                 # 使用原视频的时间位置（不是新字幕的时间）
                 clip_start = max(0, orig_start)
@@ -219,10 +166,6 @@ class TimelineAligner:
 
                 if clip_end > clip_start:
                     segments.append((clip_start, clip_end))
-                    used_original_indices.add(orig_idx)
-                    last_original_index = orig_idx
-
-                    text_sim = self.text_similarity(new_text, self.original_subs[orig_idx].text)
 
                     processing_log.append({
                         'index': i + 1,
@@ -273,7 +216,8 @@ class TimelineAligner:
 
         print(f"\n提取视频片段（使用{'精确' if self.use_precise_seek else '快速'}模式）...")
 
-        for i, (start, end) in enumerate(tqdm(segments, desc="提取片段")):
+        cmds = []
+        for i, (start, end) in enumerate(segments):
             temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
             duration = end - start
 
@@ -283,10 +227,8 @@ class TimelineAligner:
                     '-ss', str(start),
                     '-i', self.video_path,
                     '-t', str(duration),
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
+                    *self.profile.video_args(),
+                    *self.profile.audio_args(),
                     '-loglevel', 'error',
                     str(temp_segment)
                 ]
@@ -302,22 +244,20 @@ class TimelineAligner:
                     str(temp_segment)
                 ]
 
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-
-                if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
-                    segment_files.append(str(temp_segment))
-                else:
-                    print(f"  ⚠️  片段{i+1}提取失败")
-            except subprocess.TimeoutExpired:
+            cmds.append(cmd)
+
+        # 各片段互不依赖，同时提取
+        results = run_ffmpeg_many(cmds, timeout=300)
+        for i, result in enumerate(results):
+            temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
+            if isinstance(result, subprocess.TimeoutExpired):
                 print(f"  ⚠️  片段{i+1}提取超时")
-            except Exception as e:
-                print(f"  ⚠️  片段{i+1}提取出错: {e}")
+            elif isinstance(result, Exception):
+                print(f"  ⚠️  片段{i+1}提取出错: {result}")
+            elif result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
+                segment_files.append(str(temp_segment))
+            else:
+                print(f"  ⚠️  片段{i+1}提取失败")
 
         return segment_files
 
@@ -345,7 +285,7 @@ class TimelineAligner:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = run_ffmpeg(cmd, timeout=600)
 
             if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
                 print(f"✅ 视频拼接成功: {output_path}")
@@ -5,15 +5,19 @@
 
 import os
 import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import pysrt
-import chardet
 from tqdm import tqdm
 import difflib
 
+from freeze_filler import get_default_filler
+from subtitle_alignment import SubtitleAligner
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe
+from scratch_space import scratch_dir, estimate_bytes, promote
+
 
 class TimelineRemapClipper:
     """时间轴重映射剪辑器"""
@@ -33,16 +37,15 @@ class TimelineRemapClipper:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.threshold = threshold
 
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="timeline_remap_"))
+        # 切出的片段放在临时工作区（大小与原视频相当，放得下时用内存盘）
+        self.temp_dir = Path(scratch_dir("timeline_remap_", estimate_bytes(video_path, factor=1.5)))
         self.original_subs = None
         self.new_subs = None
+        self.filler = get_default_filler()  # 间隙填充用的冻结帧片段（带缓存）
 
     def load_subtitle(self, srt_path: str) -> pysrt.SubRipFile:
         """加载字幕文件"""
-        with open(srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
+        encoding = detect_srt_encoding(srt_path)
         return pysrt.open(srt_path, encoding=encoding)
 
     def load_subtitles(self):
@@ -57,7 +60,7 @@ class TimelineRemapClipper:
         """获取视频时长"""
         cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', self.video_path]
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             return float(info['format']['duration'])
@@ -91,6 +94,18 @@ class TimelineRemapClipper:
 
         print("\n按新字幕时间轴提取片段...")
 
+        # 带状DP全局对齐（仅按文本相似度打分）
+        aligner = SubtitleAligner(
+            time_weight=0.0,
+            text_weight=1.0,
+            duration_weight=0.0,
+            time_window=60.0,
+            band=40,
+            min_score=0.3,
+            min_text_similarity=0.3
+        )
+        matches = {j: (idx, score) for j, idx, score in aligner.align_subs(self.original_subs, self.new_subs)}
+
         for i, new_sub in enumerate(tqdm(self.new_subs, desc="匹配字幕")):
             new_start = new_sub.start.ordinal / 1000.0
             new_end = new_sub.end.ordinal / 1000.0
@@ -100,15 +115,9 @@ class TimelineRemapClipper:
             best_score = 0.0
             best_index = -1
 
-            # 在原字幕中找匹配
-            for idx, orig_sub in enumerate(self.original_subs):
-                orig_text = orig_sub.text.lower().strip()
-                text_sim = self.text_similarity(new_text, orig_text)
-
-                if text_sim > best_score:
-                    best_score = text_sim
-                    best_match = orig_sub
-                    best_index = idx
+            if i in matches:
+                best_index, best_score = matches[i]
+                best_match = self.original_subs[best_index]
 
             # 如果找到匹配（相似度>0.3）
             if best_match and best_score > 0.3:
@@ -199,35 +208,55 @@ class TimelineRemapClipper:
 
         # 创建每个片段的视频文件
         segment_files = []
-        gap_fill_duration = 0.1  # 片段之间的间隙填充时长
+        gap_fill_duration = 0.1  # 小于该时长的间隙不填充
+        timeline_end = 0.0  # 已生成部分在新时间轴上的结束时间
+        last_frame_time = segments[0][2]  # 上一片段最后画面在原视频中的时间
 
         print("\n提取视频片段...")
 
-        for i, (new_start, new_end, orig_start) in enumerate(tqdm(segments, desc="提取片段")):
-            duration = new_end - new_start
-
-            # 从原视频提取片段
-            temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
-
-            cmd = [
+        # 各片段互不依赖，先同时从原视频提取，再按新时间轴依次处理间隙
+        cmds = [
+            [
                 'ffmpeg', '-y',
                 '-ss', str(orig_start),
                 '-i', self.video_path,
-                '-t', str(duration),
+                '-t', str(new_end - new_start),
                 '-c', 'copy',
                 '-avoid_negative_ts', '1',
                 '-loglevel', 'error',
-                str(temp_segment)
+                str(self.temp_dir / f'segment_{i:03d}.mp4')
             ]
+            for i, (new_start, new_end, orig_start) in enumerate(segments)
+        ]
+        results = run_ffmpeg_many(cmds, timeout=300)
+
+        for i, (new_start, new_end, orig_start) in enumerate(segments):
+            duration = new_end - new_start
+
+            # 新时间轴上的间隙用上一片段的最后画面填充，保持时间轴对齐
+            gap = new_start - timeline_end
+            if gap >= gap_fill_duration:
+                filler = self.filler.get_filler(self.video_path, last_frame_time, gap)
+                if filler:
+                    print(f"  间隙 {timeline_end:.3f}s-{new_start:.3f}s: 填充 {gap:.3f}s")
+                    segment_files.append((filler, timeline_end, gap))
+                else:
+                    print(f"  ⚠️  间隙填充失败: {timeline_end:.3f}s-{new_start:.3f}s")
+
+            temp_segment = self.temp_dir / f'segment_{i:03d}.mp4'
+            result = results[i]
 
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+                if isinstance(result, Exception):
+                    raise result
 
                 if result.returncode == 0 and temp_segment.exists() and temp_segment.stat().st_size > 1000:
                     # 计算实际提取的时长
                     actual_duration = self.get_segment_duration(str(temp_segment))
                     print(f"  片段{i+1}: 提取 {duration:.3f}s (实际 {actual_duration:.3f}s)")
                     segment_files.append((str(temp_segment), new_start, duration))
+                    timeline_end = max(timeline_end, new_end)
+                    last_frame_time = max(orig_start, orig_start + duration - 0.05)
                 else:
                     print(f"  ⚠️  片段{i+1}提取失败")
                     return None
@@ -239,7 +268,8 @@ class TimelineRemapClipper:
                 return None
 
         # 创建带时间轴的视频
-        output_path = self.temp_dir / 'timeline_video.mp4'
+        # 拼接结果直接写到输出目录所在的磁盘，转正时只需 rename
+        output_path = self.output_dir / 'timeline_video.partial.mp4'
 
         print("\n创建时间轴视频...")
         print(f"  片段数量: {len(segment_files)}")
@@ -261,7 +291,7 @@ class TimelineRemapClipper:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            result = run_ffmpeg(cmd, timeout=600)
 
             if result.returncode == 0 and output_path.exists() and output_path.stat().st_size > 1000:
                 actual_duration = self.get_video_duration(str(output_path))
@@ -283,7 +313,7 @@ class TimelineRemapClipper:
         """获取片段时长"""
         cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', segment_path]
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             import json
             info = json.loads(result.stdout)
             return float(info['format']['duration'])
@@ -327,9 +357,9 @@ class TimelineRemapClipper:
             timeline_video = self.create_timeline_video(segments)
 
             if timeline_video:
-                # 复制到输出目录
+                # 移动到最终文件名
                 final_video = self.output_dir / "timeline_remapped_video.mp4"
-                shutil.copy2(timeline_video, final_video)
+                promote(timeline_video, final_video)
 
                 final_duration = self.get_video_duration(str(final_video))
 
@@ -6,19 +6,22 @@
 
 import os
 import zipfile
-import tempfile
 import shutil
 from pathlib import Path
 from typing import List, Tuple, Optional
 import pysrt
-from moviepy import VideoFileClip, AudioFileClip, TextClip, CompositeAudioClip, ImageClip, CompositeVideoClip
-from moviepy.video.tools.subtitles import SubtitlesClip
-import chardet
 from tqdm import tqdm
-from PIL import Image, ImageDraw, ImageFont
 import subprocess
 import json
 
+from subtitle_track import detect_srt_encoding
+from ffmpeg_progress import run_ffmpeg, run_ffmpeg_many, run_probe, progress_stage, report_progress, moviepy_logger
+from zip_stream import write_zip
+from scratch_space import scratch_dir, estimate_bytes
+from cancellation import check_cancelled
+from metrics import stage_timer
+from encoding_profiles import get_profile
+
 
 class SubtitleProcessor:
     """字幕处理器"""
@@ -36,11 +39,7 @@ class SubtitleProcessor:
     def _load_srt(self) -> pysrt.SubRipFile:
         """加载SRT字幕文件，自动检测编码"""
         # 检测文件编码
-        with open(self.srt_path, 'rb') as f:
-            raw_data = f.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding'] or 'utf-8'
-
+        encoding = detect_srt_encoding(self.srt_path)
         # 加载字幕
         subs = pysrt.open(self.srt_path, encoding=encoding)
         return subs
@@ -99,6 +98,8 @@ class AudioMerger:
         Returns:
             输出文件路径
         """
+        from moviepy import AudioFileClip, CompositeAudioClip
+
         if not self.audio_files:
             raise ValueError("没有音频文件需要合并")
 
@@ -115,6 +116,7 @@ class AudioMerger:
         audio_clips = []
 
         for i, (audio_file, sub) in enumerate(tqdm(zip(self.audio_files, subs), desc="合并音频", total=len(self.audio_files))):
+            report_progress(i / len(self.audio_files))
             try:
                 # 加载音频文件
                 clip = AudioFileClip(audio_file)
@@ -182,7 +184,8 @@ class VideoRecomposer:
         subtitle_style: dict = None,
         enable_ai_separation: bool = False,
         original_srt_file: str = None,
-        auto_clip_video: bool = False
+        auto_clip_video: bool = False,
+        encoding_profile: Optional[str] = None
     ):
         """
         初始化视频重新生成器
@@ -196,6 +199,7 @@ class VideoRecomposer:
             enable_ai_separation: 是否启用AI音频分离（默认False）
             original_srt_file: 原字幕文件路径（可选）
             auto_clip_video: 是否根据字幕时间自动剪辑视频（默认False）
+            encoding_profile: 编码档位 draft/balanced/archive（默认当前任务绑定的档位）
         """
         self.original_video = original_video
         self.srt_file = srt_file
@@ -205,7 +209,12 @@ class VideoRecomposer:
         self.subtitle_style = {**self.DEFAULT_STYLE, **(subtitle_style or {})}
         self.enable_ai_separation = enable_ai_separation
         self.auto_clip_video = auto_clip_video
-        self.temp_dir = tempfile.mkdtemp(prefix="videorecomp_")
+        self.profile = get_profile(encoding_profile)
+        # 解压的配音、提取的音轨等中间文件放在临时工作区
+        self.temp_dir = scratch_dir(
+            "videorecomp_",
+            estimate_bytes(audio_zip, factor=2.0) + estimate_bytes(original_video, factor=0.2)
+        )
 
         # 创建输出目录
         os.makedirs(self.output_dir, exist_ok=True)
@@ -264,7 +273,7 @@ class VideoRecomposer:
         ]
 
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_probe(cmd)
             streams_info = json.loads(result.stdout)
             audio_streams = streams_info.get('streams', [])
         except subprocess.CalledProcessError as e:
@@ -285,8 +294,10 @@ class VideoRecomposer:
         os.makedirs(temp_audio_dir, exist_ok=True)
 
         extracted_files = []
+        outputs = []
+        cmds = []
 
-        # 提取每个音轨并转换为MP3
+        # 提取每个音轨并转换为MP3（各音轨同时提取）
         for idx, stream in enumerate(audio_streams):
             stream_index = stream.get('index', idx)
             language = stream.get('tags', {}).get('language', f'track_{idx}')
@@ -305,12 +316,17 @@ class VideoRecomposer:
                 '-q:a', '2',  # MP3质量（0-9，2为高质量）
                 output_path
             ]
+            outputs.append(output_path)
+            cmds.append(cmd)
 
-            try:
-                subprocess.run(cmd, capture_output=True, check=True)
+        for output_path, result in zip(outputs, run_ffmpeg_many(cmds)):
+            if isinstance(result, Exception):
+                raise result
+            if result.returncode == 0:
                 extracted_files.append(output_path)
-                print(f"  ✅ 已保存: {output_filename}")
-            except subprocess.CalledProcessError as e:
+                print(f"  ✅ 已保存: {os.path.basename(output_path)}")
+            else:
+                e = subprocess.CalledProcessError(result.returncode, result.args, stderr=result.stderr)
                 print(f"  ❌ 提取失败: {e}")
 
         if not extracted_files:
@@ -323,10 +339,8 @@ class VideoRecomposer:
 
         print(f"\n打包音轨到 {zip_filename}...")
 
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in extracted_files:
-                arcname = os.path.basename(file_path)
-                zipf.write(file_path, arcname)
+        # 音轨已是压缩格式，直接存储
+        write_zip(zip_path, [(file_path, os.path.basename(file_path)) for file_path in extracted_files])
 
         print(f"✅ 音轨已保存到: {zip_path}")
 
@@ -377,7 +391,7 @@ class VideoRecomposer:
                 main_audio_path
             ]
             try:
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
             except subprocess.CalledProcessError:
                 print("❌ 提取主音轨失败")
                 return None
@@ -424,7 +438,7 @@ class VideoRecomposer:
                     '-loglevel', 'error',
                     temp_resampled
                 ]
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
                 # 重新加载
                 audio, sample_rate = sf.read(temp_resampled, always_2d=True)
                 waveform = torch.from_numpy(audio.T).float()
@@ -438,7 +452,7 @@ class VideoRecomposer:
 
             # 使用 Demucs apply_model 分离音频
             print("正在分离音频...")
-            with torch.no_grad():
+            with torch.no_grad(), stage_timer('separation', inputs=[main_audio_path]):
                 sources = apply.apply_model(
                     model,
                     waveform,
@@ -448,6 +462,8 @@ class VideoRecomposer:
                     overlap=0.25,
                     progress=True
                 )
+            # 模型推理在本进程内执行，无法中途打断，只能在推理结束后检查取消
+            check_cancelled()
 
             # sources shape: [batch, sources, channels, samples]
             sources = sources.squeeze(0)  # [sources, channels, samples]
@@ -483,7 +499,7 @@ class VideoRecomposer:
                     '-loglevel', 'error',
                     temp_mp3_path
                 ]
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
 
                 if os.path.exists(temp_mp3_path):
                     temp_mp3_files[stem] = temp_mp3_path
@@ -521,7 +537,7 @@ class VideoRecomposer:
                     '-loglevel', 'error',
                     no_vocals_path
                 ]
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
                 print(f"  ✅ 已创建: 伴奏.mp3")
             else:
                 print("  ❌ 缺少必要的音轨文件")
@@ -541,13 +557,14 @@ class VideoRecomposer:
 
             # 打包成ZIP
             zip_path = os.path.join(self.output_dir, 'separated_audio.zip')
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                if os.path.exists(vocals_path):
-                    zipf.write(vocals_path, '人声.mp3')
-                    print(f"  ✅ 已添加到ZIP: 人声.mp3")
-                if os.path.exists(no_vocals_path):
-                    zipf.write(no_vocals_path, '伴奏.mp3')
-                    print(f"  ✅ 已添加到ZIP: 伴奏.mp3")
+            zip_entries = []
+            if os.path.exists(vocals_path):
+                zip_entries.append((vocals_path, '人声.mp3'))
+                print(f"  ✅ 已添加到ZIP: 人声.mp3")
+            if os.path.exists(no_vocals_path):
+                zip_entries.append((no_vocals_path, '伴奏.mp3'))
+                print(f"  ✅ 已添加到ZIP: 伴奏.mp3")
+            write_zip(zip_path, zip_entries)
 
             print(f"\n✅ 音频分离完成！")
             print(f"   文件已保存到: {separation_dir}")
@@ -632,6 +649,8 @@ class VideoRecomposer:
         Returns:
             包含所有字幕的CompositeVideoClip
         """
+        from PIL import Image, ImageDraw, ImageFont
+        from moviepy import ImageClip
         import numpy as np
 
         # 获取样式配置
@@ -768,6 +787,8 @@ class VideoRecomposer:
         Returns:
             包含所有生成文件路径的字典
         """
+        from moviepy import VideoFileClip, CompositeVideoClip
+
         # 1. 加载新字幕
         print("加载新字幕文件...")
         self.subtitle_processor = SubtitleProcessor(self.srt_file)
@@ -785,6 +806,7 @@ class VideoRecomposer:
 
         # 3. 根据字幕时间剪辑视频（如果启用）
         if self.auto_clip_video and self.original_srt_file:
+            progress_stage('auto_clip', 0, 20)
             clipped_video_path = self._clip_video_by_subtitle_times(
                 os.path.join(self.temp_dir, 'auto_clipped_video.mp4')
             )
@@ -802,6 +824,7 @@ class VideoRecomposer:
         print("\n生成新字幕版本...")
 
         # 4.1 生成新字幕软字幕视频
+        progress_stage('new_soft_subtitle', 20, 25)
         new_soft_subtitle_path = os.path.join(self.output_dir, "output_new_soft_subtitle.mp4")
         cmd = [
             'ffmpeg', '-y',
@@ -814,7 +837,7 @@ class VideoRecomposer:
             new_soft_subtitle_path
         ]
         try:
-            subprocess.run(cmd, capture_output=True, check=True)
+            run_ffmpeg(cmd, check=True)
             print(f"✅ 新字幕软字幕视频已生成: {new_soft_subtitle_path}")
             result['new_soft_subtitle'] = new_soft_subtitle_path
         except subprocess.CalledProcessError as e:
@@ -823,18 +846,20 @@ class VideoRecomposer:
 
         # 4.2 生成新字幕硬字幕视频
         print("生成新字幕硬字幕视频...")
+        progress_stage('new_hard_subtitle', 25, 100)
         new_hard_subtitle_path = os.path.join(self.output_dir, "output_new_hard_subtitle.mp4")
         subtitles_data = self.subtitle_processor.to_moviepy_format()
         subtitle_clips = self._create_subtitle_clips(original_clip, subtitles_data)
         final_with_subtitle = CompositeVideoClip([original_clip] + subtitle_clips)
 
-        final_with_subtitle.write_videofile(
-            new_hard_subtitle_path,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_new_hard_sub.m4a'),
-            remove_temp=True
-        )
+        with stage_timer('burn', outputs=[new_hard_subtitle_path]):
+            final_with_subtitle.write_videofile(
+                new_hard_subtitle_path,
+                **self.profile.moviepy_kwargs(),
+                temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_new_hard_sub.m4a'),
+                remove_temp=True,
+                logger=moviepy_logger()
+            )
         print(f"✅ 新字幕硬字幕视频已生成: {new_hard_subtitle_path}")
         result['new_hard_subtitle'] = new_hard_subtitle_path
 
@@ -940,11 +965,11 @@ class VideoRecomposer:
         # 提取并拼接片段
         print("\n正在提取并拼接视频片段...")
         segment_files = []
+        temp_segments = [os.path.join(self.temp_dir, f'segment_{i:03d}.mp4') for i in range(len(merged_segments))]
 
-        for i, (start, end) in enumerate(merged_segments):
-            temp_segment = os.path.join(self.temp_dir, f'segment_{i:03d}.mp4')
-
-            cmd = [
+        # 各片段互不依赖，同时提取
+        cmds = [
+            [
                 'ffmpeg', '-y',
                 '-ss', str(start),
                 '-i', self.original_video,
@@ -953,8 +978,13 @@ class VideoRecomposer:
                 '-avoid_negative_ts', '1',
                 temp_segment
             ]
+            for (start, end), temp_segment in zip(merged_segments, temp_segments)
+        ]
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+        for i, result in enumerate(run_ffmpeg_many(cmds)):
+            temp_segment = temp_segments[i]
+            if isinstance(result, Exception):
+                raise result
 
             if result.returncode == 0 and os.path.exists(temp_segment) and os.path.getsize(temp_segment) > 1000:
                 segment_files.append(temp_segment)
@@ -985,7 +1015,7 @@ class VideoRecomposer:
             clipped_video_path
         ]
 
-        result = subprocess.run(concat_cmd, capture_output=True, text=True)
+        result = run_ffmpeg(concat_cmd)
 
         if result.returncode == 0 and os.path.exists(clipped_video_path) and os.path.getsize(clipped_video_path) > 1000:
             print(f"✅ 视频剪辑完成: {clipped_video_path}")
@@ -1002,6 +1032,8 @@ class VideoRecomposer:
         Returns:
             包含所有生成文件路径的字典
         """
+        from moviepy import VideoFileClip, AudioFileClip, CompositeVideoClip
+
         # 检查是否有配音文件
         if not self.audio_zip:
             print("没有提供配音文件，将使用原视频音频生成带字幕的视频")
@@ -1009,12 +1041,14 @@ class VideoRecomposer:
             return self._process_with_original_audio()
 
         # 0. 提取原视频音轨（默认执行）
+        progress_stage('extract_audio', 0, 5)
         _, first_audio_path = self.extract_all_audio_tracks()
 
         # 0.1 AI 音频分离（自动执行，使用提取的第一个音轨）
         accompaniment_path = None
         if first_audio_path:
             print("\n自动执行 AI 音频分离...")
+            progress_stage('separation', 5, 30)
             separation_result = self.separate_audio_tracks(main_audio_path=first_audio_path, enable_ai=True)
             if separation_result:
                 accompaniment_path = separation_result.get('no_vocals')
@@ -1032,12 +1066,14 @@ class VideoRecomposer:
 
         # 2. 提取并合并配音音频
         print("\n处理配音文件...")
+        progress_stage('merge_audio', 30, 35)
         self.extracted_audio_files = self._extract_audio_from_zip()
 
         # 保存合并的音频到输出目录
         merged_audio_path = os.path.join(self.output_dir, "merged_audio.mp3")
         audio_merger = AudioMerger(self.extracted_audio_files, self.srt_file)
-        audio_merger.merge_audio(merged_audio_path)
+        with stage_timer('merge', inputs=self.extracted_audio_files, outputs=[merged_audio_path]):
+            audio_merger.merge_audio(merged_audio_path)
         print(f"✅ 音频合并完成并保存到本地: {merged_audio_path}")
 
         # 2.1 将伴奏与配音合并（如果存在伴奏）
@@ -1057,7 +1093,7 @@ class VideoRecomposer:
                 mixed_audio_path
             ]
             try:
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
                 print(f"✅ 伴奏混合完成: {mixed_audio_path}")
             except subprocess.CalledProcessError as e:
                 print(f"⚠️  伴奏混合失败: {e}")
@@ -1070,6 +1106,7 @@ class VideoRecomposer:
 
         # 3. 根据字幕时间剪辑视频（如果启用）
         if self.auto_clip_video and self.original_srt_file:
+            progress_stage('auto_clip', 35, 40)
             clipped_video_path = self._clip_video_by_subtitle_times(
                 os.path.join(self.temp_dir, 'auto_clipped_video.mp4')
             )
@@ -1093,12 +1130,13 @@ class VideoRecomposer:
         # 4. 生成不带字幕的视频
         print("\n生成不带字幕的视频...")
         no_subtitle_path = os.path.join(self.output_dir, "output_no_subtitle.mp4")
+        progress_stage('render_no_subtitle', 40, 50)
         video_with_audio.write_videofile(
             no_subtitle_path,
-            codec='libx264',
-            audio_codec='aac',
+            **self.profile.moviepy_kwargs(),
             temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_no_sub.m4a'),
-            remove_temp=True
+            remove_temp=True,
+            logger=moviepy_logger()
         )
 
         # 结果字典
@@ -1121,13 +1159,14 @@ class VideoRecomposer:
         # 4. 生成不带字幕的视频
         print("\n生成不带字幕的视频...")
         no_subtitle_path = os.path.join(self.output_dir, "output_no_subtitle.mp4")
+        progress_stage('render_no_subtitle', 50, 60)
 
         video_with_audio.write_videofile(
             no_subtitle_path,
-            codec='libx264',
-            audio_codec='aac',
+            **self.profile.moviepy_kwargs(),
             temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_no_sub.m4a'),
-            remove_temp=True
+            remove_temp=True,
+            logger=moviepy_logger()
         )
 
         # 结果字典
@@ -1141,6 +1180,8 @@ class VideoRecomposer:
         print("\n生成新字幕版本...")
 
         # 5.1 生成新字幕软字幕视频
+        has_original = bool(self.original_srt_file and os.path.exists(self.original_srt_file))
+        progress_stage('new_soft_subtitle', 60, 62)
         new_soft_subtitle_path = os.path.join(self.output_dir, "output_new_soft_subtitle.mp4")
         cmd = [
             'ffmpeg', '-y',
@@ -1153,7 +1194,7 @@ class VideoRecomposer:
             new_soft_subtitle_path
         ]
         try:
-            subprocess.run(cmd, capture_output=True, check=True)
+            run_ffmpeg(cmd, check=True)
             print(f"✅ 新字幕软字幕视频已生成: {new_soft_subtitle_path}")
             result['new_soft_subtitle'] = new_soft_subtitle_path
         except subprocess.CalledProcessError as e:
@@ -1162,18 +1203,20 @@ class VideoRecomposer:
 
         # 5.2 生成新字幕硬字幕视频
         print("生成新字幕硬字幕视频...")
+        progress_stage('new_hard_subtitle', 62, 80 if has_original else 100)
         new_hard_subtitle_path = os.path.join(self.output_dir, "output_new_hard_subtitle.mp4")
         subtitles_data = self.subtitle_processor.to_moviepy_format()
         subtitle_clips = self._create_subtitle_clips(video_with_audio, subtitles_data)
         final_with_subtitle = CompositeVideoClip([video_with_audio] + subtitle_clips)
 
-        final_with_subtitle.write_videofile(
-            new_hard_subtitle_path,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_new_hard_sub.m4a'),
-            remove_temp=True
-        )
+        with stage_timer('burn', outputs=[new_hard_subtitle_path]):
+            final_with_subtitle.write_videofile(
+                new_hard_subtitle_path,
+                **self.profile.moviepy_kwargs(),
+                temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_new_hard_sub.m4a'),
+                remove_temp=True,
+                logger=moviepy_logger()
+            )
         print(f"✅ 新字幕硬字幕视频已生成: {new_hard_subtitle_path}")
         result['new_hard_subtitle'] = new_hard_subtitle_path
 
@@ -1182,6 +1225,7 @@ class VideoRecomposer:
             print("\n生成原字幕版本...")
 
             # 6.1 生成原字幕软字幕视频
+            progress_stage('original_soft_subtitle', 80, 82)
             original_soft_subtitle_path = os.path.join(self.output_dir, "output_original_soft_subtitle.mp4")
             cmd = [
                 'ffmpeg', '-y',
@@ -1194,7 +1238,7 @@ class VideoRecomposer:
                 original_soft_subtitle_path
             ]
             try:
-                subprocess.run(cmd, capture_output=True, check=True)
+                run_ffmpeg(cmd, check=True)
                 print(f"✅ 原字幕软字幕视频已生成: {original_soft_subtitle_path}")
                 result['original_soft_subtitle'] = original_soft_subtitle_path
             except subprocess.CalledProcessError as e:
@@ -1202,18 +1246,20 @@ class VideoRecomposer:
 
             # 6.2 生成原字幕硬字幕视频
             print("生成原字幕硬字幕视频...")
+            progress_stage('original_hard_subtitle', 82, 100)
             original_hard_subtitle_path = os.path.join(self.output_dir, "output_original_hard_subtitle.mp4")
             original_subtitles_data = self.original_subtitle_processor.to_moviepy_format()
             original_subtitle_clips = self._create_subtitle_clips(video_with_audio, original_subtitles_data)
             original_final_with_subtitle = CompositeVideoClip([video_with_audio] + original_subtitle_clips)
 
-            original_final_with_subtitle.write_videofile(
-                original_hard_subtitle_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_original_hard_sub.m4a'),
-                remove_temp=True
-            )
+            with stage_timer('burn', outputs=[original_hard_subtitle_path]):
+                original_final_with_subtitle.write_videofile(
+                    original_hard_subtitle_path,
+                    **self.profile.moviepy_kwargs(),
+                    temp_audiofile=os.path.join(self.temp_dir, 'temp_audio_original_hard_sub.m4a'),
+                    remove_temp=True,
+                    logger=moviepy_logger()
+                )
             print(f"✅ 原字幕硬字幕视频已生成: {original_hard_subtitle_path}")
             result['original_hard_subtitle'] = original_hard_subtitle_path
 
@@ -1257,7 +1303,8 @@ def create_video_recomposer(
     subtitle_style: dict = None,
     enable_ai_separation: bool = False,
     original_srt_file: str = None,
-    auto_clip_video: bool = False
+    auto_clip_video: bool = False,
+    encoding_profile: Optional[str] = None
 ) -> VideoRecomposer:
     """
     创建视频重新生成器的便捷函数
@@ -1271,6 +1318,7 @@ def create_video_recomposer(
         enable_ai_separation: 是否启用AI音频分离（默认False）
         original_srt_file: 原字幕文件路径（可选）
         auto_clip_video: 是否根据字幕时间自动剪辑视频（默认False）
+        encoding_profile: 编码档位 draft/balanced/archive（可选）
 
     Returns:
         VideoRecomposer实例
@@ -1293,5 +1341,6 @@ def create_video_recomposer(
         subtitle_style=subtitle_style,
         enable_ai_separation=enable_ai_separation,
         original_srt_file=original_srt_file,
-        auto_clip_video=auto_clip_video
+        auto_clip_video=auto_clip_video,
+        encoding_profile=encoding_profile
     )
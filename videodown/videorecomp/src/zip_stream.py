@@ -0,0 +1,181 @@
+#!/usr/bin/env python3.12
+"""
+ZIP 流式打包
+边读文件边产出 ZIP 数据块，内存占用与文件总大小无关；
+已压缩的媒体（mp3/mp4/aac 等）直接存储（STORED），不再做无效的 DEFLATE。
+
+同一组文件（路径、大小、修改时间不变）每次打包出的字节完全一致，
+因此可以用 zip_etag() 做 ETag，断点续传时重新打包也能对上偏移。
+"""
+
+import os
+import hashlib
+import threading
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+# 读取文件的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 已经压缩过的格式，再 DEFLATE 只会浪费 CPU
+STORED_EXTENSIONS = frozenset({
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac', '.wma',
+    '.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi', '.flv', '.ts',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.zip', '.gz', '.7z', '.rar', '.xz', '.bz2',
+})
+
+# (源文件路径, ZIP 内文件名)
+ZipEntry = Tuple[str, str]
+
+
+def compress_type_for(name: str) -> int:
+    """根据扩展名选择压缩方式"""
+    ext = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def existing_entries(entries: Iterable[ZipEntry]) -> List[ZipEntry]:
+    """过滤掉不存在的文件"""
+    return [(path, arcname) for path, arcname in entries if os.path.isfile(path)]
+
+
+def zip_etag(entries: Iterable[ZipEntry]) -> str:
+    """
+    计算一组文件打包结果的 ETag
+
+    只看文件名、大小和修改时间，不读取文件内容
+    """
+    digest = hashlib.sha1()
+    for path, arcname in entries:
+        st = os.stat(path)
+        digest.update(f'{arcname}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _zip_info(path: str, arcname: str) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+    zinfo.compress_type = compress_type_for(arcname)
+    return zinfo
+
+
+def _partial_path(path: str) -> str:
+    # 多个线程/进程可能同时为同一个 ZIP 建缓存，临时文件各写各的
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.partial'
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：只追加、不可 seek，写入的数据由调用方取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[ZipEntry], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    流式生成 ZIP
+
+    Args:
+        entries: (源文件路径, ZIP 内文件名) 列表
+        chunk_size: 每次读取源文件的字节数
+
+    Returns:
+        ZIP 数据块迭代器
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for path, arcname in entries:
+            with open(path, 'rb') as src, zf.open(_zip_info(path, arcname), 'w') as dest:
+                while True:
+                    block = src.read(chunk_size)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # 中央目录在 close() 时写出
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def write_zip(zip_path: str, entries: Iterable[ZipEntry], chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    打包到磁盘文件（先写临时文件再改名，不会留下半个 ZIP）
+
+    Args:
+        zip_path: 输出路径
+        entries: (源文件路径, ZIP 内文件名) 列表
+        chunk_size: 每次读取源文件的字节数
+
+    Returns:
+        输出路径
+    """
+    tmp_path = _partial_path(zip_path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            for data in iter_zip(entries, chunk_size):
+                f.write(data)
+        os.replace(tmp_path, zip_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return zip_path
+
+
+def tee_zip(entries: Iterable[ZipEntry], cache_path: Optional[str] = None,
+            chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    流式生成 ZIP，同时写一份到缓存文件
+
+    只有完整产出后缓存文件才会出现，客户端中途断开时丢弃半成品
+
+    Args:
+        entries: (源文件路径, ZIP 内文件名) 列表
+        cache_path: 缓存路径，为 None 时不写缓存
+        chunk_size: 每次读取源文件的字节数
+
+    Returns:
+        ZIP 数据块迭代器
+    """
+    if not cache_path:
+        yield from iter_zip(entries, chunk_size)
+        return
+
+    tmp_path = _partial_path(cache_path)
+    cache = open(tmp_path, 'wb')
+    try:
+        for data in iter_zip(entries, chunk_size):
+            cache.write(data)
+            yield data
+        cache.close()
+        os.replace(tmp_path, cache_path)
+    finally:
+        if not cache.closed:
+            cache.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+